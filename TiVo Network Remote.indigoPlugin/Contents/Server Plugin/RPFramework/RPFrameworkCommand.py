@@ -21,6 +21,9 @@
 #	Version 17:
 #		Changed command constants to unicode
 #		Added getPayloadAsList function
+#	Version 25:
+#		Added the list of response IDs expected in reply to the command
+#		Added the UPnP enumeration refresh command (CMD_UPNP_REFRESHENUMERATION)
 #
 #/////////////////////////////////////////////////////////////////////////////////////////
 #/////////////////////////////////////////////////////////////////////////////////////////
@@ -41,6 +44,7 @@ CMD_NETWORKING_WOL_REQUEST = u'SENDWOLREQUEST'
 CMD_DEVICE_RECONNECT = u'RECONNECTDEVICE'
 
 CMD_DEBUG_LOGUPNPDEVICES = u'LOGUPNPDEVICES'
+CMD_UPNP_REFRESHENUMERATION = u'REFRESHUPNPENUMERATION'
 
 
 #/////////////////////////////////////////////////////////////////////////////////////////
@@ -58,13 +62,16 @@ class RPFrameworkCommand(object):
 	# Class construction and destruction methods
 	#/////////////////////////////////////////////////////////////////////////////////////
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
-	# Constructor allows passing in the data that makes up the command
+	# Constructor allows passing in the data that makes up the command; expectedResponses
+	# is None when any response may follow the command, otherwise the list of the IDs of
+	# the responses which answer it (an empty list when no response is expected)
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
-	def __init__(self, commandName, commandPayload=None, postCommandPause=0.0, parentAction=u''):
+	def __init__(self, commandName, commandPayload=None, postCommandPause=0.0, parentAction=u'', expectedResponses=None):
 		self.commandName = commandName
 		self.commandPayload = commandPayload
 		self.postCommandPause = postCommandPause
 		self.parentAction = parentAction
+		self.expectedResponses = expectedResponses
 		
 		
 	#/////////////////////////////////////////////////////////////////////////////////////
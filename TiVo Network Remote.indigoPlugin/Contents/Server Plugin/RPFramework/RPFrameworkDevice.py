@@ -27,6 +27,16 @@
 #	Version 17:
 #		Added unicode support
 #		Changed error messages to the new plugin-based logErrorMessage
+#	Version 25:
+#		Added queued state updates which are sent to the server as a single batch,
+#		coalescing repeated writes to a state and dropping writes of unchanged values
+#		Reconnection attempts are queued on the plugin command queue for their due time
+#		Added the exponential reconnection scheme with a maximum delay, full jitter and a
+#			persistent delay for retrying (at a low rate) once the attempt limit is reached
+#		Communications are stopped cooperatively with a bounded wait; the stop may be
+#			requested separately so that many devices are able to stop in parallel
+#		A command queued to a processing thread which has been asked to stop starts a new
+#			processing thread
 #
 #/////////////////////////////////////////////////////////////////////////////////////////
 #/////////////////////////////////////////////////////////////////////////////////////////
@@ -50,6 +60,7 @@ import RPFrameworkUtils
 #/////////////////////////////////////////////////////////////////////////////////////////
 # Constants and configuration variables
 #/////////////////////////////////////////////////////////////////////////////////////////
+DEVICE_TERMINATE_TIMEOUT = 5.0
 
 
 #/////////////////////////////////////////////////////////////////////////////////////////
@@ -87,6 +98,12 @@ class RPFrameworkDevice(object):
 		self.upgradedDeviceStates = list()
 		self.upgradedDeviceProperties = list()
 		
+		self.pendingStateUpdates = list()
+		self.pendingStateUpdatesByKey = dict()
+		self.pendingStateUpdatesSince = 0
+		self.stateUpdateLock = threading.Lock()
+		self.stateUpdateCoalesceWindow = float(plugin.getGUIConfigValue(device.deviceTypeId, RPFrameworkPlugin.GUI_CONFIG_STATEUPDATE_COALESCEWINDOW, u'0'))
+		
 	
 	#/////////////////////////////////////////////////////////////////////////////////////
 	# Validation and GUI functions
@@ -137,16 +154,56 @@ class RPFrameworkDevice(object):
 			self.queueDeviceCommand(RPFrameworkCommand.RPFrameworkCommand(RPFrameworkCommand.CMD_INITIALIZE_CONNECTION))
 
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
-	# This routine will shut down communications with the hardware device
+	# This routine will shut down communications with the hardware device, waiting no
+	# longer than the timeout (in seconds) for it to complete
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def terminateCommunications(self, timeout=DEVICE_TERMINATE_TIMEOUT):
+		self.requestCommunicationsStop()
+		self.waitForCommunicationsStop(timeout)
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine asks the processing thread to stop without waiting for it to do so; the
+	# thread stops once its current command completes or its wait is interrupted
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
-	def terminateCommunications(self):
+	def requestCommunicationsStop(self):
 		self.hostPlugin.logger.debug(u'Initiating shutdown of communications with ' + RPFrameworkUtils.to_unicode(self.indigoDevice.name))
 		if not (self.concurrentThread is None) and self.concurrentThread.isAlive() == True:
-			self.concurrentThread.terminateThread()
-			self.concurrentThread.join()
+			self.concurrentThread.requestStop()
+			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine waits, up to the timeout, for the processing thread to stop after
+	# requestCommunicationsStop; a thread still running afterwards is abandoned (it is a
+	# daemon and will stop when it next checks for the request)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def waitForCommunicationsStop(self, timeout=DEVICE_TERMINATE_TIMEOUT):
+		if not (self.concurrentThread is None) and self.concurrentThread.isAlive() == True and not (self.concurrentThread is threading.currentThread()):
+			self.concurrentThread.join(max(0.0, timeout))
+			if self.concurrentThread.isAlive() == True:
+				self.hostPlugin.logger.warning(u'Communications with ' + RPFrameworkUtils.to_unicode(self.indigoDevice.name) + u' did not stop within ' + RPFrameworkUtils.to_unicode(timeout) + u' seconds')
 		self.concurrentThread = None
 		self.hostPlugin.logger.debug(u'Shutdown of communications with ' + RPFrameworkUtils.to_unicode(self.indigoDevice.name) + u' complete')
 		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns True if the calling processing thread has been asked to stop; processing
+	# loops check this between commands
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def isCommunicationsStopRequested(self):
+		currentThread = threading.currentThread()
+		return isinstance(currentThread, RPFrameworkThread.RPFrameworkThread) and currentThread.isStopRequested()
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Sleeps the processing thread for the given number of seconds, returning early (with
+	# True) should the thread be asked to stop
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def sleepUnlessStopRequested(self, sleepTime):
+		currentThread = threading.currentThread()
+		if isinstance(currentThread, RPFrameworkThread.RPFrameworkThread):
+			currentThread.stopEvent.wait(sleepTime)
+			return currentThread.isStopRequested()
+		else:
+			time.sleep(sleepTime)
+			return False
+		
 		
 	#/////////////////////////////////////////////////////////////////////////////////////
 	# Queue and command processing methods
@@ -159,8 +216,9 @@ class RPFrameworkDevice(object):
 		self.commandQueue.put(command)
 		
 		# if connection to the device has not started, or has timed out, then start up a
-		# concurrent thread to handle communications
-		if self.concurrentThread is None or self.concurrentThread.isAlive() == False:
+		# concurrent thread to handle communications; a thread which has been asked to stop
+		# will not process the command, even if it has yet to exit, so is replaced too
+		if self.concurrentThread is None or self.concurrentThread.isAlive() == False or self.concurrentThread.isStopRequested() == True:
 			self.concurrentThread = RPFrameworkThread.RPFrameworkThread(target=functools.partial(self.concurrentCommandProcessingThread, self.commandQueue))
 			self.concurrentThread.start()
 			
@@ -187,23 +245,50 @@ class RPFrameworkDevice(object):
 		self.hostPlugin.logger.debug(u'Scheduling reconnection attempt...')
 		try:
 			self.failedConnectionAttempts = self.failedConnectionAttempts + 1
-			maxReconnectAttempts = int(self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_LIMIT, u'0'))
-			if self.failedConnectionAttempts > maxReconnectAttempts:
+			reconnectSeconds = self.getReconnectionDelay(self.failedConnectionAttempts)
+			if reconnectSeconds is None:
 				self.hostPlugin.logger.debug(u'Maximum reconnection attempts reached (or not allowed) for device ' + RPFrameworkUtils.to_unicode(self.indigoDevice.id))
 			else:
-				reconnectAttemptDelay = int(self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_DELAY, u'60'))
-				reconnectAttemptScheme = self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME, RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME_REGRESS)
-			
-				if reconnectAttemptScheme == RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME_FIXED:
-					reconnectSeconds = reconnectAttemptDelay
-				else:
-					reconnectSeconds = reconnectAttemptDelay * self.failedConnectionAttempts
 				reconnectAttemptTime = time.time() + reconnectSeconds
-
-				self.hostPlugin.pluginCommandQueue.put(RPFrameworkCommand.RPFrameworkCommand(RPFrameworkCommand.CMD_DEVICE_RECONNECT, commandPayload=(self.indigoDevice.id, self.deviceInstanceIdentifier, reconnectAttemptTime)))
-				self.hostPlugin.logger.debug(u'Reconnection attempt scheduled for ' + RPFrameworkUtils.to_unicode(reconnectSeconds) + u' seconds')
-		except e:
-			self.hostPlugin.logger.error(u'Failed to schedule reconnection attempt to device')			
+				self.hostPlugin.pluginCommandQueue.putAt(RPFrameworkCommand.RPFrameworkCommand(RPFrameworkCommand.CMD_DEVICE_RECONNECT, commandPayload=(self.indigoDevice.id, self.deviceInstanceIdentifier, reconnectAttemptTime)), reconnectAttemptTime)
+				self.hostPlugin.logger.debug(u'Reconnection attempt scheduled for ' + RPFrameworkUtils.to_unicode(round(reconnectSeconds, 1)) + u' seconds')
+		except:
+			self.hostPlugin.logger.exception(u'Failed to schedule reconnection attempt to device')
+			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine returns the number of seconds to wait before the given (1-based) failed
+	# connection attempt is retried, or None once no further attempts should be made. The
+	# delay follows the configured scheme -- fixed, regress (growing linearly) or
+	# exponential (doubling) -- up to the maximum delay. Full jitter waits a random time
+	# up to the delay so that devices dropped together do not all reconnect together.
+	# After the attempt limit, a persistent delay (if set) keeps retrying at that rate
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getReconnectionDelay(self, failedAttempts):
+		deviceTypeId = self.indigoDevice.deviceTypeId
+		maxReconnectAttempts = int(self.hostPlugin.getGUIConfigValue(deviceTypeId, RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_LIMIT, u'0'))
+		reconnectAttemptDelay = float(self.hostPlugin.getGUIConfigValue(deviceTypeId, RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_DELAY, u'60'))
+		reconnectAttemptScheme = self.hostPlugin.getGUIConfigValue(deviceTypeId, RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME, RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME_REGRESS)
+		reconnectAttemptMaxDelay = float(self.hostPlugin.getGUIConfigValue(deviceTypeId, RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_MAXDELAY, u'0'))
+		reconnectAttemptJitter = self.hostPlugin.getGUIConfigValue(deviceTypeId, RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_JITTER, RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_JITTER_NONE)
+		reconnectAttemptPersistentDelay = float(self.hostPlugin.getGUIConfigValue(deviceTypeId, RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_PERSISTENTDELAY, u'0'))
+		
+		if failedAttempts > maxReconnectAttempts:
+			if reconnectAttemptPersistentDelay <= 0.0:
+				return None
+			reconnectSeconds = reconnectAttemptPersistentDelay
+		elif reconnectAttemptScheme == RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME_FIXED:
+			reconnectSeconds = reconnectAttemptDelay
+		elif reconnectAttemptScheme == RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME_EXPONENTIAL:
+			# the exponent is limited so that a long outage cannot overflow the delay
+			reconnectSeconds = reconnectAttemptDelay * (2 ** min(failedAttempts - 1, 30))
+		else:
+			reconnectSeconds = reconnectAttemptDelay * failedAttempts
+		if reconnectAttemptMaxDelay > 0.0 and failedAttempts <= maxReconnectAttempts:
+			reconnectSeconds = min(reconnectSeconds, reconnectAttemptMaxDelay)
+			
+		if reconnectAttemptJitter == RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_JITTER_FULL:
+			reconnectSeconds = random.uniform(0.0, reconnectSeconds)
+		return reconnectSeconds
 		
 		
 	#/////////////////////////////////////////////////////////////////////////////////////
@@ -262,9 +347,58 @@ class RPFrameworkDevice(object):
 	# This routine will update both the device's state list and the server with the new
 	# device states
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
-	def updateStatesForDevice(self, statesToUpdate):
+	def updateStatesForDevice(self, statesToUpdate, clearErrorState=True):
 		for updateValue in statesToUpdate:
 			self.indigoDevice.states[updateValue["key"]] = updateValue["value"]
-		self.indigoDevice.updateStatesOnServer(statesToUpdate)
+		self.indigoDevice.updateStatesOnServer(statesToUpdate, clearErrorState=clearErrorState)
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine will queue a state update to be sent to the server with the next call
+	# to flushStateUpdates; a state already queued is overwritten in place while a write
+	# of the state's current value (without a UI value) is dropped. The local copy of the
+	# state is updated immediately so that substitutions see the new value
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def queueStateUpdate(self, key, value, uiValue=None):
+		with self.stateUpdateLock:
+			pendingUpdate = self.pendingStateUpdatesByKey.get(key, None)
+			if pendingUpdate is None:
+				if uiValue is None and key in self.indigoDevice.states and self.indigoDevice.states[key] == value:
+					return
+				pendingUpdate = { "key": key }
+				self.pendingStateUpdatesByKey[key] = pendingUpdate
+				if len(self.pendingStateUpdates) == 0:
+					self.pendingStateUpdatesSince = time.time()
+				self.pendingStateUpdates.append(pendingUpdate)
+			
+			pendingUpdate["value"] = value
+			self.indigoDevice.states[key] = value
+			if uiValue is None:
+				pendingUpdate.pop("uiValue", None)
+			else:
+				pendingUpdate["uiValue"] = uiValue
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine will send any queued state updates to the server in a single call; when
+	# not forced, the updates are held until the device's coalesce window has elapsed
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def flushStateUpdates(self, forceFlush=True, clearErrorState=True):
+		with self.stateUpdateLock:
+			if len(self.pendingStateUpdates) == 0:
+				return
+			if forceFlush == False and time.time() < self.pendingStateUpdatesSince + self.stateUpdateCoalesceWindow:
+				return
+			statesToUpdate = self.pendingStateUpdates
+			self.pendingStateUpdates = list()
+			self.pendingStateUpdatesByKey = dict()
+		self.updateStatesForDevice(statesToUpdate, clearErrorState=clearErrorState)
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine returns the time at which the queued state updates are due to be sent
+	# to the server, or None if no updates are queued
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getStateUpdateFlushTime(self):
+		if len(self.pendingStateUpdates) == 0:
+			return None
+		return self.pendingStateUpdatesSince + self.stateUpdateCoalesceWindow
 	
 	
\ No newline at end of file
@@ -24,6 +24,13 @@
 #		Change exception logging to new plugin-object based error logging
 #	Version 18:
 #		Added support for updateExecCondition specification on response processing effects
+#	Version 25:
+#		Match expressions are now compiled once when the response is defined
+#		Added the response dispatcher which indexes responses by their literal prefix
+#		Added the %cp:group:N% substitution for the groups captured by the match
+#		Effect conditions and evaluated values now use the plugin's compiled expressions
+#		State update effects are now queued on the device and sent as a single batch
+#		The dispatcher now reports which actions have responses specific to them
 #
 #/////////////////////////////////////////////////////////////////////////////////////////
 #/////////////////////////////////////////////////////////////////////////////////////////
@@ -46,6 +53,10 @@ RESPONSE_EFFECT_UPDATESTATE = u'updateDeviceState'
 RESPONSE_EFFECT_QUEUECOMMAND = u'queueCommand'
 RESPONSE_EFFECT_CALLBACK = u'eventCallback'
 
+RESPONSE_CRITERIA_RESPONSEONLY = u'%cp:response%'
+RESPONSE_REGEX_SPECIALCHARS = u'.^$*+?{}[]\\|()'
+RESPONSE_GROUP_SUBSTITUTION_REGEX = re.compile(r'%cp:group:(\d+)%')
+
 
 #/////////////////////////////////////////////////////////////////////////////////////////
 #/////////////////////////////////////////////////////////////////////////////////////////
@@ -71,6 +82,33 @@ class RPFrameworkDeviceResponse(object):
 		self.matchExpression = matchExpression
 		self.matchResultEffects = list()
 		
+		# compile the match expression once here rather than upon each received response;
+		# a criteria of only the response text need not go through the substitutions
+		self.matchRegex = None
+		if not (matchExpression is None or matchExpression == u''):
+			self.matchRegex = re.compile(matchExpression, re.I)
+		self.criteriaIsResponse = (criteriaFormatString == RESPONSE_CRITERIA_RESPONSEONLY)
+		self.literalPrefix = self.getLiteralPrefix()
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the (uppercase) literal text that any matching response must begin with, or
+	# an empty string if the match expression does not anchor one
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getLiteralPrefix(self):
+		if self.matchRegex is None or self.criteriaIsResponse == False or not self.matchExpression.startswith(u'^') or u'|' in self.matchExpression:
+			return u''
+			
+		literalPrefix = u''
+		for expressionChar in self.matchExpression[1:]:
+			if expressionChar in RESPONSE_REGEX_SPECIALCHARS:
+				break
+			literalPrefix += expressionChar
+			
+		# a quantifier following the literal text applies to its last character
+		if self.matchExpression[1 + len(literalPrefix):2 + len(literalPrefix)] in (u'*', u'?', u'{'):
+			literalPrefix = literalPrefix[:-1]
+		return literalPrefix.upper()
+		
 	
 	#/////////////////////////////////////////////////////////////////////////////////////
 	# Effect definition functions
@@ -90,22 +128,41 @@ class RPFrameworkDeviceResponse(object):
 	# response definition
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	def isResponseMatch(self, responseObj, rpCommand, rpDevice, rpPlugin):
-		if self.criteriaFormatString is None or self.criteriaFormatString == u'' or self.matchExpression is None or self.matchExpression == u'':
-			# we only need to look at the action...
-			if self.respondToActionId == u'' or self.respondToActionId == rpCommand.parentAction.indigoActionId:
-				return True
-			else:
-				return False
-				
-		matchCriteriaTest = self.substituteCriteriaFormatString(self.criteriaFormatString, responseObj, rpCommand, rpDevice, rpPlugin)
-		matchObj = re.match(self.matchExpression, matchCriteriaTest, re.I)
-		return (matchObj is not None) and (self.respondToActionId == u'' or self.respondToActionId == rpCommand.parentAction.indigoActionId)
+		return self.matchResponse(responseObj, rpCommand, rpDevice, rpPlugin)[0]
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine will test the given input against the response definition, returning
+	# a tuple of whether or not it matched and the regular expression match (if any) so
+	# that the captured groups are available to the effects
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def matchResponse(self, responseObj, rpCommand, rpDevice, rpPlugin):
+		# the action is the cheapest test, so it is made first
+		if self.respondToActionId != u'' and self.respondToActionId != self.getCommandActionId(rpCommand):
+			return (False, None)
+		if self.criteriaFormatString is None or self.criteriaFormatString == u'' or self.matchRegex is None:
+			return (True, None)
+			
+		if self.criteriaIsResponse == True and isinstance(responseObj, (str, unicode)):
+			matchCriteriaTest = responseObj
+		else:
+			matchCriteriaTest = self.substituteCriteriaFormatString(self.criteriaFormatString, responseObj, rpCommand, rpDevice, rpPlugin)
+		matchObj = self.matchRegex.match(matchCriteriaTest)
+		return (matchObj is not None, matchObj)
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the ID of the Indigo action which generated the command; responses may be
+	# received with no command or for commands queued internally (with no action)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getCommandActionId(self, rpCommand):
+		if rpCommand is None or rpCommand.parentAction is None:
+			return u''
+		return getattr(rpCommand.parentAction, u'indigoActionId', rpCommand.parentAction)
 	
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	# This routine will generate the criteria to test based upon the response and the
 	# response definition criteria
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
-	def substituteCriteriaFormatString(self, formatString, responseObj, rpCommand, rpDevice, rpPlugin):
+	def substituteCriteriaFormatString(self, formatString, responseObj, rpCommand, rpDevice, rpPlugin, matchObj=None):
 		substitutedCriteria = formatString
 		if substitutedCriteria is None:
 			return u''
@@ -118,6 +175,11 @@ class RPFrameworkDeviceResponse(object):
 		
 		if isinstance(responseObj, (str, unicode)):
 			substitutedCriteria = substitutedCriteria.replace("%cp:response%", responseObj)
+			
+		# substitute the groups captured when matching the response (missing optional
+		# groups substitute as an empty string)
+		if matchObj is not None and u'%cp:group:' in substitutedCriteria:
+			substitutedCriteria = RESPONSE_GROUP_SUBSTITUTION_REGEX.sub(lambda groupMatch: RPFrameworkUtils.to_unicode(matchObj.group(int(groupMatch.group(1))) or u''), substitutedCriteria)
 		
 		# substitute the standard RPFramework substitutions
 		substitutedCriteria = rpPlugin.substituteIndigoValues(substitutedCriteria, rpDevice, None)
@@ -125,17 +187,24 @@ class RPFrameworkDeviceResponse(object):
 		#return the result back to the caller
 		return substitutedCriteria
 			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine will evaluate an effect's value expression, binding the response and
+	# command substitutions as well as the standard RPFramework substitutions
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def evaluateEffectExpression(self, expressionText, responseObj, rpCommand, rpDevice, rpPlugin, matchObj=None):
+		return rpPlugin.evaluateExpression(expressionText, lambda placeholderText: self.substituteCriteriaFormatString(placeholderText, responseObj, rpCommand, rpDevice, rpPlugin, matchObj))
+		
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	# This routine will execute the effects of the response; it is assuming that it is
 	# a match (it will not re-match)
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
-	def executeEffects(self, responseObj, rpCommand, rpDevice, rpPlugin):
+	def executeEffects(self, responseObj, rpCommand, rpDevice, rpPlugin, matchObj=None):
 		for effect in self.matchResultEffects:
 			# first we need to determine if this effect should be executed (based upon a condition; by default all
 			# effects will be executed!)
 			if effect.updateExecCondition != None and effect.updateExecCondition != u'':
 				# this should eval to a boolean value
-				if eval(rpPlugin.substituteIndigoValues(effect.updateExecCondition, rpDevice, dict())) == False:
+				if rpPlugin.evaluateIndigoExpression(effect.updateExecCondition, rpDevice, dict()) == False:
 					rpPlugin.logger.threaddebug(u'Execute condition failed for response, skipping execution for effect: ' + effect.effectType)
 					continue
 		
@@ -143,48 +212,48 @@ class RPFrameworkDeviceResponse(object):
 			try:
 				if effect.effectType == RESPONSE_EFFECT_UPDATESTATE:
 					# this effect should update a device state (param) with a value as formated
-					newStateValueString = self.substituteCriteriaFormatString(effect.updateValueFormatString, responseObj, rpCommand, rpDevice, rpPlugin)
 					if effect.evalUpdateValue == True:
-						newStateValue = eval(newStateValueString)
+						newStateValue = self.evaluateEffectExpression(effect.updateValueFormatString, responseObj, rpCommand, rpDevice, rpPlugin, matchObj)
 					else:
-						newStateValue = newStateValueString
+						newStateValue = self.substituteCriteriaFormatString(effect.updateValueFormatString, responseObj, rpCommand, rpDevice, rpPlugin, matchObj)
 						
 					# the effect may have a UI value set... if not leave at an empty string so that
 					# we don't attempt to update it
 					newStateUIValue = u''
 					if effect.updateValueFormatExString != u"":
-						newStateUIValueString = self.substituteCriteriaFormatString(effect.updateValueFormatExString, responseObj, rpCommand, rpDevice, rpPlugin)
 						if effect.evalUpdateValue == True:
-							newStateUIValue = eval(newStateUIValueString)
+							newStateUIValue = self.evaluateEffectExpression(effect.updateValueFormatExString, responseObj, rpCommand, rpDevice, rpPlugin, matchObj)
 						else:
-							newStateUIValue = newStateUIValueString 
+							newStateUIValue = self.substituteCriteriaFormatString(effect.updateValueFormatExString, responseObj, rpCommand, rpDevice, rpPlugin, matchObj)
 				
 					# update the state...
 					if newStateUIValue == u'':
 						rpPlugin.logger.debug(u'Effect execution: Update state "' + effect.updateParam + u'" to "' + RPFrameworkUtils.to_unicode(newStateValue) + u'"')
-						rpDevice.indigoDevice.updateStateOnServer(key=effect.updateParam, value=newStateValue)
+						rpDevice.queueStateUpdate(effect.updateParam, newStateValue)
 					else:
 						rpPlugin.logger.debug(u'Effect execution: Update state "' + effect.updateParam + '" to "' + RPFrameworkUtils.to_unicode(newStateValue) + u'" with UIValue "' + RPFrameworkUtils.to_unicode(newStateUIValue) + u'"')
-						rpDevice.indigoDevice.updateStateOnServer(key=effect.updateParam, value=newStateValue, uiValue=newStateUIValue)
+						rpDevice.queueStateUpdate(effect.updateParam, newStateValue, uiValue=newStateUIValue)
 				
 				elif effect.effectType == RESPONSE_EFFECT_QUEUECOMMAND:
 					# this effect will enqueue a new command... the updateParam will define the command name
 					# and the updateValueFormat will define the new payload
-					queueCommandName = self.substituteCriteriaFormatString(effect.updateParam, responseObj, rpCommand, rpDevice, rpPlugin)
+					queueCommandName = self.substituteCriteriaFormatString(effect.updateParam, responseObj, rpCommand, rpDevice, rpPlugin, matchObj)
 
-					queueCommandPayloadStr = self.substituteCriteriaFormatString(effect.updateValueFormatString, responseObj, rpCommand, rpDevice, rpPlugin)
 					if effect.evalUpdateValue == True:
-						queueCommandPayload = eval(queueCommandPayloadStr)
+						queueCommandPayload = self.evaluateEffectExpression(effect.updateValueFormatString, responseObj, rpCommand, rpDevice, rpPlugin, matchObj)
 					else:
-						queueCommandPayload = queueCommandPayloadStr
+						queueCommandPayload = self.substituteCriteriaFormatString(effect.updateValueFormatString, responseObj, rpCommand, rpDevice, rpPlugin, matchObj)
 				
 					rpPlugin.logger.debug(u'Effect execution: Queuing command {' + queueCommandName + u'}')
 					rpDevice.queueDeviceCommand(RPFrameworkCommand.RPFrameworkCommand(queueCommandName, queueCommandPayload))
 				
 				elif effect.effectType == RESPONSE_EFFECT_CALLBACK:
 					# this should kick off a callback to a python call on the device...
+					# send any queued state updates first so that the callback works against (and
+					# may itself update) the states as they are known to the server
 					rpPlugin.logger.debug(u'Effect execution: Calling function ' + effect.updateParam)
-					eval(u'rpDevice.' + effect.updateParam + u'(responseObj, rpCommand)')
+					rpDevice.flushStateUpdates()
+					getattr(rpDevice, effect.updateParam)(responseObj, rpCommand)
 			except:
 				rpPlugin.logger.exception(u'Error executing effect for device id ' + RPFrameworkUtils.to_unicode(rpDevice.indigoDevice.id))
 				
@@ -214,4 +283,73 @@ class RPFrameworkDeviceResponseEffect(object):
 		self.evalUpdateValue = evalUpdateValue
 		self.updateExecCondition = updateExecCondition
 		
-		
\ No newline at end of file
+		
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# RPFrameworkDeviceResponseDispatcher
+#	Class that holds the response definitions of a device type, indexed by the literal
+#	prefix of their match expression, so that a received response is only tested against
+#	the definitions which could possibly match it
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class RPFrameworkDeviceResponseDispatcher(object):
+	
+	#/////////////////////////////////////////////////////////////////////////////////////
+	# Class construction and destruction methods
+	#/////////////////////////////////////////////////////////////////////////////////////
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor builds the index from the response definitions (in definition order)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self, responseDefinitions):
+		self.responseDefinitions = list(responseDefinitions)
+		self.prefixedResponses = dict()
+		self.unprefixedResponses = list()
+		for definitionIndex, rpResponse in enumerate(self.responseDefinitions):
+			if rpResponse.literalPrefix == u'':
+				self.unprefixedResponses.append((definitionIndex, rpResponse))
+			else:
+				self.prefixedResponses.setdefault(rpResponse.literalPrefix, list()).append((definitionIndex, rpResponse))
+		self.prefixLengths = sorted(set([len(literalPrefix) for literalPrefix in self.prefixedResponses]))
+		self.respondingActionIds = set([rpResponse.respondToActionId for rpResponse in self.responseDefinitions if rpResponse.respondToActionId != u''])
+		
+	
+	#/////////////////////////////////////////////////////////////////////////////////////
+	# Matching functions
+	#/////////////////////////////////////////////////////////////////////////////////////
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the response definitions which may match the response, in the order in
+	# which they were defined
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getCandidateResponses(self, responseObj):
+		if len(self.prefixLengths) == 0 or not isinstance(responseObj, (str, unicode)):
+			return self.responseDefinitions
+		
+		responsePrefix = responseObj[:self.prefixLengths[-1]].upper()
+		candidateResponses = list(self.unprefixedResponses)
+		for prefixLength in self.prefixLengths:
+			candidateResponses.extend(self.prefixedResponses.get(responsePrefix[:prefixLength], ()))
+		if len(candidateResponses) > 1:
+			candidateResponses.sort(key=lambda candidate: candidate[0])
+		return [candidate[1] for candidate in candidateResponses]
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Generates a (response definition, match) tuple for each of the response definitions
+	# which match the response
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def findMatches(self, responseObj, rpCommand, rpDevice, rpPlugin):
+		for rpResponse in self.getCandidateResponses(responseObj):
+			(isMatch, matchObj) = rpResponse.matchResponse(responseObj, rpCommand, rpDevice, rpPlugin)
+			if isMatch == True:
+				yield (rpResponse, matchObj)
+				
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns True if any response definition is specific to the action which generated
+	# the command (that is, a response to the command is expected)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def hasActionResponses(self, rpCommand):
+		if len(self.respondingActionIds) == 0 or rpCommand is None or rpCommand.parentAction is None:
+			return False
+		return getattr(rpCommand.parentAction, u'indigoActionId', rpCommand.parentAction) in self.respondingActionIds
+		
@@ -0,0 +1,236 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# RPFrameworkExpression by RogueProeliator <adam.d.ashe@gmail.com>
+# 	Compiles the "eval:" expressions and execution conditions found in the framework
+#	configuration once into a restricted Python expression; substitution placeholders
+#	are bound as variables when the expression is evaluated rather than substituted
+#	into its source text
+#
+#	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# 	SOFTWARE.
+#
+#	Version 25:
+#		Initial release of the compiled expressions
+#		Expressions may only call the permitted functions (no modules or classes are named)
+#			and attributes are checked as they are read so that none lead to a module or class
+#
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Python imports
+#/////////////////////////////////////////////////////////////////////////////////////////
+import ast
+import math
+import re
+import types
+
+import RPFrameworkUtils
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Constants and configuration variables
+#/////////////////////////////////////////////////////////////////////////////////////////
+EXPRESSION_PREFIX = u'eval:'
+
+# any of the framework's substitutions (including the command/response substitutions and
+# Indigo's own variable and device state substitutions) may appear in an expression
+EXPRESSION_PLACEHOLDER_REGEX = re.compile(u'%%[vd]:[a-z\d:]+%%|%(?:ap|dp|ds|pdp|pp|cp):[a-z\d:]+%', re.IGNORECASE)
+EXPRESSION_MARKER_REGEX = re.compile(r'_rpexpr(\d+)_')
+
+# values which may never be reached by an expression, whether named or through an attribute;
+# from a module or class the rest of the interpreter is only a few attributes away
+EXPRESSION_RESTRICTED_TYPES = (types.ModuleType, types.ClassType, type)
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Expression functions
+#	The functions available to an expression are plain functions wrapping those of the
+#	standard library, rather than the modules or classes (int, str...) themselves
+#/////////////////////////////////////////////////////////////////////////////////////////
+def expressionFunction(wrappedFunction):
+	def callWrappedFunction(*args):
+		return wrappedFunction(*args)
+	return callWrappedFunction
+
+def reMatch(pattern, text, flags=0):
+	return re.match(pattern, text, flags)
+
+def reSearch(pattern, text, flags=0):
+	return re.search(pattern, text, flags)
+
+def reSub(pattern, replacement, text, count=0, flags=0):
+	return re.sub(pattern, replacement, text, count, flags)
+
+#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+# Reads an attribute for an expression, refusing those of (or leading to) a module or
+# class; the attribute name itself has been checked as the expression was compiled
+#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+def getExpressionAttribute(attributeOf, attributeName):
+	if isinstance(attributeOf, EXPRESSION_RESTRICTED_TYPES):
+		raise ValueError(u'Invalid expression: the attribute "' + RPFrameworkUtils.to_unicode(attributeName) + u'" of a module or class is not permitted')
+	attributeValue = getattr(attributeOf, attributeName)
+	if isinstance(attributeValue, EXPRESSION_RESTRICTED_TYPES):
+		raise ValueError(u'Invalid expression: the attribute "' + RPFrameworkUtils.to_unicode(attributeName) + u'" is a module or class and is not permitted')
+	return attributeValue
+
+# the only names and syntax available to an expression; attributes may be read from any
+# value other than a module or class, except for those which could be used to reach
+# outside of the expression
+EXPRESSION_NAMESPACE = {u'True': True, u'False': False, u'None': None, u'abs': abs, u'len': len, u'max': max, u'min': min, u'round': round, u'bool': expressionFunction(bool), u'float': expressionFunction(float), u'int': expressionFunction(int), u'str': expressionFunction(str), u'unicode': expressionFunction(unicode), u'floor': math.floor, u'ceil': math.ceil, u'reMatch': reMatch, u'reSearch': reSearch, u'reSub': reSub}
+EXPRESSION_GLOBALS = dict(EXPRESSION_NAMESPACE, __builtins__={}, _rpattribute=getExpressionAttribute, _rpconcat=lambda *textParts: u''.join([RPFrameworkUtils.to_unicode(textPart) for textPart in textParts]))
+EXPRESSION_ALLOWED_NODES = (ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd, ast.IfExp, ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn, ast.Is, ast.IsNot, ast.Call, ast.keyword, ast.Num, ast.Str, ast.Name, ast.Attribute, ast.Subscript, ast.Index, ast.Slice, ast.List, ast.Tuple, ast.Dict, ast.Load)
+EXPRESSION_BLOCKED_ATTRIBUTES = (u'format', u'mro')
+EXPRESSION_BLOCKED_ATTRIBUTE_PREFIXES = (u'_', u'func_', u'im_', u'gi_', u'f_', u'tb_', u'co_')
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# RPFrameworkExpression
+#	An expression compiled from its text; placeholders used as a value are evaluated as
+#	an expression (as they would have been when substituted into the text) while those
+#	within a string literal are inserted as text
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class RPFrameworkExpression(object):
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor compiles the expression text; a ValueError is raised if the expression
+	# is not valid or uses anything outside of the permitted names and syntax
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self, expressionText):
+		self.expressionText = expressionText
+		self.lastUsed = 0
+
+		# replace each distinct placeholder with a marker identifier prior to parsing
+		self.placeholders = list()
+		expressionSource = EXPRESSION_PLACEHOLDER_REGEX.sub(self.replacePlaceholder, RPFrameworkUtils.to_unicode(expressionText)).strip()
+		try:
+			expressionTree = ast.parse(expressionSource, mode='eval')
+		except SyntaxError, e:
+			raise ValueError(u'Invalid expression "' + RPFrameworkUtils.to_unicode(expressionText) + u'": ' + RPFrameworkUtils.to_unicode(e))
+
+		expressionCompiler = RPFrameworkExpressionCompiler(expressionText)
+		expressionTree = ast.fix_missing_locations(expressionCompiler.visit(expressionTree))
+		self.valueBindings = [(u'_rpvalue' + unicode(placeholderIndex), self.placeholders[placeholderIndex]) for placeholderIndex in sorted(expressionCompiler.valueMarkers)]
+		self.textBindings = [(u'_rptext' + unicode(placeholderIndex), self.placeholders[placeholderIndex]) for placeholderIndex in sorted(expressionCompiler.textMarkers)]
+		self.compiledExpression = compile(expressionTree, '<expression>', 'eval')
+		
+		# literals (such as most substituted values) need not be evaluated each time
+		self.isConstant = False
+		if len(self.placeholders) == 0:
+			try:
+				self.constantValue = ast.literal_eval(expressionSource)
+				self.isConstant = True
+			except ValueError:
+				pass
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the marker identifier for a placeholder found in the expression text
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def replacePlaceholder(self, placeholderMatch):
+		if not (placeholderMatch.group(0) in self.placeholders):
+			self.placeholders.append(placeholderMatch.group(0))
+		return u'_rpexpr' + unicode(self.placeholders.index(placeholderMatch.group(0))) + u'_'
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Evaluates the expression; placeholderValue(placeholderText) must return the text
+	# which the placeholder would have been substituted with (it is None when evaluating
+	# a placeholder's value, which may not itself call for substitutions)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def evaluate(self, placeholderValue, expressionCache):
+		if self.isConstant == True:
+			return self.constantValue
+		if placeholderValue is None and len(self.placeholders) > 0:
+			raise ValueError(u'Invalid expression "' + RPFrameworkUtils.to_unicode(self.expressionText) + u'": substitutions are not available')
+			
+		# the placeholders are bound as locals, leaving the permitted names as the globals
+		boundPlaceholders = dict()
+		for (bindingName, placeholderText) in self.textBindings:
+			boundPlaceholders[bindingName] = RPFrameworkUtils.to_unicode(placeholderValue(placeholderText))
+		for (bindingName, placeholderText) in self.valueBindings:
+			boundPlaceholders[bindingName] = expressionCache.getTemplate(RPFrameworkUtils.to_unicode(placeholderValue(placeholderText))).evaluate(None, expressionCache)
+		return eval(self.compiledExpression, EXPRESSION_GLOBALS, boundPlaceholders)
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# RPFrameworkExpressionCompiler
+#	Validates the parsed expression against the permitted names and syntax, replacing
+#	the placeholder markers with the variables bound at evaluation
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class RPFrameworkExpressionCompiler(ast.NodeTransformer):
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor allows passing in the expression text for use in error messages
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self, expressionText):
+		self.expressionText = RPFrameworkUtils.to_unicode(expressionText)
+		self.valueMarkers = set()
+		self.textMarkers = set()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Rejects any syntax not explicitly permitted
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def generic_visit(self, node):
+		if not isinstance(node, EXPRESSION_ALLOWED_NODES):
+			raise ValueError(u'Invalid expression "' + self.expressionText + u'": ' + unicode(type(node).__name__) + u' is not permitted')
+		return ast.NodeTransformer.generic_visit(self, node)
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Names must either be placeholders or found in the expression namespace
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def visit_Name(self, node):
+		markerMatch = EXPRESSION_MARKER_REGEX.match(node.id)
+		if markerMatch is not None and markerMatch.end() == len(node.id):
+			self.valueMarkers.add(int(markerMatch.group(1)))
+			return ast.copy_location(ast.Name(id='_rpvalue' + markerMatch.group(1), ctx=ast.Load()), node)
+		elif not (node.id in EXPRESSION_NAMESPACE) or not isinstance(node.ctx, ast.Load):
+			raise ValueError(u'Invalid expression "' + self.expressionText + u'": the name "' + unicode(node.id) + u'" is not permitted')
+		return node
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Attributes are permitted other than the private and internal attributes and those
+	# of a module or class; as the value of an attribute is often only known once the
+	# expression is evaluated, each attribute is read through getExpressionAttribute
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def visit_Attribute(self, node):
+		if node.attr in EXPRESSION_BLOCKED_ATTRIBUTES or node.attr.startswith(EXPRESSION_BLOCKED_ATTRIBUTE_PREFIXES) or not isinstance(node.ctx, ast.Load):
+			raise ValueError(u'Invalid expression "' + self.expressionText + u'": the attribute "' + unicode(node.attr) + u'" is not permitted')
+		if isinstance(node.value, ast.Name) and isinstance(EXPRESSION_NAMESPACE.get(node.value.id, None), EXPRESSION_RESTRICTED_TYPES):
+			raise ValueError(u'Invalid expression "' + self.expressionText + u'": the attribute "' + unicode(node.attr) + u'" of a module or class is not permitted')
+		
+		attributeOf = self.visit(node.value)
+		return ast.copy_location(ast.Call(func=ast.Name(id='_rpattribute', ctx=ast.Load()), args=[attributeOf, ast.Str(s=node.attr)], keywords=[], starargs=None, kwargs=None), node)
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# String literals containing placeholders are concatenated with their text
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def visit_Str(self, node):
+		literalParts = EXPRESSION_MARKER_REGEX.split(node.s)
+		if len(literalParts) == 1:
+			return node
+
+		concatenatedParts = list()
+		for partIndex in range(0, len(literalParts)):
+			if partIndex % 2 == 0:
+				if literalParts[partIndex] != '':
+					concatenatedParts.append(ast.Str(s=literalParts[partIndex]))
+			else:
+				self.textMarkers.add(int(literalParts[partIndex]))
+				concatenatedParts.append(ast.Name(id='_rptext' + literalParts[partIndex], ctx=ast.Load()))
+		return ast.copy_location(ast.Call(func=ast.Name(id='_rpconcat', ctx=ast.Load()), args=concatenatedParts, keywords=[], starargs=None, kwargs=None), node)
+
+
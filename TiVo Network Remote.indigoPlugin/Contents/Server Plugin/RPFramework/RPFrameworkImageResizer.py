@@ -0,0 +1,266 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# RPFrameworkImageResizer by RogueProeliator <adam.d.ashe@gmail.com>
+# 	Pool of worker threads which resize downloaded images, in-process via Pillow where it
+#	is installed or else via the sips utility (Mac OS X), and which caches the resized
+#	images by the URL and size requested
+#
+#	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# 	SOFTWARE.
+#
+#	Version 25:
+#		Initial release of the image resizer
+#
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Python imports
+#/////////////////////////////////////////////////////////////////////////////////////////
+import hashlib
+import os
+import Queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+try:
+	from PIL import Image
+except ImportError:
+	Image = None
+
+import RPFrameworkThread
+import RPFrameworkUtils
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Constants and configuration variables
+#/////////////////////////////////////////////////////////////////////////////////////////
+IMAGERESIZE_BACKEND_AUTO = u'auto'
+IMAGERESIZE_BACKEND_PILLOW = u'pillow'
+IMAGERESIZE_BACKEND_SIPS = u'sips'
+
+IMAGERESIZE_JPEG_QUALITY = 85
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# RPFrameworkImageResizer
+#	Resizes images in place on a pool of worker threads shared by all of the plugin's
+#	devices, calling back once each resize is complete. A resized image may be cached
+#	under a key (such as its URL, size and version) so that a later request for the same
+#	image is answered from the cache without resizing it again
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class RPFrameworkImageResizer(object):
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor selects the resize backend; the worker threads are started upon the first
+	# resize and the cache folder created upon the first image cached
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self, hostPlugin, workerCount=2, backendName=IMAGERESIZE_BACKEND_AUTO, cacheLifetime=3600.0):
+		self.hostPlugin = hostPlugin
+		self.workerCount = max(1, workerCount)
+		self.cacheLifetime = cacheLifetime
+
+		self.resizeBackend = self.resizeWithSips
+		if backendName == IMAGERESIZE_BACKEND_PILLOW or backendName == IMAGERESIZE_BACKEND_AUTO:
+			if not (Image is None):
+				self.resizeBackend = self.resizeWithPillow
+			elif backendName == IMAGERESIZE_BACKEND_PILLOW:
+				self.hostPlugin.logger.warning(u'Pillow is not installed; images will be resized via sips')
+
+		self.resizeQueue = Queue.Queue()
+		self.workerThreads = []
+		self.workerLock = threading.Lock()
+
+		self.cacheFolder = None
+		self.cachedImages = {}
+		self.cacheLock = threading.Lock()
+
+	#/////////////////////////////////////////////////////////////////////////////////////
+	# Resize queue and worker methods
+	#/////////////////////////////////////////////////////////////////////////////////////
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Queues the image to be resized in place to the width and height given (in pixels);
+	# when only the width is given the image is scaled so that its longest side is that
+	# width. The callback, if given, is called with the image path and whether the resize
+	# succeeded once it has completed
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def resizeImage(self, imagePath, width, height=0, cacheKey=None, completionCallback=None):
+		with self.workerLock:
+			if len(self.workerThreads) == 0:
+				for workerIndex in range(0, self.workerCount):
+					workerThread = RPFrameworkThread.RPFrameworkThread(target=self.concurrentResizeThread, name=u'RPFrameworkImageResizer-' + RPFrameworkUtils.to_unicode(workerIndex))
+					workerThread.start()
+					self.workerThreads.append(workerThread)
+		self.resizeQueue.put((imagePath, width, height, cacheKey, completionCallback))
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine runs in each worker thread, resizing the queued images until it takes
+	# the None placed by stopWorkers
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def concurrentResizeThread(self):
+		while True:
+			resizeRequest = self.resizeQueue.get()
+			if resizeRequest is None:
+				return
+
+			(imagePath, width, height, cacheKey, completionCallback) = resizeRequest
+			resizeSucceeded = False
+			try:
+				self.resizeBackend(imagePath, width, height)
+				resizeSucceeded = True
+				if not (cacheKey is None):
+					self.storeCachedImage(cacheKey, imagePath)
+			except:
+				self.hostPlugin.logger.exception(u'Error resizing image ' + RPFrameworkUtils.to_unicode(imagePath))
+
+			if not (completionCallback is None):
+				try:
+					completionCallback(imagePath, resizeSucceeded)
+				except:
+					self.hostPlugin.logger.exception(u'Error processing resized image ' + RPFrameworkUtils.to_unicode(imagePath))
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Stops the worker threads once the resizes already queued are complete, waiting up to
+	# the timeout, and removes the cache folder
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def stopWorkers(self, timeout=5.0):
+		with self.workerLock:
+			workerThreads = self.workerThreads
+			self.workerThreads = []
+		for workerThread in workerThreads:
+			self.resizeQueue.put(None)
+
+		stopDeadline = time.time() + timeout
+		for workerThread in workerThreads:
+			workerThread.join(max(0.0, stopDeadline - time.time()))
+
+		with self.cacheLock:
+			if not (self.cacheFolder is None):
+				shutil.rmtree(self.cacheFolder, ignore_errors=True)
+			self.cacheFolder = None
+			self.cachedImages = {}
+
+	#/////////////////////////////////////////////////////////////////////////////////////
+	# Resize backends
+	#/////////////////////////////////////////////////////////////////////////////////////
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the width and height to which an image of the given size is to be resized
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getResizedDimensions(self, imageSize, width, height):
+		if width > 0 and height > 0:
+			return (width, height)
+		imageScale = float(width) / max(imageSize[0], imageSize[1])
+		return (max(1, int(round(imageSize[0] * imageScale))), max(1, int(round(imageSize[1] * imageScale))))
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Resizes the image in-process with Pillow, keeping its format; a JPEG is decoded at
+	# the smallest scale which still covers the new size. The resized image is written
+	# alongside and renamed over the original so that it is never seen half written
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def resizeWithPillow(self, imagePath, width, height):
+		sourceImage = Image.open(imagePath)
+		imageFormat = sourceImage.format
+		resizedDimensions = self.getResizedDimensions(sourceImage.size, width, height)
+		if imageFormat == 'JPEG':
+			sourceImage.draft(sourceImage.mode, resizedDimensions)
+		resizedImage = sourceImage.resize(resizedDimensions, Image.ANTIALIAS)
+
+		saveOptions = {}
+		if imageFormat == 'JPEG':
+			saveOptions['quality'] = IMAGERESIZE_JPEG_QUALITY
+			if not (resizedImage.mode in ('RGB', 'L')):
+				resizedImage = resizedImage.convert('RGB')
+		partialPath = imagePath + u'.resize'
+		resizedImage.save(partialPath, imageFormat, **saveOptions)
+		os.rename(partialPath, imagePath)
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Resizes the image in place with the sips utility (Mac OS X), waiting for it to finish
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def resizeWithSips(self, imagePath, width, height):
+		if width > 0 and height > 0:
+			sipsArguments = ['sips', '-z', str(height), str(width), RPFrameworkUtils.to_str(imagePath)]
+		else:
+			sipsArguments = ['sips', '-Z', str(width), RPFrameworkUtils.to_str(imagePath)]
+		with open(os.devnull, 'w') as nullOutput:
+			sipsResult = subprocess.call(sipsArguments, stdout=nullOutput, stderr=nullOutput)
+		if sipsResult != 0:
+			raise IOError(u'sips exited with status ' + RPFrameworkUtils.to_unicode(sipsResult))
+
+	#/////////////////////////////////////////////////////////////////////////////////////
+	# Resized image cache
+	#/////////////////////////////////////////////////////////////////////////////////////
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns True if a resized image is cached under the key (within the lifetime)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def hasCachedImage(self, cacheKey):
+		with self.cacheLock:
+			cachedImage = self.cachedImages.get(cacheKey, None)
+			return not (cachedImage is None) and time.time() - cachedImage[u'cachedTime'] <= self.cacheLifetime and os.path.exists(cachedImage[u'cachedPath'])
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Places the resized image found for the cache key (if cached within the lifetime) at
+	# the output path; returns True if it was found. Nothing is copied when the output path
+	# still holds the cached image from an earlier call
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def copyCachedImage(self, cacheKey, outputPath):
+		with self.cacheLock:
+			cachedImage = self.cachedImages.get(cacheKey, None)
+			if cachedImage is None:
+				return False
+			if time.time() - cachedImage[u'cachedTime'] > self.cacheLifetime or os.path.exists(cachedImage[u'cachedPath']) == False:
+				del self.cachedImages[cacheKey]
+				return False
+
+			outputStat = self.getFileSignature(outputPath)
+			if outputStat is None or cachedImage[u'outputs'].get(outputPath, None) != outputStat:
+				partialPath = outputPath + u'.cache'
+				shutil.copyfile(cachedImage[u'cachedPath'], partialPath)
+				os.rename(partialPath, outputPath)
+				cachedImage[u'outputs'][outputPath] = self.getFileSignature(outputPath)
+			return True
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Stores a copy of the resized image in the cache under the key, dropping any images
+	# cached for longer than the lifetime
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def storeCachedImage(self, cacheKey, imagePath):
+		with self.cacheLock:
+			if self.cacheFolder is None:
+				self.cacheFolder = tempfile.mkdtemp(prefix='RPFrameworkImageCache')
+
+			timeNow = time.time()
+			for (expiredKey, expiredImage) in self.cachedImages.items():
+				if timeNow - expiredImage[u'cachedTime'] > self.cacheLifetime:
+					del self.cachedImages[expiredKey]
+					if os.path.exists(expiredImage[u'cachedPath']):
+						os.remove(expiredImage[u'cachedPath'])
+
+			cachedPath = os.path.join(self.cacheFolder, hashlib.sha1(RPFrameworkUtils.to_str(repr(cacheKey))).hexdigest() + os.path.splitext(RPFrameworkUtils.to_str(imagePath))[1])
+			shutil.copyfile(imagePath, cachedPath + '.cache')
+			os.rename(cachedPath + '.cache', cachedPath)
+			self.cachedImages[cacheKey] = { u'cachedPath': cachedPath, u'cachedTime': timeNow, u'outputs': { imagePath: self.getFileSignature(imagePath) } }
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the modification time and size of the file, or None if it does not exist
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getFileSignature(self, filePath):
+		try:
+			fileStat = os.stat(filePath)
+			return (fileStat.st_mtime, fileStat.st_size)
+		except OSError:
+			return None
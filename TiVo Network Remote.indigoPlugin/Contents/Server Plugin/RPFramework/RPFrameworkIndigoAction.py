@@ -23,6 +23,10 @@
 #		Fixed typo which causes an error when validation fails for an action
 #	Version 17:
 #		Added unicode support
+#	Version 25:
+#		Execute conditions and "eval:" expressions now use the plugin's compiled expressions
+#			with the parameters bound rather than substituted into the expression text
+#		Added the responses expected in reply to each command
 #
 #/////////////////////////////////////////////////////////////////////////////////////////
 #/////////////////////////////////////////////////////////////////////////////////////////
@@ -35,6 +39,7 @@ import indigo
 import math
 import re
 import RPFrameworkCommand
+import RPFrameworkExpression
 import RPFrameworkPlugin
 import RPFrameworkUtils
 
@@ -65,7 +70,7 @@ class RPFrameworkIndigoActionDfn(object):
 		
 		self.actionCommands = []
 		if commandName != u'' and commandParamFormatString != u'':
-			self.actionCommands.append((commandName, commandParamFormatString, commandExecuteCount, u'', u''))
+			self.actionCommands.append((commandName, commandParamFormatString, commandExecuteCount, u'', u'', None))
 		
 		self.indigoParams = indigoParams
 		if self.indigoParams == None:
@@ -83,10 +88,11 @@ class RPFrameworkIndigoActionDfn(object):
 		
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	# Allows an outside class to add a new command to be sent for this action. The
-	# commands will be sent in the order received
+	# commands will be sent in the order received; commandExpectedResponses is the list
+	# of response IDs which answer the command (see RPFrameworkCommand)
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
-	def addIndigoCommand(self, commandName, commandFormatString, commandExecuteCount=u'1', commandRepeatDelay=u'', commandExecuteCondition=u''):
-		self.actionCommands.append((commandName, commandFormatString, commandExecuteCount, commandRepeatDelay, commandExecuteCondition))
+	def addIndigoCommand(self, commandName, commandFormatString, commandExecuteCount=u'1', commandRepeatDelay=u'', commandExecuteCondition=u'', commandExpectedResponses=None):
+		self.actionCommands.append((commandName, commandFormatString, commandExecuteCount, commandRepeatDelay, commandExecuteCondition, commandExpectedResponses))
 		
 		
 	#/////////////////////////////////////////////////////////////////////////////////////
@@ -140,20 +146,21 @@ class RPFrameworkIndigoActionDfn(object):
 
 		# generate the command for each of the ones defined for this action
 		commandsToQueue = []
-		for (commandName, commandFormatString, commandExecuteCount, repeatCommandDelay, executeCondition) in self.actionCommands:
+		for (commandName, commandFormatString, commandExecuteCount, repeatCommandDelay, executeCondition, expectedResponses) in self.actionCommands:
 			# this command may have an execute condition which could prevent the command
 			# from firing...
 			if executeCondition != None and executeCondition != u'':
 				# this should eval to a boolean value
-				if eval(rpPlugin.substituteIndigoValues(executeCondition, rpDevice, resolvedValues)) == False:
+				if rpPlugin.evaluateIndigoExpression(executeCondition, rpDevice, resolvedValues) == False:
 					rpPlugin.logger.threaddebug(u'Execute condition failed, skipping execution for command: ' + commandName)
 					continue
 		
 			# determine the number of times to execute this command (supports sending the same request
 			# multiple times in a row)
-			executeTimesStr = rpPlugin.substituteIndigoValues(commandExecuteCount, rpDevice, resolvedValues)
-			if executeTimesStr.startswith(u'eval:'):
-				executeTimesStr = eval(executeTimesStr.replace(u'eval:', u''))
+			if commandExecuteCount.startswith(RPFrameworkExpression.EXPRESSION_PREFIX):
+				executeTimesStr = rpPlugin.evaluateIndigoExpression(commandExecuteCount[len(RPFrameworkExpression.EXPRESSION_PREFIX):], rpDevice, resolvedValues)
+			else:
+				executeTimesStr = rpPlugin.substituteIndigoValues(commandExecuteCount, rpDevice, resolvedValues)
 			if executeTimesStr == None or executeTimesStr == u'':
 				executeTimesStr = u'1'
 			executeTimes = int(executeTimesStr)
@@ -161,9 +168,10 @@ class RPFrameworkIndigoActionDfn(object):
 			# create a new command for each of the count requested...
 			for i in range(0,executeTimes):
 				# create the payload based upon the format string provided for the command
-				payload = rpPlugin.substituteIndigoValues(commandFormatString, rpDevice, resolvedValues)
-				if payload.startswith(u'eval:'):
-					payload = eval(payload.replace(u'eval:', u''))
+				if commandFormatString.startswith(RPFrameworkExpression.EXPRESSION_PREFIX):
+					payload = rpPlugin.evaluateIndigoExpression(commandFormatString[len(RPFrameworkExpression.EXPRESSION_PREFIX):], rpDevice, resolvedValues)
+				else:
+					payload = rpPlugin.substituteIndigoValues(commandFormatString, rpDevice, resolvedValues)
 				
 				# determine the delay that should be added after the command (delay between repeats)
 				delayTimeStr = rpPlugin.substituteIndigoValues(repeatCommandDelay, rpDevice, resolvedValues)
@@ -172,7 +180,7 @@ class RPFrameworkIndigoActionDfn(object):
 					delayTime = float(delayTimeStr)
 			
 				# create and add the command to the queue
-				commandsToQueue.append(RPFrameworkCommand.RPFrameworkCommand(commandName, commandPayload=payload, postCommandPause=delayTime, parentAction=self))
+				commandsToQueue.append(RPFrameworkCommand.RPFrameworkCommand(commandName, commandPayload=payload, postCommandPause=delayTime, parentAction=self, expectedResponses=expectedResponses))
 			
 		# if the execution made it here then the list of commands has been successfully built without
 		# error and may be queued up on the device
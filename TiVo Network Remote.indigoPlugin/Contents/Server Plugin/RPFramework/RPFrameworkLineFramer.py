@@ -0,0 +1,103 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# RPFrameworkLineFramer by RogueProeliator <adam.d.ashe@gmail.com>
+# 	Class which splits the data received from a device connection (telnet, serial or
+#	socket) into lines, holding any partial line until the remainder is received
+#
+#	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# 	SOFTWARE.
+#
+#	Version 25:
+#		Initial release of the buffered line framer
+#
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Python imports
+#/////////////////////////////////////////////////////////////////////////////////////////
+import collections
+
+import RPFrameworkUtils
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Constants and configuration variables
+#/////////////////////////////////////////////////////////////////////////////////////////
+LINEFRAMER_DEFAULT_ENCODING = u'utf-8'
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# RPFrameworkLineFramer
+#	Buffers the raw data received from a connection and splits it on the line ending;
+#	complete lines are decoded and queued to be retrieved while a trailing partial line
+#	is retained, undecoded, until the rest of it is received
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class RPFrameworkLineFramer(object):
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor allows passing in the line ending token and the encoding of the data
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self, lineEndingToken, encoding=LINEFRAMER_DEFAULT_ENCODING):
+		self.encoding = encoding
+		self.lineEndingToken = RPFrameworkUtils.to_str(lineEndingToken, encoding)
+		self.lineEndingText = RPFrameworkUtils.to_unicode(lineEndingToken, encoding)
+		self.receiveBuffer = bytearray()
+		self.receivedLines = collections.deque()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Adds data read from the connection, queueing each line it completes; returns the
+	# number of lines completed
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def addData(self, receivedData):
+		if len(receivedData) == 0:
+			return 0
+		if isinstance(receivedData, unicode):
+			receivedData = receivedData.encode(self.encoding)
+		self.receiveBuffer.extend(receivedData)
+
+		# only the new data (and the end of the previous data, should the line ending have
+		# been split across reads) may contain a line ending not already found
+		searchStart = max(0, len(self.receiveBuffer) - len(receivedData) - len(self.lineEndingToken) + 1)
+		if self.receiveBuffer.find(self.lineEndingToken, searchStart) < 0:
+			return 0
+
+		# decode all of the complete lines at once and split them; the buffer may not be
+		# resized while the view of it exists
+		linesEnd = self.receiveBuffer.rfind(self.lineEndingToken) + len(self.lineEndingToken)
+		bufferView = memoryview(self.receiveBuffer)
+		completedLines = unicode(bufferView[:linesEnd].tobytes(), self.encoding, u'replace').split(self.lineEndingText)
+		del bufferView
+		del self.receiveBuffer[:linesEnd]
+
+		completedLines.pop()
+		self.receivedLines.extend(completedLines)
+		return len(completedLines)
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the next complete line (without its line ending) or None if no complete
+	# line has been received
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getLine(self):
+		if len(self.receivedLines) == 0:
+			return None
+		return self.receivedLines.popleft()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns all of the complete lines received (without their line endings)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getLines(self):
+		completedLines = list(self.receivedLines)
+		self.receivedLines.clear()
+		return completedLines
@@ -18,6 +18,15 @@
 #		Initial release of the plugin framework
 #	Version 17:
 #		Added unicode support / proper string conversions
+#	Version 25:
+#		uPnPDiscover no longer changes the default socket timeout; the search is bounded by
+#		an overall deadline, sends its retries within that deadline and is available as a
+#		generator (uPnPDiscoverIter) yielding each response as it arrives
+#		SSDPResponse parses the datagram directly (parseSSDPHeaders) rather than through
+#		httplib and holds its fields in __slots__; repeated responses from a device are
+#		recognised by their USN and dropped before a response object is created
+#		Added UPnPEnumerationCache to hold the devices found per service target until
+#		their advertised max-age expires
 #
 #/////////////////////////////////////////////////////////////////////////////////////////
 #/////////////////////////////////////////////////////////////////////////////////////////
@@ -25,12 +34,28 @@
 #/////////////////////////////////////////////////////////////////////////////////////////
 # Python imports
 #/////////////////////////////////////////////////////////////////////////////////////////
+import collections
+import errno
+import select
 import socket
-import httplib
-import StringIO
+import threading
+import time
 import RPFrameworkUtils
 
 
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Constants and configuration variables
+#/////////////////////////////////////////////////////////////////////////////////////////
+SSDP_MULTICAST_GROUP = ("239.255.255.250", 1900)
+SSDP_MAX_RESPONSE_SIZE = 8192
+SSDP_RETRY_INTERVAL = 0.5
+SSDP_MAX_MX = 5
+
+UPNP_ENUMERATIONCACHE_MAXSERVICETARGETS = 16
+UPNP_ENUMERATIONCACHE_MAXDEVICES = 256
+UPNP_ENUMERATIONCACHE_REFRESHFRACTION = 0.25
+
+
 #/////////////////////////////////////////////////////////////////////////////////////////
 #/////////////////////////////////////////////////////////////////////////////////////////
 # SSDPResponse
@@ -39,75 +64,288 @@ import RPFrameworkUtils
 #/////////////////////////////////////////////////////////////////////////////////////////
 #/////////////////////////////////////////////////////////////////////////////////////////
 class SSDPResponse(object):
-	######################################################################################
-	# Internal class for creating the socket necessary to send the request
-	######################################################################################
-	class _FakeSocket(StringIO.StringIO):
-		def makefile(self, *args, **kw):
-			return self
-		
-	def __init__(self, response):
-		r = httplib.HTTPResponse(self._FakeSocket(response))
-		r.begin()
+	__slots__ = ('location', 'usn', 'st', 'server', 'cache', 'allHeaders')
+	
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor parses the response datagram unless its headers (as returned by
+	# parseSSDPHeaders) have already been parsed; raises ValueError if the datagram is not
+	# an SSDP message
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self, response, allHeaders=None):
+		if allHeaders is None:
+			allHeaders = parseSSDPHeaders(response)
 		
 		self.location = u''
 		self.usn = u''
 		self.st = u''
 		self.server = u''
 		self.cache = u''
+		self.allHeaders = allHeaders
 		
-		if r.getheader("location") is not None:
-			self.location = RPFrameworkUtils.to_unicode(r.getheader("location"))
-			
-		if r.getheader("usn") is not None:
-			self.usn = RPFrameworkUtils.to_unicode(r.getheader("usn"))
-	
-		if r.getheader("st") is not None:
-			self.st = RPFrameworkUtils.to_unicode(r.getheader("st"))
-	
-		if r.getheader("server") is not None:
-			self.server = RPFrameworkUtils.to_unicode(r.getheader("server"))
-		
-		if r.getheader("cache-control") is not None:
-			try:
-				cacheControlHeader = RPFrameworkUtils.to_unicode(r.getheader("cache-control"))
-				cacheControlHeader = cacheControlHeader.split(u'=')[1]
-				self.cache = cacheControlHeader
-			except:
-				pass
-		
-		self.allHeaders = r.getheaders()
+		# only the first of any repeated header is used
+		for (headerName, headerValue) in reversed(allHeaders):
+			if headerName == 'location':
+				self.location = headerValue.decode('utf-8', 'replace')
+			elif headerName == 'usn':
+				self.usn = headerValue.decode('utf-8', 'replace')
+			elif headerName == 'st':
+				self.st = headerValue.decode('utf-8', 'replace')
+			elif headerName == 'server':
+				self.server = headerValue.decode('utf-8', 'replace')
+			elif headerName == 'cache-control':
+				# the cache time is that of the max-age directive, wherever it appears
+				self.cache = u''
+				for cacheDirective in headerValue.split(','):
+					(directiveName, separator, directiveValue) = cacheDirective.partition('=')
+					if directiveName.strip().lower() == 'max-age':
+						self.cache = directiveValue.strip().strip('"').decode('utf-8', 'replace')
+						break
 		
 	def __repr__(self):
-		return u'<SSDPResponse(%(location)s, %(st)s, %(usn)s, %(server)s)>' % (self.__dict__) + RPFrameworkUtils.to_unicode(self.allHeaders) + u'</SSDPResonse>'
+		return u'<SSDPResponse(' + self.location + u', ' + self.st + u', ' + self.usn + u', ' + self.server + u')>' + RPFrameworkUtils.to_unicode(self.allHeaders) + u'</SSDPResonse>'
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# parseSSDPHeaders
+#	Module-level function that parses the headers of an SSDP datagram (a response to an
+#	M-SEARCH or a NOTIFY) into a list of (name, value) with the names in lower case, as
+#	httplib returned them; raises ValueError if the datagram is not an SSDP message
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+def parseSSDPHeaders(response):
+	if not (response.startswith('HTTP/') or response.startswith('NOTIFY ')):
+		raise ValueError('Not an SSDP message')
+	
+	allHeaders = []
+	headerLines = response.split('\n')
+	for lineIndex in xrange(1, len(headerLines)):
+		headerLine = headerLines[lineIndex].rstrip('\r')
+		if headerLine == '':
+			break
+		elif headerLine[0] in ' \t':
+			# a continuation of the previous header's value
+			if len(allHeaders) > 0:
+				allHeaders[-1] = (allHeaders[-1][0], allHeaders[-1][1] + ' ' + headerLine.strip())
+		else:
+			(headerName, separator, headerValue) = headerLine.partition(':')
+			if separator != '':
+				allHeaders.append((headerName.strip().lower(), headerValue.strip()))
+	return allHeaders
 
 
 #/////////////////////////////////////////////////////////////////////////////////////////
 #/////////////////////////////////////////////////////////////////////////////////////////
 # uPnPDiscover
 #	Module-level function that executes a uPNP MSEARCH operation to find devices matching
-#	a given service
+#	a given service; returns the list of responses once the timeout has elapsed
 #/////////////////////////////////////////////////////////////////////////////////////////
 #/////////////////////////////////////////////////////////////////////////////////////////
 def uPnPDiscover(service, timeout=3, retries=1):
-    group = ("239.255.255.250", 1900)
-    message = "\r\n".join([
-        "M-SEARCH * HTTP/1.1",
-        "HOST: " + group[0] + ":" + RPFrameworkUtils.to_str(group[1]),
-        "MAN: ""ssdp:discover""",
-        "ST: " + service,"MX: 3","",""])
-    socket.setdefaulttimeout(timeout)
-    responses = {}
-    for _ in range(retries):
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
-        sock.sendto(message, group)
-        while True:
-            try:
-                response = SSDPResponse(sock.recv(1024))
-                responses[response.location] = response
-            except socket.timeout:
-                break
-    return responses.values()
- 
\ No newline at end of file
+	return list(uPnPDiscoverIter(service, timeout, retries))
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# uPnPDiscoverIter
+#	Generator that executes a uPNP MSEARCH operation, yielding each device (SSDPResponse)
+#	as its response arrives. The search ends once the timeout (in seconds) has elapsed
+#	no matter how many responses are received; the retries are sent over the first part
+#	of that time, on the same socket, rather than each waiting out its own timeout
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+def uPnPDiscoverIter(service, timeout=3, retries=1):
+	message = "\r\n".join([
+		"M-SEARCH * HTTP/1.1",
+		"HOST: " + SSDP_MULTICAST_GROUP[0] + ":" + RPFrameworkUtils.to_str(SSDP_MULTICAST_GROUP[1]),
+		"MAN: \"ssdp:discover\"",
+		"ST: " + RPFrameworkUtils.to_str(service),
+		"MX: " + RPFrameworkUtils.to_str(max(1, min(SSDP_MAX_MX, int(timeout)))), "", ""])
+	
+	sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+	try:
+		sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+		sock.setblocking(0)
+		
+		discoveryStarted = time.time()
+		discoveryDeadline = discoveryStarted + timeout
+		retryInterval = min(SSDP_RETRY_INTERVAL, float(timeout) / max(1, retries))
+		searchesSent = 0
+		responseIdsFound = set()
+		locationsFound = set()
+		while True:
+			currentTime = time.time()
+			if currentTime >= discoveryDeadline:
+				break
+			
+			# send each retry once its time arrives; a failed send does not end the search
+			# as the earlier (or later) searches may yet be answered
+			while searchesSent < retries and currentTime >= discoveryStarted + searchesSent * retryInterval:
+				try:
+					sock.sendto(message, SSDP_MULTICAST_GROUP)
+				except socket.error:
+					if searchesSent == 0:
+						raise
+				searchesSent += 1
+			
+			waitTimeout = discoveryDeadline - currentTime
+			if searchesSent < retries:
+				waitTimeout = min(waitTimeout, discoveryStarted + searchesSent * retryInterval - currentTime)
+			try:
+				readable = select.select([sock], [], [], max(0.0, waitTimeout))[0]
+			except select.error, e:
+				if e.args[0] == errno.EINTR:
+					continue
+				raise
+			if len(readable) == 0:
+				continue
+			
+			# read every response waiting, yielding those from devices not yet found; each
+			# device answers every search (and ssdp:all once per service) so most responses
+			# are repeats which are recognised by their USN; the deadline is checked for each
+			# as a busy network (or a slow consumer of this iterator) may never drain the socket
+			while True:
+				if time.time() >= discoveryDeadline:
+					return
+				try:
+					responseData = sock.recv(SSDP_MAX_RESPONSE_SIZE)
+				except socket.error, e:
+					if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+						break
+					raise
+				try:
+					allHeaders = parseSSDPHeaders(responseData)
+				except ValueError:
+					continue
+				responseId = getSSDPResponseId(allHeaders)
+				if responseId in responseIdsFound:
+					continue
+				responseIdsFound.add(responseId)
+				
+				response = SSDPResponse(responseData, allHeaders)
+				if not (response.location in locationsFound):
+					locationsFound.add(response.location)
+					yield response
+	finally:
+		sock.close()
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# getSSDPResponseId
+#	Module-level function that returns the value identifying the device service which
+#	sent an SSDP message: its USN or, lacking one, its location
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+def getSSDPResponseId(allHeaders):
+	location = None
+	for (headerName, headerValue) in allHeaders:
+		if headerName == 'usn':
+			return headerValue
+		elif headerName == 'location' and location is None:
+			location = headerValue
+	return location
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# UPnPEnumerationCache
+#	Holds the devices (SSDPResponse) found by searches for each service target; each
+#	device is kept until the max-age of its cache-control header expires, even if it does
+#	not answer a later search. The number of service targets (least recently used are
+#	dropped) and of devices per target (soonest to expire are dropped) are bounded
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class UPnPEnumerationCache(object):
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor allows passing in the bounds of the cache
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self, maxServiceTargets=UPNP_ENUMERATIONCACHE_MAXSERVICETARGETS, maxDevices=UPNP_ENUMERATIONCACHE_MAXDEVICES):
+		self.maxServiceTargets = maxServiceTargets
+		self.maxDevices = maxDevices
+		self.serviceTargets = collections.OrderedDict()
+		self.cacheLock = threading.Lock()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the unexpired devices cached for the service target or None if it has not
+	# been searched
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getDevices(self, serviceTarget):
+		with self.cacheLock:
+			cacheEntry = self.serviceTargets.pop(serviceTarget, None)
+			if cacheEntry is None:
+				return None
+			self.serviceTargets[serviceTarget] = cacheEntry
+
+			currentTime = time.time()
+			cachedDevices = cacheEntry[u'devices']
+			for (location, cachedDevice) in cachedDevices.items():
+				if cachedDevice[1] <= currentTime:
+					del cachedDevices[location]
+			return [cachedDevice[0] for cachedDevice in cachedDevices.itervalues()]
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns True if the service target should be searched again, either as the refresh
+	# interval has passed since its last search or as a device is nearing the end of its
+	# max-age; the refresh is claimed so that only the first caller is told to refresh
+	# until updateDevices is called
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def claimRefresh(self, serviceTarget, refreshInterval):
+		with self.cacheLock:
+			cacheEntry = self.serviceTargets.get(serviceTarget, None)
+			if cacheEntry is None or cacheEntry[u'refreshClaimed'] == True:
+				return False
+
+			currentTime = time.time()
+			needsRefresh = currentTime >= cacheEntry[u'lastSearch'] + refreshInterval
+			for (response, expiresAt, maxAge) in cacheEntry[u'devices'].itervalues():
+				if expiresAt - currentTime < maxAge * UPNP_ENUMERATIONCACHE_REFRESHFRACTION:
+					needsRefresh = True
+					break
+			cacheEntry[u'refreshClaimed'] = needsRefresh
+			return needsRefresh
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Updates the service target with the devices found by a search; devices which do not
+	# give a max-age are kept for the default max-age (in seconds)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def updateDevices(self, serviceTarget, discoveredDevices, defaultMaxAge):
+		with self.cacheLock:
+			cacheEntry = self.serviceTargets.pop(serviceTarget, None)
+			if cacheEntry is None:
+				cacheEntry = {u'devices': collections.OrderedDict(), u'lastSearch': 0.0, u'refreshClaimed': False}
+			self.serviceTargets[serviceTarget] = cacheEntry
+			while len(self.serviceTargets) > self.maxServiceTargets:
+				self.serviceTargets.popitem(last=False)
+
+			currentTime = time.time()
+			cachedDevices = cacheEntry[u'devices']
+			for discoveredDevice in discoveredDevices:
+				try:
+					maxAge = int(discoveredDevice.cache)
+				except ValueError:
+					maxAge = defaultMaxAge
+				cachedDevices.pop(discoveredDevice.location, None)
+				cachedDevices[discoveredDevice.location] = (discoveredDevice, currentTime + maxAge, maxAge)
+
+			for (location, cachedDevice) in cachedDevices.items():
+				if cachedDevice[1] <= currentTime:
+					del cachedDevices[location]
+			if len(cachedDevices) > self.maxDevices:
+				for (location, cachedDevice) in sorted(cachedDevices.items(), key=lambda cachedItem: cachedItem[1][1])[:len(cachedDevices) - self.maxDevices]:
+					del cachedDevices[location]
+
+			cacheEntry[u'lastSearch'] = currentTime
+			cacheEntry[u'refreshClaimed'] = False
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Releases a claimed refresh without updating the devices, such as when the search
+	# failed
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def releaseRefresh(self, serviceTarget):
+		with self.cacheLock:
+			cacheEntry = self.serviceTargets.get(serviceTarget, None)
+			if not (cacheEntry is None):
+				cacheEntry[u'refreshClaimed'] = False
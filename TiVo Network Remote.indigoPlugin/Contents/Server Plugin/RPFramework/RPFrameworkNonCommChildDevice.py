@@ -69,7 +69,13 @@ class RPFrameworkNonCommChildDevice(RPFrameworkDevice.RPFrameworkDevice):
 	def initiateCommunications(self):
 		super(RPFrameworkNonCommChildDevice, self).initiateCommunications(initializeConnect=False)
 		
-	def terminateCommunications(self):
+	def terminateCommunications(self, timeout=RPFrameworkDevice.DEVICE_TERMINATE_TIMEOUT):
+		pass
+		
+	def requestCommunicationsStop(self):
+		pass
+		
+	def waitForCommunicationsStop(self, timeout=RPFrameworkDevice.DEVICE_TERMINATE_TIMEOUT):
 		pass
 		
 	#/////////////////////////////////////////////////////////////////////////////////////
@@ -88,6 +88,22 @@
 #		Added new version check against Plugin store
 #	Version 24 [February 2019]
 #		Modified version check to only execute against API 2.0 and below
+#	Version 25:
+#		Added the shared telnet reactor used by devices with the reactor I/O engine
+#		Device responses are now dispatched through a per-device type prefix index
+#		Substitution format strings are now parsed once into cached templates
+#		Added evaluateExpression/evaluateIndigoExpression to replace eval of configuration
+#			expressions with cached, restricted compiled expressions
+#		Added the stateUpdateCoalesceWindow device setting for batched state updates
+#		Added the commandExpectedResponse setting to the commands of managed actions
+#		UPnP enumeration logs each device as it is found by the (deadline-bounded) search
+#		UPnP enumerations are cached per service target until each device's max-age and
+#			are refreshed in the background via the plugin command queue
+#		The plugin command queue holds commands until due (RPFrameworkScheduledQueue) and
+#			the concurrent thread sleeps until the next is due rather than polling
+#		Devices are asked to stop in parallel when the plugin stops and any still running
+#			at shutdown are stopped together (stopAllDeviceCommunications)
+#		Added the shared image resizer (getImageResizer) for downloaded images
 #
 #/////////////////////////////////////////////////////////////////////////////////////////
 #/////////////////////////////////////////////////////////////////////////////////////////
@@ -97,15 +113,18 @@
 #/////////////////////////////////////////////////////////////////////////////////////////
 import indigo
 import os
-import re
 import requests
 import RPFrameworkCommand
 from RPFrameworkIndigoAction import RPFrameworkIndigoActionDfn
 import RPFrameworkDeviceResponse 
+import RPFrameworkExpression
+import RPFrameworkImageResizer
 import RPFrameworkIndigoParam
 import RPFrameworkNetworkingUPnP
+import RPFrameworkScheduler
+import RPFrameworkTelnetReactor
+import RPFrameworkTemplate
 from dataAccess import indigosql
-import Queue
 import shutil
 import socket
 from subprocess import call
@@ -125,6 +144,9 @@ GUI_CONFIG_PLUGINSETTINGS = u'plugin'
 GUI_CONFIG_PLUGIN_COMMANDQUEUEIDLESLEEP = u'pluginCommandQueueIdleSleep'
 GUI_CONFIG_PLUGIN_DEBUG_SHOWUPNPOPTION = u'showUPnPDebug'
 GUI_CONFIG_PLUGIN_DEBUG_UPNPOPTION_SERVICEFILTER = u'UPnPDebugServiceFilter'
+GUI_CONFIG_PLUGIN_IMAGERESIZEBACKEND = u'imageResizeBackend'
+GUI_CONFIG_PLUGIN_IMAGERESIZECACHETIME = u'imageResizeCacheLifetime'
+GUI_CONFIG_PLUGIN_IMAGERESIZEWORKERS = u'imageResizeWorkers'
 GUI_CONFIG_PLUGIN_UPDATEDOWNLOADURL = u'pluginUpdateURL'
 
 GUI_CONFIG_ADDRESSKEY = u'deviceAddressFormat'
@@ -143,6 +165,14 @@ GUI_CONFIG_RECONNECTIONATTEMPT_DELAY = u'reconnectAttemptDelay'
 GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME = u'reconnectAttemptScheme'
 GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME_FIXED = u'fixed'
 GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME_REGRESS = u'regress'
+GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME_EXPONENTIAL = u'exponential'
+GUI_CONFIG_RECONNECTIONATTEMPT_MAXDELAY = u'reconnectAttemptMaxDelay'
+GUI_CONFIG_RECONNECTIONATTEMPT_JITTER = u'reconnectAttemptJitter'
+GUI_CONFIG_RECONNECTIONATTEMPT_JITTER_NONE = u'none'
+GUI_CONFIG_RECONNECTIONATTEMPT_JITTER_FULL = u'full'
+GUI_CONFIG_RECONNECTIONATTEMPT_PERSISTENTDELAY = u'reconnectAttemptPersistentDelay'
+
+GUI_CONFIG_STATEUPDATE_COALESCEWINDOW = u'stateUpdateCoalesceWindow'
 
 GUI_CONFIG_DATABASE_CONN_ENABLED = u'databaseConnectionEnabled'
 GUI_CONFIG_DATABASE_CONN_TYPE = u'databaseConnectionType'
@@ -218,18 +248,31 @@ class RPFrameworkPlugin(indigo.PluginBase):
 		# automatically when possible by the base classes alone)
 		self.indigoActions = dict()
 		self.deviceResponseDefinitions = dict()
+		self.deviceResponseDispatchers = dict()
+		
+		# the format strings used for substitutions are parsed once and cached
+		self.substitutionTemplates = RPFrameworkTemplate.RPFrameworkTemplateCache()
+		self.expressionCache = RPFrameworkTemplate.RPFrameworkTemplateCache(templateClass=RPFrameworkExpression.RPFrameworkExpression)
 		
 		# the plugin defines the Events processing so that we can handle the update trigger,
 		# if it exists
 		self.indigoEvents = dict()
 		
-		# this list stores a list of enumerated devices for those devices which support
-		# enumeration via uPNP
-		self.enumeratedDevices = []
-		self.lastDeviceEnumeration = time.time() - 9999
+		# the uPNP enumeration cache holds the devices found for each service target for
+		# those devices which support enumeration via uPNP
+		self.upnpEnumerationCache = RPFrameworkNetworkingUPnP.UPnPEnumerationCache()
 		
 		# create the command queue that will be used at the device level
-		self.pluginCommandQueue = Queue.Queue()
+		self.pluginCommandQueue = RPFrameworkScheduler.RPFrameworkScheduledQueue()
+		
+		# the telnet reactor is created on demand when the first device using the reactor
+		# I/O engine begins communications
+		self.telnetReactor = None
+		self.telnetReactorLock = threading.Lock()
+		
+		# the image resizer is likewise created when the first downloaded image is resized
+		self.imageResizer = None
+		self.imageResizerLock = threading.Lock()
 		
 		# setup the plugin update checker... it will be disabled if the URL is empty or the
 		# Indigo API is 2.1 or above as it will be built in... but it may be configured for
@@ -395,8 +438,15 @@ class RPFrameworkPlugin(indigo.PluginBase):
 								commandRepeatDelayNode = commandDefn.find("commandRepeatDelay")
 								if commandRepeatDelayNode != None:
 									commandRepeatDelay = RPFrameworkUtils.to_unicode(commandRepeatDelayNode.text)
+									
+								# the responses expected in reply to the command may be "none" or a comma
+								# separated list of response IDs; if not specified any response is accepted
+								commandExpectedResponses = None
+								commandExpectedResponsesNode = commandDefn.find("commandExpectedResponse")
+								if commandExpectedResponsesNode != None:
+									commandExpectedResponses = [responseId.strip() for responseId in RPFrameworkUtils.to_unicode(commandExpectedResponsesNode.text or u'').split(u',') if not (responseId.strip().lower() in (u'', u'none'))]
 								
-								rpAction.addIndigoCommand(RPFrameworkUtils.to_unicode(commandNameNode.text), RPFrameworkUtils.to_unicode(commandFormatStringNode.text), commandRepeatCount, commandRepeatDelay, commandExecuteCondition)
+								rpAction.addIndigoCommand(RPFrameworkUtils.to_unicode(commandNameNode.text), RPFrameworkUtils.to_unicode(commandFormatStringNode.text), commandRepeatCount, commandRepeatDelay, commandExecuteCondition, commandExpectedResponses)
 							
 						paramsNode = managedAction.find("params")
 						if paramsNode != None:
@@ -476,7 +526,11 @@ class RPFrameworkPlugin(indigo.PluginBase):
 	# being disabled, during an update process or if the server is being shut down
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	def shutdown(self):
-		pass
+		self.stopAllDeviceCommunications()
+		if not (self.telnetReactor is None):
+			self.telnetReactor.stopReactor()
+		if not (self.imageResizer is None):
+			self.imageResizer.stopWorkers()
 		
 		
 		
@@ -605,72 +659,127 @@ class RPFrameworkPlugin(indigo.PluginBase):
 	#/////////////////////////////////////////////////////////////////////////////////////
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	# This routine will run the concurrent processing thread used at the plugin (not
-	# device) level - such things as update checks and device reconnections
+	# device) level - such things as update checks and device reconnections. The thread
+	# sleeps until the next command is due, a command is queued or the next update check
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	def runConcurrentThread(self):
 		try:
-			# read in any configuration values necessary...
+			# read in any configuration values necessary... the idle sleep is now the
+			# longest the thread waits when nothing is scheduled
 			emptyQueueProcessingThreadSleepTime = float(self.getGUIConfigValue(GUI_CONFIG_PLUGINSETTINGS, GUI_CONFIG_PLUGIN_COMMANDQUEUEIDLESLEEP, u'20'))
 			
 			while True:
-				# process pending commands now...
+				if self.stopThread == True:
+					raise self.StopThread()
+				
+				# wait for the next command to come due; the wait is cut short for the next
+				# update check
+				wakeTime = time.time() + emptyQueueProcessingThreadSleepTime
+				if self.updateCheckPollEnabled:
+					wakeTime = min(wakeTime, self.nextUpdateCheck)
+				command = self.pluginCommandQueue.getDue(wakeTime)
+				if command is None:
+					# arbitrary time to check to see if we need to check for updates...
+					# this shouldn't block unless it is time to check
+					if self.stopThread == False:
+						self.pollForAvailableUpdate()
+					continue
+				self.logger.threaddebug(u'Plugin Command queue has ' + RPFrameworkUtils.to_unicode(self.pluginCommandQueue.qsize() + 1) + u' command(s) waiting')
+				
+				# the command name will identify what action should be taken...
 				reQueueCommandsList = list()
-				while not self.pluginCommandQueue.empty():
-					lenQueue = self.pluginCommandQueue.qsize()
-					self.logger.threaddebug(u'Plugin Command queue has ' + RPFrameworkUtils.to_unicode(lenQueue) + u' command(s) waiting')
-					
-					# the command name will identify what action should be taken...
-					reQueueCommand = False
-					command = self.pluginCommandQueue.get()
-					if command.commandName == RPFrameworkCommand.CMD_DEVICE_RECONNECT:
-						# the command payload will be in the form of a tuple:
-						#	(DeviceID, DeviceInstanceIdentifier, ReconnectTime)
-						#	ReconnectTime is the datetime where the next reconnection attempt should occur
-						timeNow = time.time()
-						if timeNow > command.commandPayload[2]:
-							if command.commandPayload[0] in self.managedDevices:
-								if self.managedDevices[command.commandPayload[0]].deviceInstanceIdentifier == command.commandPayload[1]:
-									self.logger.debug(u'Attempting reconnection to device ' + RPFrameworkUtils.to_unicode(command.commandPayload[0]))
-									self.managedDevices[command.commandPayload[0]].initiateCommunications()
-								else:
-									self.logger.threaddebug(u'Ignoring reconnection command for device ' + RPFrameworkUtils.to_unicode(command.commandPayload[0]) + u'; new instance detected')
+				if command.commandName == RPFrameworkCommand.CMD_DEVICE_RECONNECT:
+					# the command payload will be in the form of a tuple:
+					#	(DeviceID, DeviceInstanceIdentifier, ReconnectTime)
+					#	ReconnectTime is the datetime where the next reconnection attempt should occur
+					timeNow = time.time()
+					if timeNow >= command.commandPayload[2]:
+						if command.commandPayload[0] in self.managedDevices:
+							reconnectDevice = self.managedDevices[command.commandPayload[0]]
+							if reconnectDevice.deviceInstanceIdentifier == command.commandPayload[1]:
+								self.logger.debug(u'Attempting reconnection to device ' + RPFrameworkUtils.to_unicode(command.commandPayload[0]))
+								reconnectDevice.initiateCommunications()
 							else:
-								self.logger.debug(u'Ignoring reconnection command for device ' + RPFrameworkUtils.to_unicode(command.commandPayload[0]) + u'; device not created')
+								self.logger.threaddebug(u'Ignoring reconnection command for device ' + RPFrameworkUtils.to_unicode(command.commandPayload[0]) + u'; new instance detected')
 						else:
-							reQueueCommand = True
-					
-					elif command.commandName == RPFrameworkCommand.CMD_DEBUG_LOGUPNPDEVICES:
-						# kick off the UPnP discovery and logging now
-						self.logUPnPDevicesFoundProcessing()
-					
+							self.logger.debug(u'Ignoring reconnection command for device ' + RPFrameworkUtils.to_unicode(command.commandPayload[0]) + u'; device not created')
 					else:
-						# allow a base class to process the command
-						self.handleUnknownPluginCommand(command, reQueueCommandsList)
-					
-					# complete the dequeuing of the command, allowing the next
-					# command in queue to rise to the top
-					self.pluginCommandQueue.task_done()
-					if reQueueCommand == True:
-						self.logger.threaddebug(u'Plugin command queue not yet ready; requeuing for future execution')
-						reQueueCommandsList.append(command)	
-						
-				# arbitrary time to check to see if we need to check for updates...
-				# this shouldn't block unless it is time to check
-				self.pollForAvailableUpdate()	
+						# queued without its due time; hold it until then
+						self.pluginCommandQueue.putAt(command, command.commandPayload[2])
 				
-				# any commands that did not yet execute should be placed back into the queue
-				for commandToRequeue in reQueueCommandsList:
-					self.pluginCommandQueue.put(commandToRequeue)
+				elif command.commandName == RPFrameworkCommand.CMD_DEBUG_LOGUPNPDEVICES:
+					# kick off the UPnP discovery and logging now
+					self.logUPnPDevicesFoundProcessing()
 				
-				# sleep on an empty queue... note that this should not normally be as granular
-				# as a device's communications! (value is in seconds)
-				self.sleep(emptyQueueProcessingThreadSleepTime)
+				elif command.commandName == RPFrameworkCommand.CMD_UPNP_REFRESHENUMERATION:
+					# the command payload will be in the form of a tuple:
+					#	(ServiceTarget, DefaultMaxAge)
+					self.refreshUPNPEnumeration(command.commandPayload[0], command.commandPayload[1])
+				
+				else:
+					# allow a base class to process the command
+					self.handleUnknownPluginCommand(command, reQueueCommandsList)
+				
+				# any commands that did not yet execute are retried after the idle sleep time
+				for commandToRequeue in reQueueCommandsList:
+					self.logger.threaddebug(u'Plugin command queue not yet ready; requeuing for future execution')
+					self.pluginCommandQueue.putAt(commandToRequeue, time.time() + emptyQueueProcessingThreadSleepTime)
 				
 		except self.StopThread:
 			# this exception is simply shutting down the thread... there is nothing
 			# that we need to process
 			pass
 			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine is called by Indigo to request that the concurrent thread stop; the
+	# thread is woken as it may be waiting on the command queue
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def stopConcurrentThread(self):
+		super(RPFrameworkPlugin, self).stopConcurrentThread()
+		self.pluginCommandQueue.wake()
+		
+		# Indigo follows this with a deviceStopComm call for each device in turn; asking all
+		# of the devices to stop now allows them to do so in parallel so that each of those
+		# calls finds its device (nearly) stopped
+		for rpDevice in self.managedDevices.values():
+			rpDevice.requestCommunicationsStop()
+			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine stops communications with all of the managed devices at once, waiting
+	# until the timeout (overall, not per device) for them to complete
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def stopAllDeviceCommunications(self, timeout=5.0):
+		rpDevices = self.managedDevices.values()
+		for rpDevice in rpDevices:
+			rpDevice.requestCommunicationsStop()
+		
+		stopDeadline = time.time() + timeout
+		for rpDevice in rpDevices:
+			rpDevice.waitForCommunicationsStop(stopDeadline - time.time())
+			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine returns the telnet reactor shared by all devices using the reactor I/O
+	# engine, creating it on first use
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getTelnetReactor(self):
+		with self.telnetReactorLock:
+			if self.telnetReactor is None:
+				self.telnetReactor = RPFrameworkTelnetReactor.RPFrameworkTelnetReactor(self)
+			return self.telnetReactor
+			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine returns the image resizer shared by all devices which download images,
+	# creating it on first use
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getImageResizer(self):
+		with self.imageResizerLock:
+			if self.imageResizer is None:
+				workerCount = int(self.getGUIConfigValue(GUI_CONFIG_PLUGINSETTINGS, GUI_CONFIG_PLUGIN_IMAGERESIZEWORKERS, u'2'))
+				backendName = self.getGUIConfigValue(GUI_CONFIG_PLUGINSETTINGS, GUI_CONFIG_PLUGIN_IMAGERESIZEBACKEND, RPFrameworkImageResizer.IMAGERESIZE_BACKEND_AUTO)
+				cacheLifetime = float(self.getGUIConfigValue(GUI_CONFIG_PLUGINSETTINGS, GUI_CONFIG_PLUGIN_IMAGERESIZECACHETIME, u'3600'))
+				self.imageResizer = RPFrameworkImageResizer.RPFrameworkImageResizer(self, workerCount, backendName, cacheLifetime)
+			return self.imageResizer
+			
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	# This routine will be called to handle any unknown commands at the plugin level; it
 	# can/should be overridden in the plugin implementation (if needed)
@@ -697,6 +806,7 @@ class RPFrameworkPlugin(indigo.PluginBase):
 		if not (deviceTypeId in self.deviceResponseDefinitions):
 			self.deviceResponseDefinitions[deviceTypeId] = list()
 		self.deviceResponseDefinitions[deviceTypeId].append(responseDfn)
+		self.deviceResponseDispatchers[deviceTypeId] = RPFrameworkDeviceResponse.RPFrameworkDeviceResponseDispatcher(self.deviceResponseDefinitions[deviceTypeId])
 		
 		
 		
@@ -949,8 +1059,7 @@ class RPFrameworkPlugin(indigo.PluginBase):
 	# network matching the service given by the filter
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-	
 	def getConfigDialogUPNPDeviceMenu(self, filter=u'', valuesDict=None, typeId=u'', targetId=0):
-		self.updateUPNPEnumerationList(typeId)
-		return self.parseUPNPDeviceList(self.enumeratedDevices)
+		return self.parseUPNPDeviceList(self.updateUPNPEnumerationList(typeId))
 		
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	# This routine is called whenever the user clicks the "Select" button on a device
@@ -1181,53 +1290,72 @@ class RPFrameworkPlugin(indigo.PluginBase):
 	# may be substituted (variables, devices, states, parameters, etc.)
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	def substituteIndigoValues(self, input, rpDevice, actionParamValues):
-		substitutedString = input
-		if substitutedString is None:
-			substitutedString = u''
-		
-		# substitute each parameter value called for in the string; this is done first so that
-		# the parameter could call for a substitution
-		apMatcher = re.compile(u'%ap:([a-z\d]+)%', re.IGNORECASE)
-		for match in apMatcher.finditer(substitutedString):
-			substitutedString = substitutedString.replace(RPFrameworkUtils.to_unicode(match.group(0)), RPFrameworkUtils.to_unicode(actionParamValues[match.group(1)]))
-			
-		# substitute device properties since the substitute method below handles states...
-		dpMatcher = re.compile(u'%dp:([a-z\d]+)%', re.IGNORECASE)
-		for match in dpMatcher.finditer(substitutedString):
-			if type(rpDevice.indigoDevice.pluginProps.get(match.group(1), None)) is indigo.List:
-				substitutedString = substitutedString.replace(RPFrameworkUtils.to_unicode(match.group(0)), u"'" + u','.join(rpDevice.indigoDevice.pluginProps.get(match.group(1))) + u"'")
-			else:
-				substitutedString = substitutedString.replace(RPFrameworkUtils.to_unicode(match.group(0)), RPFrameworkUtils.to_unicode(rpDevice.indigoDevice.pluginProps.get(match.group(1), u'')))
-			
-		# handle device states for any where we do not specify a device id
-		dsMatcher = re.compile(u'%ds:([a-z\d]+)%', re.IGNORECASE)
-		for match in dsMatcher.finditer(substitutedString):
-			substitutedString = substitutedString.replace(RPFrameworkUtils.to_unicode(match.group(0)), RPFrameworkUtils.to_unicode(rpDevice.indigoDevice.states.get(match.group(1), u'')))
-			
-		# handle parent device properties (for child devices)
-		if rpDevice != None:
-			if self.getGUIConfigValue(rpDevice.indigoDevice.deviceTypeId, GUI_CONFIG_ISCHILDDEVICEID, u'false').lower() == 'true':
-				parentDeviceId = int(rpDevice.indigoDevice.pluginProps[self.getGUIConfigValue(rpDevice.indigoDevice.deviceTypeId, GUI_CONFIG_PARENTDEVICEIDPROPERTYNAME, u'')])
-				if parentDeviceId in self.managedDevices:
-					parentRPDevice = self.managedDevices[parentDeviceId]
-					pdpMatcher = re.compile(u'%pdp:([a-z\d]+)%', re.IGNORECASE)
-					for match in pdpMatcher.finditer(substitutedString):
-						if type(parentRPDevice.indigoDevice.pluginProps.get(match.group(1), None)) is indigo.List:
-							substitutedString = substitutedString.replace(RPFrameworkUtils.to_unicode(match.group(0)), u"'" + u','.join(parentRPDevice.indigoDevice.pluginProps.get(match.group(1))) + u"'")
-						else:
-							substitutedString = substitutedString.replace(RPFrameworkUtils.to_unicode(match.group(0)), RPFrameworkUtils.to_unicode(parentRPDevice.indigoDevice.pluginProps.get(match.group(1), u'')))
-			
-		# handle plugin preferences
-		ppMatcher = re.compile(u'%pp:([a-z\d]+)%', re.IGNORECASE)
-		for match in ppMatcher.finditer(substitutedString):
-			substitutedString = substitutedString.replace(RPFrameworkUtils.to_unicode(match.group(0)), RPFrameworkUtils.to_unicode(self.pluginPrefs.get(match.group(1), u'')))
-			
-		# perform the standard indigo values substitution...
-		substitutedString = self.substitute(substitutedString)
+		if input is None:
+			return u''
+		if not (u'%' in input):
+			return input
+		
+		# render the (cached) parsed template; the parameter values are substituted first so
+		# that the parameter could call for a substitution
+		substitutedString = self.substitutionTemplates.renderTemplate(input, lambda substitutionType, substitutionKey: self.getSubstitutionValue(substitutionType, substitutionKey, rpDevice, actionParamValues))
+		
+		# perform the standard indigo values substitution (%%v:...%% and %%d:...%%)
+		if u'%%' in substitutedString:
+			substitutedString = self.substitute(substitutedString)
 		
 		# return the new string to the caller
 		return substitutedString
 		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine will evaluate an expression (such as an "eval:" format string without
+	# its prefix); the expression is compiled once and cached. The optional callable is
+	# passed each placeholder found in the expression and returns its substituted text
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def evaluateExpression(self, expressionText, placeholderValue=None):
+		return self.expressionCache.getTemplate(expressionText).evaluate(placeholderValue, self.expressionCache)
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine will evaluate an expression with its placeholders substituted as
+	# substituteIndigoValues would have done
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def evaluateIndigoExpression(self, expressionText, rpDevice, actionParamValues):
+		return self.evaluateExpression(expressionText, lambda placeholderText: self.substituteIndigoValues(placeholderText, rpDevice, actionParamValues))
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine will return the value for a single substitution placeholder found by
+	# substituteIndigoValues; None leaves the placeholder in place
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getSubstitutionValue(self, substitutionType, substitutionKey, rpDevice, actionParamValues):
+		if substitutionType == RPFrameworkTemplate.TEMPLATE_SUBSTITUTION_ACTIONPARAM:
+			return RPFrameworkUtils.to_unicode(actionParamValues[substitutionKey])
+		elif substitutionType == RPFrameworkTemplate.TEMPLATE_SUBSTITUTION_DEVICEPROP:
+			return self.getSubstitutionPropertyValue(rpDevice.indigoDevice.pluginProps, substitutionKey)
+		elif substitutionType == RPFrameworkTemplate.TEMPLATE_SUBSTITUTION_DEVICESTATE:
+			return RPFrameworkUtils.to_unicode(rpDevice.indigoDevice.states.get(substitutionKey, u''))
+		elif substitutionType == RPFrameworkTemplate.TEMPLATE_SUBSTITUTION_PARENTDEVICEPROP:
+			# parent device properties are only available for child devices
+			if rpDevice is None or self.getGUIConfigValue(rpDevice.indigoDevice.deviceTypeId, GUI_CONFIG_ISCHILDDEVICEID, u'false').lower() != 'true':
+				return None
+			parentDeviceId = int(rpDevice.indigoDevice.pluginProps[self.getGUIConfigValue(rpDevice.indigoDevice.deviceTypeId, GUI_CONFIG_PARENTDEVICEIDPROPERTYNAME, u'')])
+			if not (parentDeviceId in self.managedDevices):
+				return None
+			return self.getSubstitutionPropertyValue(self.managedDevices[parentDeviceId].indigoDevice.pluginProps, substitutionKey)
+		elif substitutionType == RPFrameworkTemplate.TEMPLATE_SUBSTITUTION_PLUGINPREF:
+			return RPFrameworkUtils.to_unicode(self.pluginPrefs.get(substitutionKey, u''))
+		else:
+			return None
+			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine will format a device property for substitution; lists are substituted
+	# as a quoted, comma-delimited string
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getSubstitutionPropertyValue(self, pluginProps, propertyName):
+		propertyValue = pluginProps.get(propertyName, u'')
+		if type(propertyValue) is indigo.List:
+			return u"'" + u','.join(propertyValue) + u"'"
+		else:
+			return RPFrameworkUtils.to_unicode(propertyValue)
+		
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	# This routine will set a GUI configuration value given the device type, the key and
 	# the value for the device
@@ -1259,20 +1387,51 @@ class RPFrameworkPlugin(indigo.PluginBase):
 			return self.deviceResponseDefinitions[deviceTypeId]
 		else:
 			return ()
+			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine will retrieve the dispatcher used to match responses against the device
+	# response definitions for the given device type
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getDeviceResponseDispatcher(self, deviceTypeId):
+		if not (deviceTypeId in self.deviceResponseDispatchers):
+			self.deviceResponseDispatchers[deviceTypeId] = RPFrameworkDeviceResponse.RPFrameworkDeviceResponseDispatcher(())
+		return self.deviceResponseDispatchers[deviceTypeId]
 	
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
-	# This routine will update the enumeratedDevices list of devices from the uPNP
+	# This routine will return the list of devices from the uPNP enumeration cache for the
+	# device type's service target; the search is only run here if the service target has
+	# never been searched, otherwise (even where that search found nothing) a refresh is
+	# queued once the cache time passes or a device nears the end of its max-age
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	def updateUPNPEnumerationList(self, deviceTypeId):
 		uPNPCacheTime = int(self.getGUIConfigValue(deviceTypeId, GUI_CONFIG_UPNP_CACHETIMESEC, u'180'))
-		if time.time() > self.lastDeviceEnumeration + uPNPCacheTime or len(self.enumeratedDevices) == 0:
-			serviceId = self.getGUIConfigValue(deviceTypeId, GUI_CONFIG_UPNP_SERVICE, u'ssdp:all')
+		serviceId = self.getGUIConfigValue(deviceTypeId, GUI_CONFIG_UPNP_SERVICE, u'ssdp:all')
+		cachedDevices = self.upnpEnumerationCache.getDevices(serviceId)
+		if cachedDevices is None:
+			self.refreshUPNPEnumeration(serviceId, uPNPCacheTime)
+			cachedDevices = self.upnpEnumerationCache.getDevices(serviceId) or []
+		elif self.upnpEnumerationCache.claimRefresh(serviceId, uPNPCacheTime) == True:
+			self.logger.threaddebug(u'Queuing uPnP search refresh for: ' + serviceId)
+			self.pluginCommandQueue.put(RPFrameworkCommand.RPFrameworkCommand(RPFrameworkCommand.CMD_UPNP_REFRESHENUMERATION, commandPayload=(serviceId, uPNPCacheTime)))
+		return cachedDevices
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine performs the uPNP search for a service target and updates the
+	# enumeration cache with the devices found
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def refreshUPNPEnumeration(self, serviceId, defaultMaxAge):
+		try:
 			self.logger.debug(u'Performing uPnP search for: ' + serviceId)
-			discoveredDevices = RPFrameworkNetworkingUPnP.uPnPDiscover(serviceId)
+			discoveredDevices = []
+			for discoveredDevice in RPFrameworkNetworkingUPnP.uPnPDiscoverIter(serviceId):
+				self.logger.threaddebug(u'Found uPnP device at ' + discoveredDevice.location)
+				discoveredDevices.append(discoveredDevice)
 			self.logger.debug(u'Found ' + RPFrameworkUtils.to_unicode(len(discoveredDevices)) + u' devices')
 			
-			self.enumeratedDevices = discoveredDevices
-			self.lastDeviceEnumeration = time.time()
+			self.upnpEnumerationCache.updateDevices(serviceId, discoveredDevices, defaultMaxAge)
+		except:
+			self.upnpEnumerationCache.releaseRefresh(serviceId)
+			self.logger.exception(u'Error performing uPnP search for: ' + serviceId)
 			
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	# This routine will get the full path to a file with the given name inside the plugin
@@ -51,6 +51,28 @@
 #		Added threaddebug level logging of headers to the SOAP request
 #	February 2019:
 #		Removed obsolete database connection support
+#	Version 25:
+#		Text responses are now matched through the plugin's response dispatcher
+#		The state updates made by a response's effects are sent as a single batch
+#		The processing thread checks for a cooperative stop request between commands
+#		Requests are made through a per-device HTTP session which keeps its connections
+#			alive (up to httpConnectionPoolSize) and reuses digest authentication state;
+#			the session is closed after httpConnectionIdleTimeout seconds without use
+#		Downloads are streamed to disk by a separate download thread, so that commands
+#			queued behind them are not held up; each is written to a partial file which
+#			is renamed once complete and resumed (via a Range request) if interrupted, with
+#			its progress reported to the downloadProgressState device state (if given)
+#		A partial download is only resumed from the URL it came from and while the file
+#			is unchanged: its URL and validator (ETag or Last-Modified) are kept alongside
+#			it and sent as If-Range, the partial file being discarded otherwise
+#		Downloaded images are resized by the plugin's image resizer rather than by a
+#			sips shell command, the device being notified once the resize completes;
+#			resized images are cached by URL, size and validator (ETag/Last-Modified) and
+#			reused only once a conditional GET finds the image unchanged (304)
+#		Status poll GETs are made conditional (If-None-Match/If-Modified-Since) and the
+#			response processing skipped when the document is unchanged (not modified or
+#			the same content), as counted by statusPollsProcessed/statusPollsSkipped; set
+#			updateStatusPollerConditional to false to process every poll
 #
 #/////////////////////////////////////////////////////////////////////////////////////////
 #/////////////////////////////////////////////////////////////////////////////////////////
@@ -59,13 +81,14 @@
 # Python imports
 #/////////////////////////////////////////////////////////////////////////////////////////
 import functools
+import hashlib
 import httplib
 import indigo
+import json
 import Queue
 import os
 import re
 import string
-import subprocess
 import sys
 import threading
 import telnetlib
@@ -75,11 +98,13 @@ import urllib2
 from urlparse import urlparse
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPDigestAuth
 import RPFrameworkPlugin
 import RPFrameworkCommand
 import RPFrameworkDevice
 import RPFrameworkNetworkingWOL
+import RPFrameworkThread
 import RPFrameworkUtils
 
 
@@ -96,8 +121,17 @@ CMD_DOWNLOADIMAGE = u'DOWNLOAD_IMAGE'
 GUI_CONFIG_RESTFULSTATUSPOLL_INTERVALPROPERTY = u'updateStatusPollerIntervalProperty'
 GUI_CONFIG_RESTFULSTATUSPOLL_ACTIONID = u'updateStatusPollerActionId'
 GUI_CONFIG_RESTFULSTATUSPOLL_STARTUPDELAY = u'updateStatusPollerStartupDelay'
+GUI_CONFIG_RESTFULSTATUSPOLL_CONDITIONAL = u'updateStatusPollerConditional'
 
 GUI_CONFIG_RESTFULDEV_EMPTYQUEUE_SPEEDUPCYCLES = u'emptyQueueReducedWaitCycles'
+GUI_CONFIG_RESTFULDEV_HTTPPOOLSIZE = u'httpConnectionPoolSize'
+GUI_CONFIG_RESTFULDEV_HTTPIDLETIMEOUT = u'httpConnectionIdleTimeout'
+GUI_CONFIG_RESTFULDEV_DOWNLOADCHUNKSIZE = u'downloadChunkSize'
+GUI_CONFIG_RESTFULDEV_DOWNLOADTIMEOUT = u'downloadReadTimeout'
+GUI_CONFIG_RESTFULDEV_DOWNLOADPROGRESSSTATE = u'downloadProgressState'
+
+DOWNLOAD_PARTIALFILE_EXTENSION = u'.part'
+DOWNLOAD_PARTIALINFO_EXTENSION = u'.partinfo'
 
 
 #/////////////////////////////////////////////////////////////////////////////////////////
@@ -121,6 +155,52 @@ class RPFrameworkRESTfulDevice(RPFrameworkDevice.RPFrameworkDevice):
 	def __init__(self, plugin, device):
 		super(RPFrameworkRESTfulDevice, self).__init__(plugin, device)
 		
+		# the HTTP session, along with its pool of keep-alive connections, is created by the
+		# processing thread on first use and closed once it has gone unused for a time
+		self.httpSession = None
+		self.httpSessionLastUsed = 0.0
+		self.httpSessionIdleTimeout = 60.0
+		self.httpAuthentications = {}
+		
+		# the validators (ETag, Last-Modified and content hash) of the document last
+		# processed from each status poll URL, used to skip polls returning it unchanged
+		self.statusPollValidators = {}
+		self.statusPollsProcessed = 0
+		self.statusPollsSkipped = 0
+		
+		# the validators (ETag and Last-Modified) of the image last downloaded from each URL,
+		# used to revalidate the resized copies held by the image resizer's cache
+		self.downloadedImageValidators = {}
+		
+		# downloads are queued to their own thread, which is started as needed and ends once
+		# the queue is empty
+		self.downloadQueue = Queue.Queue()
+		self.downloadLock = threading.Lock()
+		self.downloadThread = None
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine asks the processing and download threads to stop without waiting; an
+	# interrupted download is left in its partial file to be resumed
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def requestCommunicationsStop(self):
+		super(RPFrameworkRESTfulDevice, self).requestCommunicationsStop()
+		downloadThread = self.downloadThread
+		if not (downloadThread is None):
+			downloadThread.requestStop()
+			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine waits, up to the timeout overall, for the processing and download
+	# threads to stop
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def waitForCommunicationsStop(self, timeout=RPFrameworkDevice.DEVICE_TERMINATE_TIMEOUT):
+		stopDeadline = time.time() + timeout
+		super(RPFrameworkRESTfulDevice, self).waitForCommunicationsStop(timeout)
+		downloadThread = self.downloadThread
+		if not (downloadThread is None) and not (downloadThread is threading.currentThread()):
+			downloadThread.join(max(0.0, stopDeadline - time.time()))
+			if downloadThread.isAlive() == True:
+				self.hostPlugin.logger.warning(u'Download for ' + RPFrameworkUtils.to_unicode(self.indigoDevice.name) + u' did not stop within ' + RPFrameworkUtils.to_unicode(timeout) + u' seconds')
+		
 		
 	#/////////////////////////////////////////////////////////////////////////////////////
 	# Processing and command functions
@@ -146,7 +226,9 @@ class RPFrameworkRESTfulDevice(RPFrameworkDevice.RPFrameworkDevice):
 			updateStatusPollerInterval = int(self.indigoDevice.pluginProps.get(updateStatusPollerPropertyName, u'90'))
 			updateStatusPollerNextRun = None
 			updateStatusPollerActionId = self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_RESTFULSTATUSPOLL_ACTIONID, u'')
+			updateStatusPollerConditional = self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_RESTFULSTATUSPOLL_CONDITIONAL, u'true').lower() == u'true'
 			emptyQueueReducedWaitCycles = int(self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_RESTFULDEV_EMPTYQUEUE_SPEEDUPCYCLES, u'80'))
+			self.httpSessionIdleTimeout = float(self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_RESTFULDEV_HTTPIDLETIMEOUT, u'60'))
 			
 			# begin the infinite loop which will run as long as the queue contains commands
 			# and we have not received an explicit shutdown request
@@ -154,7 +236,7 @@ class RPFrameworkRESTfulDevice(RPFrameworkDevice.RPFrameworkDevice):
 			lastQueuedCommandCompleted = 0
 			while continueProcessingCommands == True:
 				# process pending commands now...
-				while not commandQueue.empty():
+				while not commandQueue.empty() and self.isCommunicationsStopRequested() == False:
 					lenQueue = commandQueue.qsize()
 					self.hostPlugin.logger.threaddebug(u'Command queue has ' + RPFrameworkUtils.to_unicode(lenQueue) + u' command(s) waiting')
 					
@@ -185,7 +267,7 @@ class RPFrameworkRESTfulDevice(RPFrameworkDevice.RPFrameworkDevice):
 						try:
 							pauseTime = float(command.commandPayload)
 							self.hostPlugin.logger.threaddebug(u'Initiating sleep of ' + RPFrameworkUtils.to_unicode(pauseTime) + u' seconds from command.')
-							time.sleep(pauseTime)
+							self.sleepUnlessStopRequested(pauseTime)
 						except:
 							self.hostPlugin.logger.warning(u'Invalid pause time requested')
 							
@@ -208,6 +290,11 @@ class RPFrameworkRESTfulDevice(RPFrameworkDevice.RPFrameworkDevice):
 							self.hostPlugin.logger.error(u'Failed to send Wake-on-LAN packet')
 						
 					elif command.commandName == CMD_RESTFUL_GET or command.commandName == CMD_RESTFUL_PUT or command.commandName == CMD_DOWNLOADFILE or command.commandName == CMD_DOWNLOADIMAGE:
+						# a GET made by the status poll action may be skipped if unchanged; any other
+						# request may change the device, so the next poll is processed in full
+						isStatusPoll = command.commandName == CMD_RESTFUL_GET and self.isStatusPollCommand(command, updateStatusPollerActionId)
+						if isStatusPoll == False:
+							self.statusPollValidators.clear()
 						try:
 							self.hostPlugin.logger.debug(u'Processing GET operation: ' + RPFrameworkUtils.to_unicode(command.commandPayload))
 							
@@ -233,7 +320,6 @@ class RPFrameworkRESTfulDevice(RPFrameworkDevice.RPFrameworkDevice):
 							customHeaders = {}
 							self.addCustomHTTPHeaders(customHeaders)
 							
-							authenticationParam = None
 							authenticationType = u'none'
 							username = u''
 							password = u''
@@ -245,77 +331,46 @@ class RPFrameworkRESTfulDevice(RPFrameworkDevice.RPFrameworkDevice):
 								password = commandPayloadList[4]
 							if authenticationType != 'none' and username != u'':
 								self.hostPlugin.logger.threaddebug(u'Using login credentials... Username=> ' + username + u'; Password=>' + RPFrameworkUtils.to_unicode(len(password)) + u' characters long')
-								if authenticationType.lower() == 'digest':
-									self.hostPlugin.logger.threaddebug(u'Enabling digest authentication')
-									authenticationParam = HTTPDigestAuth(username, password)
-								else:
-									authenticationParam = (username, password)
+							authenticationParam = self.getHTTPAuthentication(authenticationType, username, password)
 							
-							# execute the URL fetching depending upon the method requested
-							if command.commandName == CMD_RESTFUL_GET or command.commandName == CMD_DOWNLOADFILE or command.commandName == CMD_DOWNLOADIMAGE:
-								responseObj = requests.get(fullGetUrl, auth=authenticationParam, headers=customHeaders, verify=False)
+							# execute the URL fetching depending upon the method requested; downloads are
+							# streamed to disk by the download thread
+							if command.commandName == CMD_DOWNLOADFILE or command.commandName == CMD_DOWNLOADIMAGE:
+								if len(commandPayloadList) >= 6:
+									self.queueDownload(command, fullGetUrl, authenticationParam, customHeaders, commandPayloadList[5])
+								else:
+									self.hostPlugin.logger.error(u'Unable to complete download action - no filename specified')
+								responseObj = None
+							elif command.commandName == CMD_RESTFUL_GET:
+								if isStatusPoll == True and updateStatusPollerConditional == True:
+									self.addConditionalHTTPHeaders(self.statusPollValidators.get(fullGetUrl, None), customHeaders)
+								responseObj = self.getHTTPSession().get(fullGetUrl, auth=authenticationParam, headers=customHeaders, verify=False)
 							elif command.commandName == CMD_RESTFUL_PUT:
 								dataToPost = None
 								if len(commandPayloadList) >= 6:
 									dataToPost = commandPayloadList[5]
-								responseObj = requests.post(fullGetUrl, auth=authenticationParam, headers=customHeaders, verify=False, data=dataToPost)
+								responseObj = self.getHTTPSession().post(fullGetUrl, auth=authenticationParam, headers=customHeaders, verify=False, data=dataToPost)
 								
 							# if the network command failed then allow the error processor to handle the issue
-							if responseObj.status_code == 200:
-								# the response handling will depend upon the type of command... binary returns must be
-								# handled separately from (expected) text-based ones
-								if command.commandName == CMD_DOWNLOADFILE or command.commandName == CMD_DOWNLOADIMAGE:
-									# this is a binary return that should be saved to the file system without modification
-									if len(commandPayloadList) >= 6:
-										saveLocation = commandPayloadList[5]
-									
-										# execute the actual save from the binary response stream
-										try:
-											localFile = open(RPFrameworkUtils.to_str(saveLocation), "wb")
-											localFile.write(responseObj.content)
-											self.hostPlugin.logger.threaddebug(u'Command Response: [' + RPFrameworkUtils.to_unicode(responseObj.status_code) + u'] -=- binary data written to ' + RPFrameworkUtils.to_unicode(saveLocation) + u'-=-')
-										
-											if command.commandName == CMD_DOWNLOADIMAGE:
-												imageResizeWidth = 0
-												imageResizeHeight = 0
-												if len(command.commandPayload) >= 7:
-													imageResizeWidth = int(command.commandPayload[6])
-												if len(command.commandPayload) >= 8:
-													imageResizeHeight = int(command.commandPayload[7])
+							if responseObj is None:
+								# the download thread handles the outcome of a download
+								pass
+							elif isStatusPoll == True and updateStatusPollerConditional == True and self.isStatusPollUnchanged(fullGetUrl, responseObj) == True:
+								self.statusPollsSkipped += 1
+								self.hostPlugin.logger.threaddebug(u'Status unchanged at ' + fullGetUrl + u'; skipping response processing (' + RPFrameworkUtils.to_unicode(self.statusPollsSkipped) + u' skipped, ' + RPFrameworkUtils.to_unicode(self.statusPollsProcessed) + u' processed)')
+							elif responseObj.status_code == 200:
+								if isStatusPoll == True:
+									self.statusPollsProcessed += 1
+								# handle this return as a text-based return
+								self.hostPlugin.logger.threaddebug(u'Command Response: [' + RPFrameworkUtils.to_unicode(responseObj.status_code) + u'] ' + RPFrameworkUtils.to_unicode(responseObj.text))
+								self.hostPlugin.logger.threaddebug(command.commandName + u' command completed; beginning response processing')
+								self.handleDeviceTextResponse(responseObj, command)
+								self.hostPlugin.logger.threaddebug(command.commandName + u' command response processing completed')
 								
-												resizeCommandLine = u''
-												if imageResizeWidth > 0 and imageResizeHeight > 0:
-													# we have a specific size as a target...
-													resizeCommandLine = u'sips -z ' + RPFrameworkUtils.to_unicode(imageResizeHeight) + u' ' + RPFrameworkUtils.to_unicode(imageResizeWidth) + u' ' + saveLocation
-												elif imageResizeWidth > 0:
-													# we have a maximum size measurement
-													resizeCommandLine = u'sips -Z ' + RPFrameworkUtils.to_unicode(imageResizeWidth) + u' ' + saveLocation
-									
-												# if a command line has been formed, fire that off now...
-												if resizeCommandLine == u'':
-													self.hostPlugin.logger.debug(u'No image size specified for ' + RPFrameworkUtils.to_unicode(saveLocation) + u'; skipping resize.')
-												else:
-													self.hostPlugin.logger.threaddebug(u'Executing resize via command line "' + resizeCommandLine + u'"')
-													try:
-														subprocess.Popen(resizeCommandLine, shell=True)
-														self.hostPlugin.logger.debug(saveLocation + u' resized via sip shell command')
-													except:
-														self.hostPlugin.logger.error(u'Error resizing image via sips')
-														
-											# we have completed the download and processing successfully... allow the
-											# device (or its descendants) to process successful operations
-											self.notifySuccessfulDownload(command, saveLocation)
-										finally:
-											if not localFile is None:
-												localFile.close()					
-									else:
-										self.hostPlugin.logger.error(u'Unable to complete download action - no filename specified')
-								else:
-									# handle this return as a text-based return
-									self.hostPlugin.logger.threaddebug(u'Command Response: [' + RPFrameworkUtils.to_unicode(responseObj.status_code) + u'] ' + RPFrameworkUtils.to_unicode(responseObj.text))
-									self.hostPlugin.logger.threaddebug(command.commandName + u' command completed; beginning response processing')
-									self.handleDeviceTextResponse(responseObj, command)
-									self.hostPlugin.logger.threaddebug(command.commandName + u' command response processing completed')
+								# the poll's validators are only kept once its response has been
+								# processed; one which failed is processed again on the next poll
+								if isStatusPoll == True and updateStatusPollerConditional == True:
+									self.storeStatusPollValidators(fullGetUrl, responseObj)
 									
 							elif responseObj.status_code == 401:
 								self.handleRESTfulError(command, u'401 - Unauthorized', responseObj)
@@ -329,6 +384,7 @@ class RPFrameworkRESTfulDevice(RPFrameworkDevice.RPFrameworkDevice):
 							self.handleRESTfulError(command, e, None)
 						
 					elif command.commandName == CMD_SOAP_REQUEST or command.commandName == CMD_JSON_REQUEST:
+						self.statusPollValidators.clear()
 						responseObj = None
 						try:
 							# this is to post a SOAP request to a web service... this will be similar to a restful put request
@@ -353,7 +409,7 @@ class RPFrameworkRESTfulDevice(RPFrameworkDevice.RPFrameworkDevice):
 							# execute the URL post to the web service
 							self.hostPlugin.logger.threaddebug(u'Sending SOAP/JSON request:\n' + RPFrameworkUtils.to_unicode(soapBody))
 							self.hostPlugin.logger.threaddebug(u'Using headers: \n' + RPFrameworkUtils.to_unicode(customHeaders))
-							responseObj = requests.post(fullGetUrl, headers=customHeaders, verify=False, data=RPFrameworkUtils.to_str(soapBody))
+							responseObj = self.getHTTPSession().post(fullGetUrl, headers=customHeaders, verify=False, data=RPFrameworkUtils.to_str(soapBody))
 							
 							if responseObj.status_code == 200:
 								# handle this return as a text-based return
@@ -378,22 +434,32 @@ class RPFrameworkRESTfulDevice(RPFrameworkDevice.RPFrameworkDevice):
 					# should execute that pause now
 					if command.postCommandPause > 0.0 and continueProcessingCommands == True:
 						self.hostPlugin.logger.threaddebug(u'Post Command Pause: ' + RPFrameworkUtils.to_unicode(command.postCommandPause))
-						time.sleep(command.postCommandPause)
+						self.sleepUnlessStopRequested(command.postCommandPause)
 					
 					# complete the dequeuing of the command, allowing the next
 					# command in queue to rise to the top
 					commandQueue.task_done()
 					lastQueuedCommandCompleted = emptyQueueReducedWaitCycles
 				
+				# a stop requested via requestCommunicationsStop ends processing once the
+				# command in progress has completed
+				if self.isCommunicationsStopRequested() == True:
+					continueProcessingCommands = False
+				
 				# when the queue is empty, pause a bit on each iteration
 				if continueProcessingCommands == True:
 					# if we have just completed a command recently, half the amount of
 					# wait time, assuming that a subsequent command could be forthcoming
 					if lastQueuedCommandCompleted > 0:
-						time.sleep(self.emptyQueueProcessingThreadSleepTime/2)
+						self.sleepUnlessStopRequested(self.emptyQueueProcessingThreadSleepTime/2)
 						lastQueuedCommandCompleted = lastQueuedCommandCompleted - 1
 					else:
-						time.sleep(self.emptyQueueProcessingThreadSleepTime)
+						self.sleepUnlessStopRequested(self.emptyQueueProcessingThreadSleepTime)
+				
+				# release the kept-alive connections once the device has gone quiet
+				if self.httpSession is not None and time.time() - self.httpSessionLastUsed > self.httpSessionIdleTimeout:
+					self.hostPlugin.logger.threaddebug(u'Closing idle HTTP session')
+					self.closeHTTPSession()
 				
 				# check to see if we need to issue an update...
 				if updateStatusPollerNextRun is not None and time.time() > updateStatusPollerNextRun:
@@ -408,6 +474,7 @@ class RPFrameworkRESTfulDevice(RPFrameworkDevice.RPFrameworkDevice):
 		except:
 			self.hostPlugin.logger.exception(u'Exception in background processing')
 		finally:
+			self.closeHTTPSession()
 			self.hostPlugin.logger.debug(u'Command thread ending processing')
 		
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
@@ -416,7 +483,333 @@ class RPFrameworkRESTfulDevice(RPFrameworkDevice.RPFrameworkDevice):
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	def getRESTfulDeviceAddress(self):
 		return None
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine returns the device's HTTP session, creating it if needed; requests made
+	# through it reuse kept-alive connections. It should only be used from the processing
+	# thread (including within handleUnmanagedCommandInQueue)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getHTTPSession(self):
+		if self.httpSession is None:
+			httpPoolSize = int(self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_RESTFULDEV_HTTPPOOLSIZE, u'1'))
+			httpAdapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, httpPoolSize))
+			self.httpSession = requests.Session()
+			self.httpSession.mount(u'http://', httpAdapter)
+			self.httpSession.mount(u'https://', httpAdapter)
+		self.httpSessionLastUsed = time.time()
+		return self.httpSession
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine closes the HTTP session along with any connections it is keeping alive;
+	# a new session is created by the next request
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def closeHTTPSession(self):
+		if self.httpSession is not None:
+			try:
+				self.httpSession.close()
+			except:
+				self.hostPlugin.logger.threaddebug(u'Error closing HTTP session')
+			self.httpSession = None
+			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine returns the authentication to pass with a request (None when there is
+	# none); a digest authentication is kept for the credentials so that later requests
+	# answer the device's last challenge up-front rather than being challenged again
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getHTTPAuthentication(self, authenticationType, username, password):
+		if authenticationType == u'none' or username == u'':
+			return None
+			
+		authenticationKey = (authenticationType.lower(), username, password)
+		authenticationParam = self.httpAuthentications.get(authenticationKey, None)
+		if authenticationParam is None:
+			if authenticationType.lower() == u'digest':
+				self.hostPlugin.logger.threaddebug(u'Enabling digest authentication')
+				authenticationParam = HTTPDigestAuth(username, password)
+			else:
+				authenticationParam = (username, password)
+			self.httpAuthentications[authenticationKey] = authenticationParam
+		return authenticationParam
 	
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine returns True if the command was generated by the status poll action
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def isStatusPollCommand(self, rpCommand, updateStatusPollerActionId):
+		if updateStatusPollerActionId == u'' or rpCommand.parentAction is None:
+			return False
+		return getattr(rpCommand.parentAction, u'indigoActionId', rpCommand.parentAction) == updateStatusPollerActionId
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine adds the If-None-Match/If-Modified-Since headers for the validators
+	# recorded for a URL (if any), such as those of the document last processed from a
+	# status poll URL
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def addConditionalHTTPHeaders(self, urlValidators, customHeaders):
+		if urlValidators is None:
+			return
+		if not (urlValidators[u'etag'] is None):
+			customHeaders['If-None-Match'] = urlValidators[u'etag']
+		if not (urlValidators[u'lastModified'] is None):
+			customHeaders['If-Modified-Since'] = urlValidators[u'lastModified']
+			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine returns True if the response to a status poll is the document last
+	# processed from its URL -- either not modified (304) or, for devices which do not send
+	# validators, a 200 with the same content
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def isStatusPollUnchanged(self, statusPollUrl, responseObj):
+		pollValidators = self.statusPollValidators.get(statusPollUrl, None)
+		if responseObj.status_code == 304:
+			return not (pollValidators is None)
+		elif responseObj.status_code != 200:
+			self.statusPollValidators.pop(statusPollUrl, None)
+			return False
+		return not (pollValidators is None) and pollValidators[u'contentHash'] == hashlib.sha1(responseObj.content).digest()
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine records the validators (and content hash) of a status poll response
+	# once it has been processed successfully
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def storeStatusPollValidators(self, statusPollUrl, responseObj):
+		self.statusPollValidators[statusPollUrl] = { u'etag': responseObj.headers.get('ETag', None), u'lastModified': responseObj.headers.get('Last-Modified', None), u'contentHash': hashlib.sha1(responseObj.content).digest() }
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine queues a download (from a DOWNLOAD_FILE or DOWNLOAD_IMAGE command) to
+	# the download thread, starting the thread if it is not running
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def queueDownload(self, rpCommand, downloadUrl, authenticationParam, customHeaders, saveLocation):
+		with self.downloadLock:
+			self.downloadQueue.put((rpCommand, downloadUrl, authenticationParam, customHeaders, saveLocation))
+			if self.downloadThread is None:
+				self.downloadThread = RPFrameworkThread.RPFrameworkThread(target=self.concurrentDownloadThread)
+				self.downloadThread.start()
+				
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine runs in the download thread, streaming each queued download to disk in
+	# turn; the thread ends once the queue is empty or it is asked to stop. The downloads
+	# share an HTTP session of their own as the processing thread's is not thread safe
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def concurrentDownloadThread(self):
+		downloadSession = requests.Session()
+		try:
+			while self.isCommunicationsStopRequested() == False:
+				with self.downloadLock:
+					if self.downloadQueue.empty():
+						self.downloadThread = None
+						return
+					(rpCommand, downloadUrl, authenticationParam, customHeaders, saveLocation) = self.downloadQueue.get()
+					
+				try:
+					if rpCommand.commandName == CMD_DOWNLOADIMAGE:
+						# an image already downloaded and resized at this size is taken from the
+						# resizer's cache once the device confirms (304) that it is unchanged
+						imageCacheKey = self.getDownloadedImageCacheKey(rpCommand, downloadUrl)
+						imageHeaders = dict(customHeaders)
+						if not (imageCacheKey is None) and self.hostPlugin.getImageResizer().hasCachedImage(imageCacheKey) == True:
+							self.addConditionalHTTPHeaders(self.downloadedImageValidators[downloadUrl], imageHeaders)
+						downloadResult = self.streamDownload(downloadSession, rpCommand, downloadUrl, authenticationParam, imageHeaders, saveLocation)
+						if downloadResult is None and self.hostPlugin.getImageResizer().copyCachedImage(imageCacheKey, saveLocation) == False:
+							# the cached image expired while it was revalidated
+							downloadResult = self.streamDownload(downloadSession, rpCommand, downloadUrl, authenticationParam, customHeaders, saveLocation)
+							
+						if downloadResult is None:
+							self.hostPlugin.logger.threaddebug(u'Using cached image for ' + RPFrameworkUtils.to_unicode(saveLocation))
+							self.notifySuccessfulDownload(rpCommand, saveLocation)
+						elif downloadResult == True:
+							# the device is notified once the resize completes
+							self.resizeDownloadedImage(rpCommand, downloadUrl, saveLocation)
+					elif self.streamDownload(downloadSession, rpCommand, downloadUrl, authenticationParam, customHeaders, saveLocation) == True:
+						# we have completed the download and processing successfully... allow the
+						# device (or its descendants) to process successful operations
+						self.notifySuccessfulDownload(rpCommand, saveLocation)
+				except Exception, e:
+					# the partial file is kept so that the download may be resumed
+					self.handleRESTfulError(rpCommand, e, None)
+		finally:
+			downloadSession.close()
+			with self.downloadLock:
+				if self.downloadThread is threading.currentThread():
+					self.downloadThread = None
+					
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine streams a download to a partial file alongside the save location, in
+	# chunks so that memory use is bounded, renaming it into place once complete. A
+	# partial file left by an earlier attempt from the same URL is resumed via a Range
+	# request, conditional (If-Range) on the file being unchanged since. Returns True if
+	# the download completed, None if the request was conditional (If-None-Match/If-
+	# Modified-Since) and the device reports the file unchanged, or False otherwise
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def streamDownload(self, downloadSession, rpCommand, downloadUrl, authenticationParam, customHeaders, saveLocation):
+		downloadChunkSize = int(self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_RESTFULDEV_DOWNLOADCHUNKSIZE, u'65536'))
+		downloadReadTimeout = float(self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_RESTFULDEV_DOWNLOADTIMEOUT, u'30'))
+		partialLocation = RPFrameworkUtils.to_str(saveLocation + DOWNLOAD_PARTIALFILE_EXTENSION)
+		
+		downloadHeaders = dict(customHeaders)
+		resumeFrom = 0
+		if os.path.exists(partialLocation):
+			# a partial file may only be resumed from the URL it came from, and then only
+			# if the server can tell whether the file has changed since
+			partialInfo = self.readPartialDownloadInfo(partialLocation)
+			if partialInfo is None or partialInfo.get(u'url', None) != RPFrameworkUtils.to_unicode(downloadUrl) or partialInfo.get(u'validator', None) is None:
+				self.hostPlugin.logger.debug(u'Discarding partial download of ' + RPFrameworkUtils.to_unicode(saveLocation) + u' as it may not be resumed from ' + RPFrameworkUtils.to_unicode(downloadUrl))
+				self.discardPartialDownload(partialLocation)
+			else:
+				resumeFrom = os.path.getsize(partialLocation)
+		if resumeFrom > 0:
+			self.hostPlugin.logger.debug(u'Resuming download of ' + RPFrameworkUtils.to_unicode(saveLocation) + u' from byte ' + RPFrameworkUtils.to_unicode(resumeFrom))
+			downloadHeaders['Range'] = 'bytes=' + str(resumeFrom) + '-'
+			downloadHeaders['If-Range'] = RPFrameworkUtils.to_str(partialInfo[u'validator'])
+			
+		responseObj = downloadSession.get(downloadUrl, auth=authenticationParam, headers=downloadHeaders, verify=False, stream=True, timeout=downloadReadTimeout)
+		try:
+			if responseObj.status_code == 206 and resumeFrom > 0 and responseObj.headers.get('Content-Range', '').startswith('bytes ' + str(resumeFrom) + '-'):
+				partialFileMode = 'ab'
+			elif responseObj.status_code == 304 and ('If-None-Match' in downloadHeaders or 'If-Modified-Since' in downloadHeaders):
+				# the copy which the caller holds is current
+				return None
+			elif responseObj.status_code == 200:
+				# the device does not support resuming, the file has changed since the partial
+				# file was written (If-Range) or this is a new download
+				resumeFrom = 0
+				partialFileMode = 'wb'
+				self.writePartialDownloadInfo(partialLocation, downloadUrl, responseObj)
+			elif (responseObj.status_code == 206 or responseObj.status_code == 416) and resumeFrom > 0:
+				# the partial file does not match the file on the device; start again
+				self.hostPlugin.logger.debug(u'Partial download of ' + RPFrameworkUtils.to_unicode(saveLocation) + u' does not match the device\'s file [' + RPFrameworkUtils.to_unicode(responseObj.status_code) + u' ' + RPFrameworkUtils.to_unicode(responseObj.headers.get('Content-Range', '')) + u']; restarting')
+				responseObj.close()
+				self.discardPartialDownload(partialLocation)
+				return self.streamDownload(downloadSession, rpCommand, downloadUrl, authenticationParam, customHeaders, saveLocation)
+			elif responseObj.status_code == 401:
+				self.handleRESTfulError(rpCommand, u'401 - Unauthorized', responseObj)
+				return False
+			else:
+				self.handleRESTfulError(rpCommand, str(responseObj.status_code), responseObj)
+				return False
+				
+			if rpCommand.commandName == CMD_DOWNLOADIMAGE:
+				self.downloadedImageValidators[downloadUrl] = { u'etag': responseObj.headers.get('ETag', None), u'lastModified': responseObj.headers.get('Last-Modified', None) }
+				
+			totalBytes = None
+			if responseObj.headers.get('Content-Length', '').isdigit():
+				totalBytes = resumeFrom + int(responseObj.headers['Content-Length'])
+			bytesReceived = resumeFrom
+			with open(partialLocation, partialFileMode) as localFile:
+				for downloadChunk in responseObj.iter_content(chunk_size=downloadChunkSize):
+					if self.isCommunicationsStopRequested() == True:
+						self.hostPlugin.logger.debug(u'Download of ' + RPFrameworkUtils.to_unicode(saveLocation) + u' stopped after ' + RPFrameworkUtils.to_unicode(bytesReceived) + u' bytes')
+						return False
+					localFile.write(downloadChunk)
+					bytesReceived += len(downloadChunk)
+					self.reportDownloadProgress(bytesReceived, totalBytes)
+					
+			if not (totalBytes is None) and bytesReceived < totalBytes:
+				raise IOError(u'Download ended after ' + RPFrameworkUtils.to_unicode(bytesReceived) + u' of ' + RPFrameworkUtils.to_unicode(totalBytes) + u' bytes')
+			os.rename(partialLocation, RPFrameworkUtils.to_str(saveLocation))
+			self.discardPartialDownload(partialLocation)
+			self.reportDownloadProgress(bytesReceived, bytesReceived)
+			self.hostPlugin.logger.threaddebug(u'Command Response: [' + RPFrameworkUtils.to_unicode(responseObj.status_code) + u'] -=- binary data written to ' + RPFrameworkUtils.to_unicode(saveLocation) + u'-=-')
+			return True
+		finally:
+			responseObj.close()
+			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine returns the URL and validator recorded alongside a partial download, or
+	# None if there is no (readable) record of them
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def readPartialDownloadInfo(self, partialLocation):
+		try:
+			with open(partialLocation + RPFrameworkUtils.to_str(DOWNLOAD_PARTIALINFO_EXTENSION), 'rb') as partialInfoFile:
+				partialInfo = json.load(partialInfoFile)
+			if isinstance(partialInfo, dict):
+				return partialInfo
+		except (IOError, ValueError):
+			pass
+		return None
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine records the URL of a download and the validator of its response (its
+	# strong ETag or else its Last-Modified date) alongside the partial file, so that an
+	# interrupted download is only resumed while the file on the device is unchanged
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def writePartialDownloadInfo(self, partialLocation, downloadUrl, responseObj):
+		downloadValidator = responseObj.headers.get('ETag', None)
+		if downloadValidator is None or downloadValidator.startswith('W/'):
+			# weak entity tags may not be used with If-Range
+			downloadValidator = responseObj.headers.get('Last-Modified', None)
+		with open(partialLocation + RPFrameworkUtils.to_str(DOWNLOAD_PARTIALINFO_EXTENSION), 'wb') as partialInfoFile:
+			json.dump({u'url': RPFrameworkUtils.to_unicode(downloadUrl), u'validator': downloadValidator}, partialInfoFile)
+			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine removes a partial download and the record of where it came from
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def discardPartialDownload(self, partialLocation):
+		for discardLocation in [partialLocation, partialLocation + RPFrameworkUtils.to_str(DOWNLOAD_PARTIALINFO_EXTENSION)]:
+			if os.path.exists(discardLocation):
+				os.remove(discardLocation)
+				
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine reports the progress of a download, as a whole percentage, to the state
+	# named by the downloadProgressState setting (if any)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def reportDownloadProgress(self, bytesReceived, totalBytes):
+		downloadProgressState = self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_RESTFULDEV_DOWNLOADPROGRESSSTATE, u'')
+		if downloadProgressState == u'' or totalBytes is None or totalBytes <= 0:
+			return
+			
+		downloadProgress = int(bytesReceived * 100 / totalBytes)
+		self.queueStateUpdate(downloadProgressState, downloadProgress)
+		self.flushStateUpdates(downloadProgress >= 100)
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine returns the width and height given by a DOWNLOAD_IMAGE command (0 for
+	# those not given)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getDownloadedImageSize(self, rpCommand):
+		commandPayloadList = rpCommand.getPayloadAsList()
+		imageResizeWidth = 0
+		imageResizeHeight = 0
+		if len(commandPayloadList) >= 7:
+			imageResizeWidth = int(commandPayloadList[6])
+		if len(commandPayloadList) >= 8:
+			imageResizeHeight = int(commandPayloadList[7])
+		return (imageResizeWidth, imageResizeHeight)
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine returns the key under which the resized image for a DOWNLOAD_IMAGE
+	# command is cached -- its URL and size -- or None if the image is not resized
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getDownloadedImageCacheKey(self, rpCommand, downloadUrl):
+		(imageResizeWidth, imageResizeHeight) = self.getDownloadedImageSize(rpCommand)
+		imageValidators = self.downloadedImageValidators.get(downloadUrl, None)
+		if imageResizeWidth <= 0 or imageValidators is None or (imageValidators[u'etag'] is None and imageValidators[u'lastModified'] is None):
+			return None
+		return (downloadUrl, imageResizeWidth, imageResizeHeight, imageValidators[u'etag'], imageValidators[u'lastModified'])
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine resizes a downloaded image to the width/height given by the DOWNLOAD_
+	# IMAGE command (if any) via the plugin's image resizer, notifying the device of the
+	# successful download once the resize completes
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def resizeDownloadedImage(self, rpCommand, downloadUrl, saveLocation):
+		(imageResizeWidth, imageResizeHeight) = self.getDownloadedImageSize(rpCommand)
+		if imageResizeWidth <= 0:
+			self.hostPlugin.logger.debug(u'No image size specified for ' + RPFrameworkUtils.to_unicode(saveLocation) + u'; skipping resize.')
+			self.notifySuccessfulDownload(rpCommand, saveLocation)
+		else:
+			self.hostPlugin.logger.threaddebug(u'Queuing resize of ' + RPFrameworkUtils.to_unicode(saveLocation) + u' to ' + RPFrameworkUtils.to_unicode(imageResizeWidth) + u'x' + RPFrameworkUtils.to_unicode(imageResizeHeight))
+			self.hostPlugin.getImageResizer().resizeImage(saveLocation, imageResizeWidth, imageResizeHeight, self.getDownloadedImageCacheKey(rpCommand, downloadUrl), functools.partial(self.downloadedImageResized, rpCommand))
+			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine is called (on an image resizer thread) once a downloaded image has been
+	# resized
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def downloadedImageResized(self, rpCommand, saveLocation, resizeSucceeded):
+		if resizeSucceeded == True:
+			self.hostPlugin.logger.debug(RPFrameworkUtils.to_unicode(saveLocation) + u' resized')
+			self.notifySuccessfulDownload(rpCommand, saveLocation)
+		else:
+			self.hostPlugin.logger.error(u'Error resizing image ' + RPFrameworkUtils.to_unicode(saveLocation))
+		
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	# This routine should be overridden in individual device classes whenever they must
 	# handle custom commands that are not already defined
@@ -440,10 +833,11 @@ class RPFrameworkRESTfulDevice(RPFrameworkDevice.RPFrameworkDevice):
 		# loop through the list of response definitions defined in the (base) class
 		# and determine if any match
 		responseText = responseObj.text
-		for rpResponse in self.hostPlugin.getDeviceResponseDefinitions(self.indigoDevice.deviceTypeId):
-			if rpResponse.isResponseMatch(responseText, rpCommand, self, self.hostPlugin):
-				self.hostPlugin.logger.threaddebug(u'Found response match: ' + RPFrameworkUtils.to_unicode(rpResponse.responseId))
-				rpResponse.executeEffects(responseText, rpCommand, self, self.hostPlugin)
+		responseDispatcher = self.hostPlugin.getDeviceResponseDispatcher(self.indigoDevice.deviceTypeId)
+		for (rpResponse, matchObj) in responseDispatcher.findMatches(responseText, rpCommand, self, self.hostPlugin):
+			self.hostPlugin.logger.threaddebug(u'Found response match: ' + RPFrameworkUtils.to_unicode(rpResponse.responseId))
+			rpResponse.executeEffects(responseText, rpCommand, self, self.hostPlugin, matchObj)
+		self.flushStateUpdates()
 	
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	# This routine will handle an error as thrown by the REST call... it allows 
@@ -0,0 +1,150 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# RPFrameworkScheduler by RogueProeliator <adam.d.ashe@gmail.com>
+# 	Command queue which holds each command until the time at which it is due, allowing
+#	the processing thread to sleep until exactly the next command is due or a command is
+#	queued
+#
+#	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# 	SOFTWARE.
+#
+#	Version 25:
+#		Initial release of the scheduled command queue
+#
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Python imports
+#/////////////////////////////////////////////////////////////////////////////////////////
+import errno
+import fcntl
+import heapq
+import itertools
+import os
+import select
+import threading
+import time
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# RPFrameworkScheduledQueue
+#	Queue of commands ordered by the time at which each is due (those put without a time
+#	are due immediately, in the order queued). The waiting thread blocks in select on a
+#	wake-up pipe rather than on a threading.Condition as, under Python 2, a condition
+#	wait with a timeout polls every 50ms
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class RPFrameworkScheduledQueue(object):
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor creates the empty queue and its wake-up pipe
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self):
+		self.scheduledItems = []
+		self.scheduleSequence = itertools.count()
+		self.queueLock = threading.Lock()
+		self.wakeRequested = False
+
+		self.wakeupPipe = os.pipe()
+		for pipeDescriptor in self.wakeupPipe:
+			fcntl.fcntl(pipeDescriptor, fcntl.F_SETFL, fcntl.fcntl(pipeDescriptor, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Queues an item to be processed immediately; the signature matches Queue.put so that
+	# existing callers are unchanged
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def put(self, item, block=True, timeout=None):
+		self.putAt(item, 0.0)
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Queues an item to be processed once the due time (as per time.time()) arrives; the
+	# waiting thread is only woken if the item is due before any already queued
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def putAt(self, item, dueTime):
+		with self.queueLock:
+			heapq.heappush(self.scheduledItems, (dueTime, next(self.scheduleSequence), item))
+			isNextDue = self.scheduledItems[0][2] is item
+		if isNextDue == True:
+			self.signalWakeup()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the next item which is due, waiting until it is due; returns None should the
+	# wake time pass or wake be called first. A new item only wakes the wait so that it
+	# may be rescheduled, so a wake-up left from an item queued earlier never cuts it short
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getDue(self, wakeTime=None):
+		while True:
+			with self.queueLock:
+				timeNow = time.time()
+				if len(self.scheduledItems) > 0 and self.scheduledItems[0][0] <= timeNow:
+					return heapq.heappop(self.scheduledItems)[2]
+				elif self.wakeRequested == True or (wakeTime is not None and wakeTime <= timeNow):
+					self.wakeRequested = False
+					return None
+
+				waitUntil = wakeTime
+				if len(self.scheduledItems) > 0 and (waitUntil is None or self.scheduledItems[0][0] < waitUntil):
+					waitUntil = self.scheduledItems[0][0]
+
+			waitTimeout = None
+			if waitUntil is not None:
+				waitTimeout = max(0.0, waitUntil - timeNow)
+			try:
+				if len(select.select([self.wakeupPipe[0]], [], [], waitTimeout)[0]) > 0:
+					self.drainWakeups()
+			except select.error, e:
+				if e.args[0] != errno.EINTR:
+					raise
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Wakes the thread waiting in getDue, such as when it should stop; should no thread be
+	# waiting then the next call to getDue returns None without waiting
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def wake(self):
+		with self.queueLock:
+			self.wakeRequested = True
+		self.signalWakeup()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Writes a wake-up to the pipe so that the thread waiting in getDue re-checks the queue
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def signalWakeup(self):
+		try:
+			os.write(self.wakeupPipe[1], b'!')
+		except OSError:
+			# the pipe is full -- the waiting thread already has a wake-up pending
+			pass
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Reads any pending wake-ups from the pipe
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def drainWakeups(self):
+		try:
+			while len(os.read(self.wakeupPipe[0], 512)) == 512:
+				pass
+		except OSError:
+			pass
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the number of items queued, whether or not they are due
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def qsize(self):
+		with self.queueLock:
+			return len(self.scheduledItems)
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns True if no items are queued
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def empty(self):
+		return self.qsize() == 0
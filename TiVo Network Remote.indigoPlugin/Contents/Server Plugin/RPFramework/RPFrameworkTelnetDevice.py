@@ -31,6 +31,32 @@
 #		Added ability to specify 0 as the polling interval (<= 0 turns off polling)
 #	Version 18:
 #		Changed error trapping to include EOFError as a re-connectable error
+#	Version 25:
+#		Added the select-based I/O engine which blocks on the connection and a wake-up
+#		pipe rather than sleep-polling the command queue
+#		Added the reactor I/O engine which services the device from the plugin's shared
+#		telnet reactor thread rather than a thread per device
+#		Responses are now matched through the plugin's response dispatcher
+#		State update commands now evaluate "eval:" values with the compiled expressions
+#		State updates from responses and connection changes are now sent in batches
+#		Added pipelining of consecutive write commands matching the device type's
+#			telnetConnectionPipelinedCommands expression; these are written in a single
+#			send without waiting on a response after each
+#		Commands declaring their expected responses only wait until one of those is
+#			received, and not at all when no response is expected
+#		Received data is now split into lines by a buffered line framer shared by the
+#			telnet, serial and socket connections; each read takes all of the data
+#			available and may deliver several lines at once
+#		Added connection health monitoring: TCP keepalive (where supported), a liveness
+#			check that written data is acknowledged or an idle connection answers a
+#			liveness command, and the time since data was last received (kept in the
+#			device state named by telnetConnectionDeviceStateLastReceived, if any)
+#		Telnet connections are made with the connection timeout (socketConnectionTimeout)
+#		Reactor connections are left non-blocking; the reactor buffers their writes
+#		The processing thread is stopped cooperatively: it checks for a stop request
+#			between commands and is woken from its wait (or sleep) when one is made
+#		A failed connection is closed before its reconnection is scheduled and its thread
+#			flagged as stopping, so the reconnection never waits on the old thread
 #
 #/////////////////////////////////////////////////////////////////////////////////////////
 #/////////////////////////////////////////////////////////////////////////////////////////
@@ -38,24 +64,31 @@
 #/////////////////////////////////////////////////////////////////////////////////////////
 # Python imports
 #/////////////////////////////////////////////////////////////////////////////////////////
+import errno
+import fcntl
 import functools
 import httplib
 import indigo
 import Queue
 import os
 import re
+import select
 import serial
 import string
 import socket
+import struct
 import sys
 import threading
 import telnetlib
+import termios
 import time
 import urllib
 
 import RPFrameworkPlugin
 import RPFrameworkCommand
 import RPFrameworkDevice
+import RPFrameworkExpression
+import RPFrameworkLineFramer
 import RPFrameworkUtils
 
 
@@ -70,6 +103,7 @@ GUI_CONFIG_COMMANDREADTIMEOUT = u'commandReadTimeout'
 
 GUI_CONFIG_ISCONNECTEDSTATEKEY = u'telnetConnectionDeviceStateBoolean'
 GUI_CONFIG_CONNECTIONSTATEKEY = u'telnetConnectionDeviceStateName'
+GUI_CONFIG_LASTRECEIVEDSTATEKEY = u'telnetConnectionDeviceStateLastReceived'
 GUI_CONFIG_EOL = u'telnetConnectionEOLString'
 GUI_CONFIG_SENDENCODING = u'telnetConnectionStringEncoding'
 GUI_CONFIG_REQUIRES_LOGIN_DP = u'telnetConnectionRequiresLoginProperty'
@@ -87,9 +121,35 @@ GUI_CONFIG_SERIALPORT_WRITETIMEOUT = u'telnetDeviceWriteTimeout'
 GUI_CONFIG_SOCKET_CONNECTIONTIMEOUT = u'socketConnectionTimeout'
 
 GUI_CONFIG_TELNETDEV_EMPTYQUEUE_SPEEDUPCYCLES = u'emptyQueueReducedWaitCycles'
+GUI_CONFIG_TELNETDEV_IOENGINE = u'telnetConnectionIOEngine'
+GUI_CONFIG_TELNETDEV_PIPELINEDCOMMANDS = u'telnetConnectionPipelinedCommands'
+GUI_CONFIG_TELNETDEV_KEEPALIVEIDLE = u'telnetConnectionKeepAliveIdle'
+GUI_CONFIG_TELNETDEV_KEEPALIVEINTERVAL = u'telnetConnectionKeepAliveInterval'
+GUI_CONFIG_TELNETDEV_KEEPALIVECOUNT = u'telnetConnectionKeepAliveCount'
+GUI_CONFIG_TELNETDEV_LIVENESSTIMEOUT = u'telnetConnectionLivenessTimeout'
+GUI_CONFIG_TELNETDEV_LIVENESSIDLETIME = u'telnetConnectionLivenessIdleTime'
+GUI_CONFIG_TELNETDEV_LIVENESSCOMMAND = u'telnetConnectionLivenessCommand'
+
+TELNETDEV_IOENGINE_POLLING = u'polling'
+TELNETDEV_IOENGINE_SELECT = u'select'
+TELNETDEV_IOENGINE_REACTOR = u'reactor'
 
 CMD_WRITE_TO_DEVICE = u'writeToTelnetConn'
 
+# the keepalive socket options are only named by Python 2 on some platforms, so the OS X
+# values are supplied where they are missing; SO_NWRITE reports the bytes not yet
+# acknowledged by the peer on OS X as TIOCOUTQ (SIOCOUTQ) does on Linux
+if sys.platform == 'darwin':
+	TCPOPT_KEEPALIVEIDLE = getattr(socket, 'TCP_KEEPALIVE', 0x10)
+	TCPOPT_KEEPALIVEINTERVAL = getattr(socket, 'TCP_KEEPINTVL', 0x101)
+	TCPOPT_KEEPALIVECOUNT = getattr(socket, 'TCP_KEEPCNT', 0x102)
+	SOCKOPT_UNACKNOWLEDGEDBYTES = 0x1024
+else:
+	TCPOPT_KEEPALIVEIDLE = getattr(socket, 'TCP_KEEPIDLE', None)
+	TCPOPT_KEEPALIVEINTERVAL = getattr(socket, 'TCP_KEEPINTVL', None)
+	TCPOPT_KEEPALIVECOUNT = getattr(socket, 'TCP_KEEPCNT', None)
+	SOCKOPT_UNACKNOWLEDGEDBYTES = None
+
 
 #/////////////////////////////////////////////////////////////////////////////////////////
 #/////////////////////////////////////////////////////////////////////////////////////////
@@ -112,8 +172,67 @@ class RPFrameworkTelnetDevice(RPFrameworkDevice.RPFrameworkDevice):
 	def __init__(self, plugin, device, connectionType=CONNECTIONTYPE_TELNET):
 		super(RPFrameworkTelnetDevice, self).__init__(plugin, device)
 		self.connectionType = connectionType
+		self.wakeupPipe = None
+		
+		# the select engine and reactor wait on the connection itself and so require a
+		# selectable connection; serial ports always use the original polling loop
+		self.ioEngine = self.hostPlugin.getGUIConfigValue(device.deviceTypeId, GUI_CONFIG_TELNETDEV_IOENGINE, TELNETDEV_IOENGINE_POLLING)
+		if self.ioEngine != TELNETDEV_IOENGINE_POLLING and self.connectionType == CONNECTIONTYPE_SERIAL:
+			self.hostPlugin.logger.threaddebug(u'I/O engine "' + RPFrameworkUtils.to_unicode(self.ioEngine) + u'" not supported for serial connections; using polling')
+			self.ioEngine = TELNETDEV_IOENGINE_POLLING
 		
+		# the connection settings are (re)loaded from the GUI configuration each time a
+		# connection is established
+		self.isConnectedStateKey = u''
+		self.connectionStateKey = u''
+		self.lastReceivedStateKey = u''
+		self.lineFramer = None
 		
+		# the health of the connection is judged by when data was last received and whether
+		# the data written since has been acknowledged or answered
+		self.connectionLastReceived = 0.0
+		self.connectionLastWritten = 0.0
+		self.connectionUnconfirmedSince = None
+		self.livenessCheckSentTime = None
+		
+		# event set by the reactor once it has closed the connection following a stop request
+		self.reactorClosedEvent = None
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine asks for communications to stop without waiting; a reactor device asks
+	# the reactor to close its connection while a select engine thread is woken from its
+	# wait so that it sees the request immediately
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def requestCommunicationsStop(self):
+		if self.ioEngine == TELNETDEV_IOENGINE_REACTOR:
+			self.hostPlugin.logger.debug(u'Initiating shutdown of communications with ' + RPFrameworkUtils.to_unicode(self.indigoDevice.name))
+			self.reactorClosedEvent = self.hostPlugin.getTelnetReactor().requestUnregisterDevice(self)
+		else:
+			super(RPFrameworkTelnetDevice, self).requestCommunicationsStop()
+			if self.ioEngine == TELNETDEV_IOENGINE_SELECT:
+				self.signalCommandQueued()
+	
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine waits, up to the timeout, for communications to stop; the wake-up pipe
+	# used by the select engine is released once the processing thread has stopped
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def waitForCommunicationsStop(self, timeout=RPFrameworkDevice.DEVICE_TERMINATE_TIMEOUT):
+		threadStopped = True
+		if self.ioEngine == TELNETDEV_IOENGINE_REACTOR:
+			if self.reactorClosedEvent is not None and self.reactorClosedEvent.wait(max(0.0, timeout)) == False:
+				self.hostPlugin.logger.debug(u'Timed out waiting for reactor to close connection to device ' + RPFrameworkUtils.to_unicode(self.indigoDevice.id))
+			self.reactorClosedEvent = None
+			self.hostPlugin.logger.debug(u'Shutdown of communications with ' + RPFrameworkUtils.to_unicode(self.indigoDevice.name) + u' complete')
+		else:
+			processingThread = self.concurrentThread
+			super(RPFrameworkTelnetDevice, self).waitForCommunicationsStop(timeout)
+			threadStopped = processingThread is None or processingThread.isAlive() == False
+		if self.wakeupPipe is not None and threadStopped == True:
+			os.close(self.wakeupPipe[0])
+			os.close(self.wakeupPipe[1])
+			self.wakeupPipe = None
+			
+			
 	#/////////////////////////////////////////////////////////////////////////////////////
 	# Processing and command functions
 	#/////////////////////////////////////////////////////////////////////////////////////
@@ -122,43 +241,22 @@ class RPFrameworkTelnetDevice(RPFrameworkDevice.RPFrameworkDevice):
 	# the commands queue for work to do.
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	def concurrentCommandProcessingThread(self, commandQueue):
+		ipConnection = None
+		connectionClosed = False
 		try:
 			# retrieve the keys and settings that will be used during the command processing
 			# for this telnet device
-			isConnectedStateKey = self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_ISCONNECTEDSTATEKEY, u'')
-			connectionStateKey = self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_CONNECTIONSTATEKEY, u'')
-			self.hostPlugin.logger.threaddebug(u'Read device state config... isConnected: "' + RPFrameworkUtils.to_unicode(isConnectedStateKey) + u'"; connectionState: "' + RPFrameworkUtils.to_unicode(connectionStateKey) + u'"')
+			self.loadConnectionSettings()
 			telnetConnectionInfo = self.getDeviceAddressInfo()
 		
 			# establish the telenet connection to the telnet-based which handles the primary
 			# network remote operations
 			self.hostPlugin.logger.debug(u'Establishing connection to ' + RPFrameworkUtils.to_unicode(telnetConnectionInfo[0]))
 			ipConnection = self.establishDeviceConnection(telnetConnectionInfo)
-			self.failedConnectionAttempts = 0
-			self.hostPlugin.logger.debug(u'Connection established')
-			
-			# update the states on the server to show that we have established a connectionStateKey
-			self.indigoDevice.setErrorStateOnServer(None)
-			if isConnectedStateKey != u'':
-				self.indigoDevice.updateStateOnServer(key=isConnectedStateKey, value=u'true')
-			if connectionStateKey != u'':
-				self.indigoDevice.updateStateOnServer(key=connectionStateKey, value=u'Connected')
-				
-			# retrieve any configuration information that may have been setup in the
-			# plugin configuration and/or device configuration	
-			lineEndingToken = self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_EOL, u'\r')
-			lineEncoding = self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_SENDENCODING, u'ascii')
-			commandResponseTimeout = float(self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_COMMANDREADTIMEOUT, u'0.5'))
+			self.onConnectionEstablished()
 			
-			telnetConnectionRequiresLoginDP = self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_REQUIRES_LOGIN_DP, u'')
-			telnetConnectionRequiresLogin = (RPFrameworkUtils.to_unicode(self.indigoDevice.pluginProps.get(telnetConnectionRequiresLoginDP, u'False')).lower() == u'true')
-			
-			updateStatusPollerPropertyName = self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_STATUSPOLL_INTERVALPROPERTY, u'updateInterval')
-			updateStatusPollerInterval = int(self.indigoDevice.pluginProps.get(updateStatusPollerPropertyName, u'90'))
-			updateStatusPollerNextRun = None
-			updateStatusPollerActionId = self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_STATUSPOLL_ACTIONID, u'')
-			
-			emptyQueueReducedWaitCycles = int(self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_TELNETDEV_EMPTYQUEUE_SPEEDUPCYCLES, u'200'))
+			if self.ioEngine == TELNETDEV_IOENGINE_SELECT:
+				self.getWakeupPipe()
 			
 			# begin the infinite loop which will run as long as the queue contains commands
 			# and we have not received an explicit shutdown request
@@ -166,25 +264,16 @@ class RPFrameworkTelnetDevice(RPFrameworkDevice.RPFrameworkDevice):
 			lastQueuedCommandCompleted = 0
 			while continueProcessingCommands == True:
 				# process pending commands now...
-				while not commandQueue.empty():
+				while not commandQueue.empty() and self.isCommunicationsStopRequested() == False:
 					lenQueue = commandQueue.qsize()
 					self.hostPlugin.logger.threaddebug(u'Command queue has ' + RPFrameworkUtils.to_unicode(lenQueue) + u' command(s) waiting')
+					awaitResponse = True
 					
-					# the command name will identify what action should be taken... we will handle the known
-					# commands and dispatch out to the device implementation, if necessary, to handle unknown
-					# commands
+					# the command name will identify what action should be taken... the thread
+					# control commands are handled here while all others are shared with the
+					# telnet reactor
 					command = commandQueue.get()
-					if command.commandName == RPFrameworkCommand.CMD_INITIALIZE_CONNECTION:
-						# specialized command to instanciate the thread/telnet connection
-						# safely ignore this... just used to spin up the thread
-						self.hostPlugin.logger.threaddebug(u'Create connection command de-queued')
-						
-						# if the device supports polling for status, it may be initiated here now that
-						# the connection has been established; no additional command will come through
-						if telnetConnectionRequiresLogin == False:
-							commandQueue.put(RPFrameworkCommand.RPFrameworkCommand(RPFrameworkCommand.CMD_UPDATE_DEVICE_STATUS_FULL, parentAction=updateStatusPollerActionId))
-						
-					elif command.commandName == RPFrameworkCommand.CMD_TERMINATE_PROCESSING_THREAD:
+					if command.commandName == RPFrameworkCommand.CMD_TERMINATE_PROCESSING_THREAD:
 						# a specialized command designed to stop the processing thread indigo
 						# the event of a shutdown
 						continueProcessingCommands = False
@@ -195,85 +284,84 @@ class RPFrameworkTelnetDevice(RPFrameworkDevice.RPFrameworkDevice):
 						try:
 							pauseTime = float(command.commandPayload)
 							self.hostPlugin.logger.threaddebug(u'Initiating sleep of ' + RPFrameworkUtils.to_unicode(pauseTime) + u' seconds from command.')
-							time.sleep(pauseTime)
+							self.sleepUnlessStopRequested(pauseTime)
 						except:
 							self.hostPlugin.logger.error(u'Invalid pause time requested')
-							
-					elif command.commandName == RPFrameworkCommand.CMD_UPDATE_DEVICE_STATUS_FULL:
-						# this command instructs the plugin to update the full status of the device (all statuses
-						# that may be read from the device should be read)
-						if updateStatusPollerActionId != u'':
-							self.hostPlugin.logger.debug(u'Executing full status update request...')
-							self.hostPlugin.executeAction(None, indigoActionId=updateStatusPollerActionId, indigoDeviceId=self.indigoDevice.id, paramValues=None)
-							if updateStatusPollerInterval > 0:
-								updateStatusPollerNextRun = time.time() + updateStatusPollerInterval
-						else:
-							self.hostPlugin.logger.threaddebug(u'Ignoring status update request, no action specified to update device status')
-					
-					elif command.commandName == RPFrameworkCommand.CMD_UPDATE_DEVICE_STATE:
-						# this command is to update a device state with the payload (which may be an
-						# eval command)
-						newStateInfo = re.match('^\{ds\:([a-zA-Z\d]+)\}\{(.+)\}$', command.commandPayload, re.I)
-						if newStateInfo is None:
-							self.hostPlugin.logger.error(u'Invalid new device state specified')
-						else:
-							# the new device state may include an eval statement...
-							updateStateName = newStateInfo.group(1)
-							updateStateValue = newStateInfo.group(2)
-							if updateStateValue.startswith(u'eval'):
-								updateStateValue = eval(updateStateValue.replace(u'eval:', u''))
-							
-							self.hostPlugin.logger.debug(u'Updating state "' + RPFrameworkUtils.to_unicode(updateStateName) + u'" to: ' + RPFrameworkUtils.to_unicode(updateStateValue))
-							self.indigoDevice.updateStateOnServer(key=updateStateName, value=updateStateValue)
 					
-					elif command.commandName == CMD_WRITE_TO_DEVICE:
-						# this command initiates a write of data to the device
-						self.hostPlugin.logger.debug(u'Sending command: ' + command.commandPayload)
-						writeCommand = command.commandPayload + lineEndingToken
-						ipConnection.write(writeCommand.encode(lineEncoding))
-						self.hostPlugin.logger.threaddebug(u'Write command completed.')
+					elif self.isPipelinedCommand(command) == True:
+						# this command and those immediately following it in the queue which
+						# may also be pipelined are sent at once; any responses are handled
+						# as unsolicited data rather than being waited upon
+						pipelinedCommands = self.getPipelinedCommands(command)
+						self.writePipelinedCommands(ipConnection, pipelinedCommands)
+						for pipelinedCommand in pipelinedCommands[1:]:
+							commandQueue.task_done()
+						command = pipelinedCommands[-1]
+						awaitResponse = False
 					
 					else:
-						# this is an unknown command; dispatch it to another routine which is
-						# able to handle the commands (to be overridden for individual devices)
-						self.handleUnmanagedCommandInQueue(ipConnection, command)
+						self.processDeviceCommand(ipConnection, command)
 						
 					# determine if any response has been received from the telnet device...
-					responseText = RPFrameworkUtils.to_unicode(self.readLine(ipConnection, lineEndingToken, commandResponseTimeout))
-					if responseText != u'':
-						self.hostPlugin.logger.threaddebug("Received: " + responseText)
-						self.handleDeviceResponse(responseText.replace(lineEndingToken, u''), command)
+					if awaitResponse == True and self.commandAwaitsResponse(command) == True:
+						self.readCommandResponse(ipConnection, command)
+						self.flushStateUpdates(False)
 						
 					# if the command has a pause defined for after it is completed then we
 					# should execute that pause now
 					if command.postCommandPause > 0.0 and continueProcessingCommands == True:
 						self.hostPlugin.logger.threaddebug(u'Post Command Pause: ' + RPFrameworkUtils.to_unicode(command.postCommandPause))
-						time.sleep(command.postCommandPause)
+						self.sleepUnlessStopRequested(command.postCommandPause)
 					
 					# complete the dequeuing of the command, allowing the next
 					# command in queue to rise to the top
 					commandQueue.task_done()
-					lastQueuedCommandCompleted = emptyQueueReducedWaitCycles
+					lastQueuedCommandCompleted = self.emptyQueueReducedWaitCycles
+					
+				# a stop requested via requestCommunicationsStop ends processing once the
+				# command in progress has completed
+				if self.isCommunicationsStopRequested() == True:
+					continueProcessingCommands = False
 					
 				# continue with empty-queue processing unless the connection is shutting down...
-				if continueProcessingCommands == True:
+				if continueProcessingCommands == True and self.ioEngine == TELNETDEV_IOENGINE_SELECT:
+					# process anything already waiting on the connection and, if there is nothing to
+					# do, block until the device sends data, a command is queued or a poll is due
+					receivedData = self.readAvailable(ipConnection)
+					healthCheckTime = self.checkConnectionHealth(ipConnection)
+					if len(receivedData) == 0 and commandQueue.empty():
+						waitTimeout = None
+						nextWakeTime = self.updateStatusPollerNextRun
+						for wakeTime in (self.getStateUpdateFlushTime(), healthCheckTime):
+							if nextWakeTime is None or (wakeTime is not None and wakeTime < nextWakeTime):
+								nextWakeTime = wakeTime
+						if nextWakeTime is not None:
+							waitTimeout = max(0.0, nextWakeTime - time.time())
+						if self.waitForConnectionActivity(ipConnection, waitTimeout) == True:
+							receivedData = self.readAvailable(ipConnection)
+					self.handleReceivedText(receivedData, None)
+					self.flushStateUpdates(False)
+					
+					# check to see if we need to issue an update...
+					self.checkStatusPollerDue()
+						
+				elif continueProcessingCommands == True:
 					# check for any pending data coming IN from the telnet connection; note this is after the
-					# command queue has been emptied so it may be un-prompted incoming data
-					responseText = RPFrameworkUtils.to_unicode(self.readIfAvailable(ipConnection, lineEndingToken, commandResponseTimeout))
-					if responseText != u'':
-						self.hostPlugin.logger.threaddebug(u'Received w/o Command: ' + responseText)
-						self.handleDeviceResponse(responseText.replace(lineEndingToken, u''), None)
+					# command queue has been emptied so it may be un-prompted incoming data or the responses
+					# to pipelined commands (the data may hold several lines or end mid-line)
+					self.handleReceivedText(self.readAvailable(ipConnection), None)
+					self.flushStateUpdates(False)
 				
 					# when the queue is empty, pause a bit on each iteration
 					if lastQueuedCommandCompleted > 0:
-						time.sleep(self.emptyQueueProcessingThreadSleepTime/2)
+						self.sleepUnlessStopRequested(self.emptyQueueProcessingThreadSleepTime/2)
 						lastQueuedCommandCompleted = lastQueuedCommandCompleted - 1
 					else:
-						time.sleep(self.emptyQueueProcessingThreadSleepTime)
+						self.sleepUnlessStopRequested(self.emptyQueueProcessingThreadSleepTime)
 				
 					# check to see if we need to issue an update...
-					if updateStatusPollerNextRun is not None and time.time() > updateStatusPollerNextRun:
-						commandQueue.put(RPFrameworkCommand.RPFrameworkCommand(RPFrameworkCommand.CMD_UPDATE_DEVICE_STATUS_FULL, parentAction=updateStatusPollerActionId))
+					self.checkStatusPollerDue()
+					self.checkConnectionHealth(ipConnection)
 				
 		# handle any exceptions that are thrown during execution of the plugin... note that this
 		# should terminate the thread, but it may get spun back up again
@@ -282,50 +370,518 @@ class RPFrameworkTelnetDevice(RPFrameworkDevice.RPFrameworkDevice):
 			# the thread to expire
 			pass
 		except (socket.timeout, EOFError):
-			# this is a standard timeout/disconnect
-			if self.failedConnectionAttempts == 0 or self.hostPlugin.debug == True:
-				self.hostPlugin.logger.error(u'Connection timed out for device ' + RPFrameworkUtils.to_unicode(self.indigoDevice.id))
-				
-			if connectionStateKey != u'':
-				self.indigoDevice.updateStateOnServer(key=connectionStateKey, value=u'Unavailable')
-				connectionStateKey = u''  # prevents the finally from re-updating to disconnected
-				
-			# this really is an error from the user's perspective, so set that state now
-			self.indigoDevice.setErrorStateOnServer(u'Connection Error')
-				
-			# check to see if we should attempt a reconnect
-			self.scheduleReconnectionAttempt()
+			# this is a standard timeout/disconnect; as with the reactor, the connection is
+			# closed first and this thread flagged as stopping so that a reconnection falling
+			# due at once starts a new processing thread rather than queuing to this one
+			self.closeDeviceConnection(ipConnection, u'Unavailable')
+			ipConnection = None
+			connectionClosed = True
+			threading.currentThread().requestStop()
+			self.handleConnectionFailure(u'Connection timed out for device ' + RPFrameworkUtils.to_unicode(self.indigoDevice.id))
 		except socket.error, e:
 			# this is a standard socket error, such as a reset... we can attempt to recover from this with
 			# a scheduled reconnect
-			if self.failedConnectionAttempts == 0 or self.hostPlugin.debug == True:
-				self.hostPlugin.logg.error(u'Connection failed for device ' + RPFrameworkUtils.to_unicode(self.indigoDevice.id) + u': ' + RPFrameworkUtils.to_unicode(e))
-
-			if connectionStateKey != u'':
-				self.indigoDevice.updateStateOnServer(key=connectionStateKey, value=u'Unavailable')
-				connectionStateKey = u''  # prevents the finally from re-updating to disconnected
-				
-			# this really is an error from the user's perspective, so set that state now
-			self.indigoDevice.setErrorStateOnServer(u'Connection Error')
-				
-			# check to see if we should attempt a reconnect
-			self.scheduleReconnectionAttempt()
+			self.closeDeviceConnection(ipConnection, u'Unavailable')
+			ipConnection = None
+			connectionClosed = True
+			threading.currentThread().requestStop()
+			self.handleConnectionFailure(u'Connection failed for device ' + RPFrameworkUtils.to_unicode(self.indigoDevice.id) + u': ' + RPFrameworkUtils.to_unicode(e))
 		except:
 			self.indigoDevice.setErrorStateOnServer(u'Error')
 			self.hostPlugin.logger.exception(u'Error during background processing')
-		finally:			
-			# update the device's connection state to no longer connected...
-			self.hostPlugin.logger.debug(u'Closing connection to device')
-			if isConnectedStateKey != u'':
-				self.indigoDevice.updateStateOnServer(key=isConnectedStateKey, value=u'false', clearErrorState=False)
-			if connectionStateKey != u'':
-				self.indigoDevice.updateStateOnServer(key=connectionStateKey, value=u'Disconnected', clearErrorState=False)
+		finally:
+			# update the device's connection state to no longer connected and close it
+			if connectionClosed == False:
+				self.closeDeviceConnection(ipConnection, u'Disconnected')
+			ipConnection = None
+			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine reads the configuration used while processing commands for this device
+	# from the plugin's GUI configuration and the device's properties; called each time a
+	# connection is to be established
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def loadConnectionSettings(self):
+		self.isConnectedStateKey = self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_ISCONNECTEDSTATEKEY, u'')
+		self.connectionStateKey = self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_CONNECTIONSTATEKEY, u'')
+		self.lastReceivedStateKey = self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_LASTRECEIVEDSTATEKEY, u'')
+		self.hostPlugin.logger.threaddebug(u'Read device state config... isConnected: "' + RPFrameworkUtils.to_unicode(self.isConnectedStateKey) + u'"; connectionState: "' + RPFrameworkUtils.to_unicode(self.connectionStateKey) + u'"')
+		
+		self.lineEndingToken = self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_EOL, u'\r')
+		self.lineEncoding = self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_SENDENCODING, u'ascii')
+		self.commandResponseTimeout = float(self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_COMMANDREADTIMEOUT, u'0.5'))
+		
+		telnetConnectionRequiresLoginDP = self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_REQUIRES_LOGIN_DP, u'')
+		self.telnetConnectionRequiresLogin = (RPFrameworkUtils.to_unicode(self.indigoDevice.pluginProps.get(telnetConnectionRequiresLoginDP, u'False')).lower() == u'true')
+		
+		updateStatusPollerPropertyName = self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_STATUSPOLL_INTERVALPROPERTY, u'updateInterval')
+		self.updateStatusPollerInterval = int(self.indigoDevice.pluginProps.get(updateStatusPollerPropertyName, u'90'))
+		self.updateStatusPollerNextRun = None
+		self.updateStatusPollerActionId = self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_STATUSPOLL_ACTIONID, u'')
+		
+		self.emptyQueueReducedWaitCycles = int(self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_TELNETDEV_EMPTYQUEUE_SPEEDUPCYCLES, u'200'))
+		
+		# TCP keepalive detects a device which has silently gone away while the connection is
+		# idle; the liveness check detects one which stops acknowledging the data written to
+		# it or, if a liveness command is given, stops answering it. Zero disables each
+		self.keepAliveIdle = int(self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_TELNETDEV_KEEPALIVEIDLE, u'0'))
+		self.keepAliveInterval = int(self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_TELNETDEV_KEEPALIVEINTERVAL, u'0'))
+		self.keepAliveCount = int(self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_TELNETDEV_KEEPALIVECOUNT, u'0'))
+		self.livenessTimeout = float(self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_TELNETDEV_LIVENESSTIMEOUT, u'0'))
+		self.livenessIdleTime = float(self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_TELNETDEV_LIVENESSIDLETIME, u'0'))
+		self.livenessCommand = self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_TELNETDEV_LIVENESSCOMMAND, u'')
+		
+		self.lineFramer = RPFrameworkLineFramer.RPFrameworkLineFramer(self.lineEndingToken)
+		
+		# write commands whose payload matches this expression may be pipelined; by default
+		# every command waits on its response before the next is sent
+		pipelinedCommandsExpression = self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_TELNETDEV_PIPELINEDCOMMANDS, u'')
+		if pipelinedCommandsExpression == u'':
+			self.pipelinedCommandsRegex = None
+		else:
+			self.pipelinedCommandsRegex = re.compile(pipelinedCommandsExpression, re.I)
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine is called once the connection to the device has been established in
+	# order to reset the reconnection count and update the connection states
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def onConnectionEstablished(self):
+		self.failedConnectionAttempts = 0
+		self.hostPlugin.logger.debug(u'Connection established')
+		
+		self.connectionLastReceived = time.time()
+		self.connectionLastWritten = 0.0
+		self.connectionUnconfirmedSince = None
+		self.livenessCheckSentTime = None
+		
+		# update the states on the server to show that we have established a connectionStateKey
+		self.indigoDevice.setErrorStateOnServer(None)
+		if self.isConnectedStateKey != u'':
+			self.queueStateUpdate(self.isConnectedStateKey, u'true')
+		if self.connectionStateKey != u'':
+			self.queueStateUpdate(self.connectionStateKey, u'Connected')
+		self.flushStateUpdates()
 			
-			# execute the close of the connection now
-			if not ipConnection is None:
-				ipConnection.close()
-				ipConnection = None
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine is called when the connection times out or fails; it flags the error
+	# on the device and schedules a reconnection attempt (if so configured)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def handleConnectionFailure(self, failureMessage):
+		if self.failedConnectionAttempts == 0 or self.hostPlugin.debug == True:
+			self.hostPlugin.logger.error(failureMessage)
+			
+		# this really is an error from the user's perspective, so set that state now
+		self.indigoDevice.setErrorStateOnServer(u'Connection Error')
+			
+		# check to see if we should attempt a reconnect
+		self.scheduleReconnectionAttempt()
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine will close the connection (if open) and update the device's connection
+	# states to show that it is no longer connected; any state updates still queued are
+	# sent along with them without clearing an error state set by the failure
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def closeDeviceConnection(self, ipConnection, connectionState=u'Disconnected'):
+		self.hostPlugin.logger.debug(u'Closing connection to device')
+		if self.isConnectedStateKey != u'':
+			self.queueStateUpdate(self.isConnectedStateKey, u'false')
+		if self.connectionStateKey != u'':
+			self.queueStateUpdate(self.connectionStateKey, connectionState)
+		self.flushStateUpdates(clearErrorState=False)
+		
+		# execute the close of the connection now
+		if not ipConnection is None:
+			ipConnection.close()
+			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine processes a single command de-queued from the device's command queue;
+	# commands which control the processing loop itself (terminate and pause) are handled
+	# by the processing thread or telnet reactor
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def processDeviceCommand(self, ipConnection, command):
+		# the command name will identify what action should be taken... we will handle the known
+		# commands and dispatch out to the device implementation, if necessary, to handle unknown
+		# commands
+		if command.commandName == RPFrameworkCommand.CMD_INITIALIZE_CONNECTION:
+			# specialized command to instanciate the thread/telnet connection
+			# safely ignore this... just used to spin up the thread
+			self.hostPlugin.logger.threaddebug(u'Create connection command de-queued')
+			
+			# if the device supports polling for status, it may be initiated here now that
+			# the connection has been established; no additional command will come through
+			if self.telnetConnectionRequiresLogin == False:
+				self.commandQueue.put(RPFrameworkCommand.RPFrameworkCommand(RPFrameworkCommand.CMD_UPDATE_DEVICE_STATUS_FULL, parentAction=self.updateStatusPollerActionId))
+			
+		elif command.commandName == RPFrameworkCommand.CMD_UPDATE_DEVICE_STATUS_FULL:
+			# this command instructs the plugin to update the full status of the device (all statuses
+			# that may be read from the device should be read)
+			if self.updateStatusPollerActionId != u'':
+				self.hostPlugin.logger.debug(u'Executing full status update request...')
+				self.hostPlugin.executeAction(None, indigoActionId=self.updateStatusPollerActionId, indigoDeviceId=self.indigoDevice.id, paramValues=None)
+				if self.updateStatusPollerInterval > 0:
+					self.updateStatusPollerNextRun = time.time() + self.updateStatusPollerInterval
+			else:
+				self.hostPlugin.logger.threaddebug(u'Ignoring status update request, no action specified to update device status')
+		
+		elif command.commandName == RPFrameworkCommand.CMD_UPDATE_DEVICE_STATE:
+			# this command is to update a device state with the payload (which may be an
+			# eval command)
+			newStateInfo = re.match('^\{ds\:([a-zA-Z\d]+)\}\{(.+)\}$', command.commandPayload, re.I)
+			if newStateInfo is None:
+				self.hostPlugin.logger.error(u'Invalid new device state specified')
+			else:
+				# the new device state may include an eval statement...
+				updateStateName = newStateInfo.group(1)
+				updateStateValue = newStateInfo.group(2)
+				if updateStateValue.startswith(RPFrameworkExpression.EXPRESSION_PREFIX):
+					updateStateValue = self.hostPlugin.evaluateExpression(updateStateValue[len(RPFrameworkExpression.EXPRESSION_PREFIX):])
+				
+				self.hostPlugin.logger.debug(u'Updating state "' + RPFrameworkUtils.to_unicode(updateStateName) + u'" to: ' + RPFrameworkUtils.to_unicode(updateStateValue))
+				self.queueStateUpdate(updateStateName, updateStateValue)
+				self.flushStateUpdates(False)
+		
+		elif command.commandName == CMD_WRITE_TO_DEVICE:
+			# this command initiates a write of data to the device
+			self.hostPlugin.logger.debug(u'Sending command: ' + command.commandPayload)
+			writeCommand = command.commandPayload + self.lineEndingToken
+			ipConnection.write(writeCommand.encode(self.lineEncoding))
+			self.onConnectionDataWritten()
+			self.hostPlugin.logger.threaddebug(u'Write command completed.')
+		
+		else:
+			# this is an unknown command; dispatch it to another routine which is
+			# able to handle the commands (to be overridden for individual devices)
+			self.handleUnmanagedCommandInQueue(ipConnection, command)
+			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine returns True if a response to the command should be awaited (up to the
+	# command read timeout) before the next command is processed; commands which declare
+	# that no response is expected continue immediately
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def commandAwaitsResponse(self, command):
+		if command.commandName in (RPFrameworkCommand.CMD_INITIALIZE_CONNECTION, RPFrameworkCommand.CMD_UPDATE_DEVICE_STATUS_FULL, RPFrameworkCommand.CMD_UPDATE_DEVICE_STATE):
+			return False
+		return command.expectedResponses is None or len(command.expectedResponses) > 0
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine returns True if the responses matched by a line of text answer the
+	# command; a command without expected responses is answered by any line
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def isCommandResponse(self, command, matchedResponseIds):
+		if command.expectedResponses is None:
+			return True
+		for responseId in matchedResponseIds:
+			if responseId in command.expectedResponses:
+				return True
+		return False
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine reads and processes the lines received after a command until the
+	# command has been answered or the command read timeout has elapsed; any lines read
+	# along with the response are then processed as un-prompted data
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def readCommandResponse(self, ipConnection, command):
+		responseDeadline = time.time() + self.commandResponseTimeout
+		while True:
+			responseText = self.lineFramer.getLine()
+			if responseText is None:
+				remainingTime = responseDeadline - time.time()
+				if remainingTime <= 0.0:
+					return
+				self.lineFramer.addData(self.readReceivedData(ipConnection, remainingTime))
+			elif responseText != u'':
+				self.hostPlugin.logger.threaddebug(u'Received: ' + responseText)
+				if self.isCommandResponse(command, self.handleDeviceResponse(responseText, command)) == True:
+					break
+		self.handleReceivedText('', None)
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine returns True if the command may be sent without waiting on a response:
+	# a write whose payload matches the pipelined commands expression, which expects no
+	# specific response and for whose action no specific response has been defined
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def isPipelinedCommand(self, command):
+		if self.pipelinedCommandsRegex is None or command.commandName != CMD_WRITE_TO_DEVICE or not isinstance(command.commandPayload, basestring):
+			return False
+		if command.expectedResponses is not None and len(command.expectedResponses) > 0:
+			return False
+		if self.pipelinedCommandsRegex.match(command.commandPayload) is None:
+			return False
+		return not self.hostPlugin.getDeviceResponseDispatcher(self.indigoDevice.deviceTypeId).hasActionResponses(command)
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine returns the list of commands to be sent along with the (pipelined)
+	# command given, removing them from the command queue. The commands are taken from the
+	# front of the queue while they may also be pipelined; a command with a post command
+	# pause ends the list so that its pause is honoured. The caller must call task_done
+	# on the queue for each command after the first
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getPipelinedCommands(self, command):
+		pipelinedCommands = [command]
+		with self.commandQueue.mutex:
+			while command.postCommandPause <= 0.0 and len(self.commandQueue.queue) > 0 and self.isPipelinedCommand(self.commandQueue.queue[0]) == True:
+				command = self.commandQueue.queue.popleft()
+				pipelinedCommands.append(command)
+		return pipelinedCommands
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine writes the payloads of the pipelined commands to the device as a
+	# single write
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def writePipelinedCommands(self, ipConnection, pipelinedCommands):
+		self.hostPlugin.logger.debug(u'Sending ' + RPFrameworkUtils.to_unicode(len(pipelinedCommands)) + u' pipelined command(s): ' + u', '.join([pipelinedCommand.commandPayload for pipelinedCommand in pipelinedCommands]))
+		writeCommands = u''.join([pipelinedCommand.commandPayload + self.lineEndingToken for pipelinedCommand in pipelinedCommands])
+		ipConnection.write(writeCommands.encode(self.lineEncoding))
+		self.onConnectionDataWritten()
+		self.hostPlugin.logger.threaddebug(u'Write command completed.')
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine passes data read from the connection through the line framer and
+	# processes each line completed as a device response; a trailing partial line is held
+	# by the framer until the remainder arrives. The command (if any) is passed with each
+	# line until it has been answered. Returns True if the command was answered
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def handleReceivedText(self, receivedData, rpCommand):
+		self.lineFramer.addData(receivedData)
+		
+		commandAnswered = False
+		for responseText in self.lineFramer.getLines():
+			if responseText != u'':
+				if rpCommand is None:
+					self.hostPlugin.logger.threaddebug(u'Received w/o Command: ' + responseText)
+				else:
+					self.hostPlugin.logger.threaddebug(u'Received: ' + responseText)
+				matchedResponseIds = self.handleDeviceResponse(responseText, rpCommand)
+				if not (rpCommand is None) and self.isCommandResponse(rpCommand, matchedResponseIds) == True:
+					rpCommand = None
+					commandAnswered = True
+		return commandAnswered
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine queues a full status update if the status poller is due to run
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def checkStatusPollerDue(self):
+		if self.updateStatusPollerNextRun is not None and time.time() > self.updateStatusPollerNextRun:
+			# the next run is re-scheduled once the update executes
+			self.updateStatusPollerNextRun = None
+			self.commandQueue.put(RPFrameworkCommand.RPFrameworkCommand(RPFrameworkCommand.CMD_UPDATE_DEVICE_STATUS_FULL, parentAction=self.updateStatusPollerActionId))
 
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Add new command to queue; in addition to the base class processing this will wake
+	# the processing thread should it be blocked waiting on the connection. Devices using
+	# the reactor engine are handed to the plugin's telnet reactor instead of a thread
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def queueDeviceCommand(self, command):
+		if self.ioEngine == TELNETDEV_IOENGINE_REACTOR:
+			self.commandQueue.put(command)
+			self.hostPlugin.getTelnetReactor().registerDevice(self)
+		else:
+			super(RPFrameworkTelnetDevice, self).queueDeviceCommand(command)
+			self.signalCommandQueued()
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine returns the (read, write) file descriptors of the pipe used to wake the
+	# select engine when a command is queued, creating it on first use
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getWakeupPipe(self):
+		if self.wakeupPipe is None:
+			wakeupPipe = os.pipe()
+			for pipeDescriptor in wakeupPipe:
+				fcntl.fcntl(pipeDescriptor, fcntl.F_SETFL, fcntl.fcntl(pipeDescriptor, fcntl.F_GETFL) | os.O_NONBLOCK)
+			self.wakeupPipe = wakeupPipe
+		return self.wakeupPipe
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine will wake a processing thread blocked in waitForConnectionActivity; it
+	# does nothing when the select engine is not in use
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def signalCommandQueued(self):
+		wakeupPipe = self.wakeupPipe
+		if wakeupPipe is not None:
+			try:
+				os.write(wakeupPipe[1], b'!')
+			except OSError:
+				# the pipe is full (or closed) -- either way the thread has a wake-up pending
+				pass
+				
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine blocks until the connection has data waiting, a command has been queued
+	# or the timeout (in seconds; None to wait indefinitely) elapses. Returns True when the
+	# connection is readable
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def waitForConnectionActivity(self, connection, timeout):
+		wakeupPipe = self.getWakeupPipe()
+		try:
+			readyList = select.select([connection, wakeupPipe[0]], [], [], timeout)[0]
+		except select.error, e:
+			if e.args[0] == errno.EINTR:
+				return False
+			raise
+		
+		if wakeupPipe[0] in readyList:
+			try:
+				while os.read(wakeupPipe[0], 512):
+					pass
+			except OSError:
+				pass
+		return connection in readyList
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine reads all data currently available on the connection without blocking;
+	# an empty string is returned if nothing is waiting
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def readAvailable(self, connection):
+		if self.connectionType == CONNECTIONTYPE_TELNET:
+			receivedData = connection.read_very_eager()
+		elif self.connectionType == CONNECTIONTYPE_SOCKET:
+			try:
+				receivedData = connection.recv(4096)
+			except socket.error, e:
+				if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+					return ''
+				raise
+			if receivedData == '':
+				raise EOFError(u'Connection closed by device')
+		else:
+			receivedData = ''
+			waitingBytes = connection.inWaiting()
+			if waitingBytes > 0:
+				receivedData = connection.read(waitingBytes)
+				
+		if len(receivedData) > 0:
+			self.connectionLastReceived = time.time()
+			
+			# the state is kept to the second so that it is sent (along with the other state
+			# updates) at most once a second however often the device sends data
+			if self.lastReceivedStateKey != u'':
+				self.queueStateUpdate(self.lastReceivedStateKey, time.strftime(u'%Y-%m-%d %H:%M:%S', time.localtime(self.connectionLastReceived)))
+		return receivedData
+			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine reads all data available on the connection, waiting up to the timeout
+	# for data to arrive should nothing be waiting; an empty string is returned if the
+	# timeout elapses. Serial ports wait according to their configured read timeout
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def readReceivedData(self, connection, timeout):
+		receivedData = self.readAvailable(connection)
+		if len(receivedData) > 0 or timeout <= 0.0:
+			return receivedData
+			
+		if self.connectionType == CONNECTIONTYPE_SERIAL:
+			receivedData = connection.read(1)
+			if len(receivedData) > 0:
+				receivedData += self.readAvailable(connection)
+			return receivedData
+		else:
+			try:
+				readyConnections = select.select([connection], [], [], timeout)[0]
+			except select.error, e:
+				if e.args[0] == errno.EINTR:
+					return ''
+				raise
+			if len(readyConnections) == 0:
+				return ''
+			return self.readAvailable(connection)
+			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine enables TCP keepalive on the connection's socket using the configured
+	# idle time, probe interval and probe count; options not supported by the platform are
+	# skipped, leaving the system defaults in place
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def configureConnectionHealth(self, connectionSocket):
+		if self.keepAliveIdle <= 0:
+			return
+		connectionSocket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+		for (socketOption, optionValue) in ((TCPOPT_KEEPALIVEIDLE, self.keepAliveIdle), (TCPOPT_KEEPALIVEINTERVAL, self.keepAliveInterval), (TCPOPT_KEEPALIVECOUNT, self.keepAliveCount)):
+			if socketOption is None or optionValue <= 0:
+				continue
+			try:
+				connectionSocket.setsockopt(socket.IPPROTO_TCP, socketOption, optionValue)
+			except socket.error, e:
+				self.hostPlugin.logger.threaddebug(u'Unable to set keepalive option ' + RPFrameworkUtils.to_unicode(socketOption) + u': ' + RPFrameworkUtils.to_unicode(e))
+				
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine records that data has been written to the connection; it must then be
+	# confirmed by the device (see checkConnectionHealth)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def onConnectionDataWritten(self):
+		self.connectionLastWritten = time.time()
+		if self.connectionUnconfirmedSince is None:
+			self.connectionUnconfirmedSince = self.connectionLastWritten
+			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine returns the number of seconds since data was last received from the
+	# device (or the connection was established)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getSecondsSinceLastReceived(self):
+		return time.time() - self.connectionLastReceived
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine returns the number of bytes written to the connection which the device
+	# has not yet acknowledged, or None if this cannot be determined on the platform
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getUnacknowledgedByteCount(self, connection):
+		if self.connectionType == CONNECTIONTYPE_TELNET:
+			connectionSocket = connection.sock
+		else:
+			connectionSocket = connection
+		try:
+			if SOCKOPT_UNACKNOWLEDGEDBYTES is not None:
+				return connectionSocket.getsockopt(socket.SOL_SOCKET, SOCKOPT_UNACKNOWLEDGEDBYTES)
+			elif sys.platform.startswith('linux'):
+				return struct.unpack('i', fcntl.ioctl(connectionSocket.fileno(), termios.TIOCOUTQ, '\0' * 4))[0]
+		except (IOError, socket.error):
+			pass
+		return None
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine checks that the device is still alive once the liveness timeout has
+	# elapsed since data was written to it: the data must have been answered or (where it
+	# can be measured) acknowledged. A liveness command, if configured, is written after
+	# the liveness idle time without receiving data and must be answered. A socket error
+	# is raised for a dead connection so that it is closed and a reconnection scheduled;
+	# returns the time at which the connection should next be checked, if any
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def checkConnectionHealth(self, connection):
+		if self.livenessTimeout <= 0.0 or self.connectionType == CONNECTIONTYPE_SERIAL:
+			return None
+			
+		timeNow = time.time()
+		nextCheckTime = None
+		if self.livenessCheckSentTime is not None:
+			if self.connectionLastReceived >= self.livenessCheckSentTime:
+				self.livenessCheckSentTime = None
+			elif timeNow >= self.livenessCheckSentTime + self.livenessTimeout:
+				raise socket.error(errno.ETIMEDOUT, u'No answer to liveness check; last data received ' + RPFrameworkUtils.to_unicode(int(self.getSecondsSinceLastReceived())) + u' seconds ago')
+			else:
+				nextCheckTime = self.livenessCheckSentTime + self.livenessTimeout
+				
+		if self.connectionUnconfirmedSince is not None:
+			if self.connectionLastReceived >= self.connectionUnconfirmedSince:
+				self.connectionUnconfirmedSince = None
+			elif timeNow >= self.connectionUnconfirmedSince + self.livenessTimeout:
+				unacknowledgedBytes = self.getUnacknowledgedByteCount(connection)
+				if unacknowledgedBytes is None or unacknowledgedBytes == 0:
+					self.connectionUnconfirmedSince = None
+				elif timeNow >= self.connectionLastWritten + self.livenessTimeout:
+					raise socket.error(errno.ETIMEDOUT, RPFrameworkUtils.to_unicode(unacknowledgedBytes) + u' byte(s) written not acknowledged; last data received ' + RPFrameworkUtils.to_unicode(int(self.getSecondsSinceLastReceived())) + u' seconds ago')
+				else:
+					# the bytes outstanding may be those of a write made since; allow the
+					# device the full timeout to acknowledge that write
+					self.connectionUnconfirmedSince = self.connectionLastWritten
+			if self.connectionUnconfirmedSince is not None and (nextCheckTime is None or self.connectionUnconfirmedSince + self.livenessTimeout < nextCheckTime):
+				nextCheckTime = self.connectionUnconfirmedSince + self.livenessTimeout
+				
+		if self.livenessCommand != u'' and self.livenessIdleTime > 0.0 and self.livenessCheckSentTime is None:
+			livenessCheckTime = self.connectionLastReceived + self.livenessIdleTime
+			if timeNow >= livenessCheckTime:
+				self.hostPlugin.logger.threaddebug(u'Sending liveness check; last data received ' + RPFrameworkUtils.to_unicode(int(self.getSecondsSinceLastReceived())) + u' seconds ago')
+				connection.write((self.livenessCommand + self.lineEndingToken).encode(self.lineEncoding))
+				self.livenessCheckSentTime = timeNow
+				livenessCheckTime = timeNow + self.livenessTimeout
+			if nextCheckTime is None or livenessCheckTime < nextCheckTime:
+				nextCheckTime = livenessCheckTime
+		return nextCheckTime
+		
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	# This routine should return a touple of information about the connection - in the
 	# format of (ipAddress/HostName, portNumber)
@@ -349,7 +905,11 @@ class RPFrameworkTelnetDevice(RPFrameworkDevice.RPFrameworkDevice):
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	def establishDeviceConnection(self, connectionInfo):
 		if self.connectionType == CONNECTIONTYPE_TELNET:
-			return telnetlib.Telnet(connectionInfo[0], connectionInfo[1])
+			# the connection timeout bounds the connect (and later writes) so that an address
+			# which does not answer cannot block the thread for the system's connect timeout
+			telnetConnection = telnetlib.Telnet(connectionInfo[0], connectionInfo[1], float(self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_SOCKET_CONNECTIONTIMEOUT, u'5')))
+			self.configureConnectionHealth(telnetConnection.sock)
+			return telnetConnection
 		elif self.connectionType == CONNECTIONTYPE_SERIAL:
 			return self.hostPlugin.openSerial(self.indigoDevice.name, connectionInfo[0], baudrate=connectionInfo[1][0], parity=connectionInfo[1][1], bytesize=connectionInfo[1][2], stopbits=connectionInfo[1][3], timeout=connectionInfo[1][4], writeTimeout=connectionInfo[1][5])
 		elif self.connectionType == CONNECTIONTYPE_SOCKET:
@@ -357,63 +917,71 @@ class RPFrameworkTelnetDevice(RPFrameworkDevice.RPFrameworkDevice):
 			commandSocket.settimeout(int(self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_SOCKET_CONNECTIONTIMEOUT, "5")))
 			commandSocket.connect((connectionInfo[0], connectionInfo[1]))
 			commandSocket.setblocking(0)
+			self.configureConnectionHealth(commandSocket)
 			return commandSocket
 		else:
 			raise u'Invalid connection type specified'
-		
+			
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
-	# This routine should be overridden in individual device classes whenever they must
-	# handle custom commands that are not already defined
+	# This routine begins a non-blocking connection to the device for the telnet reactor;
+	# returns a tuple of (socket, connectionTimeout)
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
-	def handleUnmanagedCommandInQueue(self, ipConnection, rpCommand):
-		pass
+	def openReactorSocket(self):
+		connectionInfo = self.getDeviceAddressInfo()
+		connectionTimeout = float(self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, GUI_CONFIG_SOCKET_CONNECTIONTIMEOUT, u'5'))
+		self.hostPlugin.logger.debug(u'Establishing connection to ' + RPFrameworkUtils.to_unicode(connectionInfo[0]))
+		
+		commandSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		commandSocket.setblocking(0)
+		connectResult = commandSocket.connect_ex((connectionInfo[0], connectionInfo[1]))
+		if not connectResult in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+			commandSocket.close()
+			raise socket.error(connectResult, os.strerror(connectResult))
+		return (commandSocket, connectionTimeout)
 		
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
-	# This routine should attempt to read a line of text from the connection, using the
-	# provided timeout as the upper-limit to wait
+	# This routine is called by the telnet reactor once the socket opened by
+	# openReactorSocket becomes writable; it returns the connection object which will be
+	# used for all reads and writes
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
-	def readLine(self, connection, lineEndingToken, commandResponseTimeout):
-		if self.connectionType == CONNECTIONTYPE_TELNET:
-			return RPFrameworkUtils.to_unicode(connection.read_until(lineEndingToken, commandResponseTimeout))
-		elif self.connectionType == CONNECTIONTYPE_SERIAL:
-			# Python 2.6 changed the readline signature to not include a line-ending token,
-			# so we have to "manually" re-create that here
-			#return connection.readline(None)
-			lineRead = u''
-			lineEndingTokenLen = len(lineEndingToken)
-			while True:
-				c = connection.read(1)
-				if c:
-					lineRead += c
-					if lineRead[-lineEndingTokenLen:] == lineEndingToken:
-						break
-				else:
-					break
-			return RPFrameworkUtils.to_unicode(lineRead)
+	def completeReactorConnection(self, commandSocket, connectionTimeout):
+		connectError = commandSocket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+		if connectError != 0:
+			raise socket.error(connectError, os.strerror(connectError))
+		self.configureConnectionHealth(commandSocket)
 			
-	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
-	# This routine should attempt to read a line of text from the connection only if there
-	# is an indication of waiting data (there is no waiting until a specified timeout)
-	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
-	def readIfAvailable(self, connection, lineEndingToken, commandResponseTimeout):
 		if self.connectionType == CONNECTIONTYPE_TELNET:
-			return RPFrameworkUtils.to_unicode(connection.read_eager())
-		elif connection.inWaiting() > 0:
-			return RPFrameworkUtils.to_unicode(self.readLine(connection, lineEndingToken, commandResponseTimeout))
+			# the socket is left non-blocking; reads are only made once select reports data
+			# waiting and the reactor buffers whatever a write cannot send at once
+			telnetConnection = telnetlib.Telnet()
+			telnetConnection.host = commandSocket.getpeername()[0]
+			telnetConnection.port = commandSocket.getpeername()[1]
+			telnetConnection.sock = commandSocket
+			return telnetConnection
 		else:
-			return u''
+			return commandSocket
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine should be overridden in individual device classes whenever they must
+	# handle custom commands that are not already defined
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def handleUnmanagedCommandInQueue(self, ipConnection, rpCommand):
+		pass
 		
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	# This routine will process any response from the device following the list of
 	# response objects defined for this device type. For telnet this will always be
-	# a text string
+	# a text string. Returns the IDs of the responses which matched
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	def handleDeviceResponse(self, responseText, rpCommand):
 		# loop through the list of response definitions defined in the (base) class
 		# and determine if any match
-		for rpResponse in self.hostPlugin.getDeviceResponseDefinitions(self.indigoDevice.deviceTypeId):
-			if rpResponse.isResponseMatch(responseText, rpCommand, self, self.hostPlugin):
-				self.hostPlugin.logger.threaddebug(u'Found response match: ' + rpResponse.responseId)
-				rpResponse.executeEffects(responseText, rpCommand, self, self.hostPlugin)
+		matchedResponseIds = []
+		responseDispatcher = self.hostPlugin.getDeviceResponseDispatcher(self.indigoDevice.deviceTypeId)
+		for (rpResponse, matchObj) in responseDispatcher.findMatches(responseText, rpCommand, self, self.hostPlugin):
+			self.hostPlugin.logger.threaddebug(u'Found response match: ' + rpResponse.responseId)
+			rpResponse.executeEffects(responseText, rpCommand, self, self.hostPlugin, matchObj)
+			matchedResponseIds.append(rpResponse.responseId)
+		return matchedResponseIds
 				
 		
\ No newline at end of file
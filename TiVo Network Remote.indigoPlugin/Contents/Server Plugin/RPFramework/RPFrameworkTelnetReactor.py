@@ -0,0 +1,528 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# RPFrameworkTelnetReactor by RogueProeliator <adam.d.ashe@gmail.com>
+# 	This class multiplexes the connections of all RPFrameworkTelnetDevice instances using
+#	the reactor I/O engine onto a single select-based thread owned by the plugin
+#
+#	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# 	SOFTWARE.
+#
+#	Version 25:
+#		Initial release of the shared telnet reactor
+#		State updates queued while reading a connection are sent once per reactor pass
+#		Pipelined commands are written together and complete without awaiting a response
+#		A command completes once a response it expects is read rather than any response
+#		Received data is passed undecoded to the device's buffered line framer
+#		A failed connection is closed before the failure is handled so its reconnection finds it gone
+#		Checks the health of each connection (see RPFrameworkTelnetDevice.checkConnectionHealth)
+#		Devices are unregistered by requestUnregisterDevice, which does not wait on the
+#			connection to close, so that several devices may be unregistered at once
+#		Writes no longer block the reactor thread: data the socket cannot take at once is
+#			buffered per connection and sent as the socket becomes writable
+#
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Python imports
+#/////////////////////////////////////////////////////////////////////////////////////////
+import errno
+import fcntl
+import os
+import select
+import socket
+import telnetlib
+import threading
+import time
+
+import RPFrameworkCommand
+import RPFrameworkUtils
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Constants and configuration variables
+#/////////////////////////////////////////////////////////////////////////////////////////
+REACTORCONN_STATE_IDLE = 0
+REACTORCONN_STATE_CONNECTING = 1
+REACTORCONN_STATE_CONNECTED = 2
+REACTORCONN_STATE_CLOSED = 3
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# RPFrameworkReactorConnection
+#	Tracks the connection and command processing state of a single device serviced by
+#	the telnet reactor
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class RPFrameworkReactorConnection(object):
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor allows passing in the device that this connection services
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self, rpDevice):
+		self.rpDevice = rpDevice
+		self.connectionState = REACTORCONN_STATE_IDLE
+		self.connection = None
+		self.connectSocket = None
+		self.connectTimeout = 0.0
+		self.connectDeadline = 0.0
+
+		self.pendingCommand = None
+		self.responseDeadline = 0.0
+		self.pausedUntil = 0.0
+
+		self.closeRequested = False
+		self.closedEvent = threading.Event()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns True if the connection has buffered data waiting to be written
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def hasPendingWrites(self):
+		return self.connectionState == REACTORCONN_STATE_CONNECTED and self.connection.hasPendingWrites() == True
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the object which should be passed to select for this connection
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getSelectable(self):
+		if self.connectionState == REACTORCONN_STATE_CONNECTING:
+			return self.connectSocket
+		else:
+			return self.connection
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# RPFrameworkReactorWriteBuffer
+#	Wraps the telnet or socket connection handed to a device by the reactor so that its
+#	writes never block: whatever the (non-blocking) socket will not take at once is kept
+#	and sent by the reactor as the socket becomes writable. All other attributes are
+#	those of the connection itself
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class RPFrameworkReactorWriteBuffer(object):
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor allows passing in the connection, its socket and the time allowed for
+	# buffered data to be taken by the socket
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self, connection, connectionSocket, writeTimeout):
+		self.connection = connection
+		self.connectionSocket = connectionSocket
+		self.isTelnetConnection = isinstance(connection, telnetlib.Telnet)
+		self.writeTimeout = writeTimeout
+		self.pendingData = []
+		self.pendingSince = None
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Passes any other attribute through to the connection
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __getattr__(self, attributeName):
+		return getattr(self.connection, attributeName)
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Queues the data to be written (doubling IAC as telnetlib's write does for a telnet
+	# connection) and sends as much of it as the socket will take now; if data is already
+	# waiting then the socket is full and the reactor sends it all once writable
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def write(self, writeData):
+		if self.isTelnetConnection == True:
+			writeData = writeData.replace(telnetlib.IAC, telnetlib.IAC + telnetlib.IAC)
+		self.pendingData.append(writeData)
+		if self.pendingSince is None:
+			self.pendingSince = time.time()
+			self.flushWrites()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Sends buffered data until the socket would block or the buffer is empty
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def flushWrites(self):
+		writeData = b''.join(self.pendingData)
+		while len(writeData) > 0:
+			try:
+				bytesSent = self.connectionSocket.send(writeData)
+			except socket.error, e:
+				if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+					self.pendingData = [writeData]
+					return
+				raise
+			writeData = writeData[bytesSent:]
+		self.pendingData = []
+		self.pendingSince = None
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns True if data remains to be sent
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def hasPendingWrites(self):
+		return len(self.pendingData) > 0
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the time by which the buffered data must have been sent, or None if there
+	# is none waiting
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getWriteDeadline(self):
+		if self.pendingSince is None:
+			return None
+		return self.pendingSince + self.writeTimeout
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# RPFrameworkTelnetReactor
+#	Runs a single thread which connects to, writes to and reads from every registered
+#	telnet/socket device; each device keeps its own command queue which the reactor
+#	drains, so the thread count does not grow with the number of devices
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class RPFrameworkTelnetReactor(object):
+
+	#/////////////////////////////////////////////////////////////////////////////////////
+	# Class construction and destruction methods
+	#/////////////////////////////////////////////////////////////////////////////////////
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor called once by the plugin upon the first device registration; the thread
+	# is started on demand
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self, plugin):
+		self.hostPlugin = plugin
+		self.reactorConnections = dict()
+		self.reactorLock = threading.Lock()
+		self.reactorThread = None
+		self.stopRequested = False
+
+		# the wake-up pipe allows other threads to interrupt the select call whenever a
+		# command is queued or a device is registered/unregistered
+		self.wakeupPipe = os.pipe()
+		for pipeDescriptor in self.wakeupPipe:
+			fcntl.fcntl(pipeDescriptor, fcntl.F_SETFL, fcntl.fcntl(pipeDescriptor, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+
+	#/////////////////////////////////////////////////////////////////////////////////////
+	# Public interface methods
+	#/////////////////////////////////////////////////////////////////////////////////////
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine adds the device to those serviced by the reactor (if not already) and
+	# wakes the reactor thread so that any newly-queued commands are processed
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def registerDevice(self, rpDevice):
+		with self.reactorLock:
+			reactorConnection = self.reactorConnections.get(rpDevice.indigoDevice.id, None)
+			if reactorConnection is None or not (reactorConnection.rpDevice is rpDevice):
+				self.reactorConnections[rpDevice.indigoDevice.id] = RPFrameworkReactorConnection(rpDevice)
+
+			if self.reactorThread is None or self.reactorThread.isAlive() == False:
+				self.stopRequested = False
+				self.reactorThread = threading.Thread(target=self.runReactor, name=u'RPFrameworkTelnetReactor')
+				self.reactorThread.daemon = True
+				self.reactorThread.start()
+		self.wake()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine asks the reactor to close the device's connection without waiting for
+	# it to do so; returns the event set once the connection is closed (None if the device
+	# is not registered)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def requestUnregisterDevice(self, rpDevice):
+		closeImmediately = False
+		with self.reactorLock:
+			reactorConnection = self.reactorConnections.get(rpDevice.indigoDevice.id, None)
+			if reactorConnection is None or not (reactorConnection.rpDevice is rpDevice):
+				return None
+			if self.reactorThread is None or self.reactorThread.isAlive() == False or threading.current_thread() is self.reactorThread:
+				closeImmediately = True
+			else:
+				reactorConnection.closeRequested = True
+
+		if closeImmediately == True:
+			self.closeConnection(reactorConnection, u'Disconnected')
+		else:
+			self.wake()
+		return reactorConnection.closedEvent
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine will interrupt the reactor's select call, causing it to re-examine the
+	# command queues of all registered devices
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def wake(self):
+		try:
+			os.write(self.wakeupPipe[1], b'!')
+		except OSError:
+			# the pipe is full -- the reactor already has a wake-up pending
+			pass
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine stops the reactor thread, closing any connections which remain open
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def stopReactor(self, timeout=5.0):
+		self.stopRequested = True
+		self.wake()
+		if not (self.reactorThread is None) and not (threading.current_thread() is self.reactorThread):
+			self.reactorThread.join(timeout)
+
+
+	#/////////////////////////////////////////////////////////////////////////////////////
+	# Reactor processing methods
+	#/////////////////////////////////////////////////////////////////////////////////////
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This is the main routine of the reactor thread; each pass services every registered
+	# device and then blocks in select until a connection has activity, the reactor is
+	# woken or the earliest device deadline (pause, response timeout, poll) passes
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def runReactor(self):
+		self.hostPlugin.logger.threaddebug(u'Telnet reactor thread started')
+		try:
+			while self.stopRequested == False:
+				with self.reactorLock:
+					reactorConnections = self.reactorConnections.values()
+
+				# service each connection (connect, process commands, check timeouts) and build
+				# the list of connections to wait upon
+				readList = [self.wakeupPipe[0]]
+				writeList = []
+				selectableConnections = dict()
+				nextDeadline = None
+				for reactorConnection in reactorConnections:
+					connectionDeadline = self.runGuarded(reactorConnection, self.serviceConnection, reactorConnection)
+					if reactorConnection.connectionState == REACTORCONN_STATE_CONNECTING:
+						writeList.append(reactorConnection.connectSocket)
+					elif reactorConnection.connectionState == REACTORCONN_STATE_CONNECTED:
+						readList.append(reactorConnection.connection)
+						if reactorConnection.hasPendingWrites() == True:
+							writeList.append(reactorConnection.connection)
+					else:
+						continue
+					selectableConnections[reactorConnection.getSelectable().fileno()] = reactorConnection
+					if connectionDeadline is not None and (nextDeadline is None or connectionDeadline < nextDeadline):
+						nextDeadline = connectionDeadline
+
+				selectTimeout = None
+				if nextDeadline is not None:
+					selectTimeout = max(0.0, nextDeadline - time.time())
+				try:
+					readyToRead, readyToWrite = select.select(readList, writeList, [], selectTimeout)[0:2]
+				except select.error, e:
+					if e.args[0] == errno.EINTR:
+						continue
+					raise
+
+				# drain the wake-up pipe; the wake-up itself only needed to interrupt the select
+				if self.wakeupPipe[0] in readyToRead:
+					try:
+						while os.read(self.wakeupPipe[0], 512):
+							pass
+					except OSError:
+						pass
+
+				for readySelectable in readyToWrite:
+					reactorConnection = selectableConnections[readySelectable.fileno()]
+					if reactorConnection.connectionState == REACTORCONN_STATE_CONNECTING:
+						self.runGuarded(reactorConnection, self.completeConnection, reactorConnection)
+					elif reactorConnection.connectionState == REACTORCONN_STATE_CONNECTED:
+						self.runGuarded(reactorConnection, reactorConnection.connection.flushWrites)
+				for readySelectable in readyToRead:
+					if readySelectable is self.wakeupPipe[0]:
+						continue
+					reactorConnection = selectableConnections[readySelectable.fileno()]
+					self.runGuarded(reactorConnection, self.readConnection, reactorConnection)
+		except:
+			self.hostPlugin.logger.exception(u'Error in telnet reactor thread')
+		finally:
+			with self.reactorLock:
+				reactorConnections = self.reactorConnections.values()
+			for reactorConnection in reactorConnections:
+				self.closeConnection(reactorConnection, u'Disconnected')
+			self.hostPlugin.logger.threaddebug(u'Telnet reactor thread stopped')
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine executes a processing step for a single connection, handling errors in
+	# the same way as the device processing thread so that one failed device does not
+	# affect any others
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def runGuarded(self, reactorConnection, processingStep, *args):
+		rpDevice = reactorConnection.rpDevice
+		try:
+			return processingStep(*args)
+		except (socket.timeout, EOFError):
+			# the connection is closed first so that a reconnection falling due at once
+			# registers a new connection rather than finding this one
+			self.closeConnection(reactorConnection, u'Unavailable')
+			rpDevice.handleConnectionFailure(u'Connection timed out for device ' + RPFrameworkUtils.to_unicode(rpDevice.indigoDevice.id))
+		except socket.error, e:
+			self.closeConnection(reactorConnection, u'Unavailable')
+			rpDevice.handleConnectionFailure(u'Connection failed for device ' + RPFrameworkUtils.to_unicode(rpDevice.indigoDevice.id) + u': ' + RPFrameworkUtils.to_unicode(e))
+		except:
+			rpDevice.indigoDevice.setErrorStateOnServer(u'Error')
+			self.hostPlugin.logger.exception(u'Error during background processing')
+			self.closeConnection(reactorConnection, u'Disconnected')
+		return None
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine performs all non-I/O driven work for a connection: starting the
+	# connection, processing queued commands, sending queued state updates and checking
+	# timeouts. Returns the time at which the connection next needs servicing, or None if
+	# it only awaits I/O
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def serviceConnection(self, reactorConnection):
+		rpDevice = reactorConnection.rpDevice
+		if reactorConnection.connectionState == REACTORCONN_STATE_CLOSED:
+			return None
+		if reactorConnection.closeRequested == True:
+			self.closeConnection(reactorConnection, u'Disconnected')
+			return None
+
+		timeNow = time.time()
+		if reactorConnection.connectionState == REACTORCONN_STATE_IDLE:
+			rpDevice.loadConnectionSettings()
+			(reactorConnection.connectSocket, reactorConnection.connectTimeout) = rpDevice.openReactorSocket()
+			reactorConnection.connectDeadline = timeNow + reactorConnection.connectTimeout
+			reactorConnection.connectionState = REACTORCONN_STATE_CONNECTING
+
+		if reactorConnection.connectionState == REACTORCONN_STATE_CONNECTING:
+			if timeNow >= reactorConnection.connectDeadline:
+				raise socket.timeout(u'Connection attempt timed out')
+			return reactorConnection.connectDeadline
+
+		# written data must be taken by the socket within the connection timeout, as it was
+		# when writes blocked up to that timeout
+		writeDeadline = reactorConnection.connection.getWriteDeadline()
+		if writeDeadline is not None and timeNow >= writeDeadline:
+			raise socket.timeout(u'Write to device timed out')
+
+		# the previous command is complete once a response is received or the command
+		# read timeout has elapsed
+		if not (reactorConnection.pendingCommand is None) and timeNow >= reactorConnection.responseDeadline:
+			self.completeCommand(reactorConnection, timeNow)
+
+		while reactorConnection.pendingCommand is None and timeNow >= reactorConnection.pausedUntil and not rpDevice.commandQueue.empty():
+			command = rpDevice.commandQueue.get()
+			self.hostPlugin.logger.threaddebug(u'Reactor processing command ' + RPFrameworkUtils.to_unicode(command.commandName) + u' for device ' + RPFrameworkUtils.to_unicode(rpDevice.indigoDevice.id))
+			if command.commandName == RPFrameworkCommand.CMD_TERMINATE_PROCESSING_THREAD:
+				rpDevice.commandQueue.task_done()
+				self.closeConnection(reactorConnection, u'Disconnected')
+				return None
+
+			elif command.commandName == RPFrameworkCommand.CMD_PAUSE_PROCESSING:
+				# rather than sleeping, the connection is simply not serviced until the pause
+				# has elapsed
+				try:
+					reactorConnection.pausedUntil = timeNow + float(command.commandPayload)
+				except:
+					self.hostPlugin.logger.error(u'Invalid pause time requested')
+
+			elif rpDevice.isPipelinedCommand(command) == True:
+				pipelinedCommands = rpDevice.getPipelinedCommands(command)
+				rpDevice.writePipelinedCommands(reactorConnection.connection, pipelinedCommands)
+				for pipelinedCommand in pipelinedCommands[1:]:
+					rpDevice.commandQueue.task_done()
+				reactorConnection.pendingCommand = pipelinedCommands[-1]
+				self.completeCommand(reactorConnection, timeNow)
+
+			else:
+				rpDevice.processDeviceCommand(reactorConnection.connection, command)
+				reactorConnection.pendingCommand = command
+				if rpDevice.commandAwaitsResponse(command) == True:
+					reactorConnection.responseDeadline = timeNow + rpDevice.commandResponseTimeout
+				else:
+					self.completeCommand(reactorConnection, timeNow)
+			rpDevice.commandQueue.task_done()
+
+		# check to see if we need to issue an update...
+		rpDevice.checkStatusPollerDue()
+
+		# check that the device is still alive; any liveness command is only sent between
+		# commands so that its answer is not taken for a command's response
+		healthCheckTime = None
+		if reactorConnection.pendingCommand is None:
+			healthCheckTime = rpDevice.checkConnectionHealth(reactorConnection.connection)
+
+		# send the state updates queued by the responses read since the last pass, unless
+		# they are being held to coalesce further updates
+		rpDevice.flushStateUpdates(False)
+
+		# determine when this connection next requires attention
+		if not (reactorConnection.pendingCommand is None):
+			connectionDeadline = reactorConnection.responseDeadline
+		elif not rpDevice.commandQueue.empty():
+			connectionDeadline = max(timeNow, reactorConnection.pausedUntil)
+		else:
+			connectionDeadline = rpDevice.updateStatusPollerNextRun
+
+		for wakeTime in (rpDevice.getStateUpdateFlushTime(), healthCheckTime, reactorConnection.connection.getWriteDeadline()):
+			if connectionDeadline is None or (wakeTime is not None and wakeTime < connectionDeadline):
+				connectionDeadline = wakeTime
+		return connectionDeadline
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine completes processing of the pending command, scheduling any post
+	# command pause which has been requested
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def completeCommand(self, reactorConnection, timeNow):
+		command = reactorConnection.pendingCommand
+		reactorConnection.pendingCommand = None
+		if command.postCommandPause > 0.0:
+			self.hostPlugin.logger.threaddebug(u'Post Command Pause: ' + RPFrameworkUtils.to_unicode(command.postCommandPause))
+			reactorConnection.pausedUntil = timeNow + command.postCommandPause
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine is called when a connecting socket becomes writable, indicating that
+	# the connection attempt has completed (successfully or otherwise)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def completeConnection(self, reactorConnection):
+		rpDevice = reactorConnection.rpDevice
+		reactorConnection.connection = RPFrameworkReactorWriteBuffer(rpDevice.completeReactorConnection(reactorConnection.connectSocket, reactorConnection.connectTimeout), reactorConnection.connectSocket, reactorConnection.connectTimeout)
+		reactorConnection.connectSocket = None
+		reactorConnection.connectionState = REACTORCONN_STATE_CONNECTED
+		rpDevice.onConnectionEstablished()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine is called when a connection has data waiting; the data is passed
+	# undecoded to the device's line framer as a response to the pending command, if any
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def readConnection(self, reactorConnection):
+		rpDevice = reactorConnection.rpDevice
+		receivedData = rpDevice.readAvailable(reactorConnection.connection)
+		if rpDevice.handleReceivedText(receivedData, reactorConnection.pendingCommand) == True and not (reactorConnection.pendingCommand is None):
+			self.completeCommand(reactorConnection, time.time())
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine closes the connection and removes it from the reactor; the device's
+	# states are updated to the given connection state
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def closeConnection(self, reactorConnection, connectionState):
+		with self.reactorLock:
+			if reactorConnection.connectionState == REACTORCONN_STATE_CLOSED:
+				return
+			reactorConnection.connectionState = REACTORCONN_STATE_CLOSED
+			if self.reactorConnections.get(reactorConnection.rpDevice.indigoDevice.id, None) is reactorConnection:
+				del self.reactorConnections[reactorConnection.rpDevice.indigoDevice.id]
+
+		try:
+			if reactorConnection.connection is None:
+				reactorConnection.rpDevice.closeDeviceConnection(reactorConnection.connectSocket, connectionState)
+			else:
+				# anything still buffered gets one last chance to be sent (such as the commands
+				# written ahead of a stop request)
+				try:
+					reactorConnection.connection.flushWrites()
+				except socket.error:
+					pass
+				reactorConnection.rpDevice.closeDeviceConnection(reactorConnection.connection, connectionState)
+		except:
+			self.hostPlugin.logger.exception(u'Error closing device connection')
+		finally:
+			reactorConnection.connection = None
+			reactorConnection.connectSocket = None
+			reactorConnection.closedEvent.set()
@@ -0,0 +1,160 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# RPFrameworkTemplate by RogueProeliator <adam.d.ashe@gmail.com>
+# 	Classes which parse the format strings used for the RPFramework value substitutions
+#	(%ap:, %dp:, %ds:, %pdp: and %pp:) once into a list of literal text and placeholders
+#	so that they may be rendered repeatedly without re-scanning the string
+#
+#	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# 	SOFTWARE.
+#
+#	Version 25:
+#		Initial release of the compiled substitution templates
+#
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Python imports
+#/////////////////////////////////////////////////////////////////////////////////////////
+import itertools
+import re
+import threading
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Constants and configuration variables
+#/////////////////////////////////////////////////////////////////////////////////////////
+TEMPLATE_SUBSTITUTION_ACTIONPARAM = u'ap'
+TEMPLATE_SUBSTITUTION_DEVICEPROP = u'dp'
+TEMPLATE_SUBSTITUTION_DEVICESTATE = u'ds'
+TEMPLATE_SUBSTITUTION_PARENTDEVICEPROP = u'pdp'
+TEMPLATE_SUBSTITUTION_PLUGINPREF = u'pp'
+
+# the substitutions in the order in which they are applied; a substituted value may
+# itself call for any of the substitutions which follow it
+TEMPLATE_SUBSTITUTION_STAGES = [TEMPLATE_SUBSTITUTION_ACTIONPARAM, TEMPLATE_SUBSTITUTION_DEVICEPROP, TEMPLATE_SUBSTITUTION_DEVICESTATE, TEMPLATE_SUBSTITUTION_PARENTDEVICEPROP, TEMPLATE_SUBSTITUTION_PLUGINPREF]
+TEMPLATE_PLACEHOLDER_REGEX = re.compile(u'%(ap|dp|ds|pdp|pp):([a-z\d]+)%', re.IGNORECASE)
+
+TEMPLATE_CACHE_DEFAULT_SIZE = 512
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# RPFrameworkTemplate
+#	A format string parsed into its literal text segments and substitution placeholders
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class RPFrameworkTemplate(object):
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor parses the template text; placeholders are stored as a tuple of the
+	# stage, substitution type, key and the original placeholder text
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self, templateText):
+		self.templateText = templateText
+		self.segments = list()
+		self.lastUsed = 0
+
+		literalStart = 0
+		for placeholderMatch in TEMPLATE_PLACEHOLDER_REGEX.finditer(templateText):
+			if placeholderMatch.start() > literalStart:
+				self.segments.append(templateText[literalStart:placeholderMatch.start()])
+			substitutionType = placeholderMatch.group(1).lower()
+			self.segments.append((TEMPLATE_SUBSTITUTION_STAGES.index(substitutionType), substitutionType, placeholderMatch.group(2), placeholderMatch.group(0)))
+			literalStart = placeholderMatch.end()
+		if literalStart < len(templateText):
+			self.segments.append(templateText[literalStart:])
+		self.hasSubstitutions = literalStart > 0
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Renders the template using the valueLookup(substitutionType, key) callable, which
+	# returns None for a placeholder that should be left as-is; placeholders before the
+	# minimum stage are not substituted
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def render(self, valueLookup, templateCache, minimumStage=0):
+		if self.hasSubstitutions == False:
+			return self.templateText
+
+		renderedSegments = list()
+		for segment in self.segments:
+			if not isinstance(segment, tuple):
+				renderedSegments.append(segment)
+				continue
+
+			(substitutionStage, substitutionType, substitutionKey, placeholderText) = segment
+			substitutedValue = None
+			if substitutionStage >= minimumStage:
+				substitutedValue = valueLookup(substitutionType, substitutionKey)
+			if substitutedValue is None:
+				renderedSegments.append(placeholderText)
+			elif u'%' in substitutedValue and substitutionStage + 1 < len(TEMPLATE_SUBSTITUTION_STAGES):
+				renderedSegments.append(templateCache.getTemplate(substitutedValue).render(valueLookup, templateCache, substitutionStage + 1))
+			else:
+				renderedSegments.append(substitutedValue)
+		return u''.join(renderedSegments)
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# RPFrameworkTemplateCache
+#	A thread-safe, least-recently-used cache of the parsed templates keyed by their text;
+#	once full, the least recently used quarter of the templates is evicted at once so
+#	that a cache hit need only look up the template and note its use
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class RPFrameworkTemplateCache(object):
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor allows passing in the maximum number of templates to retain and the
+	# class used to parse them (any class taking the text and having a lastUsed member)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self, maximumSize=TEMPLATE_CACHE_DEFAULT_SIZE, templateClass=RPFrameworkTemplate):
+		self.maximumSize = maximumSize
+		self.templateClass = templateClass
+		self.templates = dict()
+		self.useCounter = itertools.count(1)
+		self.cacheLock = threading.Lock()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the parsed template for the text, parsing and caching it if necessary
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getTemplate(self, templateText):
+		template = self.templates.get(templateText, None)
+		if template is None:
+			# parse outside of the lock; should two threads parse the same text at once, the
+			# results are equivalent and either may be retained
+			template = self.templateClass(templateText)
+			with self.cacheLock:
+				if len(self.templates) >= self.maximumSize:
+					self.evictTemplates()
+				self.templates[templateText] = template
+		template.lastUsed = next(self.useCounter)
+		return template
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Removes the least recently used quarter of the cached templates; the cache lock
+	# must be held by the caller
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def evictTemplates(self):
+		templatesByUse = sorted(self.templates.items(), key=lambda cachedTemplate: cachedTemplate[1].lastUsed)
+		for (templateText, template) in templatesByUse[:max(1, len(templatesByUse) / 4)]:
+			del self.templates[templateText]
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Renders the text as a template using the valueLookup(substitutionType, key) callable
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def renderTemplate(self, templateText, valueLookup):
+		return self.getTemplate(templateText).render(valueLookup, self)
+
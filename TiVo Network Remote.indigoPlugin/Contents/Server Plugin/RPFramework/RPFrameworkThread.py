@@ -3,8 +3,8 @@
 #/////////////////////////////////////////////////////////////////////////////////////////
 #/////////////////////////////////////////////////////////////////////////////////////////
 # RPFrameworkThread by RogueProeliator <adam.d.ashe@gmail.com>
-# 	Class for all RogueProeliator's device threads; supports cancellation via raising an
-#	exception in the thread
+# 	Class for all RogueProeliator's device threads; supports cooperative cancellation via
+#	a stop event which the thread's processing loop checks
 #	
 #	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
 # 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
@@ -18,71 +18,50 @@
 #		Initial release of the thread to the framework
 #	Version 17:
 #		Changed strings to unicode strings
+#	Version 25:
+#		Replaced raising SystemExit in the thread (which could land mid-write or inside
+#		logging) with a cooperative stop request; threads are now daemons
 #
 #/////////////////////////////////////////////////////////////////////////////////////////
 #/////////////////////////////////////////////////////////////////////////////////////////
-import ctypes
-import inspect
 import threading
 
 
-#/////////////////////////////////////////////////////////////////////////////////////////
-# Internal module-level function used to send an exception to a given thread
-#/////////////////////////////////////////////////////////////////////////////////////////
-def _async_raise(tid, exctype):
-	if not inspect.isclass(exctype):
-		raise TypeError(u'Only types can be raised (not instances)')
-	res = ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_long(tid), ctypes.py_object(exctype))
-	if res == 0:
-		raise ValueError(u'Invalid thread ID')
-	elif res != 1:
-		# if it returns a number greater than one, you're in trouble, 
-		# and you should call it again with exc=NULL to revert the effect
-		ctypes.pythonapi.PyThreadState_SetAsyncExc(tid, 0)
-		raise SystemError(u'PyThreadState_SetAsyncExc failed')
-        
-
 #/////////////////////////////////////////////////////////////////////////////////////////
 #/////////////////////////////////////////////////////////////////////////////////////////
 #/////////////////////////////////////////////////////////////////////////////////////////
-# RPFrameworkCommand
-#	Class that allows communication of an action request between the plugin device and
-#	its processing thread that is executing the actions/requests/communications
+# RPFrameworkThread
+#	Thread used by devices to process their commands; the processing loop is responsible
+#	for checking isStopRequested and exiting once a stop has been requested
 #/////////////////////////////////////////////////////////////////////////////////////////
 #/////////////////////////////////////////////////////////////////////////////////////////
 #/////////////////////////////////////////////////////////////////////////////////////////
 class RPFrameworkThread(threading.Thread):
 
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
-	# This routine returns the ID of the thread, which should be unique to all threads
-	# in this package
+	# Constructor accepts the same arguments as threading.Thread; the thread is a daemon so
+	# that one which fails to stop in time cannot hold the plugin host process open
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self, *args, **kwargs):
+		super(RPFrameworkThread, self).__init__(*args, **kwargs)
+		self.stopEvent = threading.Event()
+		self.daemon = True
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Requests that the thread stop at its next check; this does not wait for it to do so
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
-	def _get_my_tid(self):
-		if not self.isAlive():
-			raise threading.ThreadError(u'The thread is not active')
+	def requestStop(self):
+		self.stopEvent.set()
 
-		# check to see if we have the ID already retrieved/cached
-		if hasattr(self, u'_thread_id'):
-			return self._thread_id
-        
-		# the id is not yet cached to the class... attempt to find it now in the list
-		# of active threads
-		for tid, tobj in threading._active.items():
-			if tobj is self:
-				self._thread_id = tid
-				return tid
-        
-		# we could not find the thread's ID
-		raise AssertionError(u'Could not determine the thread''s id')
-    
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
-	# This routine raises an exception of the given type within the thread's context
+	# Returns True once a stop has been requested for the thread
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
-	def raise_exc(self, exctype):
-		_async_raise(self._get_my_tid(), exctype)
+	def isStopRequested(self):
+		return self.stopEvent.isSet()
 
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
-	# This routine may be called in order to terminate the thread
+	# This routine may be called in order to terminate the thread; retained for existing
+	# callers, it now only requests the stop
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	def terminateThread(self):
-		self.raise_exc(SystemExit)
\ No newline at end of file
+		self.requestStop()
@@ -24,13 +24,19 @@ import RPFrameworkPlugin
 from RPFrameworkDevice import RPFrameworkDevice
 import RPFrameworkRESTfulDevice
 import RPFrameworkTelnetDevice
+import RPFrameworkTelnetReactor
 import RPFrameworkNonCommChildDevice
 
 from RPFrameworkIndigoAction import RPFrameworkIndigoActionDfn
 import RPFrameworkCommand
 import RPFrameworkIndigoParam
 import RPFrameworkDeviceResponse
+import RPFrameworkExpression
+import RPFrameworkImageResizer
+import RPFrameworkLineFramer
+import RPFrameworkScheduler
 
+import RPFrameworkTemplate
 import RPFrameworkUtils
 import RPFrameworkThread
 import RPFrameworkNetworkingUPnP
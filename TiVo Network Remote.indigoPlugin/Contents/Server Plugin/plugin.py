@@ -25,6 +25,20 @@
 #		Implement auto-reconnect for disconnected/failed connections
 #	Version 2.0.1:
 #		Updated API to use Indigo 7 API calls
+#	Version 2.2.2:
+#		TiVo discovery finds the name and version of each TiVo concurrently, with a
+#		time limit for each, and stops listening once the configured TiVos reply
+#		Discovered TiVos are cached (in the plugin prefs) so that the device dialog lists
+#		them immediately; the cache is refreshed in the background (away from the plugin
+#		command queue) and a TiVo whose address has changed is re-resolved by its TCD ID
+#		Added an optional listener for the beacons which TiVos broadcast, keeping the
+#		discovery cache current without sending discovery announcements
+#		A TiVo which drops off the network is noticed within seconds (by TCP keepalive
+#		while idle or unacknowledged key presses) and its connection re-established; the
+#		time data was last received from the TiVo is shown in the lastDataReceived state
+#		The plugin stops all of its TiVo connections in parallel when reloaded or disabled
+#		When a MAK is entered the TiVo's Now Playing list is read periodically (a page at a
+#		time, parsed as it streams in) and its totals shown in the new nowPlaying states
 #
 #/////////////////////////////////////////////////////////////////////////////////////////
 #/////////////////////////////////////////////////////////////////////////////////////////
@@ -34,31 +48,16 @@
 # Python imports
 #/////////////////////////////////////////////////////////////////////////////////////////
 import os
-import random
-import re
-import select
-import socket
 import string
-import struct
-import telnetlib
+import threading
 
+import indigo
 import RPFramework
+import tivoDiscovery
+import tivoNowPlaying
 import tivoRemoteDevice
 
 
-#/////////////////////////////////////////////////////////////////////////////////////////
-# Constants and configuration variables
-#/////////////////////////////////////////////////////////////////////////////////////////
-# beacon template for use when finding TiVo devices or for when attempting to get more
-# information about them (name/version)
-ANNOUNCE = """tivoconnect=1
-method=%(method)s
-platform=pc
-identity=remote-%(port)x
-services=TiVoMediaServer:%(port)d/http
-"""
-
-
 #/////////////////////////////////////////////////////////////////////////////////////////
 #/////////////////////////////////////////////////////////////////////////////////////////
 # Plugin
@@ -78,6 +77,37 @@ class Plugin(RPFramework.RPFrameworkPlugin.RPFrameworkPlugin):
 	def __init__(self, pluginId, pluginDisplayName, pluginVersion, pluginPrefs):
 		# RP framework base class's init method
 		super(Plugin, self).__init__(pluginId, pluginDisplayName, pluginVersion, pluginPrefs, managedDeviceClassModule=tivoRemoteDevice)
+		
+		# the address and port to which the discovery announcement is sent
+		self.tivoDiscoveryBroadcastAddress = tivoDiscovery.TIVO_DISCOVERY_BROADCASTADDRESS
+		self.tivoBeaconPort = tivoDiscovery.TIVO_BEACON_PORT
+		
+		# the TiVos found by discovery are cached across restarts in the plugin prefs; the
+		# cache is refreshed on a thread of its own so that the plugin command queue (and
+		# the reconnection attempts on it) are not held up by the discovery
+		self.tivoDiscoveryCache = tivoDiscovery.TiVoDiscoveryCache()
+		self.tivoDiscoveryCache.loadJson(pluginPrefs.get(u'tivoDiscoveryCache', u''))
+		self.tivoDiscoveryLock = threading.Lock()
+		self.tivoDiscoveryRefreshThread = None
+		
+		# the (optional) listener for the beacons broadcast by the TiVos on the network
+		self.tivoBeaconListener = None
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# startup is called by Indigo whenever the plugin is first starting up (by a restart
+	# of Indigo server or the plugin or an update)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def startup(self):
+		super(Plugin, self).startup()
+		self.updateTiVoBeaconListener(self.pluginPrefs.get(u'enableTiVoBeaconListener', False))
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# shutdown is called by Indigo whenever the entire plugin is being shut down from
+	# being disabled, during an update process or if the server is being shut down
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def shutdown(self):
+		self.updateTiVoBeaconListener(False)
+		super(Plugin, self).shutdown()
 	
 	
 	#/////////////////////////////////////////////////////////////////////////////////////
@@ -98,9 +128,22 @@ class Plugin(RPFramework.RPFrameworkPlugin.RPFrameworkPlugin):
 					errorMsgDict[u'tivoIPAddress'] = u'Device "' + dev.name + u'" already set to use this IP Address. You cannot have two Indigo devices attached to the same TiVo device.'
 					return (False, valuesDict, errorMsgDict)
 		
+		# remember the TCD ID of a discovered TiVo so that it may be found again should its
+		# address change
+		valuesDict[u'tivoTCDID'] = self.tivoDiscoveryCache.getTcdId(valuesDict[u'tivoIPAddress']) or u''
+		
 		# user input is all valid
 		return (True, valuesDict)
 		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine is called once the user has exited the preferences dialog; the beacon
+	# listener is started or stopped to match the new preferences
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def closedPrefsConfigUi(self, valuesDict, userCancelled):
+		super(Plugin, self).closedPrefsConfigUi(valuesDict, userCancelled)
+		if not userCancelled:
+			self.updateTiVoBeaconListener(valuesDict.get(u'enableTiVoBeaconListener', False))
+		
 		
 	#/////////////////////////////////////////////////////////////////////////////////////
 	# Configuration and Action Dialog Callbacks
@@ -139,103 +182,128 @@ class Plugin(RPFramework.RPFrameworkPlugin.RPFrameworkPlugin):
 	#/////////////////////////////////////////////////////////////////////////////////////
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	# This routine is called back to the plugin when the GUI configuration loads... it
-	# should allow for selecting a TiVo device via a drop-down
+	# should allow for selecting a TiVo device via a drop-down. The TiVos are listed from
+	# the discovery cache; discovery only runs here if the cache has never been filled,
+	# otherwise the cache is refreshed in the background for the next time the dialog is
+	# opened (unless the beacon listener is keeping the cache current). The refresh only
+	# probes the TiVos which are new or whose details are stale
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	def findTiVoDevices(self, filter="", valuesDict=None, typeId="", targetId=0):
-		tcd_id = re.compile('TiVo_TCD_ID: (.*)\r\n').findall
-		tcds = {}
-
-		# we must setup a listening server in order to listen for the TiVo returns, but
-		# the port does not matter... find an available one
-		hsock = socket.socket()
-		attempts = 0
-		while True:
-			port = random.randint(0x8000, 0xffff)
-			try:
-				hsock.bind(('', port))
-				break
-			except:
-				attempts += 1
-				if attempts == 7:
-					# can't bind to a port... return an empty list
-					return []
-		hsock.listen(5)
-
-		# broadcast an announcement so that the TiVos will respond
-		method = 'broadcast'
-		try:
-			usock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-			usock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-			usock.sendto(ANNOUNCE % locals(), ('255.255.255.255', 2190))
-			usock.close()
-		except:
-			hsock.close()
-			# the announcement broadcast failed.
-			return []   
-
-		# collect the queries made in response; these return quickly
-		while True:
-			isock, junk1, junk2 = select.select([hsock], [], [], 1)
-			if not isock:
-				break
-			client, address = hsock.accept()
-			message = client.recv(1500)
-			client.close()
-			tcd = tcd_id(message)[0]
-			if tcd[0] >= '6' and tcd[:3] != '649':  # only support series 3 & 4 TiVos are supported
-				tcds[tcd] = address[0]
-		hsock.close()
-
-		# unfortunately the HTTP requests don't include the machine names, 
-		# so we find them by making direct TCD connections to each TiVo
+		if self.tivoDiscoveryCache.isEmpty() == True:
+			self.refreshTiVoDiscovery()
+		elif self.tivoBeaconListener is None:
+			self.queueTiVoDiscoveryRefresh()
+		
 		tivos = []
-		for tcd, address in tcds.items():
-			name, version = self.getTiVoNameAndVersion(address)
+		for (tcdId, address, name, version) in self.tivoDiscoveryCache.getTiVos():
 			tivos.append((address, RPFramework.RPFrameworkUtils.to_unicode(name) + u' (v' + RPFramework.RPFrameworkUtils.to_unicode(version) + u')'))
 		return tivos
 		
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
-	# This routine will exchange TiVo Connect Discovery beacons in order to extract the
-	# name and software version
+	# This routine starts a refresh of the TiVo discovery cache in the background unless
+	# one is already running or the last completed within minimumInterval seconds
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
-	def getTiVoNameAndVersion(self, address):
-		method = 'connected'
-		port = 0
-		our_beacon = ANNOUNCE % locals()
-		machine_name = re.compile('machine=(.*)\n').findall
-		swversion = re.compile('swversion=(\d*.\d*)').findall
-
+	def queueTiVoDiscoveryRefresh(self, minimumInterval=0.0):
+		with self.tivoDiscoveryLock:
+			if not (self.tivoDiscoveryRefreshThread is None) or self.tivoDiscoveryCache.isRefreshedWithin(minimumInterval) == True:
+				return
+			self.tivoDiscoveryRefreshThread = RPFramework.RPFrameworkThread.RPFrameworkThread(target=self.concurrentTiVoDiscoveryRefresh)
+			self.tivoDiscoveryRefreshThread.start()
+			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine runs a background refresh of the TiVo discovery cache
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def concurrentTiVoDiscoveryRefresh(self):
 		try:
-			tsock = socket.socket()
-			tsock.connect((address, 2190))
-
-			tsock.sendall(struct.pack('!I', len(our_beacon)) + our_beacon)
-			length = struct.unpack('!I', self.receiveBytesFromSocket(tsock, 4))[0]
-			tivo_beacon = self.receiveBytesFromSocket(tsock, length)
-
-			tsock.close()
-
-			self.logger.threaddebug(u'Received beacon: ' + tivo_beacon)
-			name = machine_name(tivo_beacon)[0]
-			version = float(swversion(tivo_beacon)[0])
+			self.refreshTiVoDiscovery()
 		except:
-			name = address
-			version = 0.0
-			if self.debug == True:
-				self.exceptionLog()
-		return name, version
+			self.exceptionLog()
+		finally:
+			with self.tivoDiscoveryLock:
+				self.tivoDiscoveryRefreshThread = None
 		
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
-	# Reads the specified number of bytes from the socket
-	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-	
-	def receiveBytesFromSocket(self, sock, length):
-		block = ''
-		while len(block) < length:
-			add = sock.recv(length - len(block))
-			if not add:
-				break
-			block += add
-		return block
+	# This routine finds the TiVos on the network and updates the discovery cache; only
+	# the TiVos which are new, have moved or whose details are stale are probed for their
+	# name and version. Devices whose TiVo has moved are updated with its new address
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def refreshTiVoDiscovery(self):
+		expectedAddresses = [dev.pluginProps.get(u'tivoIPAddress', u'') for dev in indigo.devices.iter(u'self')]
+		expectedAddresses.extend([cachedTiVo[1] for cachedTiVo in self.tivoDiscoveryCache.getTiVos()])
+		discovery = tivoDiscovery.TiVoDiscovery(self.tivoDiscoveryBroadcastAddress, self.tivoBeaconPort)
+		discoveredTiVos = discovery.discoverTiVos(expectedAddresses, self.tivoDiscoveryCache.getFreshTiVos())
+		for (tcdId, address, tivoBeacon) in discoveredTiVos:
+			if not (tivoBeacon is None):
+				self.logger.threaddebug(u'Received beacon from ' + RPFramework.RPFrameworkUtils.to_unicode(address) + u': ' + RPFramework.RPFrameworkUtils.to_unicode(tivoBeacon))
+		
+		changedAddresses = self.tivoDiscoveryCache.updateTiVos(discoveredTiVos)
+		self.pluginPrefs[u'tivoDiscoveryCache'] = self.tivoDiscoveryCache.toJson()
+		self.updateMovedTiVoDevices(changedAddresses)
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine updates the devices whose TiVo has moved with its new address; the
+	# changed addresses are given as (tcdId, address) as returned by updateTiVos
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def updateMovedTiVoDevices(self, changedAddresses):
+		for (tcdId, address) in changedAddresses:
+			for dev in indigo.devices.iter(u'self'):
+				if dev.pluginProps.get(u'tivoTCDID', u'') == tcdId and dev.pluginProps.get(u'tivoIPAddress', u'') != address:
+					self.logger.info(u'TiVo for device "' + dev.name + u'" found at new address ' + RPFramework.RPFrameworkUtils.to_unicode(address))
+					updatedProps = dev.pluginProps
+					updatedProps[u'tivoIPAddress'] = address
+					dev.replacePluginPropsOnServer(updatedProps)
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine starts or stops the listener for TiVo beacons; should the beacon port
+	# not be available the listener is left disabled and discovery falls back to sending
+	# announcements
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def updateTiVoBeaconListener(self, enableListener):
+		if enableListener == True and self.tivoBeaconListener is None:
+			try:
+				self.tivoBeaconListener = tivoDiscovery.TiVoBeaconListener(self.handleTiVoBeacon, self.tivoBeaconPort)
+				self.tivoBeaconListener.startListener()
+				self.logger.debug(u'Listening for TiVo beacons on port ' + RPFramework.RPFrameworkUtils.to_unicode(self.tivoBeaconListener.getPort()))
+			except:
+				self.logger.error(u'Unable to listen for TiVo beacons on port ' + RPFramework.RPFrameworkUtils.to_unicode(self.tivoBeaconPort) + u'; the port may be in use by another application')
+				self.tivoBeaconListener = None
+		elif enableListener != True and not (self.tivoBeaconListener is None):
+			self.tivoBeaconListener.stopListener()
+			self.tivoBeaconListener = None
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine is called back by the beacon listener (on its thread) for each beacon
+	# received from a TiVo; the prefs are only saved when the beacon changed the cache
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def handleTiVoBeacon(self, tcdId, address, tivoBeacon):
+		try:
+			changedAddresses = self.tivoDiscoveryCache.updateTiVos([(tcdId, address, tivoBeacon)], isRefresh=False)
+			if self.tivoDiscoveryCache.hasUnsavedChanges == True:
+				self.logger.threaddebug(u'Received beacon from ' + RPFramework.RPFrameworkUtils.to_unicode(address) + u': ' + RPFramework.RPFrameworkUtils.to_unicode(tivoBeacon))
+				self.pluginPrefs[u'tivoDiscoveryCache'] = self.tivoDiscoveryCache.toJson()
+			self.updateMovedTiVoDevices(changedAddresses)
+		except:
+			self.exceptionLog()
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine returns the address at which to reach a device's TiVo: the address
+	# last discovered for its TCD ID or, if not known, the address configured
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def resolveTiVoAddress(self, tcdId, configuredAddress):
+		if tcdId == u'':
+			return configuredAddress
+		return self.tivoDiscoveryCache.getAddress(tcdId) or configuredAddress
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine handles the plugin-specific commands placed on the plugin command queue
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def handleUnknownPluginCommand(self, rpCommand, reQueueCommandsList):
+		if rpCommand.commandName == tivoNowPlaying.CMD_REFRESH_NOWPLAYING:
+			# the payload is (DeviceID, DeviceInstanceIdentifier); a refresh scheduled for a
+			# device since stopped or restarted is dropped
+			refreshDevice = self.managedDevices.get(rpCommand.commandPayload[0], None)
+			if not (refreshDevice is None) and refreshDevice.deviceInstanceIdentifier == rpCommand.commandPayload[1]:
+				refreshDevice.refreshNowPlaying()
 		
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	# This routine may be used by plugins to perform any upgrades specific to the plugin;
@@ -0,0 +1,605 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# TiVo Network Remote Control by RogueProeliator <rp@rogueproeliator.com>
+# 	See plugin.py for more plugin details and information; this module finds the TiVos
+#	on the network using the TiVo Connect Discovery (TCD) beacons
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Python imports
+#/////////////////////////////////////////////////////////////////////////////////////////
+import errno
+import fcntl
+import json
+import os
+import random
+import re
+import select
+import socket
+import struct
+import threading
+import time
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Constants and configuration variables
+#/////////////////////////////////////////////////////////////////////////////////////////
+TIVO_BEACON_PORT = 2190
+TIVO_DISCOVERY_BROADCASTADDRESS = '255.255.255.255'
+
+# the listening phase ends once no TiVo has replied for the quiet timeout (or the shorter
+# expected timeout once every expected TiVo has replied) and never runs beyond the maximum
+TIVO_DISCOVERY_QUIETTIMEOUT = 1.0
+TIVO_DISCOVERY_EXPECTEDTIMEOUT = 0.25
+TIVO_DISCOVERY_MAXLISTENTIME = 5.0
+
+# the time allowed to exchange beacons with a single TiVo (connect, send and receive)
+TIVO_BEACON_TIMEOUT = 2.0
+
+# cached TiVos are served as-is for the time to live, after which a re-scan is called for
+# and their names and versions are re-probed; TiVos not seen for the expiry are dropped
+TIVO_DISCOVERYCACHE_TIMETOLIVE = 3600.0
+TIVO_DISCOVERYCACHE_EXPIRY = 30.0 * 86400.0
+
+# beacon template for use when finding TiVo devices or for when attempting to get more
+# information about them (name/version)
+ANNOUNCE = """tivoconnect=1
+method=%(method)s
+platform=pc
+identity=remote-%(port)x
+services=TiVoMediaServer:%(port)d/http
+"""
+
+TIVO_TCDID_REGEX = re.compile('TiVo_TCD_ID: (.*)\r\n')
+TIVO_BEACON_IDENTITY_REGEX = re.compile('identity=(.*)\n')
+TIVO_BEACON_MACHINE_REGEX = re.compile('machine=(.*)\n')
+TIVO_BEACON_SWVERSION_REGEX = re.compile('swversion=(\d*.\d*)')
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Beacon parsing routines
+#/////////////////////////////////////////////////////////////////////////////////////////
+#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+# Returns True if the TCD ID is that of a TiVo supported by the plugin; only series 3 &
+# 4 TiVos are supported (other applications, such as TiVo Desktop, identify themselves
+# by a GUID rather than a TCD ID)
+#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+def isSupportedTiVo(tcdId):
+	return len(tcdId) > 0 and '6' <= tcdId[0] <= '9' and tcdId[:3] != '649'
+
+#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+# Returns the name and software version from a TiVo's beacon; the address and version
+# 0.0 are returned if the beacon could not be received or parsed
+#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+def getTiVoNameAndVersion(address, tivoBeacon):
+	if tivoBeacon is None:
+		return (address, 0.0)
+	machineNames = TIVO_BEACON_MACHINE_REGEX.findall(tivoBeacon)
+	swVersions = TIVO_BEACON_SWVERSION_REGEX.findall(tivoBeacon)
+	try:
+		return (machineNames[0], float(swVersions[0]))
+	except (IndexError, ValueError):
+		return (address, 0.0)
+
+
+#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+# Returns the TCD ID from the identity= line of a beacon, or None if it has none; newer
+# TiVo software prefixes the TCD ID with tsn: which is removed
+#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+def getTiVoBeaconIdentity(tivoBeacon):
+	identities = TIVO_BEACON_IDENTITY_REGEX.findall(tivoBeacon)
+	if len(identities) == 0:
+		return None
+	tcdId = identities[0].strip()
+	if tcdId[:4].lower() == 'tsn:':
+		tcdId = tcdId[4:].strip()
+	return tcdId
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# TiVoBeaconExchange
+#	A non-blocking, connected exchange of beacons with a single TiVo; the exchange is
+#	driven by the caller's select loop and must complete before its deadline
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class TiVoBeaconExchange(object):
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor begins the connection to the TiVo
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self, address, beaconPort=TIVO_BEACON_PORT, timeout=TIVO_BEACON_TIMEOUT):
+		self.address = address
+		self.deadline = time.time() + timeout
+		self.isConnected = False
+		self.isComplete = False
+		self.tivoBeacon = None
+
+		ourBeacon = ANNOUNCE % {u'method': u'connected', u'port': 0}
+		self.sendBuffer = struct.pack('!I', len(ourBeacon)) + ourBeacon
+		self.receiveBuffer = ''
+		self.beaconLength = None
+
+		self.exchangeSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.exchangeSocket.setblocking(0)
+		connectResult = self.exchangeSocket.connect_ex((address, beaconPort))
+		if not connectResult in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+			self.exchangeSocket.close()
+			raise socket.error(connectResult, os.strerror(connectResult))
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Allows the exchange to be passed to select directly
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def fileno(self):
+		return self.exchangeSocket.fileno()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns True while our beacon has not been completely sent
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def wantsWrite(self):
+		return len(self.sendBuffer) > 0
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Called when the socket is writable; completes the connection and sends our beacon
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def handleWritable(self):
+		if self.isConnected == False:
+			connectError = self.exchangeSocket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+			if connectError != 0:
+				raise socket.error(connectError, os.strerror(connectError))
+			self.isConnected = True
+		bytesSent = self.exchangeSocket.send(self.sendBuffer)
+		self.sendBuffer = self.sendBuffer[bytesSent:]
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Called when the socket is readable; receives the length-prefixed TiVo beacon
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def handleReadable(self):
+		receivedData = self.exchangeSocket.recv(4096)
+		if receivedData == '':
+			raise EOFError(u'Connection closed before the beacon was received')
+		self.receiveBuffer += receivedData
+
+		if self.beaconLength is None and len(self.receiveBuffer) >= 4:
+			self.beaconLength = struct.unpack('!I', self.receiveBuffer[:4])[0]
+			self.receiveBuffer = self.receiveBuffer[4:]
+		if not (self.beaconLength is None) and len(self.receiveBuffer) >= self.beaconLength:
+			self.tivoBeacon = self.receiveBuffer[:self.beaconLength]
+			self.isComplete = True
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Closes the connection to the TiVo
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def close(self):
+		try:
+			self.exchangeSocket.close()
+		except:
+			pass
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# TiVoDiscovery
+#	Broadcasts the TCD announcement and collects the TiVos which reply; the beacon
+#	exchanges used to find each TiVo's name and version are started as soon as it replies
+#	and run concurrently with each other and with the listening, each with its own
+#	deadline
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class TiVoDiscovery(object):
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor allows overriding the broadcast address, beacon port and timeouts
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self, broadcastAddress=TIVO_DISCOVERY_BROADCASTADDRESS, beaconPort=TIVO_BEACON_PORT, beaconTimeout=TIVO_BEACON_TIMEOUT):
+		self.broadcastAddress = broadcastAddress
+		self.beaconPort = beaconPort
+		self.beaconTimeout = beaconTimeout
+		self.beaconExchanges = dict()
+		self.tivoBeacons = dict()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Finds the TiVos on the network, returning a list of (tcdId, address, tivoBeacon)
+	# tuples where the beacon is None if it could not be received. Listening ends early
+	# once each of the expected addresses (e.g. those already configured) has replied.
+	# Beacons are not exchanged with the known TiVos (a dictionary of TCD ID to address)
+	# which reply from their known address
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def discoverTiVos(self, expectedAddresses=None, knownTiVos=None):
+		# we must setup a listening server in order to listen for the TiVo returns, but
+		# the port does not matter... find an available one
+		listenSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		attempts = 0
+		while True:
+			port = random.randint(0x8000, 0xffff)
+			try:
+				listenSocket.bind(('', port))
+				break
+			except socket.error:
+				attempts += 1
+				if attempts == 7:
+					# can't bind to a port... return an empty list
+					listenSocket.close()
+					return []
+		listenSocket.listen(50)
+
+		# broadcast an announcement so that the TiVos will respond
+		try:
+			announceSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+			announceSocket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+			announceSocket.sendto(ANNOUNCE % {u'method': u'broadcast', u'port': port}, (self.broadcastAddress, self.beaconPort))
+			announceSocket.close()
+		except socket.error:
+			listenSocket.close()
+			return []
+
+		expectedAddresses = set([address for address in (expectedAddresses or []) if address != u''])
+		awaitingExpected = len(expectedAddresses) > 0
+		discoveredTiVos = []
+		listenDeadline = time.time() + TIVO_DISCOVERY_MAXLISTENTIME
+		quietDeadline = time.time() + TIVO_DISCOVERY_QUIETTIMEOUT
+		while not (listenSocket is None) or len(self.beaconExchanges) > 0:
+			if not (listenSocket is None) and time.time() >= min(quietDeadline, listenDeadline):
+				listenSocket.close()
+				listenSocket = None
+				continue
+
+			waitDeadline = self.expireBeaconExchanges()
+			if not (listenSocket is None):
+				waitDeadline = min(waitDeadline, quietDeadline, listenDeadline)
+			readSockets = self.beaconExchanges.values()
+			if not (listenSocket is None):
+				readSockets = readSockets + [listenSocket]
+			if len(readSockets) == 0:
+				continue
+
+			try:
+				(readableSockets, writableSockets, errorSockets) = select.select(readSockets, [beaconExchange for beaconExchange in self.beaconExchanges.values() if beaconExchange.wantsWrite()], [], max(0.0, waitDeadline - time.time()))
+			except select.error, e:
+				if e.args[0] == errno.EINTR:
+					continue
+				raise
+			self.serviceBeaconExchanges([readableSocket for readableSocket in readableSockets if not (readableSocket is listenSocket)], writableSockets)
+
+			# collect the queries made in response; these return quickly
+			if not (listenSocket is None) and listenSocket in readableSockets:
+				(tcdId, address) = self.acceptTiVoReply(listenSocket)
+				if not (tcdId is None) and isSupportedTiVo(tcdId) and not (tcdId in [discoveredTiVo[0] for discoveredTiVo in discoveredTiVos]):
+					discoveredTiVos.append((tcdId, address))
+					if knownTiVos is None or knownTiVos.get(tcdId, None) != address:
+						self.startBeaconExchange(address)
+					expectedAddresses.discard(address)
+				quietDeadline = time.time() + (TIVO_DISCOVERY_EXPECTEDTIMEOUT if awaitingExpected == True and len(expectedAddresses) == 0 else TIVO_DISCOVERY_QUIETTIMEOUT)
+
+		return [(tcdId, address, self.tivoBeacons.get(address, None)) for (tcdId, address) in discoveredTiVos]
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Exchanges beacons with each of the addresses concurrently, returning a dictionary
+	# of the beacons received by address (None where no beacon could be received)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def exchangeBeacons(self, addresses):
+		for address in addresses:
+			self.startBeaconExchange(address)
+		while len(self.beaconExchanges) > 0:
+			waitDeadline = self.expireBeaconExchanges()
+			if len(self.beaconExchanges) == 0:
+				break
+			try:
+				(readableSockets, writableSockets, errorSockets) = select.select(self.beaconExchanges.values(), [beaconExchange for beaconExchange in self.beaconExchanges.values() if beaconExchange.wantsWrite()], [], max(0.0, waitDeadline - time.time()))
+			except select.error, e:
+				if e.args[0] == errno.EINTR:
+					continue
+				raise
+			self.serviceBeaconExchanges(readableSockets, writableSockets)
+		return dict([(address, self.tivoBeacons.get(address, None)) for address in addresses])
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Begins the beacon exchange with the TiVo at the address unless one has already
+	# been made
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def startBeaconExchange(self, address):
+		if address in self.beaconExchanges or address in self.tivoBeacons:
+			return
+		try:
+			self.beaconExchanges[address] = TiVoBeaconExchange(address, self.beaconPort, self.beaconTimeout)
+		except socket.error:
+			self.tivoBeacons[address] = None
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Abandons the beacon exchanges which have passed their deadline; returns the
+	# earliest deadline of those remaining
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def expireBeaconExchanges(self):
+		currentTime = time.time()
+		earliestDeadline = currentTime + TIVO_DISCOVERY_MAXLISTENTIME
+		for beaconExchange in self.beaconExchanges.values():
+			if currentTime >= beaconExchange.deadline:
+				self.finishBeaconExchange(beaconExchange)
+			else:
+				earliestDeadline = min(earliestDeadline, beaconExchange.deadline)
+		return earliestDeadline
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Processes the beacon exchanges which select reported as ready
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def serviceBeaconExchanges(self, readableExchanges, writableExchanges):
+		for (beaconExchanges, serviceRoutine) in [(writableExchanges, TiVoBeaconExchange.handleWritable), (readableExchanges, TiVoBeaconExchange.handleReadable)]:
+			for beaconExchange in beaconExchanges:
+				if not (self.beaconExchanges.get(beaconExchange.address, None) is beaconExchange):
+					continue
+				try:
+					serviceRoutine(beaconExchange)
+				except (socket.error, EOFError):
+					self.finishBeaconExchange(beaconExchange)
+					continue
+				if beaconExchange.isComplete == True:
+					self.finishBeaconExchange(beaconExchange)
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Records the result of the beacon exchange and closes its connection
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def finishBeaconExchange(self, beaconExchange):
+		beaconExchange.close()
+		del self.beaconExchanges[beaconExchange.address]
+		self.tivoBeacons[beaconExchange.address] = beaconExchange.tivoBeacon
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Accepts a TiVo's reply to the announcement, returning its (tcdId, address); the TCD
+	# ID is None if the reply could not be read
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def acceptTiVoReply(self, listenSocket):
+		try:
+			(clientSocket, address) = listenSocket.accept()
+		except socket.error:
+			return (None, None)
+		try:
+			clientSocket.settimeout(TIVO_DISCOVERY_QUIETTIMEOUT)
+			message = clientSocket.recv(1500)
+		except socket.error:
+			message = ''
+		finally:
+			clientSocket.close()
+		tcdIds = TIVO_TCDID_REGEX.findall(message)
+		if len(tcdIds) == 0:
+			return (None, address[0])
+		return (tcdIds[0], address[0])
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# TiVoDiscoveryCache
+#	The TiVos found by discovery keyed by their TCD ID, holding the address, machine
+#	name, software version and when each was last seen and probed; the cache may be
+#	saved as JSON (e.g. to the plugin prefs) so that it survives restarts
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class TiVoDiscoveryCache(object):
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor allows overriding the time to live and expiry of the cached TiVos
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self, timeToLive=TIVO_DISCOVERYCACHE_TIMETOLIVE, expiryTime=TIVO_DISCOVERYCACHE_EXPIRY):
+		self.timeToLive = timeToLive
+		self.expiryTime = expiryTime
+		self.cachedTiVos = dict()
+		self.lastRefresh = 0.0
+		self.hasUnsavedChanges = False
+		self.cacheLock = threading.Lock()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Loads the cache from its saved JSON; invalid or missing JSON leaves the cache empty
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def loadJson(self, cacheJson):
+		try:
+			savedCache = json.loads(cacheJson)
+			cachedTiVos = dict([(tcdId, dict(cachedTiVo)) for (tcdId, cachedTiVo) in savedCache[u'tivos'].items()])
+			lastRefresh = float(savedCache[u'lastRefresh'])
+		except (TypeError, ValueError, KeyError, AttributeError):
+			return
+		with self.cacheLock:
+			self.cachedTiVos = cachedTiVos
+			self.lastRefresh = lastRefresh
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the cache as JSON for saving
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def toJson(self):
+		with self.cacheLock:
+			self.hasUnsavedChanges = False
+			return json.dumps({u'lastRefresh': self.lastRefresh, u'tivos': self.cachedTiVos})
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns True if no discovery has populated the cache
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def isEmpty(self):
+		return self.lastRefresh == 0.0
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns True if the last discovery completed within the given number of seconds
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def isRefreshedWithin(self, refreshInterval):
+		return time.time() - self.lastRefresh < refreshInterval
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns a list of (tcdId, address, machineName, swVersion) for the cached TiVos
+	# ordered by name
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getTiVos(self):
+		with self.cacheLock:
+			cachedTiVos = [(tcdId, cachedTiVo[u'address'], cachedTiVo[u'machineName'], cachedTiVo[u'swVersion']) for (tcdId, cachedTiVo) in self.cachedTiVos.items()]
+		return sorted(cachedTiVos, key=lambda cachedTiVo: (cachedTiVo[2].lower(), cachedTiVo[1]))
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns a dictionary of TCD ID to address for the TiVos whose name and version were
+	# probed within the time to live (and so need not be probed again)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getFreshTiVos(self):
+		probedSince = time.time() - self.timeToLive
+		with self.cacheLock:
+			return dict([(tcdId, cachedTiVo[u'address']) for (tcdId, cachedTiVo) in self.cachedTiVos.items() if cachedTiVo[u'lastProbed'] > probedSince])
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the cached address of the TiVo with the TCD ID, or None if it is unknown
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getAddress(self, tcdId):
+		with self.cacheLock:
+			cachedTiVo = self.cachedTiVos.get(tcdId, None)
+			return None if cachedTiVo is None else cachedTiVo[u'address']
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the TCD ID of the cached TiVo at the address, or None if there is none
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getTcdId(self, address):
+		with self.cacheLock:
+			for (tcdId, cachedTiVo) in self.cachedTiVos.items():
+				if cachedTiVo[u'address'] == address:
+					return tcdId
+		return None
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Updates the cache with the TiVos found by a discovery (as returned by discoverTiVos)
+	# or with beacons heard by the listener, which do not count as a full refresh;
+	# returns a list of (tcdId, address) for the cached TiVos whose address changed
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def updateTiVos(self, discoveredTiVos, isRefresh=True):
+		currentTime = time.time()
+		changedAddresses = []
+		with self.cacheLock:
+			for (tcdId, address, tivoBeacon) in discoveredTiVos:
+				cachedTiVo = self.cachedTiVos.get(tcdId, None)
+				if cachedTiVo is None:
+					cachedTiVo = {u'address': address, u'machineName': address, u'swVersion': 0.0, u'lastSeen': currentTime, u'lastProbed': 0.0}
+					self.cachedTiVos[tcdId] = cachedTiVo
+					self.hasUnsavedChanges = True
+				elif cachedTiVo[u'address'] != address:
+					changedAddresses.append((tcdId, address))
+					cachedTiVo[u'address'] = address
+					self.hasUnsavedChanges = True
+
+				cachedTiVo[u'lastSeen'] = currentTime
+				if not (tivoBeacon is None):
+					tivoNameAndVersion = getTiVoNameAndVersion(address, tivoBeacon)
+					if tivoNameAndVersion != (cachedTiVo[u'machineName'], cachedTiVo[u'swVersion']):
+						(cachedTiVo[u'machineName'], cachedTiVo[u'swVersion']) = tivoNameAndVersion
+						self.hasUnsavedChanges = True
+					cachedTiVo[u'lastProbed'] = currentTime
+
+			for (tcdId, cachedTiVo) in self.cachedTiVos.items():
+				if currentTime - cachedTiVo[u'lastSeen'] > self.expiryTime:
+					del self.cachedTiVos[tcdId]
+					self.hasUnsavedChanges = True
+			if isRefresh == True:
+				self.lastRefresh = currentTime
+				self.hasUnsavedChanges = True
+		return changedAddresses
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# TiVoBeaconListener
+#	Listens for the beacons which TiVos broadcast periodically on the beacon port and
+#	passes those of supported TiVos to the callback as (tcdId, address, tivoBeacon); the
+#	listener runs on its own (daemon) thread until stopped
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class TiVoBeaconListener(object):
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor binds the beacon port; raises socket.error should the port be in use
+	# by an application which does not share it
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self, beaconCallback, beaconPort=TIVO_BEACON_PORT, listenAddress=''):
+		self.beaconCallback = beaconCallback
+		self.beaconsReceived = 0
+
+		self.listenSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.listenSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		if hasattr(socket, 'SO_REUSEPORT'):
+			self.listenSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+		try:
+			self.listenSocket.bind((listenAddress, beaconPort))
+		except socket.error:
+			self.listenSocket.close()
+			raise
+		self.listenSocket.setblocking(0)
+
+		self.wakeupPipe = os.pipe()
+		for pipeDescriptor in self.wakeupPipe:
+			fcntl.fcntl(pipeDescriptor, fcntl.F_SETFL, fcntl.fcntl(pipeDescriptor, fcntl.F_GETFL) | os.O_NONBLOCK)
+		self.stopRequested = False
+		self.listenerThread = threading.Thread(target=self.runListener, name=u'TiVoBeaconListener')
+		self.listenerThread.daemon = True
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the port on which beacons are received
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getPort(self):
+		return self.listenSocket.getsockname()[1]
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Starts the listener thread
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def startListener(self):
+		self.listenerThread.start()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Stops the listener thread, waiting up to the timeout for it to exit
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def stopListener(self, timeout=5.0):
+		self.stopRequested = True
+		try:
+			os.write(self.wakeupPipe[1], 'x')
+		except OSError:
+			pass
+		if self.listenerThread.isAlive() == True:
+			self.listenerThread.join(timeout)
+		else:
+			self.closeListener()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Receives beacons until stopped; the callback is made on the listener thread
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def runListener(self):
+		try:
+			while self.stopRequested == False:
+				try:
+					readableSockets = select.select([self.listenSocket, self.wakeupPipe[0]], [], [])[0]
+				except select.error, e:
+					if e.args[0] == errno.EINTR:
+						continue
+					raise
+				if self.listenSocket in readableSockets:
+					self.readBeacons()
+		finally:
+			self.closeListener()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Reads every beacon waiting on the socket and passes those of supported TiVos to the
+	# callback; beacons from other applications (e.g. TiVo Desktop) are ignored
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def readBeacons(self):
+		while True:
+			try:
+				(tivoBeacon, senderAddress) = self.listenSocket.recvfrom(4096)
+			except socket.error, e:
+				if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+					return
+				raise
+			tcdId = getTiVoBeaconIdentity(tivoBeacon)
+			if not (tcdId is None) and isSupportedTiVo(tcdId):
+				self.beaconsReceived += 1
+				self.beaconCallback(tcdId, senderAddress[0], tivoBeacon)
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Closes the socket and wake-up pipe
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def closeListener(self):
+		self.listenSocket.close()
+		for pipeDescriptor in self.wakeupPipe:
+			try:
+				os.close(pipeDescriptor)
+			except OSError:
+				pass
@@ -0,0 +1,243 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# TiVo Network Remote Control by RogueProeliator <rp@rogueproeliator.com>
+# 	See plugin.py for more plugin details and information; this module reads the TiVo's
+#	Now Playing list (its recordings) via the TiVoConnect QueryContainer HTTPS request,
+#	authenticated by the TiVo's Media Access Key (MAK)
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Python imports
+#/////////////////////////////////////////////////////////////////////////////////////////
+import collections
+import time
+import xml.etree.cElementTree
+
+import indigo
+import RPFramework
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Constants and configuration variables
+#/////////////////////////////////////////////////////////////////////////////////////////
+CMD_REFRESH_NOWPLAYING = u'REFRESHNOWPLAYING'
+
+GUI_CONFIG_NOWPLAYING_REFRESHINTERVAL = u'nowPlayingRefreshInterval'
+GUI_CONFIG_NOWPLAYING_STARTUPDELAY = u'nowPlayingStartupDelay'
+GUI_CONFIG_NOWPLAYING_PAGESIZE = u'nowPlayingPageSize'
+
+# the TiVo serves TiVoConnect over HTTPS, with digest authentication as the user "tivo"
+# and the MAK as the password
+TIVO_NOWPLAYING_PORT = 443
+TIVO_NOWPLAYING_PATH = u'/TiVoConnect'
+TIVO_NOWPLAYING_USERNAME = u'tivo'
+
+# the time allowed to connect to the TiVo and between reads of a page of the list
+TIVO_NOWPLAYING_CONNECTTIMEOUT = 10.0
+TIVO_NOWPLAYING_READTIMEOUT = 30.0
+
+# the list is read again from the start should it change while being paged through, up
+# to this many times
+TIVO_NOWPLAYING_MAXRESTARTS = 2
+
+NOWPLAYING_STATES = [u'nowPlayingRecordingCount', u'nowPlayingInProgressCount', u'nowPlayingDiskUsed', u'nowPlayingDuration', u'nowPlayingLatestRecording', u'nowPlayingLastRefreshed']
+
+# a single recording in the list, as read from its Details element; the capture time is
+# in seconds since the epoch, the duration in seconds and the size in bytes
+TiVoRecording = collections.namedtuple('TiVoRecording', ['title', 'episodeTitle', 'channel', 'captureTime', 'duration', 'sourceSize', 'inProgress'])
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Now Playing parsing routines
+#/////////////////////////////////////////////////////////////////////////////////////////
+#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+# Parses a page of the Now Playing list as it is read from the stream, calling back with
+# each recording; each item is discarded once read so that only one is held in memory.
+# Returns the total number of items in the list and the number of items on the page
+#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+def parseNowPlayingPage(pageStream, recordingCallback):
+	totalItems = 0
+	itemCount = 0
+	containerElement = None
+	isInItem = False
+	for (parseEvent, element) in xml.etree.cElementTree.iterparse(pageStream, events=('start', 'end')):
+		elementName = element.tag.rpartition('}')[2]
+		if parseEvent == 'start':
+			if containerElement is None:
+				containerElement = element
+			elif elementName == 'Item':
+				isInItem = True
+		elif elementName == 'Item':
+			isInItem = False
+			itemCount += 1
+			tivoRecording = getTiVoRecording(element)
+			if not (tivoRecording is None):
+				recordingCallback(tivoRecording)
+			containerElement.clear()
+		elif elementName == 'TotalItems' and isInItem == False:
+			totalItems = int(element.text or 0)
+	return (totalItems, itemCount)
+
+#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+# Returns the recording described by an Item element of the list, or None should the
+# item be a folder rather than a recording
+#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+def getTiVoRecording(itemElement):
+	itemDetails = {}
+	for itemChild in itemElement:
+		if itemChild.tag.rpartition('}')[2] == 'Details':
+			for detailElement in itemChild:
+				itemDetails[detailElement.tag.rpartition('}')[2]] = detailElement.text or ''
+	if itemDetails.get('ContentType', '').startswith('x-tivo-container'):
+		return None
+
+	captureTime = 0
+	if itemDetails.get('CaptureDate', '') != '':
+		captureTime = int(itemDetails['CaptureDate'], 16)
+	return TiVoRecording(itemDetails.get('Title', u''), itemDetails.get('EpisodeTitle', u''), itemDetails.get('SourceChannel', u''), captureTime, int(itemDetails.get('Duration', '') or 0) / 1000, int(itemDetails.get('SourceSize', '') or 0), itemDetails.get('InProgress', '') == 'Yes')
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# TiVoNowPlayingSummary
+#	Totals of the recordings in the Now Playing list, accumulated as each recording is
+#	read so that the list itself need not be kept
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class TiVoNowPlayingSummary(object):
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor creates the summary of an empty list
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self):
+		self.recordingCount = 0
+		self.inProgressCount = 0
+		self.totalSize = 0
+		self.totalDuration = 0
+		self.latestRecording = None
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Adds a recording read from the list to the totals
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def addRecording(self, tivoRecording):
+		self.recordingCount += 1
+		if tivoRecording.inProgress == True:
+			self.inProgressCount += 1
+		self.totalSize += tivoRecording.sourceSize
+		self.totalDuration += tivoRecording.duration
+		if self.latestRecording is None or tivoRecording.captureTime > self.latestRecording.captureTime:
+			self.latestRecording = tivoRecording
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the device state values for the totals as (key, value) pairs; the disk used
+	# is in GB and the duration in hours
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getDeviceStates(self):
+		latestRecordingTitle = u''
+		if not (self.latestRecording is None):
+			latestRecordingTitle = RPFramework.RPFrameworkUtils.to_unicode(self.latestRecording.title)
+			if self.latestRecording.episodeTitle != u'':
+				latestRecordingTitle += u' - ' + RPFramework.RPFrameworkUtils.to_unicode(self.latestRecording.episodeTitle)
+		return [(u'nowPlayingRecordingCount', self.recordingCount), (u'nowPlayingInProgressCount', self.inProgressCount), (u'nowPlayingDiskUsed', round(self.totalSize / 1000000000.0, 1)), (u'nowPlayingDuration', round(self.totalDuration / 3600.0, 1)), (u'nowPlayingLatestRecording', latestRecordingTitle)]
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# TiVoNowPlayingDevice
+#	Reads the Now Playing list of a TiVo device's TiVo, updating the TiVo device's states
+#	with its totals. Requests are made by the RESTful device's processing thread through
+#	its (kept-alive, digest authenticated) HTTP session; the thread runs only while a
+#	refresh is being made
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class TiVoNowPlayingDevice(RPFramework.RPFrameworkRESTfulDevice.RPFrameworkRESTfulDevice):
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor called by the TiVo device whose Now Playing list is to be read
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self, plugin, device, tivoDevice):
+		super(TiVoNowPlayingDevice, self).__init__(plugin, device)
+		self.tivoDevice = tivoDevice
+		self.nowPlayingPort = TIVO_NOWPLAYING_PORT
+		self.nowPlayingPageSize = int(plugin.getGUIConfigValue(device.deviceTypeId, GUI_CONFIG_NOWPLAYING_PAGESIZE, u'50'))
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine returns the address of the TiVo's TiVoConnect service
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getRESTfulDeviceAddress(self):
+		return (self.tivoDevice.getDeviceAddressInfo()[0], self.nowPlayingPort)
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine handles the refresh command on the processing thread, scheduling the
+	# next refresh and ending the thread once it completes
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def handleUnmanagedCommandInQueue(self, deviceHTTPAddress, rpCommand):
+		if rpCommand.commandName == CMD_REFRESH_NOWPLAYING:
+			try:
+				self.refreshNowPlaying(deviceHTTPAddress)
+			except Exception, e:
+				self.hostPlugin.logger.error(u'Unable to read the Now Playing list of ' + RPFramework.RPFrameworkUtils.to_unicode(self.indigoDevice.name) + u': ' + RPFramework.RPFrameworkUtils.to_unicode(e))
+			if self.isCommunicationsStopRequested() == False:
+				self.tivoDevice.scheduleNowPlayingRefresh()
+			self.requestCommunicationsStop()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine reads the Now Playing list a page at a time and updates the device's
+	# states with its totals; the states are left unchanged if the refresh is stopped
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def refreshNowPlaying(self, deviceHTTPAddress):
+		nowPlayingUrl = u'https://' + deviceHTTPAddress[0] + u':' + RPFramework.RPFrameworkUtils.to_unicode(deviceHTTPAddress[1]) + TIVO_NOWPLAYING_PATH
+		authenticationParam = self.getHTTPAuthentication(u'digest', TIVO_NOWPLAYING_USERNAME, self.indigoDevice.pluginProps.get(u'tivoMAK', u''))
+		nowPlayingSummary = self.readNowPlayingList(nowPlayingUrl, authenticationParam)
+		if nowPlayingSummary is None:
+			return
+
+		self.hostPlugin.logger.debug(u'Read ' + RPFramework.RPFrameworkUtils.to_unicode(nowPlayingSummary.recordingCount) + u' recording(s) from the Now Playing list of ' + RPFramework.RPFrameworkUtils.to_unicode(self.indigoDevice.name))
+		for (stateName, stateValue) in nowPlayingSummary.getDeviceStates():
+			self.queueStateUpdate(stateName, stateValue)
+		self.queueStateUpdate(u'nowPlayingLastRefreshed', time.strftime(u'%Y-%m-%d %H:%M:%S'))
+		self.flushStateUpdates()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine pages through the Now Playing list, streaming each page through the
+	# parser, and returns the summary of its recordings (None if stopped part way). The
+	# list is read again should its length change between pages
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def readNowPlayingList(self, nowPlayingUrl, authenticationParam):
+		listRestarts = 0
+		nowPlayingSummary = TiVoNowPlayingSummary()
+		anchorOffset = 0
+		listLength = None
+		while self.isCommunicationsStopRequested() == False:
+			queryParams = {u'Command': u'QueryContainer', u'Container': u'/NowPlaying', u'Recurse': u'Yes', u'ItemCount': self.nowPlayingPageSize, u'AnchorOffset': anchorOffset}
+			responseObj = self.getHTTPSession().get(nowPlayingUrl, params=queryParams, auth=authenticationParam, verify=False, stream=True, timeout=(TIVO_NOWPLAYING_CONNECTTIMEOUT, TIVO_NOWPLAYING_READTIMEOUT))
+			try:
+				if responseObj.status_code == 401:
+					raise IOError(u'401 - Unauthorized; please check the Media Access Key')
+				elif responseObj.status_code != 200:
+					raise IOError(u'HTTP status ' + RPFramework.RPFrameworkUtils.to_unicode(responseObj.status_code))
+				responseObj.raw.decode_content = True
+				(totalItems, itemCount) = parseNowPlayingPage(responseObj.raw, nowPlayingSummary.addRecording)
+				
+				# the page has been read to its end, so the connection is kept alive for the
+				# next (closing the response otherwise closes it)
+				responseObj.raw.release_conn()
+			finally:
+				responseObj.close()
+
+			if not (listLength is None) and totalItems != listLength and listRestarts < TIVO_NOWPLAYING_MAXRESTARTS:
+				self.hostPlugin.logger.threaddebug(u'Now Playing list changed while being read; reading again')
+				listRestarts += 1
+				nowPlayingSummary = TiVoNowPlayingSummary()
+				anchorOffset = 0
+				listLength = None
+				continue
+
+			listLength = totalItems
+			anchorOffset += itemCount
+			if itemCount == 0 or anchorOffset >= totalItems:
+				return nowPlayingSummary
+		return None
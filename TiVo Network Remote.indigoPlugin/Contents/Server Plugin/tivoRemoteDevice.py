@@ -23,6 +23,7 @@ import time
 
 import indigo
 import RPFramework
+import tivoNowPlaying
 
 #/////////////////////////////////////////////////////////////////////////////////////////
 #/////////////////////////////////////////////////////////////////////////////////////////
@@ -43,6 +44,40 @@ class TivoRemoteDevice(RPFramework.RPFrameworkTelnetDevice.RPFrameworkTelnetDevi
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	def __init__(self, plugin, device):
 		super(TivoRemoteDevice, self).__init__(plugin, device)
+		self.upgradedDeviceStates.append(u'lastDataReceived')
+		self.upgradedDeviceStates.extend(tivoNowPlaying.NOWPLAYING_STATES)
+		
+		# the Now Playing list is read (when a MAK has been entered) by a RESTful device
+		# created along with the connection
+		self.nowPlayingDevice = None
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine begins communications with the TiVo and, if a MAK has been entered, the
+	# periodic refresh of its Now Playing list
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def initiateCommunications(self, initializeConnect=True):
+		super(TivoRemoteDevice, self).initiateCommunications(initializeConnect)
+		if self.nowPlayingDevice is None and self.indigoDevice.pluginProps.get(u'tivoMAK', u'') != u'':
+			self.nowPlayingDevice = tivoNowPlaying.TiVoNowPlayingDevice(self.hostPlugin, self.indigoDevice, self)
+			self.scheduleNowPlayingRefresh(float(self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, tivoNowPlaying.GUI_CONFIG_NOWPLAYING_STARTUPDELAY, u'10')))
+			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine asks the connection and any Now Playing refresh to stop without waiting
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def requestCommunicationsStop(self):
+		super(TivoRemoteDevice, self).requestCommunicationsStop()
+		if not (self.nowPlayingDevice is None):
+			self.nowPlayingDevice.requestCommunicationsStop()
+			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine waits, up to the timeout overall, for the connection and any Now Playing
+	# refresh to stop
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def waitForCommunicationsStop(self, timeout=RPFramework.RPFrameworkTelnetDevice.RPFrameworkDevice.DEVICE_TERMINATE_TIMEOUT):
+		stopDeadline = time.time() + timeout
+		super(TivoRemoteDevice, self).waitForCommunicationsStop(timeout)
+		if not (self.nowPlayingDevice is None):
+			self.nowPlayingDevice.waitForCommunicationsStop(max(0.0, stopDeadline - time.time()))
 
 
 	#/////////////////////////////////////////////////////////////////////////////////////
@@ -53,6 +88,34 @@ class TivoRemoteDevice(RPFramework.RPFrameworkTelnetDevice.RPFrameworkTelnetDevi
 	# format of (ipAddress/HostName, portNumber)
 	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 	def getDeviceAddressInfo(self):
-		return (self.indigoDevice.pluginProps.get(u'tivoIPAddress', u''), int(self.indigoDevice.pluginProps.get(u'portNumber', u'31339')))
+		tivoAddress = self.hostPlugin.resolveTiVoAddress(self.indigoDevice.pluginProps.get(u'tivoTCDID', u''), self.indigoDevice.pluginProps.get(u'tivoIPAddress', u''))
+		return (tivoAddress, int(self.indigoDevice.pluginProps.get(u'portNumber', u'31339')))
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine is called when the connection times out or fails; a TiVo found via
+	# discovery may have been given a new address, so the discovery is refreshed in the
+	# background ahead of the reconnection attempt -- at most once per reconnection delay
+	# and not at all while the beacon listener is keeping the discovery cache current
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def handleConnectionFailure(self, failureMessage):
+		super(TivoRemoteDevice, self).handleConnectionFailure(failureMessage)
+		if self.indigoDevice.pluginProps.get(u'tivoTCDID', u'') != u'' and self.hostPlugin.tivoBeaconListener is None:
+			self.hostPlugin.queueTiVoDiscoveryRefresh(float(self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_DELAY, u'60')))
+			
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine schedules the next refresh of the Now Playing list on the plugin's
+	# command queue, after the refresh interval unless a delay is given
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def scheduleNowPlayingRefresh(self, refreshDelay=None):
+		if refreshDelay is None:
+			refreshDelay = float(self.hostPlugin.getGUIConfigValue(self.indigoDevice.deviceTypeId, tivoNowPlaying.GUI_CONFIG_NOWPLAYING_REFRESHINTERVAL, u'900'))
+		self.hostPlugin.pluginCommandQueue.putAt(RPFramework.RPFrameworkCommand.RPFrameworkCommand(tivoNowPlaying.CMD_REFRESH_NOWPLAYING, commandPayload=(self.indigoDevice.id, self.deviceInstanceIdentifier)), time.time() + refreshDelay)
+		
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# This routine queues a refresh of the Now Playing list to the Now Playing device
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def refreshNowPlaying(self):
+		if not (self.nowPlayingDevice is None):
+			self.nowPlayingDevice.queueDeviceCommand(RPFramework.RPFrameworkCommand.RPFrameworkCommand(tivoNowPlaying.CMD_REFRESH_NOWPLAYING))
 		
 		
\ No newline at end of file
@@ -0,0 +1,148 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Indigo Stand-In by RogueProeliator <adam.d.ashe@gmail.com>
+# 	A minimal stand-in for the "indigo" module which the Indigo server provides to its
+#	plugins, covering only the parts of the API used by the TiVo Network Remote plugin.
+#	It allows the benchmark suite (tivoRemoteBenchmark.py) to load the plugin outside of
+#	Indigo; it is used only when no "indigo" module is otherwise importable.
+#
+#	Plugin preferences and device properties are plain dictionaries, the server log is
+#	written to the plugin's logger and devices must be added to indigo.devices by the
+#	caller (none are by default). E-mail is not sent.
+#
+#	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# 	SOFTWARE.
+#
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Python imports
+#/////////////////////////////////////////////////////////////////////////////////////////
+import logging
+import os
+import tempfile
+import threading
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Constants and configuration variables
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Indigo adds a level below DEBUG to the standard logging module for its plugins
+if not hasattr(logging, 'THREADDEBUG'):
+	logging.THREADDEBUG = 5
+	logging.addLevelName(logging.THREADDEBUG, 'THREADDEBUG')
+
+	def threaddebug(self, message, *args, **kwargs):
+		if self.isEnabledFor(logging.THREADDEBUG):
+			self._log(logging.THREADDEBUG, message, args, **kwargs)
+	logging.Logger.threaddebug = threaddebug
+
+# the API version reported is that of Indigo 7.4, which checks for plugin updates itself
+# (and so the plugin's own update check makes no network requests)
+INDIGO_APIVERSION = '2.4'
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Indigo's collection types
+#/////////////////////////////////////////////////////////////////////////////////////////
+class Dict(dict):
+	pass
+
+class List(list):
+	pass
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# StandInServer
+#	The indigo.server object: the API version, install folder and server log
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class StandInServer(object):
+
+	def __init__(self):
+		self.apiVersion = INDIGO_APIVERSION
+		self.installFolderPath = os.path.join(tempfile.gettempdir(), 'IndigoStandIn')
+
+	def getInstallFolderPath(self):
+		return self.installFolderPath
+
+	def log(self, message, type=u'', isError=False, level=logging.INFO):
+		logging.getLogger('Plugin').log(logging.ERROR if isError == True else level, message)
+
+	def sendEmailTo(self, emailAddress, subject=u'', body=u''):
+		logging.getLogger('Plugin').debug(u'E-mail to ' + emailAddress + u' not sent: ' + subject)
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# StandInDeviceList
+#	The indigo.devices collection, keyed by device id; iter() lists every device as the
+#	stand-in only ever holds the plugin's own devices
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class StandInDeviceList(dict):
+
+	def iter(self, filter=u''):
+		return iter(self.values())
+
+server = StandInServer()
+devices = StandInDeviceList()
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# PluginBase
+#	The base class of every Indigo plugin; provides the plugin's identity, preferences
+#	and logger along with the concurrent thread's stop request and sleep
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class PluginBase(object):
+
+	class StopThread(Exception):
+		pass
+
+	def __init__(self, pluginId, pluginDisplayName, pluginVersion, pluginPrefs):
+		self.pluginId = pluginId
+		self.pluginDisplayName = pluginDisplayName
+		self.pluginVersion = pluginVersion
+		self.pluginPrefs = pluginPrefs
+		self.debug = False
+
+		self.logger = logging.getLogger('Plugin')
+		self.plugin_file_handler = logging.StreamHandler()
+		self.indigo_log_handler = logging.StreamHandler()
+
+		self.stopThread = False
+		self.stopThreadEvent = threading.Event()
+
+	def sleep(self, seconds):
+		if self.stopThreadEvent.wait(seconds) == True or self.stopThread == True:
+			raise self.StopThread()
+
+	def stopConcurrentThread(self):
+		self.stopThread = True
+		self.stopThreadEvent.set()
+
+	def substitute(self, inputString, validateOnly=False):
+		if validateOnly == True:
+			return (True, u'')
+		return inputString
+
+	def openSerial(self, ownerName, portUrl, **kwargs):
+		import serial
+		return serial.serial_for_url(portUrl, **kwargs)
@@ -0,0 +1,348 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# TiVo Beacon Simulator by RogueProeliator <adam.d.ashe@gmail.com>
+# 	Simulates any number of TiVos answering TiVo Connect Discovery (TCD) on the local
+#	machine for use in benchmarking the plugin's TiVo discovery (findTiVoDevices). Each
+#	TiVo is given its own loopback address (127.0.0.1, 127.0.0.2, ...) as the plugin
+#	identifies TiVos by address; this works as-is on Linux, while macOS requires the
+#	additional addresses be aliased first (sudo ifconfig lo0 alias 127.0.0.2 up).
+#
+#	Each simulated TiVo:
+#		replies to the UDP announcement by connecting to the port advertised in its
+#		services= line and sending a request carrying its TiVo_TCD_ID
+#		answers a connected beacon exchange (on the beacon port of its own address)
+#		with a beacon holding its machine= name and swversion=
+#		broadcasts a beacon (method=broadcast) from its own address when asked to via
+#		broadcastBeacons, as a TiVo does every minute or so
+#	"Hung" TiVos reply to the announcement but never answer the beacon exchange, as a
+#	TiVo which is powering down or unresponsive would.
+#
+#	Usage:
+#		python tivoBeaconSimulator.py --count 10 --hung 1 --port 2190 --latency 20
+#
+#	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# 	SOFTWARE.
+#
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Python imports
+#/////////////////////////////////////////////////////////////////////////////////////////
+import errno
+import fcntl
+import heapq
+import optparse
+import os
+import random
+import re
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Constants and configuration variables
+#/////////////////////////////////////////////////////////////////////////////////////////
+TIVO_BEACON_PORT = 2190
+
+TIVO_ANNOUNCE_SERVICES_REGEX = re.compile('services=TiVoMediaServer:(\d+)/http')
+
+TIVO_DISCOVERY_REQUEST = 'GET /TiVoConnect?Command=QueryContainer&Container=%%2F HTTP/1.0\r\nTiVo_TCD_ID: %(tcdId)s\r\nHost: %(address)s\r\n\r\n'
+TIVO_BEACON = """tivoconnect=1
+swversion=%(swVersion)s
+method=%(method)s
+identity=%(tcdId)s
+machine=%(machineName)s
+platform=tcd/Series4
+services=TiVoMediaServer:80/http
+"""
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# SimulatedBeaconTiVo
+#	The identity of a single simulated TiVo and its beacon exchange listener
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class SimulatedBeaconTiVo(object):
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor allows passing in the TiVo's address, listening socket and whether it
+	# fails to answer beacon exchanges
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self, tivoIndex, address, listenSocket, isHung=False):
+		self.address = address
+		self.listenSocket = listenSocket
+		self.isHung = isHung
+		self.tcdId = '74600019%07X' % (tivoIndex + 1)
+		self.machineName = 'Simulated TiVo %d' % (tivoIndex + 1)
+		self.swVersion = '20.7.4.RC9-USC-11-746'
+		self.announcementsAnswered = 0
+		self.beaconsExchanged = 0
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the length-prefixed beacon sent in a connected beacon exchange
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getBeacon(self):
+		tivoBeacon = TIVO_BEACON % {'swVersion': self.swVersion, 'method': 'connected', 'tcdId': self.tcdId, 'machineName': self.machineName}
+		return struct.pack('!I', len(tivoBeacon)) + tivoBeacon
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the beacon broadcast periodically over UDP (which is not length-prefixed)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getBroadcastBeacon(self):
+		return TIVO_BEACON % {'swVersion': self.swVersion, 'method': 'broadcast', 'tcdId': self.tcdId, 'machineName': self.machineName}
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# TiVoBeaconSimulator
+#	Runs the simulated TiVos from a single select loop; may be run from the command line
+#	or started on a background thread by the benchmark suite
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class TiVoBeaconSimulator(object):
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor; latency and jitter (in seconds) delay each reply. A port of 0 uses an
+	# ephemeral port, found with getPort
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self, count=1, hungCount=0, port=TIVO_BEACON_PORT, latency=0.0, jitter=0.0):
+		self.latency = latency
+		self.jitter = jitter
+
+		# the announcement is received on the first TiVo's address; the plugin sends it to
+		# this address rather than broadcasting when benchmarking
+		self.announceSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.announceSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self.announceSocket.bind(('127.0.0.1', port))
+		self.announceSocket.setblocking(0)
+		self.port = self.announceSocket.getsockname()[1]
+
+		self.tivos = []
+		for tivoIndex in range(0, count):
+			tivoAddress = '127.0.%d.%d' % ((tivoIndex + 1) / 256, (tivoIndex + 1) % 256)
+			listenSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+			listenSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+			listenSocket.bind((tivoAddress, self.port))
+			listenSocket.listen(16)
+			listenSocket.setblocking(0)
+			self.tivos.append(SimulatedBeaconTiVo(tivoIndex, tivoAddress, listenSocket, isHung=(tivoIndex >= count - hungCount)))
+
+		# beacon exchange connections, keyed by socket, hold (tivo, receiveBuffer)
+		self.exchangeConnections = dict()
+		self.scheduledActions = []
+		self.scheduleSequence = 0
+		self.wakeupPipe = os.pipe()
+		for pipeDescriptor in self.wakeupPipe:
+			fcntl.fcntl(pipeDescriptor, fcntl.F_SETFL, fcntl.fcntl(pipeDescriptor, fcntl.F_GETFL) | os.O_NONBLOCK)
+		self.simulatorThread = None
+		self.stopRequested = False
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the port on which the announcement and beacon exchanges are received
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getPort(self):
+		return self.port
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the addresses of the simulated TiVos
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getAddresses(self):
+		return [tivo.address for tivo in self.tivos]
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Sends each TiVo's broadcast beacon to the beacon listener on the given port, from
+	# the TiVo's own address or, to simulate TiVos which have moved, from the addresses
+	# given (in the order of the TiVos)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def broadcastBeacons(self, listenerPort, fromAddresses=None):
+		if fromAddresses is None:
+			fromAddresses = self.getAddresses()
+		for (tivo, fromAddress) in zip(self.tivos, fromAddresses):
+			beaconSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+			try:
+				beaconSocket.bind((fromAddress, 0))
+				beaconSocket.sendto(tivo.getBroadcastBeacon(), ('127.0.0.1', listenerPort))
+			finally:
+				beaconSocket.close()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Starts the simulator on a background (daemon) thread
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def start(self):
+		self.simulatorThread = threading.Thread(target=self.run, name='TiVoBeaconSimulator')
+		self.simulatorThread.daemon = True
+		self.simulatorThread.start()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Stops the simulator and closes all sockets
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def stop(self):
+		self.stopRequested = True
+		try:
+			os.write(self.wakeupPipe[1], 'x')
+		except OSError:
+			pass
+		if not (self.simulatorThread is None):
+			self.simulatorThread.join(5.0)
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Schedules an action to be run after the simulated latency
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def scheduleAction(self, action):
+		actionDelay = max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+		self.scheduleSequence += 1
+		heapq.heappush(self.scheduledActions, (time.time() + actionDelay, self.scheduleSequence, action))
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Runs the simulator until stopped
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def run(self):
+		listenSockets = dict([(tivo.listenSocket, tivo) for tivo in self.tivos])
+		try:
+			while self.stopRequested == False:
+				while len(self.scheduledActions) > 0 and self.scheduledActions[0][0] <= time.time():
+					heapq.heappop(self.scheduledActions)[2]()
+
+				waitTimeout = None
+				if len(self.scheduledActions) > 0:
+					waitTimeout = max(0.0, self.scheduledActions[0][0] - time.time())
+				readSockets = [self.announceSocket, self.wakeupPipe[0]] + listenSockets.keys() + self.exchangeConnections.keys()
+				try:
+					readableSockets = select.select(readSockets, [], [], waitTimeout)[0]
+				except select.error, e:
+					if e.args[0] == errno.EINTR:
+						continue
+					raise
+
+				for readableSocket in readableSockets:
+					if readableSocket is self.announceSocket:
+						self.readAnnouncement()
+					elif readableSocket in listenSockets:
+						self.acceptExchange(listenSockets[readableSocket])
+					elif readableSocket in self.exchangeConnections:
+						self.readExchange(readableSocket)
+		finally:
+			for connectionSocket in [self.announceSocket] + listenSockets.keys() + self.exchangeConnections.keys():
+				connectionSocket.close()
+			for pipeDescriptor in self.wakeupPipe:
+				os.close(pipeDescriptor)
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Reads an announcement; every TiVo replies to the address it was sent from
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def readAnnouncement(self):
+		try:
+			(announcement, senderAddress) = self.announceSocket.recvfrom(4096)
+		except socket.error:
+			return
+		servicesMatch = TIVO_ANNOUNCE_SERVICES_REGEX.search(announcement)
+		if servicesMatch is None:
+			return
+		replyAddress = (senderAddress[0], int(servicesMatch.group(1)))
+		for tivo in self.tivos:
+			self.scheduleAction(lambda tivo=tivo: self.replyToAnnouncement(tivo, replyAddress))
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Connects back to the announcer from the TiVo's address with its TCD ID
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def replyToAnnouncement(self, tivo, replyAddress):
+		replySocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		try:
+			replySocket.settimeout(1.0)
+			replySocket.bind((tivo.address, 0))
+			replySocket.connect(replyAddress)
+			replySocket.sendall(TIVO_DISCOVERY_REQUEST % {'tcdId': tivo.tcdId, 'address': replyAddress[0]})
+			tivo.announcementsAnswered += 1
+		except socket.error:
+			pass
+		finally:
+			replySocket.close()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Accepts a beacon exchange connection to the TiVo
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def acceptExchange(self, tivo):
+		try:
+			(exchangeSocket, clientAddress) = tivo.listenSocket.accept()
+		except socket.error:
+			return
+		exchangeSocket.setblocking(0)
+		self.exchangeConnections[exchangeSocket] = [tivo, '']
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Reads the announcer's beacon; once it has been received the TiVo's beacon is sent
+	# in reply (unless the TiVo is hung) and the connection closed
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def readExchange(self, exchangeSocket):
+		exchangeConnection = self.exchangeConnections[exchangeSocket]
+		try:
+			receivedData = exchangeSocket.recv(4096)
+		except socket.error:
+			receivedData = ''
+		if receivedData == '':
+			del self.exchangeConnections[exchangeSocket]
+			exchangeSocket.close()
+			return
+
+		exchangeConnection[1] += receivedData
+		if len(exchangeConnection[1]) >= 4 and len(exchangeConnection[1]) >= 4 + struct.unpack('!I', exchangeConnection[1][:4])[0]:
+			tivo = exchangeConnection[0]
+			if tivo.isHung == False:
+				self.scheduleAction(lambda: self.sendBeacon(tivo, exchangeSocket))
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Sends the TiVo's beacon and closes the exchange
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def sendBeacon(self, tivo, exchangeSocket):
+		if not (exchangeSocket in self.exchangeConnections):
+			return
+		del self.exchangeConnections[exchangeSocket]
+		try:
+			exchangeSocket.setblocking(1)
+			exchangeSocket.sendall(tivo.getBeacon())
+			tivo.beaconsExchanged += 1
+		except socket.error:
+			pass
+		exchangeSocket.close()
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Command line entry point
+#/////////////////////////////////////////////////////////////////////////////////////////
+def main(argv):
+	optionParser = optparse.OptionParser(usage='%prog [options]')
+	optionParser.add_option('--count', type='int', default=1, help='number of TiVos to simulate [%default]')
+	optionParser.add_option('--hung', type='int', default=0, help='number of those TiVos which never answer a beacon exchange [%default]')
+	optionParser.add_option('--port', type='int', default=TIVO_BEACON_PORT, help='beacon port; 0 for an ephemeral port [%default]')
+	optionParser.add_option('--latency', type='float', default=0.0, help='reply latency in milliseconds [%default]')
+	optionParser.add_option('--jitter', type='float', default=0.0, help='reply latency jitter (+/-) in milliseconds [%default]')
+	(options, args) = optionParser.parse_args(argv)
+
+	simulator = TiVoBeaconSimulator(count=options.count, hungCount=options.hung, port=options.port, latency=options.latency / 1000.0, jitter=options.jitter / 1000.0)
+	sys.stdout.write('LISTENING 127.0.0.1:' + str(simulator.getPort()) + '\n')
+	sys.stdout.flush()
+	try:
+		simulator.run()
+	except KeyboardInterrupt:
+		pass
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,1630 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# TiVo Network Remote Benchmarks by RogueProeliator <adam.d.ashe@gmail.com>
+# 	Benchmark suite for the TiVo Network Remote plugin's communications hot path, run
+#	against the TiVo simulator (tivoRemoteSimulator.py) on the local machine.
+#
+#	Suites:
+#		wire        protocol round-trip and reconnect time using a bare socket client;
+#		            requires only the simulator
+#		latency     end-to-end action (executeAction) to wire latency per I/O engine
+#		macro       time to send a 20-key IR macro, per I/O engine, with the keys sent one
+#		            command at a time and with the keys pipelined
+#		responses   responses/sec end-to-end from the simulator through handleDeviceResponse,
+#		            and the number of state update calls made to the server, per I/O engine
+#		matching    lines/sec through handleDeviceResponse called directly, for channel
+#		            status lines and for a mix including lines matching no response
+#		framing     lines/sec split from a synthetic high-rate stream read in random-sized
+#		            chunks: the line framer alone, the former split of decoded text, serial
+#		            line reads (framed versus the former byte-at-a-time loop) and the
+#		            framed stream processed end-to-end through handleReceivedText
+#		templates   renders/sec of substituteIndigoValues over the format strings found in
+#		            the plugin's RPFrameworkConfig.xml
+#		expressions evaluations/sec of the "eval:" expressions found in RPFrameworkConfig.xml,
+#		            compiled versus substituted into the text and passed to eval
+#		reconnect   time from a dropped connection to the plugin reconnecting, per engine;
+#		            also the spread of reconnections when N TiVos are dropped at once,
+#		            with and without jitter on the reconnection delay
+#		health      time for the plugin to notice a TiVo which has silently dropped off
+#		            the network, while idle and when a key is pressed, per engine and
+#		            with the connection health checks enabled and disabled; traffic is
+#		            black-holed between private network namespaces and so the suite is
+#		            only run on Linux as root (with unshare, ip and tc), else skipped;
+#		            tivoRemoteTests.py checks the detection bounds without root
+#		discovery   time for findTiVoDevices to populate the device dialog with 1, 10 and
+#		            50 TiVos (and 10 with one hung) run by the beacon simulator
+#		            (tivoBeaconSimulator.py), with no TiVos configured and with all of them
+#		            configured, versus looking up each TiVo's name and version in turn;
+#		            also the dialog served from the discovery cache and a cache refresh
+#		ssdp        time to parse 10k synthetic ssdp:all responses (250 devices) with the
+#		            header parser versus the former httplib parse, and with the USN
+#		            de-duplication done as uPnPDiscoverIter receives them; also the time
+#		            to list the UPnP device menu for two device types searching
+#		            different service targets, answered by a local responder
+#		scaling     CPU, wake-ups (voluntary context switches) and threads per second
+#		            for N idle TiVos, per I/O engine (thread-per-device vs reactor)
+#		http        requests/sec of the framework's RESTful device (pooled keep-alive HTTP
+#		            session) against a local HTTP stand-in, over HTTP and HTTPS and with
+#		            digest authentication, versus a new request (and connection) each time;
+#		            HTTPS requires openssl to create the stand-in's certificate
+#		download    a 256MB download by the RESTful device streamed to disk versus read into
+#		            memory as formerly, with the peak memory of each and the time taken by
+#		            a status request queued behind the download; also resuming a download
+#		            dropped half way
+#		conditional status polls/sec and CPU per poll by the RESTful device, with every poll
+#		            processed as formerly, with conditional GETs answered 304 Not Modified
+#		            and with unchanged content detected by its hash (no validators sent);
+#		            also the polls processed and skipped and the state updates made
+#		images      cover art downloaded and resized (to 240x240 and to at most 320 pixels)
+#		            by the RESTful device via the image resizer, with Pillow and with sips
+#		            (where installed): time until the device is notified and whether the
+#		            image had been resized by then; also repeated refreshes of the same
+#		            image answered from the cache, and the former sips shell command
+#		            (Mac OS X only)
+#		nowplaying  time and peak memory to read a Now Playing list of 1000 and 20000
+#		            recordings served a page at a time by the HTTP stand-in (over HTTPS with
+#		            digest authentication, as by a TiVo) and parsed as it streams in, and
+#		            whether the totals read are correct; versus the whole list requested at
+#		            once and parsed into a tree. Requires openssl (as the http suite)
+#		shutdown    time to stop the plugin (stopConcurrentThread, deviceStopComm for each
+#		            device and shutdown, as done by Indigo) with N connected TiVos, per
+#		            I/O engine
+#
+#	All suites except "wire" load the plugin itself and so require the Python 2.7
+#	runtime along with the plugin's own dependencies (requests and pyserial, as bundled
+#	with Indigo). The "indigo" module is the one on the PYTHONPATH if any, else the
+#	minimal stand-in found in indigoStandIn; the suites are skipped, naming the missing
+#	module, should the plugin not load. Each of these suites is run in a process of its
+#	own (so that the peak memory reported is its own); the exit status is non-zero if any
+#	suite failed.
+#
+#	Usage:
+#		python tivoRemoteBenchmark.py [--suite wire,latency,...] [--devices 12] [--duration 10]
+#
+#	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# 	SOFTWARE.
+#
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Python imports
+#/////////////////////////////////////////////////////////////////////////////////////////
+import BaseHTTPServer
+import httplib
+import logging
+import optparse
+import os
+import resource
+import shutil
+import socket
+import SocketServer
+import ssl
+import StringIO
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import urlparse
+import xml.etree.cElementTree
+
+import tivoBeaconSimulator
+import tivoRemoteSimulator
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Constants and configuration variables
+#/////////////////////////////////////////////////////////////////////////////////////////
+PLUGIN_ID = u'com.duncanware.tivoNetworkRemote'
+PLUGIN_DISPLAYNAME = u'TiVo Network Remote Plugin'
+PLUGIN_DEVICETYPEID = u'tivoRemoteDevice'
+TOOLS_PATH = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_SERVERPATH = os.path.join(TOOLS_PATH, os.pardir, u'TiVo Network Remote.indigoPlugin', u'Contents', u'Server Plugin')
+INDIGO_STANDINPATH = os.path.join(TOOLS_PATH, u'indigoStandIn')
+
+IO_ENGINES = [u'polling', u'select', u'reactor']
+MACRO_KEYS = [u'NUM0', u'NUM2', u'NUM5', u'ENTER'] * 5
+HEALTH_NAMESPACE = 'tivoHealth'
+HEALTH_BENCHMARKADDRESS = '10.231.0.1'
+HEALTH_SIMULATORADDRESS = '10.231.0.2'
+DOWNLOAD_CHUNK = os.urandom(65536)
+DOWNLOAD_SIZE = 256 * 1024 * 1024
+IMAGE_SIZE = (1200, 1200)
+STATUS_ETAG = '"702-local"'
+STATUS_POLLACTIONID = u'benchmarkStatusPoll'
+NOWPLAYING_PAGE = '<?xml version="1.0" encoding="utf-8"?>\n<TiVoContainer xmlns="http://www.tivo.com/developer/calypso-protocol-1.6/"><Details><ContentType>x-tivo-container/tivo-videos</ContentType><SourceFormat>x-tivo-container/tivo-dvr</SourceFormat><Title>Now Playing</Title><TotalItems>%d</TotalItems><UniqueId>/NowPlaying</UniqueId></Details><SortOrder>Type,CaptureDate</SortOrder><GlobalSort>Yes</GlobalSort><ItemStart>%d</ItemStart><ItemCount>%d</ItemCount>%s</TiVoContainer>'
+NOWPLAYING_FOLDER = '<Item><Details><ContentType>x-tivo-container/folder</ContentType><SourceFormat>x-tivo-container/tivo-dvr</SourceFormat><Title>Benchmark Folder %d</Title><TotalItems>%d</TotalItems><LastCaptureDate>0x%X</LastCaptureDate></Details><Links><Content><Url>https://127.0.0.1:443/TiVoConnect?Command=QueryContainer&amp;Container=%%2FNowPlaying%%2F%d</Url><ContentType>x-tivo-container/folder</ContentType></Content></Links></Item>'
+NOWPLAYING_ITEM = '<Item><Details><ContentType>video/x-tivo-raw-tts</ContentType><SourceFormat>video/x-tivo-raw-tts</SourceFormat><Title>Benchmark Show %d</Title><SourceSize>%d</SourceSize><Duration>%d</Duration><CaptureDate>0x%X</CaptureDate><EpisodeTitle>Episode %d</EpisodeTitle><Description>A recording served by the benchmark\'s HTTP stand-in to fill out the Now Playing list with a description of typical length.</Description><SourceChannel>702</SourceChannel><SourceStation>BENCH</SourceStation>%s<HighDefinition>Yes</HighDefinition><ProgramId>EP%010d</ProgramId><SeriesId>SH%08d</SeriesId></Details><Links><Content><Url>http://127.0.0.1:80/download/Benchmark%%20Show.TiVo?Container=%%2FNowPlaying&amp;id=%d</Url><ContentType>video/x-tivo-raw-tts</ContentType></Content><TiVoVideoDetails><Url>https://127.0.0.1:443/TiVoVideoDetails?id=%d</Url><ContentType>text/xml</ContentType><AcceptsParams>No</AcceptsParams></TiVoVideoDetails></Links></Item>'
+NOWPLAYING_COUNTS = [1000, 20000]
+BENCHMARK_SUITES = [u'wire', u'latency', u'macro', u'responses', u'matching', u'framing', u'templates', u'expressions', u'reconnect', u'health', u'discovery', u'ssdp', u'scaling', u'http', u'download', u'conditional', u'images', u'nowplaying', u'shutdown']
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Reporting helpers
+#/////////////////////////////////////////////////////////////////////////////////////////
+def percentile(values, percent):
+	if len(values) == 0:
+		return float('nan')
+	sortedValues = sorted(values)
+	return sortedValues[min(len(sortedValues) - 1, int(round((percent / 100.0) * (len(sortedValues) - 1))))]
+
+def reportLine(suiteName, label, value):
+	sys.stdout.write('%-10s %-44s %s\n' % (suiteName, label, value))
+	sys.stdout.flush()
+
+def reportTimings(suiteName, label, timings):
+	if len(timings) == 0:
+		reportLine(suiteName, label, 'no samples')
+	else:
+		reportLine(suiteName, label, 'n=%d p50=%.2fms p95=%.2fms p99=%.2fms max=%.2fms' % (len(timings), percentile(timings, 50) * 1000.0, percentile(timings, 95) * 1000.0, percentile(timings, 99) * 1000.0, max(timings) * 1000.0))
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# SimulatorRecorder
+#	Records the time at which the simulator received connections and commands so that
+#	the benchmarks may wait upon (and time) them
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class SimulatorRecorder(object):
+
+	def __init__(self):
+		self.condition = threading.Condition()
+		self.connectionTimes = []
+		self.commandTimes = []
+
+	def __call__(self, tivo, commandLine, receivedTime):
+		with self.condition:
+			if commandLine is None:
+				self.connectionTimes.append(receivedTime)
+			else:
+				self.commandTimes.append((receivedTime, commandLine))
+			self.condition.notifyAll()
+
+	def waitFor(self, predicate, timeout):
+		deadline = time.time() + timeout
+		with self.condition:
+			while predicate() == False:
+				remainingTime = deadline - time.time()
+				if remainingTime <= 0.0:
+					return False
+				self.condition.wait(remainingTime)
+			return True
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Wire-level suite: requires only the simulator
+#/////////////////////////////////////////////////////////////////////////////////////////
+def readProtocolLine(clientSocket, receiveBuffer):
+	while not (tivoRemoteSimulator.TIVO_LINE_ENDING in receiveBuffer[0]):
+		receivedData = clientSocket.recv(4096)
+		if receivedData == '':
+			raise EOFError('Connection closed by simulator')
+		receiveBuffer[0] += receivedData
+	(responseLine, receiveBuffer[0]) = receiveBuffer[0].split(tivoRemoteSimulator.TIVO_LINE_ENDING, 1)
+	return responseLine
+
+def runWireSuite(options):
+	simulator = tivoRemoteSimulator.TiVoSimulator(count=1, basePort=0, latency=options.latency, jitter=options.jitter)
+	simulator.start()
+	try:
+		port = simulator.getPorts()[0]
+
+		# round-trip time of a channel change (command written to CH_STATUS read)
+		clientSocket = socket.create_connection(('127.0.0.1', port), 5.0)
+		clientSocket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		receiveBuffer = ['']
+		readProtocolLine(clientSocket, receiveBuffer)
+		roundTrips = []
+		for iteration in range(0, options.iterations):
+			startTime = time.time()
+			clientSocket.sendall('SETCH %d\r' % (iteration % 999 + 1))
+			readProtocolLine(clientSocket, receiveBuffer)
+			roundTrips.append(time.time() - startTime)
+		clientSocket.close()
+		reportTimings(u'wire', u'SETCH round-trip', roundTrips)
+
+		# time to re-establish a dropped connection (connect through the first status line)
+		reconnectTimes = []
+		for iteration in range(0, min(options.iterations, 200)):
+			startTime = time.time()
+			clientSocket = socket.create_connection(('127.0.0.1', port), 5.0)
+			readProtocolLine(clientSocket, [''])
+			reconnectTimes.append(time.time() - startTime)
+			clientSocket.close()
+		reportTimings(u'wire', u'connect to first CH_STATUS', reconnectTimes)
+	finally:
+		simulator.stop()
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# BenchmarkIndigoDevice
+#	Stands in for the Indigo server's device object, providing the members used by the
+#	framework's device classes and counting the state update calls made to the server;
+#	serverStates holds the values as last sent to the server
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class BenchmarkIndigoDevice(object):
+
+	def __init__(self, deviceId, port, host=u'127.0.0.1'):
+		self.id = deviceId
+		self.name = u'Benchmark TiVo ' + unicode(deviceId)
+		self.deviceTypeId = PLUGIN_DEVICETYPEID
+		self.pluginProps = {u'tivoIPAddress': unicode(host), u'portNumber': unicode(port), u'updateInterval': u'0'}
+		self.states = {u'isConnected': False, u'connectionState': u'', u'currentChannel': u'', u'channelSelector': u''}
+		self.serverStates = dict(self.states)
+		self.errorState = None
+		self.stateUpdateCount = 0
+		self.serverCallCount = 0
+		self.condition = threading.Condition()
+
+	def updateStateOnServer(self, key, value, uiValue=None, clearErrorState=True, **kwargs):
+		with self.condition:
+			self.states[key] = value
+			self.serverStates[key] = value
+			self.stateUpdateCount += 1
+			self.serverCallCount += 1
+			self.condition.notifyAll()
+
+	def updateStatesOnServer(self, stateList, clearErrorState=True):
+		with self.condition:
+			for stateUpdate in stateList:
+				self.states[stateUpdate[u'key']] = stateUpdate[u'value']
+				self.serverStates[stateUpdate[u'key']] = stateUpdate[u'value']
+			self.stateUpdateCount += len(stateList)
+			self.serverCallCount += 1
+			self.condition.notifyAll()
+
+	def setErrorStateOnServer(self, errorState):
+		self.errorState = errorState
+
+	def stateListOrDisplayStateIdChanged(self):
+		pass
+
+	def replacePluginPropsOnServer(self, pluginProps):
+		self.pluginProps = pluginProps
+
+	def waitFor(self, predicate, timeout):
+		deadline = time.time() + timeout
+		with self.condition:
+			while predicate() == False:
+				remainingTime = deadline - time.time()
+				if remainingTime <= 0.0:
+					return False
+				self.condition.wait(remainingTime)
+			return True
+
+	def waitForState(self, key, value, timeout):
+		return self.waitFor(lambda: self.serverStates.get(key, None) == value, timeout)
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Plugin-level helpers
+#/////////////////////////////////////////////////////////////////////////////////////////
+def loadPluginModule():
+	os.chdir(PLUGIN_SERVERPATH)
+	if not (PLUGIN_SERVERPATH in sys.path):
+		sys.path.insert(0, PLUGIN_SERVERPATH)
+	try:
+		import indigo
+	except ImportError:
+		sys.path.append(INDIGO_STANDINPATH)
+	import plugin
+	return plugin
+
+def createPlugin(pluginModule, ioEngine):
+	import indigo
+	import RPFramework
+	benchmarkPlugin = pluginModule.Plugin(PLUGIN_ID, PLUGIN_DISPLAYNAME, u'benchmark', indigo.Dict())
+	benchmarkPlugin.putGUIConfigValue(PLUGIN_DEVICETYPEID, RPFramework.RPFrameworkTelnetDevice.GUI_CONFIG_TELNETDEV_IOENGINE, ioEngine)
+	return benchmarkPlugin
+
+def startDevices(benchmarkPlugin, ports, timeout=10.0, host=u'127.0.0.1'):
+	benchmarkDevices = []
+	for portIndex in range(0, len(ports)):
+		benchmarkDevice = BenchmarkIndigoDevice(portIndex + 1, ports[portIndex], host)
+		benchmarkPlugin.deviceStartComm(benchmarkDevice)
+		benchmarkDevices.append(benchmarkDevice)
+	for benchmarkDevice in benchmarkDevices:
+		if benchmarkDevice.waitForState(u'connectionState', u'Connected', timeout) == False:
+			raise RuntimeError('Device ' + unicode(benchmarkDevice.id) + ' failed to connect to the simulator')
+
+	# allow the initial status exchange (and its command read timeout) to complete so that
+	# measurements begin with idle devices
+	time.sleep(1.0)
+	return benchmarkDevices
+
+def stopDevices(benchmarkPlugin, benchmarkDevices):
+	for benchmarkDevice in benchmarkDevices:
+		benchmarkPlugin.deviceStopComm(benchmarkDevice)
+	benchmarkPlugin.shutdown()
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# HTTPStandIn
+#	Local HTTP(S) server standing in for a RESTful device; it answers every request with
+#	a short status document, challenging those without an Authorization header when
+#	digest authentication is enabled (the response to the challenge is not verified), and
+#	counts the connections and requests it receives. Paths beginning /download return
+#	downloadSize bytes of the file's current downloadVersion (the version given as its
+#	ETag), honouring Range requests and If-Range; it may drop the connection part way
+#	through the next download (abortNextDownloadAfter) or answer the next range request
+#	with the whole file as a 206 (misreportNextRange), and records the Range header of
+#	each download request (downloadRanges); those beginning /image return
+#	imageData as a JPEG, with an ETag of the path and imageVersion (and 304 returned to a
+#	matching If-None-Match); /TiVoConnect returns a page (AnchorOffset/ItemCount) of a
+#	Now Playing list of nowPlayingCount items, the first nowPlayingFolders of them folders
+#	rather than recordings, recording the anchor and count of each page requested
+#	(nowPlayingPages); the list takes a new length once changeNowPlayingAfter pages have
+#	been served, given as (pages, count), to stand in for a recording made or deleted
+#	while it is paged through. The status document is sent with an
+#	ETag and Last-Modified (and 304 returned to a matching If-None-Match) when
+#	statusValidators is set
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class HTTPStandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'
+
+	# each response is written in a single send (flushed once the request is handled), as
+	# otherwise Nagle's algorithm and delayed ACKs stall a kept-alive connection
+	wbufsize = -1
+
+	def setup(self):
+		# responses larger than a segment still end in a partial one that Nagle holds back
+		# until the client's (delayed) ACK arrives
+		self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+
+	def do_GET(self):
+		self.answerRequest()
+
+	def do_POST(self):
+		self.rfile.read(int(self.headers.get('Content-Length', '0')))
+		self.answerRequest()
+
+	def answerRequest(self):
+		self.server.recordRequest(self.path)
+		if self.path.startswith('/download'):
+			self.sendDownload()
+		elif self.path.startswith('/TiVoConnect') and (self.server.digestAuthentication == False or self.headers.get('Authorization', '').startswith('Digest ')):
+			self.sendNowPlayingPage()
+		elif self.path.startswith('/image'):
+			self.sendImage()
+		elif self.server.digestAuthentication == True and not self.headers.get('Authorization', '').startswith('Digest '):
+			self.sendResponse(401, 'Unauthorized', [('WWW-Authenticate', 'Digest realm="benchmark", nonce="%s", qop="auth", algorithm=MD5' % os.urandom(8).encode('hex'))])
+		elif self.server.statusValidators == False:
+			self.sendResponse(200, self.server.statusDocument, [('Content-Type', 'text/xml')])
+		elif self.headers.get('If-None-Match', '') == STATUS_ETAG:
+			self.sendResponse(304, '', [('ETag', STATUS_ETAG)])
+		else:
+			self.sendResponse(200, self.server.statusDocument, [('Content-Type', 'text/xml'), ('ETag', STATUS_ETAG), ('Last-Modified', 'Sat, 17 Oct 2026 12:00:00 GMT')])
+
+	def sendResponse(self, statusCode, responseBody, responseHeaders):
+		self.send_response(statusCode)
+		for (headerName, headerValue) in responseHeaders:
+			self.send_header(headerName, headerValue)
+		self.send_header('Content-Length', str(len(responseBody)))
+		self.end_headers()
+		self.wfile.write(responseBody)
+
+	def sendDownload(self):
+		downloadSize = self.server.downloadSize
+		downloadVersion = self.server.downloadVersion
+		downloadETag = '"download-%d"' % downloadVersion
+		rangeHeader = self.headers.get('Range', '')
+		self.server.recordDownloadRange(rangeHeader)
+		if self.headers.get('If-Range', downloadETag) != downloadETag:
+			# the file has changed since the client's partial copy; the whole of it is sent
+			rangeHeader = ''
+		startByte = 0
+		if rangeHeader.startswith('bytes=') and rangeHeader.endswith('-'):
+			startByte = int(rangeHeader[6:-1])
+			if startByte >= downloadSize:
+				self.sendResponse(416, '', [('Content-Range', 'bytes */%d' % downloadSize)])
+				return
+			if self.server.takeRangeMisreport() == True:
+				startByte = 0
+			self.send_response(206)
+			self.send_header('Content-Range', 'bytes %d-%d/%d' % (startByte, downloadSize - 1, downloadSize))
+		else:
+			self.send_response(200)
+		self.send_header('Content-Type', 'video/mpeg')
+		self.send_header('Content-Length', str(downloadSize - startByte))
+		self.send_header('ETag', downloadETag)
+		self.end_headers()
+
+		abortAfter = self.server.takeDownloadAbort()
+		bytesSent = 0
+		while startByte + bytesSent < downloadSize:
+			chunkData = getDownloadChunk(downloadVersion, startByte + bytesSent, downloadSize - startByte - bytesSent)
+			if abortAfter is not None and bytesSent + len(chunkData) > abortAfter:
+				self.wfile.write(chunkData[0:abortAfter - bytesSent])
+				self.server.recordDownloadBytes(abortAfter)
+				self.close_connection = 1
+				return
+			self.wfile.write(chunkData)
+			bytesSent += len(chunkData)
+		self.server.recordDownloadBytes(bytesSent)
+
+	def sendImage(self):
+		imageETag = '"%s-%d"' % (self.path, self.server.imageVersion)
+		if self.headers.get('If-None-Match', '') == imageETag:
+			self.sendResponse(304, '', [('ETag', imageETag)])
+		else:
+			self.sendResponse(200, self.server.imageData, [('Content-Type', 'image/jpeg'), ('ETag', imageETag)])
+
+	def sendNowPlayingPage(self):
+		queryParams = urlparse.parse_qs(urlparse.urlparse(self.path).query)
+		anchorOffset = int(queryParams.get('AnchorOffset', ['0'])[0])
+		nowPlayingCount = self.server.recordNowPlayingPage(anchorOffset, int(queryParams.get('ItemCount', ['50'])[0]))
+		itemCount = min(int(queryParams.get('ItemCount', ['50'])[0]), max(0, nowPlayingCount - anchorOffset))
+		pageItems = [getNowPlayingItem(itemIndex, self.server.nowPlayingFolders) for itemIndex in range(anchorOffset, anchorOffset + itemCount)]
+		pageBody = NOWPLAYING_PAGE % (nowPlayingCount, anchorOffset, itemCount, ''.join(pageItems))
+		self.sendResponse(200, pageBody, [('Content-Type', 'text/xml')])
+
+	def log_message(self, format, *args):
+		pass
+
+class HTTPStandIn(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	daemon_threads = True
+
+	def __init__(self, certificatePath=None, digestAuthentication=False, downloadSize=0, imageData='', statusDocument='<status><channel>702</channel></status>', statusValidators=False):
+		BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), HTTPStandInHandler)
+		if certificatePath is not None:
+			self.socket = ssl.wrap_socket(self.socket, certfile=certificatePath, server_side=True)
+		self.digestAuthentication = digestAuthentication
+		self.downloadSize = downloadSize
+		self.imageData = imageData
+		self.imageVersion = 1
+		self.statusDocument = statusDocument
+		self.statusValidators = statusValidators
+		self.nowPlayingCount = 0
+		self.nowPlayingFolders = 0
+		self.changeNowPlayingAfter = None
+		self.nowPlayingPages = []
+		self.downloadVersion = 1
+		self.abortNextDownloadAfter = None
+		self.misreportNextRange = False
+		self.downloadRanges = []
+		self.counterLock = threading.Lock()
+		self.connectionCount = 0
+		self.requestCount = 0
+		self.statusRequestTimes = []
+		self.downloadBytesSent = 0
+
+	def process_request(self, request, clientAddress):
+		with self.counterLock:
+			self.connectionCount += 1
+		SocketServer.ThreadingMixIn.process_request(self, request, clientAddress)
+
+	def handle_error(self, request, clientAddress):
+		# clients closing kept-alive (TLS) connections without notice are expected
+		pass
+
+	def recordRequest(self, requestPath):
+		with self.counterLock:
+			self.requestCount += 1
+			if requestPath.startswith('/status'):
+				self.statusRequestTimes.append(time.time())
+
+	def recordDownloadBytes(self, bytesSent):
+		with self.counterLock:
+			self.downloadBytesSent += bytesSent
+
+	def recordNowPlayingPage(self, anchorOffset, itemCount):
+		# returns the length of the list as of this page
+		with self.counterLock:
+			self.nowPlayingPages.append((anchorOffset, itemCount))
+			if self.changeNowPlayingAfter is not None and len(self.nowPlayingPages) > self.changeNowPlayingAfter[0]:
+				self.nowPlayingCount = self.changeNowPlayingAfter[1]
+				self.changeNowPlayingAfter = None
+			return self.nowPlayingCount
+
+	def recordDownloadRange(self, rangeHeader):
+		with self.counterLock:
+			self.downloadRanges.append(rangeHeader)
+
+	def takeDownloadAbort(self):
+		with self.counterLock:
+			abortAfter = self.abortNextDownloadAfter
+			self.abortNextDownloadAfter = None
+			return abortAfter
+
+	def takeRangeMisreport(self):
+		with self.counterLock:
+			misreportRange = self.misreportNextRange
+			self.misreportNextRange = False
+			return misreportRange
+
+	def start(self):
+		serverThread = threading.Thread(target=self.serve_forever, name='HTTPStandIn')
+		serverThread.daemon = True
+		serverThread.start()
+
+	def stop(self):
+		self.shutdown()
+		self.server_close()
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Plugin-level suites
+#/////////////////////////////////////////////////////////////////////////////////////////
+def runLatencySuite(pluginModule, options):
+	for ioEngine in IO_ENGINES:
+		recorder = SimulatorRecorder()
+		simulator = tivoRemoteSimulator.TiVoSimulator(count=1, basePort=0, latency=options.latency, jitter=options.jitter, commandCallback=recorder)
+		simulator.start()
+		benchmarkPlugin = createPlugin(pluginModule, ioEngine)
+		benchmarkDevices = startDevices(benchmarkPlugin, simulator.getPorts())
+		try:
+			actionToWire = []
+			for iteration in range(0, options.iterations):
+				commandCount = len(recorder.commandTimes)
+				startTime = time.time()
+				benchmarkPlugin.executeAction(None, indigoActionId=u'irCommandToTivo', indigoDeviceId=benchmarkDevices[0].id, paramValues={u'irCommandSelect': u'CHANNELUP'})
+				if recorder.waitFor(lambda: len(recorder.commandTimes) > commandCount, 5.0) == False:
+					break
+				actionToWire.append(recorder.commandTimes[commandCount][0] - startTime)
+
+				# allow the response to be processed so that each action starts from idle
+				time.sleep(0.01)
+			reportTimings(u'latency', ioEngine + u': action to wire', actionToWire)
+		finally:
+			stopDevices(benchmarkPlugin, benchmarkDevices)
+			simulator.stop()
+
+def runMacroSuite(pluginModule, options):
+	import RPFramework
+	for ioEngine in IO_ENGINES:
+		for pipelineKeys in (False, True):
+			recorder = SimulatorRecorder()
+			simulator = tivoRemoteSimulator.TiVoSimulator(count=1, basePort=0, latency=options.latency, jitter=options.jitter, commandCallback=recorder)
+			simulator.start()
+			benchmarkPlugin = createPlugin(pluginModule, ioEngine)
+			if pipelineKeys == False:
+				benchmarkPlugin.putGUIConfigValue(PLUGIN_DEVICETYPEID, RPFramework.RPFrameworkTelnetDevice.GUI_CONFIG_TELNETDEV_PIPELINEDCOMMANDS, u'')
+			benchmarkDevices = startDevices(benchmarkPlugin, simulator.getPorts())
+			try:
+				# the keys are queued as quickly as they would be by an Indigo action group; the
+				# macro is complete once the last key reaches the simulator
+				commandCount = len(recorder.commandTimes)
+				startTime = time.time()
+				for macroKey in MACRO_KEYS:
+					benchmarkPlugin.executeAction(None, indigoActionId=u'irCommandToTivo', indigoDeviceId=benchmarkDevices[0].id, paramValues={u'irCommandSelect': macroKey})
+				completed = recorder.waitFor(lambda: len(recorder.commandTimes) >= commandCount + len(MACRO_KEYS), len(MACRO_KEYS) * 1.0 + options.duration)
+				macroLabel = ioEngine + u': ' + unicode(len(MACRO_KEYS)) + u'-key macro, ' + (u'pipelined' if pipelineKeys == True else u'sequential')
+				if completed == True:
+					reportLine(u'macro', macroLabel, '%.1fms to complete' % ((recorder.commandTimes[-1][0] - startTime) * 1000.0))
+				else:
+					reportLine(u'macro', macroLabel, 'incomplete: %d of %d keys received' % (len(recorder.commandTimes) - commandCount, len(MACRO_KEYS)))
+			finally:
+				stopDevices(benchmarkPlugin, benchmarkDevices)
+				simulator.stop()
+
+def runResponsesSuite(pluginModule, options):
+	responseCount = options.iterations * 10
+	for ioEngine in IO_ENGINES:
+		simulator = tivoRemoteSimulator.TiVoSimulator(count=1, basePort=0)
+		simulator.start()
+		benchmarkPlugin = createPlugin(pluginModule, ioEngine)
+		benchmarkDevices = startDevices(benchmarkPlugin, simulator.getPorts())
+		try:
+			# responses processed end-to-end: read from the connection, matched and applied;
+			# the flood is complete once the server has been sent the last channel reported
+			# (state updates may be coalesced, so the number of updates cannot be relied upon)
+			benchmarkDevice = benchmarkDevices[0]
+			finalChannel = '%04d' % ((responseCount - 1) % tivoRemoteSimulator.TIVO_MAX_CHANNEL + 1)
+			initialServerCallCount = benchmarkDevice.serverCallCount
+			startTime = time.time()
+			simulator.floodChannelStatus(responseCount)
+			completed = benchmarkDevice.waitFor(lambda: benchmarkDevice.serverCallCount > initialServerCallCount and benchmarkDevice.serverStates.get(u'currentChannel', None) == finalChannel, options.duration)
+			elapsedTime = time.time() - startTime
+			serverCalls = benchmarkDevice.serverCallCount - initialServerCallCount
+			if completed == True:
+				reportLine(u'responses', ioEngine + u': end-to-end', '%.0f responses/sec, %d server updates for %d responses' % (responseCount / elapsedTime, serverCalls, responseCount))
+			else:
+				# responses which are lost (e.g. several lines read as one) never complete
+				reportLine(u'responses', ioEngine + u': end-to-end', 'incomplete: final channel not reported after %.1fs (%d server updates for %d responses)' % (elapsedTime, serverCalls, responseCount))
+		finally:
+			stopDevices(benchmarkPlugin, benchmarkDevices)
+			simulator.stop()
+
+
+def runMatchingSuite(pluginModule, options):
+	# the response handling itself, independent of the I/O engine; the mixed set includes
+	# the unsolicited lines a TiVo sends which match no response definition
+	lineCount = options.iterations * 100
+	benchmarkPlugin = createPlugin(pluginModule, u'polling')
+	rpDevice = benchmarkPlugin.createDeviceObject(BenchmarkIndigoDevice(1, tivoRemoteSimulator.TIVO_REMOTE_PORT))
+	channelLines = [u'CH_STATUS %04d LOCAL' % (lineIndex % 999 + 1) for lineIndex in range(0, 100)]
+	mixedLines = [[u'CH_STATUS %04d RECORDING' % (lineIndex + 1), u'CH_FAILED NO_LIVE', u'LIVETV_READY', u'MISSING_TELEPORT_NAME'][lineIndex % 4] for lineIndex in range(0, 100)]
+	for (lineSetName, responseLines) in [(u'channel status', channelLines), (u'mixed', mixedLines)]:
+		startTime = time.time()
+		for iteration in range(0, lineCount / len(responseLines)):
+			for responseLine in responseLines:
+				rpDevice.handleDeviceResponse(responseLine, None)
+		elapsedTime = time.time() - startTime
+		reportLine(u'matching', u'handleDeviceResponse: ' + lineSetName, '%.0f lines/sec' % ((lineCount / len(responseLines)) * len(responseLines) / elapsedTime))
+
+class BenchmarkSerialStream(object):
+	# a serial port stand-in which makes the stream available in chunks, as data arrives
+	# from a real port between reads; reads return an empty string at the end of the stream
+	def __init__(self, streamData, chunkSizes):
+		self.streamData = streamData
+		self.chunkSizes = chunkSizes
+		self.chunkIndex = 0
+		self.readPosition = 0
+		self.availableEnd = 0
+
+	def inWaiting(self):
+		if self.availableEnd == self.readPosition and self.availableEnd < len(self.streamData):
+			self.availableEnd = min(len(self.streamData), self.availableEnd + self.chunkSizes[self.chunkIndex % len(self.chunkSizes)])
+			self.chunkIndex += 1
+		return self.availableEnd - self.readPosition
+
+	def read(self, size=1):
+		self.inWaiting()
+		receivedData = self.streamData[self.readPosition:min(self.readPosition + size, self.availableEnd)]
+		self.readPosition += len(receivedData)
+		return receivedData
+
+def legacySerialReadLine(connection, lineEndingToken):
+	# the serial line read used before the line framer, reading a byte at a time
+	lineRead = u''
+	lineEndingTokenLen = len(lineEndingToken)
+	while True:
+		c = connection.read(1)
+		if c:
+			lineRead += c
+			if lineRead[-lineEndingTokenLen:] == lineEndingToken:
+				break
+		else:
+			break
+	return lineRead
+
+def framedSerialReadLine(rpDevice, connection, lineEndingToken, commandResponseTimeout):
+	# a line read through the device's line framer, taking all of the data available on
+	# each read
+	readDeadline = time.time() + commandResponseTimeout
+	lineRead = rpDevice.lineFramer.getLine()
+	while lineRead is None:
+		remainingTime = readDeadline - time.time()
+		if remainingTime <= 0.0:
+			return u''
+		rpDevice.lineFramer.addData(rpDevice.readReceivedData(connection, remainingTime))
+		lineRead = rpDevice.lineFramer.getLine()
+	return lineRead + lineEndingToken
+
+def runFramingSuite(pluginModule, options):
+	# a stream of channel status lines delivered in chunks of 1 to 8192 bytes so that
+	# lines (and line endings) are split across reads
+	import random
+	import RPFramework
+	lineCount = options.iterations * 1000
+	streamData = ''.join(['CH_STATUS %04d LOCAL\r' % (lineIndex % 999 + 1) for lineIndex in range(0, lineCount)])
+	chunkRandom = random.Random(lineCount)
+	chunkSizes = [chunkRandom.randint(1, 8192) for chunkIndex in range(0, 1024)]
+	streamChunks = []
+	streamPosition = 0
+	while streamPosition < len(streamData):
+		streamChunks.append(streamData[streamPosition:streamPosition + chunkSizes[len(streamChunks) % len(chunkSizes)]])
+		streamPosition += len(streamChunks[-1])
+
+	lineFramer = RPFramework.RPFrameworkLineFramer.RPFrameworkLineFramer(u'\r')
+	framedCount = 0
+	startTime = time.time()
+	for streamChunk in streamChunks:
+		framedCount += lineFramer.addData(streamChunk)
+		lineFramer.getLines()
+	reportLine(u'framing', u'line framer: random chunks', '%.0f lines/sec (%d lines)' % (framedCount / (time.time() - startTime), framedCount))
+
+	partialResponseText = u''
+	splitCount = 0
+	startTime = time.time()
+	for streamChunk in streamChunks:
+		responseLines = (partialResponseText + unicode(streamChunk, 'utf-8')).split(u'\r')
+		partialResponseText = responseLines.pop()
+		splitCount += len(responseLines)
+	reportLine(u'framing', u'former decoded text split: random chunks', '%.0f lines/sec (%d lines)' % (splitCount / (time.time() - startTime), splitCount))
+
+	benchmarkPlugin = createPlugin(pluginModule, u'polling')
+	rpDevice = benchmarkPlugin.createDeviceObject(BenchmarkIndigoDevice(1, tivoRemoteSimulator.TIVO_REMOTE_PORT))
+	rpDevice.connectionType = RPFramework.RPFrameworkTelnetDevice.CONNECTIONTYPE_SERIAL
+	serialLineCount = min(lineCount, 50000)
+	for (methodName, readLine) in [(u'former byte-at-a-time', lambda connection: legacySerialReadLine(connection, '\r')), (u'framed', lambda connection: framedSerialReadLine(rpDevice, connection, u'\r', 1.0))]:
+		rpDevice.lineFramer = RPFramework.RPFrameworkLineFramer.RPFrameworkLineFramer(u'\r')
+		serialStream = BenchmarkSerialStream(streamData, chunkSizes)
+		startTime = time.time()
+		for lineIndex in range(0, serialLineCount):
+			readLine(serialStream)
+		reportLine(u'framing', u'serial readLine: ' + methodName, '%.0f lines/sec' % (serialLineCount / (time.time() - startTime)))
+
+	rpDevice.lineFramer = RPFramework.RPFrameworkLineFramer.RPFrameworkLineFramer(u'\r')
+	startTime = time.time()
+	for streamChunk in streamChunks:
+		rpDevice.handleReceivedText(streamChunk, None)
+	rpDevice.flushStateUpdates()
+	reportLine(u'framing', u'handleReceivedText: framed and matched', '%.0f lines/sec' % (lineCount / (time.time() - startTime)))
+
+def runTemplatesSuite(pluginModule, options):
+	# every format string in the plugin's configuration which calls for a substitution,
+	# rendered for a device with values supplied for each of the action parameters
+	import re
+	import xml.etree.ElementTree
+	configTree = xml.etree.ElementTree.parse(os.path.join(PLUGIN_SERVERPATH, u'RPFrameworkConfig.xml'))
+	formatStrings = [unicode(configElement.text) for configElement in configTree.iter() if configElement.text is not None and u'%' in configElement.text]
+	actionParamValues = dict([(paramName, u'1') for formatString in formatStrings for paramName in re.findall(u'%ap:([a-z\\d]+)%', formatString, re.I)])
+
+	renderCount = options.iterations * 100
+	benchmarkPlugin = createPlugin(pluginModule, u'polling')
+	rpDevice = benchmarkPlugin.createDeviceObject(BenchmarkIndigoDevice(1, tivoRemoteSimulator.TIVO_REMOTE_PORT))
+	startTime = time.time()
+	for iteration in range(0, renderCount / len(formatStrings)):
+		for formatString in formatStrings:
+			benchmarkPlugin.substituteIndigoValues(formatString, rpDevice, actionParamValues)
+	elapsedTime = time.time() - startTime
+	reportLine(u'templates', u'substituteIndigoValues: ' + unicode(len(formatStrings)) + u' config templates', '%.0f renders/sec' % ((renderCount / len(formatStrings)) * len(formatStrings) / elapsedTime))
+
+def runExpressionsSuite(pluginModule, options):
+	# every "eval:" expression in the plugin's configuration evaluated with its action
+	# parameters bound, compared with substituting the values into the text and eval-ing it
+	import re
+	import xml.etree.ElementTree
+	configTree = xml.etree.ElementTree.parse(os.path.join(PLUGIN_SERVERPATH, u'RPFrameworkConfig.xml'))
+	expressions = [re.sub(u'^\\{ds:[a-z\\d]+\\}\\{eval:(.*)\\}$', u'\\1', unicode(configElement.text), flags=re.I).replace(u'eval:', u'') for configElement in configTree.iter() if configElement.text is not None and u'eval:' in configElement.text]
+	actionParamValues = {u'channelToTune': u'7', u'forceTune': u'False', u'digitToAdd': u'3'}
+
+	evaluationCount = options.iterations * 100
+	benchmarkPlugin = createPlugin(pluginModule, u'polling')
+	rpDevice = benchmarkPlugin.createDeviceObject(BenchmarkIndigoDevice(1, tivoRemoteSimulator.TIVO_REMOTE_PORT))
+	rpDevice.indigoDevice.states[u'channelSelector'] = u'12'
+	evaluationMethods = [(u'substitute and eval', lambda expression: eval(benchmarkPlugin.substituteIndigoValues(expression, rpDevice, actionParamValues))), (u'compiled expression', lambda expression: benchmarkPlugin.evaluateIndigoExpression(expression, rpDevice, actionParamValues))]
+	for (methodName, evaluationMethod) in evaluationMethods:
+		startTime = time.time()
+		for iteration in range(0, evaluationCount / len(expressions)):
+			for expression in expressions:
+				evaluationMethod(expression)
+		elapsedTime = time.time() - startTime
+		reportLine(u'expressions', methodName + u': ' + unicode(len(expressions)) + u' config expressions', '%.0f evaluations/sec' % ((evaluationCount / len(expressions)) * len(expressions) / elapsedTime))
+
+def runReconnectSuite(pluginModule, options):
+	import RPFramework
+	for ioEngine in IO_ENGINES:
+		recorder = SimulatorRecorder()
+		simulator = tivoRemoteSimulator.TiVoSimulator(count=1, basePort=0, latency=options.latency, jitter=options.jitter, commandCallback=recorder)
+		simulator.start()
+		benchmarkPlugin = createPlugin(pluginModule, ioEngine)
+
+		# reconnect immediately and service the plugin command queue frequently so that the
+		# measurement reflects the reconnection path rather than the configured delays
+		benchmarkPlugin.putGUIConfigValue(PLUGIN_DEVICETYPEID, RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_DELAY, u'0')
+		benchmarkPlugin.putGUIConfigValue(PLUGIN_DEVICETYPEID, RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME, RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME_FIXED)
+		benchmarkPlugin.putGUIConfigValue(PLUGIN_DEVICETYPEID, RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_LIMIT, unicode(options.iterations + 1))
+		benchmarkPlugin.putGUIConfigValue(RPFramework.RPFrameworkPlugin.GUI_CONFIG_PLUGINSETTINGS, RPFramework.RPFrameworkPlugin.GUI_CONFIG_PLUGIN_COMMANDQUEUEIDLESLEEP, u'0.01')
+		pluginThread = threading.Thread(target=benchmarkPlugin.runConcurrentThread)
+		pluginThread.daemon = True
+		pluginThread.start()
+
+		benchmarkDevices = startDevices(benchmarkPlugin, simulator.getPorts())
+		try:
+			reconnectTimes = []
+			for iteration in range(0, min(options.iterations, 50)):
+				connectionCount = len(recorder.connectionTimes)
+				startTime = time.time()
+				simulator.dropConnections()
+				if recorder.waitFor(lambda: len(recorder.connectionTimes) > connectionCount, 10.0) == False:
+					break
+				reconnectTimes.append(recorder.connectionTimes[connectionCount] - startTime)
+				benchmarkDevices[0].waitForState(u'connectionState', u'Connected', 5.0)
+			reportTimings(u'reconnect', ioEngine + u': drop to reconnect', reconnectTimes)
+		finally:
+			benchmarkPlugin.stopConcurrentThread()
+			stopDevices(benchmarkPlugin, benchmarkDevices)
+			simulator.stop()
+
+	# every TiVo dropped at once (as by a router reboot) reconnects after the same delay
+	# without jitter; with full jitter the reconnections are spread across the delay
+	for reconnectAttemptJitter in (u'none', u'full'):
+		recorder = SimulatorRecorder()
+		simulator = tivoRemoteSimulator.TiVoSimulator(count=options.devices, basePort=0, commandCallback=recorder)
+		simulator.start()
+		benchmarkPlugin = createPlugin(pluginModule, u'select')
+		benchmarkPlugin.putGUIConfigValue(PLUGIN_DEVICETYPEID, RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_DELAY, u'1')
+		benchmarkPlugin.putGUIConfigValue(PLUGIN_DEVICETYPEID, RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME, RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME_EXPONENTIAL)
+		benchmarkPlugin.putGUIConfigValue(PLUGIN_DEVICETYPEID, RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_JITTER, reconnectAttemptJitter)
+		pluginThread = threading.Thread(target=benchmarkPlugin.runConcurrentThread)
+		pluginThread.daemon = True
+		pluginThread.start()
+
+		benchmarkDevices = startDevices(benchmarkPlugin, simulator.getPorts())
+		try:
+			connectionCount = len(recorder.connectionTimes)
+			startTime = time.time()
+			simulator.dropConnections()
+			recorder.waitFor(lambda: len(recorder.connectionTimes) >= connectionCount + options.devices, 10.0)
+			reportTimings(u'reconnect', u'%d TiVos dropped, 1s exponential, jitter=%s' % (options.devices, reconnectAttemptJitter), [connectionTime - startTime for connectionTime in recorder.connectionTimes[connectionCount:]])
+		finally:
+			benchmarkPlugin.stopConcurrentThread()
+			stopDevices(benchmarkPlugin, benchmarkDevices)
+			simulator.stop()
+
+def runNamespaceCommand(command):
+	subprocess.check_call(['ip', 'netns', 'exec', HEALTH_NAMESPACE] + command)
+
+def createHealthNamespace():
+	# the simulator runs in its own namespace, linked to the benchmark's by a veth pair,
+	# so that its traffic may be dropped as it leaves; dropping the plugin's own packets
+	# would be taken by TCP for local congestion rather than a silent peer
+	subprocess.check_call(['ip', 'link', 'set', 'lo', 'up'])
+	subprocess.check_call(['ip', 'netns', 'add', HEALTH_NAMESPACE])
+	subprocess.check_call(['ip', 'link', 'add', 'tivoHealthA', 'type', 'veth', 'peer', 'name', 'tivoHealthB'])
+	subprocess.check_call(['ip', 'link', 'set', 'tivoHealthB', 'netns', HEALTH_NAMESPACE])
+	subprocess.check_call(['ip', 'addr', 'add', HEALTH_BENCHMARKADDRESS + '/30', 'dev', 'tivoHealthA'])
+	subprocess.check_call(['ip', 'link', 'set', 'tivoHealthA', 'up'])
+	runNamespaceCommand(['ip', 'addr', 'add', HEALTH_SIMULATORADDRESS + '/30', 'dev', 'tivoHealthB'])
+	runNamespaceCommand(['ip', 'link', 'set', 'tivoHealthB', 'up'])
+
+def setSimulatorBlackHole(enabled):
+	# a packet fifo of no length silently drops everything the simulator sends, the ACKs
+	# included, as though the TiVo had dropped off the network
+	if enabled == True:
+		runNamespaceCommand(['tc', 'qdisc', 'add', 'dev', 'tivoHealthB', 'root', 'pfifo', 'limit', '0'])
+	else:
+		runNamespaceCommand(['tc', 'qdisc', 'del', 'dev', 'tivoHealthB', 'root'])
+
+def runHealthSuite(pluginModule, options):
+	# black-holing traffic requires private network namespaces, so the suite re-runs itself
+	# within one where possible (Linux, as root, with unshare and ip available)
+	if os.environ.get('TIVO_BENCHMARK_NETNS', '') != '1':
+		if not sys.platform.startswith('linux') or os.geteuid() != 0 or subprocess.call('command -v unshare ip tc', shell=True, stdout=open(os.devnull, 'w')) != 0:
+			reportLine(u'health', u'skipped', 'requires Linux, root, unshare, ip and tc')
+			return
+		benchmarkEnvironment = dict(os.environ)
+		benchmarkEnvironment['TIVO_BENCHMARK_NETNS'] = '1'
+		sys.stdout.flush()
+		subprocess.call(['unshare', '-n', sys.executable, os.path.join(TOOLS_PATH, 'tivoRemoteBenchmark.py'), '--suite', 'health', '--iterations', str(options.iterations)], env=benchmarkEnvironment)
+		return
+
+	import RPFramework
+	healthSettings = [(u'enabled', {RPFramework.RPFrameworkTelnetDevice.GUI_CONFIG_TELNETDEV_KEEPALIVEIDLE: u'1', RPFramework.RPFrameworkTelnetDevice.GUI_CONFIG_TELNETDEV_KEEPALIVEINTERVAL: u'1', RPFramework.RPFrameworkTelnetDevice.GUI_CONFIG_TELNETDEV_KEEPALIVECOUNT: u'2', RPFramework.RPFrameworkTelnetDevice.GUI_CONFIG_TELNETDEV_LIVENESSTIMEOUT: u'1'}),
+		(u'disabled', {RPFramework.RPFrameworkTelnetDevice.GUI_CONFIG_TELNETDEV_KEEPALIVEIDLE: u'0', RPFramework.RPFrameworkTelnetDevice.GUI_CONFIG_TELNETDEV_LIVENESSTIMEOUT: u'0'})]
+	detectionLimit = 10.0
+
+	createHealthNamespace()
+	simulatorProcess = subprocess.Popen(['ip', 'netns', 'exec', HEALTH_NAMESPACE, sys.executable, os.path.join(TOOLS_PATH, 'tivoRemoteSimulator.py'), '--host', HEALTH_SIMULATORADDRESS, '--base-port', '0'], stdout=subprocess.PIPE)
+	try:
+		listeningLine = simulatorProcess.stdout.readline().strip()
+		ports = [int(port) for port in listeningLine.split(' ', 1)[1].split(',')]
+		for ioEngine in IO_ENGINES:
+			for (settingsName, guiConfigValues) in healthSettings:
+				benchmarkPlugin = createPlugin(pluginModule, ioEngine)
+				for (guiConfigName, guiConfigValue) in guiConfigValues.items():
+					benchmarkPlugin.putGUIConfigValue(PLUGIN_DEVICETYPEID, guiConfigName, guiConfigValue)
+				benchmarkPlugin.putGUIConfigValue(PLUGIN_DEVICETYPEID, RPFramework.RPFrameworkTelnetDevice.GUI_CONFIG_SOCKET_CONNECTIONTIMEOUT, u'1')
+				benchmarkPlugin.putGUIConfigValue(PLUGIN_DEVICETYPEID, RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_DELAY, u'0')
+				benchmarkPlugin.putGUIConfigValue(PLUGIN_DEVICETYPEID, RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME, RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME_FIXED)
+				benchmarkPlugin.putGUIConfigValue(PLUGIN_DEVICETYPEID, RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_LIMIT, u'1000')
+				pluginThread = threading.Thread(target=benchmarkPlugin.runConcurrentThread)
+				pluginThread.daemon = True
+				pluginThread.start()
+
+				benchmarkDevices = startDevices(benchmarkPlugin, ports, host=HEALTH_SIMULATORADDRESS)
+				try:
+					# the TiVo drops off the network while the connection is idle and just as a
+					# key is pressed; the connection state leaves "Connected" once the plugin
+					# notices and closes the connection
+					for sendKeys in (False, True):
+						detectionTimes = []
+						for iteration in range(0, min(options.iterations, 5)):
+							setSimulatorBlackHole(True)
+							try:
+								startTime = time.time()
+								if sendKeys == True:
+									benchmarkPlugin.executeAction(None, indigoActionId=u'irCommandToTivo', indigoDeviceId=benchmarkDevices[0].id, paramValues={u'irCommandSelect': u'CHANNELUP'})
+								if benchmarkDevices[0].waitFor(lambda: benchmarkDevices[0].serverStates[u'connectionState'] != u'Connected', detectionLimit) == False:
+									break
+								detectionTimes.append(time.time() - startTime)
+							finally:
+								setSimulatorBlackHole(False)
+							if benchmarkDevices[0].waitForState(u'connectionState', u'Connected', 10.0) == False:
+								break
+							time.sleep(0.5)
+
+						caseLabel = u'%s %s: silent drop to detected (%s)' % (ioEngine, settingsName, sendKeys == True and u'key press' or u'idle')
+						if len(detectionTimes) == 0:
+							reportLine(u'health', caseLabel, 'not detected within %.0fs' % detectionLimit)
+						else:
+							reportTimings(u'health', caseLabel, detectionTimes)
+				finally:
+					benchmarkPlugin.stopConcurrentThread()
+					stopDevices(benchmarkPlugin, benchmarkDevices)
+	finally:
+		simulatorProcess.terminate()
+		simulatorProcess.wait()
+		subprocess.call(['ip', 'netns', 'del', HEALTH_NAMESPACE])
+
+def legacyGetTiVoNameAndVersion(address, beaconPort, timeout):
+	# the beacon exchange made with each TiVo in turn before TiVoDiscovery, on a blocking
+	# socket; the former exchange had no timeout, one is given so a hung TiVo is left
+	import re
+	import struct
+	import tivoDiscovery
+	def receiveBytesFromSocket(tivoSocket, length):
+		block = ''
+		while len(block) < length:
+			add = tivoSocket.recv(length - len(block))
+			if not add:
+				break
+			block += add
+		return block
+
+	ourBeacon = tivoDiscovery.ANNOUNCE % {'method': 'connected', 'port': 0}
+	try:
+		tivoSocket = socket.create_connection((address, beaconPort), timeout)
+		try:
+			tivoSocket.sendall(struct.pack('!I', len(ourBeacon)) + ourBeacon)
+			beaconLength = struct.unpack('!I', receiveBytesFromSocket(tivoSocket, 4))[0]
+			tivoBeacon = receiveBytesFromSocket(tivoSocket, beaconLength)
+		finally:
+			tivoSocket.close()
+		return (re.compile('machine=(.*)\n').findall(tivoBeacon)[0], float(re.compile('swversion=(\d*.\d*)').findall(tivoBeacon)[0]))
+	except (socket.error, struct.error, IndexError, ValueError):
+		return (address, 0.0)
+
+def runDiscoverySuite(pluginModule, options):
+	# the announcement is sent directly to the simulator rather than broadcast
+	import tivoDiscovery
+	for (tivoCount, hungCount) in [(1, 0), (10, 0), (50, 0), (10, 1)]:
+		simulator = tivoBeaconSimulator.TiVoBeaconSimulator(count=tivoCount, hungCount=hungCount, port=0, latency=options.latency, jitter=options.jitter)
+		simulator.start()
+		benchmarkPlugin = createPlugin(pluginModule, u'polling')
+		benchmarkPlugin.tivoDiscoveryBroadcastAddress = '127.0.0.1'
+		benchmarkPlugin.tivoBeaconPort = simulator.getPort()
+		scenarioName = u'%d TiVos%s' % (tivoCount, u', %d hung' % hungCount if hungCount > 0 else u'')
+		try:
+			startTime = time.time()
+			tivosFound = benchmarkPlugin.findTiVoDevices()
+			reportLine(u'discovery', scenarioName + u': findTiVoDevices', '%.0fms, %d TiVos listed' % ((time.time() - startTime) * 1000.0, len(tivosFound)))
+
+			# the first call filled the discovery cache; later calls list it and leave the
+			# refresh (which re-probes no TiVo) to run in the background
+			startTime = time.time()
+			tivosFound = benchmarkPlugin.findTiVoDevices()
+			reportLine(u'discovery', scenarioName + u': findTiVoDevices, cached', '%.2fms, %d TiVos listed' % ((time.time() - startTime) * 1000.0, len(tivosFound)))
+			refreshThread = benchmarkPlugin.tivoDiscoveryRefreshThread
+			if not (refreshThread is None):
+				refreshThread.join()
+			startTime = time.time()
+			benchmarkPlugin.refreshTiVoDiscovery()
+			reportLine(u'discovery', scenarioName + u': cache refresh', '%.0fms' % ((time.time() - startTime) * 1000.0))
+
+			discovery = tivoDiscovery.TiVoDiscovery(benchmarkPlugin.tivoDiscoveryBroadcastAddress, benchmarkPlugin.tivoBeaconPort)
+			startTime = time.time()
+			tivosFound = discovery.discoverTiVos(simulator.getAddresses())
+			reportLine(u'discovery', scenarioName + u': all configured', '%.0fms, %d TiVos listed' % ((time.time() - startTime) * 1000.0, len(tivosFound)))
+
+			startTime = time.time()
+			for tivoAddress in simulator.getAddresses():
+				legacyGetTiVoNameAndVersion(tivoAddress, benchmarkPlugin.tivoBeaconPort, tivoDiscovery.TIVO_BEACON_TIMEOUT)
+			reportLine(u'discovery', scenarioName + u': names looked up in turn', '%.0fms' % ((time.time() - startTime) * 1000.0))
+		finally:
+			simulator.stop()
+
+		# the passive listener fills an empty cache from the TiVos' broadcast beacons and
+		# notices a TiVo which has moved from its next beacon
+		simulator = tivoBeaconSimulator.TiVoBeaconSimulator(count=tivoCount, hungCount=hungCount, port=0)
+		simulator.start()
+		benchmarkPlugin = createPlugin(pluginModule, u'polling')
+		benchmarkPlugin.tivoBeaconPort = 0
+		benchmarkPlugin.updateTiVoBeaconListener(True)
+		try:
+			listenerPort = benchmarkPlugin.tivoBeaconListener.getPort()
+			startTime = time.time()
+			simulator.broadcastBeacons(listenerPort)
+			while len(benchmarkPlugin.tivoDiscoveryCache.getTiVos()) < tivoCount and time.time() - startTime < 5.0:
+				time.sleep(0.001)
+			reportLine(u'discovery', scenarioName + u': passive inventory filled', '%.1fms, %d TiVos listed' % ((time.time() - startTime) * 1000.0, len(benchmarkPlugin.tivoDiscoveryCache.getTiVos())))
+
+			movedAddresses = ['127.0.1.%d' % (tivoIndex + 1) for tivoIndex in range(tivoCount)]
+			startTime = time.time()
+			simulator.broadcastBeacons(listenerPort, movedAddresses)
+			while sorted([cachedTiVo[1] for cachedTiVo in benchmarkPlugin.tivoDiscoveryCache.getTiVos()]) != sorted(movedAddresses) and time.time() - startTime < 5.0:
+				time.sleep(0.001)
+			reportLine(u'discovery', scenarioName + u': passive address changes noticed', '%.1fms after the beacons' % ((time.time() - startTime) * 1000.0))
+		finally:
+			benchmarkPlugin.updateTiVoBeaconListener(False)
+			simulator.stop()
+
+class LegacySSDPResponse(object):
+	# the SSDP response parsing used before parseSSDPHeaders, running each datagram
+	# through httplib
+	class _FakeSocket(StringIO.StringIO):
+		def makefile(self, *args, **kw):
+			return self
+
+	def __init__(self, response):
+		import RPFramework
+		r = httplib.HTTPResponse(self._FakeSocket(response))
+		r.begin()
+		self.location = u''
+		self.usn = u''
+		self.st = u''
+		self.server = u''
+		self.cache = u''
+		if r.getheader("location") is not None:
+			self.location = RPFramework.RPFrameworkUtils.to_unicode(r.getheader("location"))
+		if r.getheader("usn") is not None:
+			self.usn = RPFramework.RPFrameworkUtils.to_unicode(r.getheader("usn"))
+		if r.getheader("st") is not None:
+			self.st = RPFramework.RPFrameworkUtils.to_unicode(r.getheader("st"))
+		if r.getheader("server") is not None:
+			self.server = RPFramework.RPFrameworkUtils.to_unicode(r.getheader("server"))
+		if r.getheader("cache-control") is not None:
+			try:
+				self.cache = RPFramework.RPFrameworkUtils.to_unicode(r.getheader("cache-control")).split(u'=')[1]
+			except:
+				pass
+		self.allHeaders = r.getheaders()
+
+def runSSDPSuite(pluginModule, options):
+	# 10k responses to ssdp:all as captured on a busy network: 250 devices, each
+	# answering for 5 services (root device, device type and 3 service types) on each of
+	# 8 searches (retries plus repeated sends by the devices themselves)
+	import RPFramework
+	ssdpPackets = []
+	for searchIndex in range(0, 8):
+		for deviceIndex in range(0, 250):
+			for serviceTarget in ['upnp:rootdevice', 'urn:schemas-upnp-org:device:MediaRenderer:1', 'urn:schemas-upnp-org:service:AVTransport:1', 'urn:schemas-upnp-org:service:RenderingControl:1', 'urn:schemas-upnp-org:service:ConnectionManager:1']:
+				ssdpPackets.append('HTTP/1.1 200 OK\r\nCACHE-CONTROL: max-age=1800\r\nDATE: Sat, 17 Oct 2026 21:04:11 GMT\r\nEXT:\r\nLOCATION: http://192.168.%d.%d:49152/description.xml\r\nSERVER: Linux/3.14 UPnP/1.0 Simulated/1.0\r\nST: %s\r\nUSN: uuid:5f9ec1b3-ed59-79bb-4530-%012d::%s\r\nBOOTID.UPNP.ORG: 1\r\nCONFIGID.UPNP.ORG: 1\r\nContent-Length: 0\r\n\r\n' % (deviceIndex // 200, deviceIndex % 200 + 1, serviceTarget, deviceIndex, serviceTarget))
+
+	for (methodName, parseResponse) in [(u'former httplib parse', LegacySSDPResponse), (u'header parser', RPFramework.RPFrameworkNetworkingUPnP.SSDPResponse)]:
+		startTime = time.time()
+		for ssdpPacket in ssdpPackets:
+			parseResponse(ssdpPacket)
+		elapsedTime = time.time() - startTime
+		reportLine(u'ssdp', u'%d packets: %s' % (len(ssdpPackets), methodName), '%.1fms (%.0f packets/sec)' % (elapsedTime * 1000.0, len(ssdpPackets) / elapsedTime))
+
+	# the reception path of uPnPDiscoverIter: repeats are dropped by USN before a response
+	# is created and a single response is kept per location
+	startTime = time.time()
+	responseIdsFound = set()
+	locationsFound = set()
+	for ssdpPacket in ssdpPackets:
+		allHeaders = RPFramework.RPFrameworkNetworkingUPnP.parseSSDPHeaders(ssdpPacket)
+		responseId = RPFramework.RPFrameworkNetworkingUPnP.getSSDPResponseId(allHeaders)
+		if responseId in responseIdsFound:
+			continue
+		responseIdsFound.add(responseId)
+		response = RPFramework.RPFrameworkNetworkingUPnP.SSDPResponse(ssdpPacket, allHeaders)
+		locationsFound.add(response.location)
+	elapsedTime = time.time() - startTime
+	reportLine(u'ssdp', u'%d packets: received with USN de-duplication' % len(ssdpPackets), '%.1fms, %d services / %d devices found' % (elapsedTime * 1000.0, len(responseIdsFound), len(locationsFound)))
+
+	legacyResponse = LegacySSDPResponse(ssdpPackets[0])
+	slottedResponse = RPFramework.RPFrameworkNetworkingUPnP.SSDPResponse(ssdpPackets[0])
+	reportLine(u'ssdp', u'response object size', 'former=%d bytes (with __dict__) header parser=%d bytes' % (sys.getsizeof(legacyResponse) + sys.getsizeof(legacyResponse.__dict__), sys.getsizeof(slottedResponse)))
+
+	# the device dialog's UPnP menu for two device types searching different service
+	# targets, answered by a local responder in place of the multicast group
+	responderSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	responderSocket.bind(('127.0.0.1', 0))
+	def answerSearches():
+		while True:
+			try:
+				(searchMessage, searchAddress) = responderSocket.recvfrom(4096)
+			except socket.error:
+				return
+			searchTarget = searchMessage.split('\r\nST: ', 1)[1].split('\r\n', 1)[0]
+			# the responses are paced so as not to overrun the receive buffer
+			for ssdpPacket in ssdpPackets[0:1250]:
+				if ('\r\nST: ' + searchTarget + '\r\n') in ssdpPacket:
+					responderSocket.sendto(ssdpPacket, searchAddress)
+					time.sleep(0.0002)
+	responderThread = threading.Thread(target=answerSearches, name='SSDPResponder')
+	responderThread.daemon = True
+	responderThread.start()
+
+	originalMulticastGroup = RPFramework.RPFrameworkNetworkingUPnP.SSDP_MULTICAST_GROUP
+	RPFramework.RPFrameworkNetworkingUPnP.SSDP_MULTICAST_GROUP = responderSocket.getsockname()
+	try:
+		benchmarkPlugin = createPlugin(pluginModule, u'polling')
+		benchmarkPlugin.putGUIConfigValue(u'benchmarkRenderer', RPFramework.RPFrameworkPlugin.GUI_CONFIG_UPNP_SERVICE, u'urn:schemas-upnp-org:device:MediaRenderer:1')
+		benchmarkPlugin.putGUIConfigValue(u'benchmarkRootDevice', RPFramework.RPFrameworkPlugin.GUI_CONFIG_UPNP_SERVICE, u'upnp:rootdevice')
+		for (deviceTypeId, menuLabel) in [(u'benchmarkRenderer', u'renderer menu, first'), (u'benchmarkRenderer', u'renderer menu, again'), (u'benchmarkRootDevice', u'root device menu, first'), (u'benchmarkRenderer', u'renderer menu after root device menu')]:
+			startTime = time.time()
+			menuItems = benchmarkPlugin.getConfigDialogUPNPDeviceMenu(typeId=deviceTypeId)
+			reportLine(u'ssdp', u'UPnP ' + menuLabel, '%.2fms, %d devices listed' % ((time.time() - startTime) * 1000.0, len(menuItems)))
+	finally:
+		RPFramework.RPFrameworkNetworkingUPnP.SSDP_MULTICAST_GROUP = originalMulticastGroup
+		responderSocket.close()
+
+def runScalingSuite(pluginModule, options):
+	# the simulator runs in its own process so that only the plugin's usage is measured
+	simulatorProcess = subprocess.Popen([sys.executable, os.path.join(TOOLS_PATH, 'tivoRemoteSimulator.py'), '--count', str(options.devices), '--base-port', '0'], stdout=subprocess.PIPE)
+	try:
+		listeningLine = simulatorProcess.stdout.readline().strip()
+		ports = [int(port) for port in listeningLine.split(' ', 1)[1].split(',')]
+		for ioEngine in IO_ENGINES:
+			benchmarkPlugin = createPlugin(pluginModule, ioEngine)
+			benchmarkDevices = startDevices(benchmarkPlugin, ports)
+			try:
+				time.sleep(1.0)
+				startUsage = resource.getrusage(resource.RUSAGE_SELF)
+				startTime = time.time()
+				time.sleep(options.duration)
+				endUsage = resource.getrusage(resource.RUSAGE_SELF)
+				elapsedTime = time.time() - startTime
+
+				cpuTime = (endUsage.ru_utime - startUsage.ru_utime) + (endUsage.ru_stime - startUsage.ru_stime)
+				wakeups = endUsage.ru_nvcsw - startUsage.ru_nvcsw
+				reportLine(u'scaling', u'%s: %d idle TiVos' % (ioEngine, options.devices), 'cpu=%.2f%% wakeups=%.1f/sec threads=%d' % (cpuTime / elapsedTime * 100.0, wakeups / elapsedTime, threading.activeCount()))
+			finally:
+				stopDevices(benchmarkPlugin, benchmarkDevices)
+	finally:
+		simulatorProcess.terminate()
+		simulatorProcess.wait()
+
+def createStandInCertificate(certificateFolder):
+	# a self-signed certificate for the stand-in; the framework does not verify certificates
+	# (TiVos present their own self-signed ones)
+	certificatePath = os.path.join(certificateFolder, 'standin.pem')
+	keyPath = os.path.join(certificateFolder, 'standin.key')
+	if subprocess.call(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=127.0.0.1', '-keyout', keyPath, '-out', certificatePath], stdout=open(os.devnull, 'w'), stderr=subprocess.STDOUT) != 0:
+		return None
+	with open(certificatePath, 'a') as certificateFile:
+		certificateFile.write(open(keyPath).read())
+	return certificatePath
+
+def createRESTfulDevice(benchmarkPlugin, port):
+	# a device of the framework's RESTful device class addressing the HTTP stand-in; it
+	# notes each download reported as complete, calling downloadCompletedCheck (if set)
+	# with the file downloaded
+	import RPFramework
+	class BenchmarkRESTfulDevice(RPFramework.RPFrameworkRESTfulDevice.RPFrameworkRESTfulDevice):
+		def getRESTfulDeviceAddress(self):
+			return (u'127.0.0.1', port)
+
+		def notifySuccessfulDownload(self, rpCommand, outputFileName):
+			self.downloadCompletedTime = time.time()
+			if self.downloadCompletedCheck is not None:
+				self.downloadCompletedCheck(outputFileName)
+			self.downloadCompletedEvent.set()
+
+	restfulDevice = BenchmarkRESTfulDevice(benchmarkPlugin, BenchmarkIndigoDevice(1, port))
+	restfulDevice.downloadCompletedEvent = threading.Event()
+	restfulDevice.downloadCompletedTime = None
+	restfulDevice.downloadCompletedCheck = None
+	return restfulDevice
+
+def runHTTPSuite(pluginModule, options):
+	import requests
+	import RPFramework
+	try:
+		requests.packages.urllib3.disable_warnings()
+	except AttributeError:
+		pass
+
+	certificateFolder = tempfile.mkdtemp()
+	try:
+		certificatePath = None
+		try:
+			certificatePath = createStandInCertificate(certificateFolder)
+		except OSError:
+			pass
+		if certificatePath is None:
+			reportLine(u'http', u'https', 'skipped: openssl is required to create the certificate')
+
+		requestCount = min(options.iterations, 500)
+		for (scheme, authenticationType) in [(u'http', u'none'), (u'http', u'digest'), (u'https', u'none'), (u'https', u'digest')]:
+			if scheme == u'https' and certificatePath is None:
+				continue
+			standIn = HTTPStandIn(certificatePath=(scheme == u'https' and certificatePath or None), digestAuthentication=(authenticationType == u'digest'))
+			standIn.start()
+			try:
+				caseLabel = u'%s %s: ' % (scheme, authenticationType == u'digest' and u'digest' or u'no auth')
+				requestUrl = u'%s://127.0.0.1:%d/status' % (scheme, standIn.server_address[1])
+
+				# as formerly made, a module-level request (with new authentication) each time
+				startTime = time.time()
+				for iteration in range(0, requestCount):
+					authenticationParam = None
+					if authenticationType == u'digest':
+						authenticationParam = requests.auth.HTTPDigestAuth(u'tivo', u'0123456789')
+					requests.get(requestUrl, auth=authenticationParam, verify=False)
+				elapsedTime = time.time() - startTime
+				reportLine(u'http', caseLabel + u'request per command (former)', '%.0f requests/sec, %d connections, %d requests served' % (requestCount / elapsedTime, standIn.connectionCount, standIn.requestCount))
+
+				# the commands processed by a RESTful device through its pooled session
+				standIn.connectionCount = 0
+				standIn.requestCount = 0
+				benchmarkPlugin = createPlugin(pluginModule, u'polling')
+				restfulDevice = createRESTfulDevice(benchmarkPlugin, standIn.server_address[1])
+				commandPayload = u'|*|'.join([scheme, u'/status', authenticationType, u'tivo', u'0123456789'])
+				startTime = time.time()
+				restfulDevice.queueDeviceCommands([RPFramework.RPFrameworkCommand.RPFrameworkCommand(RPFramework.RPFrameworkRESTfulDevice.CMD_RESTFUL_GET, commandPayload=commandPayload) for iteration in range(0, requestCount)])
+				restfulDevice.commandQueue.join()
+				elapsedTime = time.time() - startTime
+				restfulDevice.terminateCommunications()
+				reportLine(u'http', caseLabel + u'device session', '%.0f requests/sec, %d connections, %d requests served' % (requestCount / elapsedTime, standIn.connectionCount, standIn.requestCount))
+			finally:
+				standIn.stop()
+	finally:
+		shutil.rmtree(certificateFolder, ignore_errors=True)
+
+def getPeakMemory():
+	# ru_maxrss is in kilobytes on Linux but bytes on Mac OS X
+	peakMemory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	if sys.platform == 'darwin':
+		peakMemory = peakMemory / 1024
+	return peakMemory / 1024.0
+
+def runDownloadSuite(pluginModule, options):
+	import requests
+	import RPFramework
+	downloadFolder = tempfile.mkdtemp()
+	standIn = HTTPStandIn(downloadSize=DOWNLOAD_SIZE)
+	standIn.start()
+	try:
+		downloadLocation = os.path.join(downloadFolder, u'recording.mpg')
+		downloadLabel = u'%dMB download' % (DOWNLOAD_SIZE / (1024 * 1024))
+		downloadPayload = u'|*|'.join([u'http', u'/download/recording.mpg', u'none', u'', u'', downloadLocation])
+		statusPayload = u'|*|'.join([u'http', u'/status', u'none', u'', u''])
+
+		# streamed to disk by the device's download thread with a status request queued
+		# behind it; this runs first as the peak memory of the process only ever rises
+		benchmarkPlugin = createPlugin(pluginModule, u'polling')
+		restfulDevice = createRESTfulDevice(benchmarkPlugin, standIn.server_address[1])
+		peakMemoryBefore = getPeakMemory()
+		startTime = time.time()
+		restfulDevice.queueDeviceCommands([RPFramework.RPFrameworkCommand.RPFrameworkCommand(RPFramework.RPFrameworkRESTfulDevice.CMD_DOWNLOADFILE, commandPayload=downloadPayload), RPFramework.RPFrameworkCommand.RPFrameworkCommand(RPFramework.RPFrameworkRESTfulDevice.CMD_RESTFUL_GET, commandPayload=statusPayload)])
+		restfulDevice.downloadCompletedEvent.wait(120.0)
+		restfulDevice.commandQueue.join()
+		if restfulDevice.downloadCompletedTime is None or len(standIn.statusRequestTimes) == 0 or os.path.getsize(downloadLocation) != DOWNLOAD_SIZE:
+			reportLine(u'download', downloadLabel + u': streamed', 'did not complete')
+		else:
+			reportLine(u'download', downloadLabel + u': streamed', '%.2fs, peak memory +%.1fMB, queued status request served after %.1fms' % (restfulDevice.downloadCompletedTime - startTime, getPeakMemory() - peakMemoryBefore, (standIn.statusRequestTimes[0] - startTime) * 1000.0))
+
+		# resuming a download which was dropped half way through
+		os.remove(downloadLocation)
+		standIn.abortNextDownloadAfter = DOWNLOAD_SIZE / 2
+		restfulDevice.downloadCompletedEvent.clear()
+		restfulDevice.downloadCompletedTime = None
+		logging.disable(logging.CRITICAL)
+		restfulDevice.queueDeviceCommand(RPFramework.RPFrameworkCommand.RPFrameworkCommand(RPFramework.RPFrameworkRESTfulDevice.CMD_DOWNLOADFILE, commandPayload=downloadPayload))
+		restfulDevice.commandQueue.join()
+		while not (restfulDevice.downloadThread is None):
+			time.sleep(0.01)
+		logging.disable(logging.NOTSET)
+		downloadBytesSent = standIn.downloadBytesSent
+		restfulDevice.queueDeviceCommand(RPFramework.RPFrameworkCommand.RPFrameworkCommand(RPFramework.RPFrameworkRESTfulDevice.CMD_DOWNLOADFILE, commandPayload=downloadPayload))
+		restfulDevice.downloadCompletedEvent.wait(120.0)
+		if restfulDevice.downloadCompletedTime is None or os.path.getsize(downloadLocation) != DOWNLOAD_SIZE:
+			reportLine(u'download', downloadLabel + u': dropped half way, resumed', 'did not complete')
+		else:
+			reportLine(u'download', downloadLabel + u': dropped half way, resumed', '%.1fMB transferred to complete' % ((standIn.downloadBytesSent - downloadBytesSent) / (1024.0 * 1024.0)))
+		restfulDevice.terminateCommunications()
+
+		# as formerly downloaded, the whole of the response read before being written
+		os.remove(downloadLocation)
+		peakMemoryBefore = getPeakMemory()
+		startTime = time.time()
+		responseObj = requests.get(u'http://127.0.0.1:%d/download/recording.mpg' % standIn.server_address[1], verify=False)
+		with open(downloadLocation, 'wb') as localFile:
+			localFile.write(responseObj.content)
+		responseObj = None
+		reportLine(u'download', downloadLabel + u': read into memory (former)', '%.2fs, peak memory +%.1fMB, queued commands wait for the download' % (time.time() - startTime, getPeakMemory() - peakMemoryBefore))
+	finally:
+		standIn.stop()
+		shutil.rmtree(downloadFolder, ignore_errors=True)
+
+def getProcessCPUTime():
+	processUsage = resource.getrusage(resource.RUSAGE_SELF)
+	return processUsage.ru_utime + processUsage.ru_stime
+
+def runConditionalSuite(pluginModule, options):
+	import RPFramework
+	pollCount = min(options.iterations, 500)
+	statusPayload = u'|*|'.join([u'http', u'/status', u'none', u'', u''])
+	for (caseLabel, statusValidators, conditionalPolling) in [(u'every poll processed (former)', True, u'false'), (u'conditional GET (304)', True, u'true'), (u'content hash (no validators)', False, u'true')]:
+		# the status document is a channel status line as matched by the TiVo's responses
+		standIn = HTTPStandIn(statusDocument='CH_STATUS 0702 LOCAL', statusValidators=statusValidators)
+		standIn.start()
+		try:
+			benchmarkPlugin = createPlugin(pluginModule, u'polling')
+			benchmarkPlugin.putGUIConfigValue(PLUGIN_DEVICETYPEID, RPFramework.RPFrameworkRESTfulDevice.GUI_CONFIG_RESTFULSTATUSPOLL_ACTIONID, STATUS_POLLACTIONID)
+			benchmarkPlugin.putGUIConfigValue(PLUGIN_DEVICETYPEID, RPFramework.RPFrameworkRESTfulDevice.GUI_CONFIG_RESTFULSTATUSPOLL_CONDITIONAL, conditionalPolling)
+			restfulDevice = createRESTfulDevice(benchmarkPlugin, standIn.server_address[1])
+			startTime = time.time()
+			startCPUTime = getProcessCPUTime()
+			restfulDevice.queueDeviceCommands([RPFramework.RPFrameworkCommand.RPFrameworkCommand(RPFramework.RPFrameworkRESTfulDevice.CMD_RESTFUL_GET, commandPayload=statusPayload, parentAction=STATUS_POLLACTIONID) for iteration in range(0, pollCount)])
+			restfulDevice.commandQueue.join()
+			cpuTime = getProcessCPUTime() - startCPUTime
+			elapsedTime = time.time() - startTime
+			restfulDevice.terminateCommunications()
+			reportLine(u'conditional', caseLabel, '%.0f polls/sec, %.3fms CPU per poll, %d processed, %d skipped, %d state updates' % (pollCount / elapsedTime, cpuTime * 1000.0 / pollCount, restfulDevice.statusPollsProcessed, restfulDevice.statusPollsSkipped, restfulDevice.indigoDevice.stateUpdateCount))
+		finally:
+			standIn.stop()
+
+def getDownloadChunk(downloadVersion, startByte, maximumLength):
+	# each version of the download repeats DOWNLOAD_CHUNK from a different offset, so that
+	# a file stitched together from two versions is told apart
+	chunkOffset = (startByte + downloadVersion * 7919) % len(DOWNLOAD_CHUNK)
+	return DOWNLOAD_CHUNK[chunkOffset:chunkOffset + maximumLength]
+
+def getDownloadContent(downloadVersion, downloadSize):
+	downloadContent = []
+	contentLength = 0
+	while contentLength < downloadSize:
+		downloadContent.append(getDownloadChunk(downloadVersion, contentLength, downloadSize - contentLength))
+		contentLength += len(downloadContent[-1])
+	return ''.join(downloadContent)
+
+def getNowPlayingItem(itemIndex, folderCount=0):
+	# the first recording is in progress and the last is the latest captured; the folders
+	# (which give a TotalItems of their own) come before the recordings
+	if itemIndex < folderCount:
+		return NOWPLAYING_FOLDER % (itemIndex, 3, 1900000000 + itemIndex, itemIndex)
+	inProgress = ''
+	if itemIndex == 0:
+		inProgress = '<InProgress>Yes</InProgress>'
+	return NOWPLAYING_ITEM % (itemIndex, 2000000000 + itemIndex, 1800000, 1500000000 + itemIndex * 3600, itemIndex, inProgress, itemIndex, itemIndex, itemIndex, itemIndex)
+
+def runNowPlayingSuite(pluginModule, options):
+	import requests
+	import RPFramework
+	import tivoNowPlaying
+	import tivoRemoteDevice
+	try:
+		requests.packages.urllib3.disable_warnings()
+	except AttributeError:
+		pass
+
+	certificateFolder = tempfile.mkdtemp()
+	try:
+		certificatePath = None
+		try:
+			certificatePath = createStandInCertificate(certificateFolder)
+		except OSError:
+			pass
+		if certificatePath is None:
+			reportLine(u'nowplaying', u'skipped', 'openssl is required to create the certificate')
+			return
+
+		standIn = HTTPStandIn(certificatePath=certificatePath, digestAuthentication=True)
+		standIn.start()
+		try:
+			# read by the TiVo device's Now Playing device a page at a time; these run first
+			# as the peak memory of the process only ever rises
+			for nowPlayingCount in NOWPLAYING_COUNTS:
+				standIn.nowPlayingCount = nowPlayingCount
+				standIn.requestCount = 0
+				standIn.connectionCount = 0
+				benchmarkPlugin = createPlugin(pluginModule, u'polling')
+				benchmarkDevice = BenchmarkIndigoDevice(1, 0)
+				benchmarkDevice.pluginProps[u'tivoMAK'] = u'0123456789'
+				tivoDevice = tivoRemoteDevice.TivoRemoteDevice(benchmarkPlugin, benchmarkDevice)
+				tivoDevice.nowPlayingDevice = tivoNowPlaying.TiVoNowPlayingDevice(benchmarkPlugin, benchmarkDevice, tivoDevice)
+				tivoDevice.nowPlayingDevice.nowPlayingPort = standIn.server_address[1]
+				peakMemoryBefore = getPeakMemory()
+				startTime = time.time()
+				tivoDevice.refreshNowPlaying()
+				completed = benchmarkDevice.waitFor(lambda: u'nowPlayingLastRefreshed' in benchmarkDevice.serverStates, 300.0)
+				elapsedTime = time.time() - startTime
+				tivoDevice.terminateCommunications()
+
+				caseLabel = u'%d recordings: paged, streamed parse' % nowPlayingCount
+				expectedDiskUsed = round(sum([2000000000 + itemIndex for itemIndex in range(0, nowPlayingCount)]) / 1000000000.0, 1)
+				if completed == False:
+					reportLine(u'nowplaying', caseLabel, 'did not complete')
+				else:
+					totalsCorrect = benchmarkDevice.serverStates.get(u'nowPlayingRecordingCount', None) == nowPlayingCount and benchmarkDevice.serverStates.get(u'nowPlayingInProgressCount', None) == 1 and benchmarkDevice.serverStates.get(u'nowPlayingDiskUsed', None) == expectedDiskUsed and benchmarkDevice.serverStates.get(u'nowPlayingLatestRecording', None) == u'Benchmark Show %d - Episode %d' % (nowPlayingCount - 1, nowPlayingCount - 1)
+					reportLine(u'nowplaying', caseLabel, '%.2fs, peak memory +%.1fMB, %d requests, %d connections, totals %s' % (elapsedTime, getPeakMemory() - peakMemoryBefore, standIn.requestCount, standIn.connectionCount, totalsCorrect and 'correct' or 'INCORRECT'))
+
+			# the whole of the list requested at once and parsed into a tree
+			for nowPlayingCount in NOWPLAYING_COUNTS:
+				standIn.nowPlayingCount = nowPlayingCount
+				peakMemoryBefore = getPeakMemory()
+				startTime = time.time()
+				responseObj = requests.get(u'https://127.0.0.1:%d/TiVoConnect' % standIn.server_address[1], params={u'Command': u'QueryContainer', u'Container': u'/NowPlaying', u'Recurse': u'Yes', u'ItemCount': nowPlayingCount}, auth=requests.auth.HTTPDigestAuth(u'tivo', u'0123456789'), verify=False)
+				nowPlayingTree = xml.etree.cElementTree.fromstring(responseObj.content)
+				recordingCount = len(nowPlayingTree.findall('{http://www.tivo.com/developer/calypso-protocol-1.6/}Item'))
+				elapsedTime = time.time() - startTime
+				responseObj = None
+				nowPlayingTree = None
+				reportLine(u'nowplaying', u'%d recordings: whole list parsed into a tree' % nowPlayingCount, '%.2fs, peak memory +%.1fMB, %d recordings' % (elapsedTime, getPeakMemory() - peakMemoryBefore, recordingCount))
+		finally:
+			standIn.stop()
+	finally:
+		shutil.rmtree(certificateFolder, ignore_errors=True)
+
+def createStandInImage():
+	# a JPEG of cover art proportions with enough detail that its encoding is realistic
+	from PIL import Image
+	standInImage = Image.frombytes('RGB', IMAGE_SIZE, os.urandom(IMAGE_SIZE[0] * IMAGE_SIZE[1] * 3)).resize((IMAGE_SIZE[0] / 8, IMAGE_SIZE[1] / 8)).resize(IMAGE_SIZE, Image.BILINEAR)
+	imageOutput = StringIO.StringIO()
+	standInImage.save(imageOutput, 'JPEG', quality=90)
+	return imageOutput.getvalue()
+
+def getImageDimensions(imagePath):
+	from PIL import Image
+	return Image.open(imagePath).size
+
+def downloadImages(RPFramework, restfulDevice, imagePaths, imageWidth, imageHeight, saveLocation):
+	# queues a DOWNLOAD_IMAGE command for each path in turn, waiting for the device to be
+	# notified of each; returns the time until each notification
+	downloadTimes = []
+	for imagePath in imagePaths:
+		restfulDevice.downloadCompletedEvent.clear()
+		commandPayload = u'|*|'.join([u'http', imagePath, u'none', u'', u'', saveLocation, unicode(imageWidth), unicode(imageHeight)])
+		startTime = time.time()
+		restfulDevice.queueDeviceCommand(RPFramework.RPFrameworkCommand.RPFrameworkCommand(RPFramework.RPFrameworkRESTfulDevice.CMD_DOWNLOADIMAGE, commandPayload=commandPayload))
+		if restfulDevice.downloadCompletedEvent.wait(30.0) != True:
+			break
+		downloadTimes.append(restfulDevice.downloadCompletedTime - startTime)
+	return downloadTimes
+
+def runImagesSuite(pluginModule, options):
+	import requests
+	import RPFramework
+	try:
+		standInImage = createStandInImage()
+	except ImportError:
+		reportLine(u'images', u'skipped', 'Pillow is required to create the stand-in image')
+		return
+
+	sipsInstalled = any(os.path.exists(os.path.join(searchPath, 'sips')) for searchPath in os.environ.get('PATH', '').split(os.pathsep))
+	imageFolder = tempfile.mkdtemp()
+	standIn = HTTPStandIn(imageData=standInImage)
+	standIn.start()
+	try:
+		imageCount = min(options.iterations, 50)
+		saveLocation = os.path.join(imageFolder, u'coverArt.jpg')
+		for backendName in [RPFramework.RPFrameworkImageResizer.IMAGERESIZE_BACKEND_PILLOW, RPFramework.RPFrameworkImageResizer.IMAGERESIZE_BACKEND_SIPS]:
+			if backendName == RPFramework.RPFrameworkImageResizer.IMAGERESIZE_BACKEND_SIPS and sipsInstalled == False:
+				reportLine(u'images', backendName, 'skipped: sips is only available on Mac OS X')
+				continue
+
+			for (imageWidth, imageHeight, expectedDimensions) in [(240, 240, (240, 240)), (320, 0, (320, 320))]:
+				caseLabel = u'%s %s: ' % (backendName, imageHeight > 0 and u'%dx%d' % (imageWidth, imageHeight) or u'max %d' % imageWidth)
+				benchmarkPlugin = createPlugin(pluginModule, u'polling')
+				benchmarkPlugin.imageResizer = RPFramework.RPFrameworkImageResizer.RPFrameworkImageResizer(benchmarkPlugin, 2, backendName)
+				restfulDevice = createRESTfulDevice(benchmarkPlugin, standIn.server_address[1])
+				resizedCount = [0]
+				def checkResized(outputFileName):
+					if getImageDimensions(outputFileName) == expectedDimensions:
+						resizedCount[0] += 1
+				restfulDevice.downloadCompletedCheck = checkResized
+
+				# a different image each time, each downloaded and resized
+				downloadTimes = downloadImages(RPFramework, restfulDevice, [u'/image/%d.jpg' % imageIndex for imageIndex in range(0, imageCount)], imageWidth, imageHeight, saveLocation)
+				reportTimings(u'images', caseLabel + u'download and resize (%d of %d resized when notified)' % (resizedCount[0], len(downloadTimes)), downloadTimes)
+
+				# the same image refreshed repeatedly, as by a control page; each refresh is
+				# revalidated with the stand-in and answered from the cache
+				standIn.requestCount = 0
+				resizedCount[0] = 0
+				downloadTimes = downloadImages(RPFramework, restfulDevice, [u'/image/0.jpg'] * imageCount, imageWidth, imageHeight, saveLocation)
+				reportTimings(u'images', caseLabel + u'refresh of the same image (%d of %d resized, %d requests)' % (resizedCount[0], len(downloadTimes), standIn.requestCount), downloadTimes)
+
+				restfulDevice.terminateCommunications()
+				benchmarkPlugin.imageResizer.stopWorkers()
+
+		# as formerly resized, a sips shell command started once the download is written
+		# and not waited upon
+		if sipsInstalled == False:
+			reportLine(u'images', u'sips shell command (former)', 'skipped: sips is only available on Mac OS X')
+		else:
+			downloadTimes = []
+			resizedCount = 0
+			for imageIndex in range(0, imageCount):
+				startTime = time.time()
+				responseObj = requests.get(u'http://127.0.0.1:%d/image/%d.jpg' % (standIn.server_address[1], imageIndex))
+				with open(saveLocation, 'wb') as localFile:
+					localFile.write(responseObj.content)
+				subprocess.Popen(u'sips -z 240 240 ' + saveLocation, shell=True)
+				downloadTimes.append(time.time() - startTime)
+				if getImageDimensions(saveLocation) == (240, 240):
+					resizedCount += 1
+				time.sleep(0.5)
+			reportTimings(u'images', u'sips shell command (former) 240x240: download and resize (%d of %d resized when notified)' % (resizedCount, len(downloadTimes)), downloadTimes)
+	finally:
+		standIn.stop()
+		shutil.rmtree(imageFolder, ignore_errors=True)
+
+def runShutdownSuite(pluginModule, options):
+	simulator = tivoRemoteSimulator.TiVoSimulator(count=options.devices, basePort=0)
+	simulator.start()
+	try:
+		for ioEngine in IO_ENGINES:
+			shutdownTimes = []
+			for iteration in range(0, min(options.iterations, 5)):
+				benchmarkPlugin = createPlugin(pluginModule, ioEngine)
+				pluginThread = threading.Thread(target=benchmarkPlugin.runConcurrentThread)
+				pluginThread.daemon = True
+				pluginThread.start()
+				benchmarkDevices = startDevices(benchmarkPlugin, simulator.getPorts())
+
+				startTime = time.time()
+				benchmarkPlugin.stopConcurrentThread()
+				stopDevices(benchmarkPlugin, benchmarkDevices)
+				shutdownTimes.append(time.time() - startTime)
+			reportTimings(u'shutdown', u'%s: %d TiVos' % (ioEngine, options.devices), shutdownTimes)
+	finally:
+		simulator.stop()
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Command line entry point
+#/////////////////////////////////////////////////////////////////////////////////////////
+def main(argv):
+	optionParser = optparse.OptionParser(usage='%prog [options]')
+	optionParser.add_option('--suite', default=','.join(BENCHMARK_SUITES), help='comma-separated list of suites to run [%default]')
+	optionParser.add_option('--iterations', type='int', default=200, help='samples per timing measurement [%default]')
+	optionParser.add_option('--devices', type='int', default=12, help='number of simulated TiVos for the scaling, reconnect and shutdown suites [%default]')
+	optionParser.add_option('--duration', type='float', default=10.0, help='seconds to measure each engine in the scaling suite [%default]')
+	optionParser.add_option('--latency', type='float', default=0.0, help='simulated TiVo response latency in milliseconds [%default]')
+	optionParser.add_option('--jitter', type='float', default=0.0, help='simulated TiVo response jitter in milliseconds [%default]')
+	(options, args) = optionParser.parse_args(argv)
+	logging.basicConfig(level=logging.WARNING)
+	options.latency = options.latency / 1000.0
+	options.jitter = options.jitter / 1000.0
+
+	suites = [suiteName.strip() for suiteName in options.suite.split(',') if suiteName.strip() != '']
+	for suiteName in suites:
+		if not (suiteName in BENCHMARK_SUITES):
+			optionParser.error('unknown suite: ' + suiteName)
+
+	if u'wire' in suites:
+		runWireSuite(options)
+
+	pluginSuites = [suiteName for suiteName in suites if suiteName != u'wire']
+	if len(pluginSuites) > 0:
+		try:
+			pluginModule = loadPluginModule()
+		except ImportError, e:
+			for suiteName in pluginSuites:
+				reportLine(suiteName, u'skipped', 'the plugin failed to load: ' + unicode(e))
+			return 0
+
+		suiteRoutines = {u'latency': runLatencySuite, u'macro': runMacroSuite, u'responses': runResponsesSuite, u'matching': runMatchingSuite, u'framing': runFramingSuite, u'templates': runTemplatesSuite, u'expressions': runExpressionsSuite, u'reconnect': runReconnectSuite, u'health': runHealthSuite, u'discovery': runDiscoverySuite, u'ssdp': runSSDPSuite, u'scaling': runScalingSuite, u'http': runHTTPSuite, u'download': runDownloadSuite, u'conditional': runConditionalSuite, u'images': runImagesSuite, u'nowplaying': runNowPlayingSuite, u'shutdown': runShutdownSuite}
+		# each suite is run in a process of its own so that it starts without the threads,
+		# sockets and (for the peak memory reported) memory high-water mark of another
+		exitCode = 0
+		for suiteName in pluginSuites:
+			suiteProcessId = os.fork()
+			if suiteProcessId == 0:
+				suiteExitCode = 1
+				try:
+					suiteRoutines[suiteName](pluginModule, options)
+					suiteExitCode = 0
+				except:
+					traceback.print_exc()
+				finally:
+					sys.stdout.flush()
+					sys.stderr.flush()
+					os._exit(suiteExitCode)
+			if os.waitpid(suiteProcessId, 0)[1] != 0:
+				reportLine(suiteName, u'failed', 'see the error above')
+				exitCode = 1
+		return exitCode
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,494 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# TiVo Network Remote Simulator by RogueProeliator <adam.d.ashe@gmail.com>
+# 	Simulates any number of TiVo DVRs speaking the TCP Network Remote protocol (port 31339)
+#	on the local machine for use in development, load testing and benchmarking of the
+#	TiVo Network Remote plugin. All simulated TiVos are serviced by a single select loop
+#	so that hundreds of instances may be run from a single process.
+#
+#	Usage:
+#		python tivoRemoteSimulator.py --count 10 --base-port 31339 --latency 20 --jitter 5
+#
+#	Commands understood:
+#		IRCODE <key>               CHANNELUP/CHANNELDOWN change channel, others ignored
+#		KEYBOARD <key>             accepted and ignored
+#		TELEPORT <screen>          LIVETV reports the current channel, others ignored
+#		SETCH <ch> [<subch>]       tune, failing with CH_FAILED RECORDING if recording
+#		FORCECH <ch> [<subch>]     tune, even if recording
+#
+#	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# 	SOFTWARE.
+#
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Python imports
+#/////////////////////////////////////////////////////////////////////////////////////////
+import errno
+import fcntl
+import heapq
+import optparse
+import os
+import random
+import select
+import socket
+import sys
+import threading
+import time
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Constants and configuration variables
+#/////////////////////////////////////////////////////////////////////////////////////////
+TIVO_REMOTE_PORT = 31339
+TIVO_LINE_ENDING = '\r'
+
+TIVO_MIN_CHANNEL = 1
+TIVO_MAX_CHANNEL = 9999
+
+CH_FAILED_REASONS = ['NO_LIVE', 'MISSING_CHANNEL', 'MALFUNCTION']
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# SimulatedTiVo
+#	Holds the tuner state of a single simulated TiVo; a TiVo may have several remote
+#	connections open at once, all of which receive channel status updates
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class SimulatedTiVo(object):
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor allows passing in the listening socket and initial tuner state
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self, listenSocket, channel=1, subChannel=0, isRecording=False):
+		self.listenSocket = listenSocket
+		self.port = listenSocket.getsockname()[1]
+		self.channel = channel
+		self.subChannel = subChannel
+		self.isRecording = isRecording
+		self.connections = []
+		self.connectionsAccepted = 0
+		self.commandsReceived = 0
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the CH_STATUS line reporting the current channel
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getChannelStatus(self, reason='LOCAL'):
+		if self.isRecording == True:
+			reason = 'RECORDING'
+		if self.subChannel > 0:
+			return 'CH_STATUS %04d %04d %s' % (self.channel, self.subChannel, reason)
+		else:
+			return 'CH_STATUS %04d %s' % (self.channel, reason)
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Processes a single command line received from a remote connection; returns a tuple
+	# of (responseLine or None, broadcastToAllConnections)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def processCommand(self, commandLine, failRate=0.0):
+		self.commandsReceived += 1
+		commandParts = commandLine.strip().split()
+		if len(commandParts) == 0:
+			return (None, False)
+		commandName = commandParts[0].upper()
+		commandArgs = commandParts[1:]
+
+		if commandName == 'IRCODE' and len(commandArgs) > 0:
+			keyName = commandArgs[0].upper()
+			if keyName == 'CHANNELUP':
+				self.tuneChannel(self.channel + 1 if self.channel < TIVO_MAX_CHANNEL else TIVO_MIN_CHANNEL, 0)
+				return (self.getChannelStatus(), True)
+			elif keyName == 'CHANNELDOWN':
+				self.tuneChannel(self.channel - 1 if self.channel > TIVO_MIN_CHANNEL else TIVO_MAX_CHANNEL, 0)
+				return (self.getChannelStatus(), True)
+			elif keyName == 'LIVETV':
+				return (self.getChannelStatus(), False)
+			return (None, False)
+
+		elif commandName == 'KEYBOARD':
+			return (None, False)
+
+		elif commandName == 'TELEPORT' and len(commandArgs) > 0:
+			if commandArgs[0].upper() == 'LIVETV':
+				return (self.getChannelStatus(), False)
+			return (None, False)
+
+		elif commandName in ('SETCH', 'FORCECH'):
+			try:
+				# the plugin historically sent floating point values ("SETCH 7.0")
+				newChannel = int(float(commandArgs[0]))
+				newSubChannel = int(float(commandArgs[1])) if len(commandArgs) > 1 else 0
+			except (IndexError, ValueError):
+				return ('CH_FAILED INVALID_CHANNEL', False)
+
+			if newChannel < TIVO_MIN_CHANNEL or newChannel > TIVO_MAX_CHANNEL:
+				return ('CH_FAILED INVALID_CHANNEL', False)
+			if commandName == 'SETCH' and self.isRecording == True:
+				return ('CH_FAILED RECORDING', False)
+			if failRate > 0.0 and random.random() < failRate:
+				return ('CH_FAILED ' + random.choice(CH_FAILED_REASONS), False)
+
+			if commandName == 'FORCECH':
+				self.isRecording = False
+			self.tuneChannel(newChannel, newSubChannel)
+			return (self.getChannelStatus(), True)
+
+		return (None, False)
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Changes the tuned channel
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def tuneChannel(self, channel, subChannel):
+		self.channel = channel
+		self.subChannel = subChannel
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# SimulatedTiVoConnection
+#	A single remote-control connection to a simulated TiVo
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class SimulatedTiVoConnection(object):
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor allows passing in the accepted socket and the TiVo it belongs to
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self, clientSocket, tivo):
+		self.clientSocket = clientSocket
+		self.tivo = tivo
+		self.receiveBuffer = ''
+		self.sendBuffer = ''
+		self.lastScheduledSend = 0.0
+		self.isClosed = False
+		self.isFrozen = False
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# TiVoSimulator
+#	Runs any number of simulated TiVos from a single select loop; may be run from the
+#	command line or started on a background thread by the benchmark suite
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class TiVoSimulator(object):
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Constructor; latency and jitter are in seconds, disconnectRate and failRate are the
+	# probability (per command) of dropping the connection or failing a channel change.
+	# A basePort of 0 assigns each TiVo an ephemeral port; a receiveBufferSize (in bytes)
+	# shrinks the receive buffer of each connection so that a frozen one fills quickly
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def __init__(self, count=1, host='127.0.0.1', basePort=TIVO_REMOTE_PORT, latency=0.0, jitter=0.0, disconnectRate=0.0, failRate=0.0, statusOnConnect=True, commandCallback=None, receiveBufferSize=0):
+		self.host = host
+		self.latency = latency
+		self.jitter = jitter
+		self.disconnectRate = disconnectRate
+		self.failRate = failRate
+		self.statusOnConnect = statusOnConnect
+		self.commandCallback = commandCallback
+
+		self.tivos = []
+		for tivoIndex in range(0, count):
+			listenSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+			listenSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+			if receiveBufferSize > 0:
+				# set before listening so that the accepted connections inherit the buffer
+				# size (and advertise a window to match)
+				listenSocket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receiveBufferSize)
+			listenSocket.bind((host, basePort + tivoIndex if basePort > 0 else 0))
+			listenSocket.listen(16)
+			listenSocket.setblocking(0)
+			self.tivos.append(SimulatedTiVo(listenSocket, channel=tivoIndex + 1))
+
+		self.scheduledSends = []
+		self.scheduleSequence = 0
+		self.pendingActions = []
+		self.actionLock = threading.Lock()
+		self.wakeupPipe = os.pipe()
+		for pipeDescriptor in self.wakeupPipe:
+			fcntl.fcntl(pipeDescriptor, fcntl.F_SETFL, fcntl.fcntl(pipeDescriptor, fcntl.F_GETFL) | os.O_NONBLOCK)
+		self.simulatorThread = None
+		self.stopRequested = False
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Returns the list of ports on which the simulated TiVos are listening
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def getPorts(self):
+		return [tivo.port for tivo in self.tivos]
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Starts the simulator on a background (daemon) thread
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def start(self):
+		self.simulatorThread = threading.Thread(target=self.run, name='TiVoSimulator')
+		self.simulatorThread.daemon = True
+		self.simulatorThread.start()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Stops the simulator and closes all sockets
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def stop(self):
+		self.stopRequested = True
+		self.wake()
+		if not (self.simulatorThread is None):
+			self.simulatorThread.join(5.0)
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Schedules a routine to run on the simulator thread (thread-safe)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def callOnSimulatorThread(self, action):
+		with self.actionLock:
+			self.pendingActions.append(action)
+		self.wake()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Drops every open remote connection (as a TiVo reboot or network fault would)
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def dropConnections(self):
+		def dropAll():
+			for tivo in self.tivos:
+				for connection in list(tivo.connections):
+					self.closeConnection(connection)
+		self.callOnSimulatorThread(dropAll)
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Stops reading from and writing to every open remote connection, as a TiVo which has
+	# hung would; commands are left unanswered and, once the connection's receive buffer
+	# has filled, the data written is no longer acknowledged. The connections stay open
+	# and new connections are serviced as normal
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def freezeConnections(self):
+		def freezeAll():
+			for tivo in self.tivos:
+				for connection in tivo.connections:
+					connection.isFrozen = True
+		self.callOnSimulatorThread(freezeAll)
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Sends the given number of unsolicited CH_STATUS lines down every open connection,
+	# as though the channel were being changed on the TiVo itself
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def floodChannelStatus(self, lineCount):
+		def flood():
+			for tivo in self.tivos:
+				statusLines = []
+				for lineIndex in range(0, lineCount):
+					tivo.tuneChannel(lineIndex % TIVO_MAX_CHANNEL + 1, 0)
+					statusLines.append(tivo.getChannelStatus() + TIVO_LINE_ENDING)
+				for connection in tivo.connections:
+					connection.sendBuffer += ''.join(statusLines)
+		self.callOnSimulatorThread(flood)
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Interrupts the select loop
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def wake(self):
+		try:
+			os.write(self.wakeupPipe[1], b'!')
+		except OSError:
+			pass
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# The main simulator loop; accepts connections, reads commands, and sends responses
+	# once their simulated latency has elapsed
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def run(self):
+		listenSockets = dict((tivo.listenSocket.fileno(), tivo) for tivo in self.tivos)
+		try:
+			while self.stopRequested == False:
+				# run any actions requested from other threads
+				with self.actionLock:
+					pendingActions = self.pendingActions
+					self.pendingActions = []
+				for pendingAction in pendingActions:
+					pendingAction()
+
+				# move any responses whose latency has elapsed into the send buffers
+				timeNow = time.time()
+				while len(self.scheduledSends) > 0 and self.scheduledSends[0][0] <= timeNow:
+					(sendTime, sequence, connection, responseLine) = heapq.heappop(self.scheduledSends)
+					if connection.isClosed == False and connection.isFrozen == False:
+						connection.sendBuffer += responseLine + TIVO_LINE_ENDING
+
+				readList = [self.wakeupPipe[0]] + [tivo.listenSocket for tivo in self.tivos]
+				writeList = []
+				clientSockets = dict()
+				for tivo in self.tivos:
+					for connection in tivo.connections:
+						if connection.isFrozen == True:
+							continue
+						readList.append(connection.clientSocket)
+						clientSockets[connection.clientSocket.fileno()] = connection
+						if connection.sendBuffer != '':
+							writeList.append(connection.clientSocket)
+
+				selectTimeout = None
+				if len(self.scheduledSends) > 0:
+					selectTimeout = max(0.0, self.scheduledSends[0][0] - time.time())
+				try:
+					readyToRead, readyToWrite = select.select(readList, writeList, [], selectTimeout)[0:2]
+				except select.error as e:
+					if e.args[0] == errno.EINTR:
+						continue
+					raise
+
+				for readySocket in readyToWrite:
+					connection = clientSockets[readySocket.fileno()]
+					if connection.isClosed == False:
+						self.writeConnection(connection)
+
+				for readySocket in readyToRead:
+					if readySocket is self.wakeupPipe[0]:
+						os.read(self.wakeupPipe[0], 4096)
+					elif readySocket.fileno() in listenSockets:
+						self.acceptConnection(listenSockets[readySocket.fileno()])
+					else:
+						connection = clientSockets[readySocket.fileno()]
+						if connection.isClosed == False:
+							self.readConnection(connection)
+		finally:
+			for tivo in self.tivos:
+				for connection in list(tivo.connections):
+					self.closeConnection(connection)
+				tivo.listenSocket.close()
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Accepts a new remote connection; the TiVo reports its current channel immediately
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def acceptConnection(self, tivo):
+		try:
+			clientSocket = tivo.listenSocket.accept()[0]
+		except socket.error:
+			return
+		clientSocket.setblocking(0)
+		clientSocket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		connection = SimulatedTiVoConnection(clientSocket, tivo)
+		tivo.connections.append(connection)
+		tivo.connectionsAccepted += 1
+		if self.commandCallback is not None:
+			self.commandCallback(tivo, None, time.time())
+		if self.statusOnConnect == True:
+			self.scheduleResponse(connection, tivo.getChannelStatus())
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Reads waiting data from the connection and processes any complete command lines
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def readConnection(self, connection):
+		try:
+			receivedData = connection.clientSocket.recv(4096)
+		except socket.error as e:
+			if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+				return
+			receivedData = ''
+		if receivedData == '':
+			self.closeConnection(connection)
+			return
+
+		receivedTime = time.time()
+		commandLines = (connection.receiveBuffer + receivedData).replace('\n', '\r').split(TIVO_LINE_ENDING)
+		connection.receiveBuffer = commandLines.pop()
+		for commandLine in commandLines:
+			if commandLine.strip() == '':
+				continue
+			tivo = connection.tivo
+			if self.commandCallback is not None:
+				self.commandCallback(tivo, commandLine, receivedTime)
+			if self.disconnectRate > 0.0 and random.random() < self.disconnectRate:
+				self.closeConnection(connection)
+				return
+
+			(responseLine, broadcastResponse) = tivo.processCommand(commandLine, self.failRate)
+			if responseLine is not None:
+				responseConnections = tivo.connections if broadcastResponse == True else [connection]
+				for responseConnection in responseConnections:
+					self.scheduleResponse(responseConnection, responseLine)
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Writes as much of the connection's send buffer as the socket will accept
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def writeConnection(self, connection):
+		try:
+			bytesSent = connection.clientSocket.send(connection.sendBuffer)
+			connection.sendBuffer = connection.sendBuffer[bytesSent:]
+		except socket.error as e:
+			if not (e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK)):
+				self.closeConnection(connection)
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Queues a response line to be sent after the simulated latency (+/- jitter); the
+	# responses on a single connection are never re-ordered
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def scheduleResponse(self, connection, responseLine):
+		responseDelay = self.latency
+		if self.jitter > 0.0:
+			responseDelay += random.uniform(-self.jitter, self.jitter)
+		sendTime = max(time.time() + max(0.0, responseDelay), connection.lastScheduledSend)
+		connection.lastScheduledSend = sendTime
+
+		self.scheduleSequence += 1
+		heapq.heappush(self.scheduledSends, (sendTime, self.scheduleSequence, connection, responseLine))
+
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	# Closes the remote connection
+	#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+	def closeConnection(self, connection):
+		if connection.isClosed == False:
+			connection.isClosed = True
+			connection.tivo.connections.remove(connection)
+			try:
+				connection.clientSocket.close()
+			except socket.error:
+				pass
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Command line entry point
+#/////////////////////////////////////////////////////////////////////////////////////////
+def main(argv):
+	optionParser = optparse.OptionParser(usage='%prog [options]')
+	optionParser.add_option('--count', type='int', default=1, help='number of TiVos to simulate [%default]')
+	optionParser.add_option('--host', default='127.0.0.1', help='address on which to listen [%default]')
+	optionParser.add_option('--base-port', type='int', default=TIVO_REMOTE_PORT, help='port of the first TiVo; each additional TiVo uses the next port; 0 for ephemeral ports [%default]')
+	optionParser.add_option('--latency', type='float', default=0.0, help='response latency in milliseconds [%default]')
+	optionParser.add_option('--jitter', type='float', default=0.0, help='response latency jitter (+/-) in milliseconds [%default]')
+	optionParser.add_option('--disconnect-rate', type='float', default=0.0, help='probability that a command drops the connection [%default]')
+	optionParser.add_option('--fail-rate', type='float', default=0.0, help='probability that a channel change fails with CH_FAILED [%default]')
+	optionParser.add_option('--verbose', action='store_true', default=False, help='print each command received')
+	(options, args) = optionParser.parse_args(argv)
+
+	def logCommand(tivo, commandLine, receivedTime):
+		if commandLine is None:
+			sys.stdout.write('%.3f\t%d\tCONNECTED\n' % (receivedTime, tivo.port))
+		else:
+			sys.stdout.write('%.3f\t%d\t%s\n' % (receivedTime, tivo.port, commandLine))
+		sys.stdout.flush()
+
+	simulator = TiVoSimulator(count=options.count, host=options.host, basePort=options.base_port, latency=options.latency / 1000.0, jitter=options.jitter / 1000.0, disconnectRate=options.disconnect_rate, failRate=options.fail_rate, commandCallback=logCommand if options.verbose else None)
+
+	# the benchmark suite reads this line to find the ports when run as a sub-process
+	sys.stdout.write('LISTENING ' + ','.join([str(port) for port in simulator.getPorts()]) + '\n')
+	sys.stdout.flush()
+	try:
+		simulator.run()
+	except KeyboardInterrupt:
+		pass
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,840 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# TiVo Network Remote Tests by RogueProeliator <adam.d.ashe@gmail.com>
+# 	Checks of the TiVo Network Remote plugin's behaviour which must hold rather than be
+#	measured (see tivoRemoteBenchmark.py for the latter); the plugin is loaded in the same
+#	way as by the benchmark suite, against the indigo stand-in where Indigo is absent,
+#	and TiVos are played by the simulator (tivoRemoteSimulator.py). No root privileges
+#	or network access are required.
+#
+#	Usage:
+#		python tivoRemoteTests.py [-v] [TestCaseName]
+#
+#	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# 	SOFTWARE.
+#
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Python imports
+#/////////////////////////////////////////////////////////////////////////////////////////
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import tivoRemoteBenchmark
+import tivoRemoteSimulator
+
+pluginModule = tivoRemoteBenchmark.loadPluginModule()
+import RPFramework
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# ExpressionTests
+#	The compiled "eval:" expressions must evaluate the plugin's own expressions but give
+#	no way out of the expression to the rest of the interpreter, as the text of a value
+#	placeholder (which may come from the TiVo) is itself compiled as an expression
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class ExpressionTests(unittest.TestCase):
+
+	def setUp(self):
+		self.expressionCache = RPFramework.RPFrameworkTemplate.RPFrameworkTemplateCache(templateClass=RPFramework.RPFrameworkExpression.RPFrameworkExpression)
+
+	def evaluate(self, expressionText, placeholderValues=None):
+		placeholderValues = placeholderValues or dict()
+		return self.expressionCache.getTemplate(expressionText).evaluate(lambda placeholderText: placeholderValues.get(placeholderText, u''), self.expressionCache)
+
+	def test_permittedExpressions(self):
+		self.assertEqual(self.evaluate(u'"FORCECH %ap:channelToTune%" if %ap:forceTune% else "SETCH %ap:channelToTune%"', {u'%ap:channelToTune%': u'702', u'%ap:forceTune%': u'False'}), u'SETCH 702')
+		self.assertEqual(self.evaluate(u'"%ds:channelSelector%"[:-1]', {u'%ds:channelSelector%': u'702'}), u'70')
+		self.assertEqual(self.evaluate(u'int("12") + 1'), 13)
+		self.assertEqual(self.evaluate(u'reMatch("CH_STATUS (\\\\d+)", "CH_STATUS 0702 LOCAL").group(1)'), u'0702')
+		self.assertEqual(self.evaluate(u'reSub("^0+", "", "0702")'), u'702')
+		self.assertEqual(self.evaluate(u'" abc ".strip().upper()'), u'ABC')
+
+	def test_modulesAndClassesRejected(self):
+		for expressionText in [u're.sys.modules["os"].getcwd()', u'math.sys', u'str.__class__', u'int.mro()', u'(1).__class__.__bases__', u'"".__class__', u'str.join', u'float.fromhex("1")', u'reMatch.func_globals', u'abs.__self__', u'len.__module__', u'reMatch("a", "a").re.__class__', u'__import__("os")', u'_rpattribute(1, "real")']:
+			self.assertRaises((ValueError, AttributeError), self.evaluate, expressionText)
+
+	def test_placeholderValueRejected(self):
+		# a value placeholder is evaluated as an expression, so device text must be held to
+		# the same restrictions
+		self.assertRaises(ValueError, self.evaluate, u'%cp:1%', {u'%cp:1%': u're.sys.modules["os"].getcwd()'})
+		self.assertEqual(self.evaluate(u'%cp:1%', {u'%cp:1%': u'702'}), 702)
+
+	def test_attributeOfModuleRejectedAtEvaluation(self):
+		self.assertRaises(ValueError, RPFramework.RPFrameworkExpression.getExpressionAttribute, os, u'getcwd')
+		self.assertRaises(ValueError, RPFramework.RPFrameworkExpression.getExpressionAttribute, str, u'join')
+		self.assertRaises(ValueError, RPFramework.RPFrameworkExpression.getExpressionAttribute, sys.stdout, u'__class__')
+		self.assertEqual(RPFramework.RPFrameworkExpression.getExpressionAttribute(u'abc', u'upper')(), u'ABC')
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# StatusPollTests
+#	Conditional status polls skip a document already processed, but one whose processing
+#	failed must be processed again when next polled
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class StatusPollTests(unittest.TestCase):
+
+	def pollAfterFailedProcessing(self, statusValidators):
+		standIn = tivoRemoteBenchmark.HTTPStandIn(statusDocument='CH_STATUS 0702 LOCAL', statusValidators=statusValidators)
+		standIn.start()
+		try:
+			testPlugin = tivoRemoteBenchmark.createPlugin(pluginModule, u'polling')
+			testPlugin.putGUIConfigValue(tivoRemoteBenchmark.PLUGIN_DEVICETYPEID, RPFramework.RPFrameworkRESTfulDevice.GUI_CONFIG_RESTFULSTATUSPOLL_ACTIONID, tivoRemoteBenchmark.STATUS_POLLACTIONID)
+			testPlugin.putGUIConfigValue(tivoRemoteBenchmark.PLUGIN_DEVICETYPEID, RPFramework.RPFrameworkRESTfulDevice.GUI_CONFIG_RESTFULSTATUSPOLL_CONDITIONAL, u'true')
+			restfulDevice = tivoRemoteBenchmark.createRESTfulDevice(testPlugin, standIn.server_address[1])
+			
+			# the first response fails in processing, as would a malformed document; later ones are only noted
+			responsesHandled = []
+			def handleDeviceTextResponse(responseObj, rpCommand):
+				responsesHandled.append(responseObj.status_code)
+				if len(responsesHandled) == 1:
+					raise ValueError(u'Processing failed')
+			restfulDevice.handleDeviceTextResponse = handleDeviceTextResponse
+			
+			statusPayload = u'|*|'.join([u'http', u'/status', u'none', u'', u''])
+			restfulDevice.queueDeviceCommands([RPFramework.RPFrameworkCommand.RPFrameworkCommand(RPFramework.RPFrameworkRESTfulDevice.CMD_RESTFUL_GET, commandPayload=statusPayload, parentAction=tivoRemoteBenchmark.STATUS_POLLACTIONID) for iteration in range(0, 3)])
+			restfulDevice.commandQueue.join()
+			restfulDevice.terminateCommunications()
+			return (responsesHandled, restfulDevice.statusPollsSkipped)
+		finally:
+			standIn.stop()
+
+	def test_failedProcessingRepeated(self):
+		self.assertEqual(self.pollAfterFailedProcessing(True), ([200, 200], 1))
+
+	def test_failedProcessingRepeatedWithoutValidators(self):
+		self.assertEqual(self.pollAfterFailedProcessing(False), ([200, 200], 1))
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# UPnPEnumerationTests
+#	A uPnP search which found nothing is cached as any other, so the device dialog only
+#	searches while it waits on a service target never searched before
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class UPnPEnumerationTests(unittest.TestCase):
+
+	def setUp(self):
+		self.testPlugin = tivoRemoteBenchmark.createPlugin(pluginModule, u'polling')
+		self.searchesRun = []
+		self.testPlugin.refreshUPNPEnumeration = lambda serviceId, defaultMaxAge: self.searchesRun.append(serviceId)
+
+	def test_emptyResultCached(self):
+		self.testPlugin.upnpEnumerationCache.updateDevices(u'ssdp:all', [], 180)
+		self.assertEqual(self.testPlugin.updateUPNPEnumerationList(tivoRemoteBenchmark.PLUGIN_DEVICETYPEID), [])
+		self.assertEqual(self.searchesRun, [])
+		self.assertEqual(self.testPlugin.pluginCommandQueue.qsize(), 0)
+
+	def test_emptyResultRefreshedInBackground(self):
+		self.testPlugin.upnpEnumerationCache.updateDevices(u'ssdp:all', [], 180)
+		self.testPlugin.upnpEnumerationCache.serviceTargets[u'ssdp:all'][u'lastSearch'] -= 181
+		for dialogOpened in range(0, 2):
+			self.assertEqual(self.testPlugin.updateUPNPEnumerationList(tivoRemoteBenchmark.PLUGIN_DEVICETYPEID), [])
+		self.assertEqual(self.searchesRun, [])
+		self.assertEqual(self.testPlugin.pluginCommandQueue.qsize(), 1)
+		self.assertEqual(self.testPlugin.pluginCommandQueue.getDue().commandName, RPFramework.RPFrameworkCommand.CMD_UPNP_REFRESHENUMERATION)
+
+	def test_neverSearched(self):
+		self.assertEqual(self.testPlugin.updateUPNPEnumerationList(tivoRemoteBenchmark.PLUGIN_DEVICETYPEID), [])
+		self.assertEqual(self.searchesRun, [u'ssdp:all'])
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# SSDPParsingTests
+#	SSDP datagrams (M-SEARCH responses and NOTIFY announcements) are parsed into their
+#	headers as httplib would, with the first of any repeated header used, and anything
+#	else is rejected
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+SSDP_SEARCHRESPONSE = '\r\n'.join([
+	'HTTP/1.1 200 OK',
+	'CACHE-CONTROL: max-age=1800',
+	'EXT:',
+	'LOCATION: http://192.168.1.20:80/upnp/description.xml',
+	'SERVER: Linux/2.6 UPnP/1.0 TiVo/20.7',
+	'ST: upnp:rootdevice',
+	'USN: uuid:tivo-0001::upnp:rootdevice',
+	'', ''])
+
+class SSDPParsingTests(unittest.TestCase):
+
+	def test_searchResponse(self):
+		ssdpResponse = RPFramework.RPFrameworkNetworkingUPnP.SSDPResponse(SSDP_SEARCHRESPONSE)
+		self.assertEqual(ssdpResponse.location, u'http://192.168.1.20:80/upnp/description.xml')
+		self.assertEqual(ssdpResponse.usn, u'uuid:tivo-0001::upnp:rootdevice')
+		self.assertEqual(ssdpResponse.st, u'upnp:rootdevice')
+		self.assertEqual(ssdpResponse.server, u'Linux/2.6 UPnP/1.0 TiVo/20.7')
+		self.assertEqual(ssdpResponse.cache, u'1800')
+		self.assertEqual(ssdpResponse.allHeaders[0:2], [('cache-control', 'max-age=1800'), ('ext', '')])
+
+	def test_continuationLines(self):
+		ssdpHeaders = RPFramework.RPFrameworkNetworkingUPnP.parseSSDPHeaders('HTTP/1.1 200 OK\r\nSERVER: Linux/2.6\r\n  UPnP/1.0\r\n\tTiVo/20.7\r\nST: upnp:rootdevice\r\n\r\nIGNORED: body\r\n')
+		self.assertEqual(ssdpHeaders, [('server', 'Linux/2.6 UPnP/1.0 TiVo/20.7'), ('st', 'upnp:rootdevice')])
+
+		# the line ending may be a bare line feed
+		self.assertEqual(RPFramework.RPFrameworkNetworkingUPnP.parseSSDPHeaders(SSDP_SEARCHRESPONSE.replace('\r\n', '\n')), RPFramework.RPFrameworkNetworkingUPnP.parseSSDPHeaders(SSDP_SEARCHRESPONSE))
+
+	def test_repeatedHeaderFirstUsed(self):
+		ssdpResponse = RPFramework.RPFrameworkNetworkingUPnP.SSDPResponse(SSDP_SEARCHRESPONSE + 'Location: http://192.168.1.99/other.xml\r\nCache-Control: max-age=60\r\nUSN: uuid:other\r\n')
+		self.assertEqual(ssdpResponse.location, u'http://192.168.1.20:80/upnp/description.xml')
+		self.assertEqual(ssdpResponse.usn, u'uuid:tivo-0001::upnp:rootdevice')
+		self.assertEqual(ssdpResponse.cache, u'1800')
+
+	def test_cacheControlValues(self):
+		for (cacheControl, cacheTime) in [('max-age=1800', u'1800'), ('max-age = 1800, no-cache', u'1800'), ('MAX-AGE=900', u'900'), ('no-cache="ext", max-age=120', u'120'), ('max-age="300"', u'300'), ('no-cache', u''), ('', u'')]:
+			ssdpResponse = RPFramework.RPFrameworkNetworkingUPnP.SSDPResponse(SSDP_SEARCHRESPONSE.replace('max-age=1800', cacheControl))
+			self.assertEqual(ssdpResponse.cache, cacheTime, cacheControl)
+
+	def test_notifyAnnouncement(self):
+		ssdpResponse = RPFramework.RPFrameworkNetworkingUPnP.SSDPResponse('\r\n'.join([
+			'NOTIFY * HTTP/1.1',
+			'HOST: 239.255.255.250:1900',
+			'CACHE-CONTROL: max-age=1800',
+			'LOCATION: http://192.168.1.20:80/upnp/description.xml',
+			'NT: upnp:rootdevice',
+			'NTS: ssdp:alive',
+			'USN: uuid:tivo-0001::upnp:rootdevice',
+			'', '']))
+		self.assertEqual(ssdpResponse.location, u'http://192.168.1.20:80/upnp/description.xml')
+		self.assertEqual(ssdpResponse.usn, u'uuid:tivo-0001::upnp:rootdevice')
+		self.assertEqual(ssdpResponse.cache, u'1800')
+		self.assertTrue(('nts', 'ssdp:alive') in ssdpResponse.allHeaders)
+
+	def test_notSSDPRejected(self):
+		for notSSDP in ['', 'M-SEARCH * HTTP/1.1\r\nHOST: 239.255.255.250:1900\r\nMAN: "ssdp:discover"\r\n\r\n', 'tivoConnect=1\nmethod=broadcast\n', '\x00\x01\x02\x03', ' HTTP/1.1 200 OK\r\n\r\n']:
+			self.assertRaises(ValueError, RPFramework.RPFrameworkNetworkingUPnP.parseSSDPHeaders, notSSDP)
+			self.assertRaises(ValueError, RPFramework.RPFrameworkNetworkingUPnP.SSDPResponse, notSSDP)
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# ImageCacheTests
+#	A resized image is taken from the image resizer's cache only once the device has
+#	confirmed, in answer to a conditional GET, that the image is unchanged; a changed
+#	image is downloaded and resized again
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class ImageCacheTests(unittest.TestCase):
+
+	def setUp(self):
+		try:
+			self.standIn = tivoRemoteBenchmark.HTTPStandIn(imageData=tivoRemoteBenchmark.createStandInImage())
+		except ImportError:
+			self.skipTest(u'Pillow is required to create the stand-in image')
+		self.standIn.start()
+		self.imageFolder = tempfile.mkdtemp()
+		self.saveLocation = os.path.join(self.imageFolder, u'coverArt.jpg')
+		self.testPlugin = tivoRemoteBenchmark.createPlugin(pluginModule, u'polling')
+		self.testPlugin.imageResizer = RPFramework.RPFrameworkImageResizer.RPFrameworkImageResizer(self.testPlugin, 1, RPFramework.RPFrameworkImageResizer.IMAGERESIZE_BACKEND_PILLOW)
+		self.restfulDevice = tivoRemoteBenchmark.createRESTfulDevice(self.testPlugin, self.standIn.server_address[1])
+		
+		self.resizeCount = [0]
+		resizeImage = self.testPlugin.imageResizer.resizeImage
+		def countedResize(*args, **kwargs):
+			self.resizeCount[0] += 1
+			return resizeImage(*args, **kwargs)
+		self.testPlugin.imageResizer.resizeImage = countedResize
+
+	def tearDown(self):
+		self.restfulDevice.terminateCommunications()
+		self.testPlugin.imageResizer.stopWorkers()
+		self.standIn.stop()
+		shutil.rmtree(self.imageFolder, ignore_errors=True)
+
+	def downloadImage(self):
+		downloadTimes = tivoRemoteBenchmark.downloadImages(RPFramework, self.restfulDevice, [u'/image/0.jpg'], 240, 240, self.saveLocation)
+		self.assertEqual(len(downloadTimes), 1)
+		self.assertEqual(tivoRemoteBenchmark.getImageDimensions(self.saveLocation), (240, 240))
+		with open(self.saveLocation, 'rb') as savedImage:
+			return savedImage.read()
+
+	def test_unchangedImageRevalidated(self):
+		firstImage = self.downloadImage()
+		os.remove(self.saveLocation)
+		self.assertEqual(self.downloadImage(), firstImage)
+		self.assertEqual(self.standIn.requestCount, 2)
+		self.assertEqual(self.resizeCount[0], 1)
+
+	def test_changedImageDownloaded(self):
+		firstImage = self.downloadImage()
+		self.standIn.imageData = tivoRemoteBenchmark.createStandInImage()
+		self.standIn.imageVersion = 2
+		self.assertNotEqual(self.downloadImage(), firstImage)
+		self.assertEqual(self.standIn.requestCount, 2)
+		self.assertEqual(self.resizeCount[0], 2)
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# NowPlayingTests
+#	The Now Playing list is paged through nowPlayingPageSize items at a time and its
+#	recordings totalled, skipping folders; the list is read again from the start should
+#	its length change part way through
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+NOWPLAYING_PAGESIZE = 3
+
+class NowPlayingTests(unittest.TestCase):
+
+	def setUp(self):
+		self.standIn = tivoRemoteBenchmark.HTTPStandIn()
+		self.standIn.start()
+		testPlugin = tivoRemoteBenchmark.createPlugin(pluginModule, u'polling')
+		testPlugin.putGUIConfigValue(tivoRemoteBenchmark.PLUGIN_DEVICETYPEID, pluginModule.tivoNowPlaying.GUI_CONFIG_NOWPLAYING_PAGESIZE, unicode(NOWPLAYING_PAGESIZE))
+		testIndigoDevice = tivoRemoteBenchmark.BenchmarkIndigoDevice(1, 0)
+		tivoDevice = pluginModule.tivoRemoteDevice.TivoRemoteDevice(testPlugin, testIndigoDevice)
+		self.nowPlayingDevice = pluginModule.tivoNowPlaying.TiVoNowPlayingDevice(testPlugin, testIndigoDevice, tivoDevice)
+
+	def tearDown(self):
+		self.nowPlayingDevice.terminateCommunications()
+		self.standIn.stop()
+
+	def readNowPlayingList(self, nowPlayingCount, nowPlayingFolders=0):
+		self.standIn.nowPlayingCount = nowPlayingCount
+		self.standIn.nowPlayingFolders = nowPlayingFolders
+		return self.nowPlayingDevice.readNowPlayingList(u'http://127.0.0.1:%d/TiVoConnect' % self.standIn.server_address[1], None)
+
+	def assertTotals(self, nowPlayingSummary, firstRecording, recordingCount):
+		# the stand-in's recordings are numbered from the first after any folders
+		recordingIndexes = range(firstRecording, firstRecording + recordingCount)
+		self.assertEqual(nowPlayingSummary.recordingCount, recordingCount)
+		self.assertEqual(nowPlayingSummary.inProgressCount, 1 if firstRecording == 0 else 0)
+		self.assertEqual(nowPlayingSummary.totalSize, sum([2000000000 + itemIndex for itemIndex in recordingIndexes]))
+		self.assertEqual(nowPlayingSummary.totalDuration, 1800 * recordingCount)
+		self.assertEqual(nowPlayingSummary.latestRecording.title, u'Benchmark Show %d' % recordingIndexes[-1])
+		self.assertEqual(dict(nowPlayingSummary.getDeviceStates())[u'nowPlayingLatestRecording'], u'Benchmark Show %d - Episode %d' % (recordingIndexes[-1], recordingIndexes[-1]))
+
+	def test_totals(self):
+		self.assertTotals(self.readNowPlayingList(7), 0, 7)
+
+	def test_pagedWithPartialLastPage(self):
+		self.readNowPlayingList(7)
+		self.assertEqual(self.standIn.nowPlayingPages, [(0, 3), (3, 3), (6, 3)])
+
+	def test_pagedWithFullLastPage(self):
+		self.assertTotals(self.readNowPlayingList(6), 0, 6)
+		self.assertEqual(self.standIn.nowPlayingPages, [(0, 3), (3, 3)])
+
+	def test_foldersSkipped(self):
+		self.assertTotals(self.readNowPlayingList(7, 2), 2, 5)
+
+	def test_emptyList(self):
+		nowPlayingSummary = self.readNowPlayingList(0)
+		self.assertEqual(nowPlayingSummary.recordingCount, 0)
+		self.assertEqual(nowPlayingSummary.latestRecording, None)
+		self.assertEqual(self.standIn.nowPlayingPages, [(0, 3)])
+
+	def test_restartedWhenListChanges(self):
+		# a recording is made once the first page has been read
+		self.standIn.changeNowPlayingAfter = (1, 8)
+		self.assertTotals(self.readNowPlayingList(7), 0, 8)
+		self.assertEqual(self.standIn.nowPlayingPages, [(0, 3), (3, 3), (0, 3), (3, 3), (6, 3)])
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# TiVoDiscoveryCacheTests
+#	TiVos are identified by the TCD ID of their beacon (with or without the tsn: prefix)
+#	and only series 3 and later TiVos are kept; the cache reports each cached TiVo found
+#	at a new address so that its devices may be reconnected there
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class TiVoDiscoveryCacheTests(unittest.TestCase):
+
+	def getBeacon(self, identity):
+		return 'tivoconnect=1\nmethod=broadcast\nplatform=tcd/Series4\nmachine=Living Room\nidentity=' + identity + '\nswversion=20.7.4\nservices=TiVoMediaServer:80/http\n'
+
+	def test_beaconIdentity(self):
+		for (identity, tcdId, isSupported) in [('7460001900A1B2C', '7460001900A1B2C', True), ('tsn:7460001900A1B2C', '7460001900A1B2C', True), ('TSN:7460001900A1B2C', '7460001900A1B2C', True), ('6520001800ABCDE', '6520001800ABCDE', True), ('tsn:6490001800ABCDE', '6490001800ABCDE', False), ('tsn:5400001800ABCDE', '5400001800ABCDE', False), ('tsn:', '', False), ('{F6B0B2E1-0000-4C3B-0000-1B2C3D4E5F60}', '{F6B0B2E1-0000-4C3B-0000-1B2C3D4E5F60}', False)]:
+			beaconIdentity = pluginModule.tivoDiscovery.getTiVoBeaconIdentity(self.getBeacon(identity))
+			self.assertEqual(beaconIdentity, tcdId, identity)
+			self.assertEqual(pluginModule.tivoDiscovery.isSupportedTiVo(beaconIdentity), isSupported, identity)
+		self.assertEqual(pluginModule.tivoDiscovery.getTiVoBeaconIdentity('tivoconnect=1\nmethod=broadcast\n'), None)
+
+	def test_addressChangesReturned(self):
+		discoveryCache = pluginModule.tivoDiscovery.TiVoDiscoveryCache()
+		self.assertEqual(discoveryCache.updateTiVos([('7460001', '192.168.1.20', None), ('7460002', '192.168.1.21', None)]), [])
+		self.assertEqual(discoveryCache.updateTiVos([('7460001', '192.168.1.20', None), ('7460002', '192.168.1.22', None), ('7460003', '192.168.1.23', None)]), [('7460002', '192.168.1.22')])
+		self.assertEqual(discoveryCache.updateTiVos([('7460002', '192.168.1.22', self.getBeacon('tsn:7460002'))], False), [])
+		self.assertEqual(discoveryCache.cachedTiVos['7460002'][u'address'], '192.168.1.22')
+		self.assertEqual((discoveryCache.cachedTiVos['7460002'][u'machineName'], discoveryCache.cachedTiVos['7460002'][u'swVersion']), ('Living Room', 20.7))
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# TiVoDiscoveryRefreshTests
+#	The TiVo discovery cache is refreshed in the background, one refresh at a time, so
+#	that neither the device dialog nor a failed connection waits on the discovery; a
+#	failed connection refreshes it at most once per reconnection delay and not at all
+#	while the beacon listener keeps it current
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class TiVoDiscoveryRefreshTests(unittest.TestCase):
+
+	def setUp(self):
+		self.testPlugin = tivoRemoteBenchmark.createPlugin(pluginModule, u'polling')
+		self.testPlugin.putGUIConfigValue(tivoRemoteBenchmark.PLUGIN_DEVICETYPEID, RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_DELAY, u'60')
+		self.testPlugin.tivoDiscoveryCache.updateTiVos([(u'6490001', u'127.0.0.1', None)])
+		self.testPlugin.tivoDiscoveryCache.lastRefresh -= 3600.0
+		self.refreshThreads = []
+		self.refreshRelease = threading.Event()
+		self.testPlugin.refreshTiVoDiscovery = self.refreshTiVoDiscovery
+
+		testIndigoDevice = tivoRemoteBenchmark.BenchmarkIndigoDevice(1, 31339)
+		testIndigoDevice.pluginProps[u'tivoTCDID'] = u'6490001'
+		self.testDevice = pluginModule.tivoRemoteDevice.TivoRemoteDevice(self.testPlugin, testIndigoDevice)
+
+	def tearDown(self):
+		self.refreshRelease.set()
+		self.waitForRefresh()
+
+	def refreshTiVoDiscovery(self):
+		# stands in for the discovery, which takes several seconds on a real network
+		self.refreshThreads.append(threading.currentThread())
+		self.refreshRelease.wait(10.0)
+		self.testPlugin.tivoDiscoveryCache.updateTiVos([])
+
+	def waitForRefresh(self):
+		refreshThread = self.testPlugin.tivoDiscoveryRefreshThread
+		if not (refreshThread is None):
+			refreshThread.join(10.0)
+
+	def test_connectionFailureRefreshesInBackground(self):
+		for failedAttempt in range(0, 3):
+			self.testDevice.handleConnectionFailure(u'Connection failed')
+		time.sleep(0.1)
+		self.assertEqual(len(self.refreshThreads), 1)
+		self.assertNotEqual(self.refreshThreads[0], threading.currentThread())
+		self.assertEqual(self.testPlugin.pluginCommandQueue.qsize(), 3)
+
+	def test_connectionFailureRefreshRateLimited(self):
+		self.refreshRelease.set()
+		self.testDevice.handleConnectionFailure(u'Connection failed')
+		self.waitForRefresh()
+		self.testDevice.handleConnectionFailure(u'Connection failed')
+		self.waitForRefresh()
+		self.assertEqual(len(self.refreshThreads), 1)
+
+	def test_connectionFailureWithBeaconListener(self):
+		self.testPlugin.tivoBeaconListener = object()
+		self.testDevice.handleConnectionFailure(u'Connection failed')
+		self.assertEqual(self.refreshThreads, [])
+
+	def test_dialogRefreshesInBackground(self):
+		self.refreshRelease.set()
+		for dialogOpened in range(0, 2):
+			self.assertEqual(self.testPlugin.findTiVoDevices(), [(u'127.0.0.1', u'127.0.0.1 (v0.0)')])
+			self.waitForRefresh()
+		self.assertEqual(len(self.refreshThreads), 2)
+
+		self.testPlugin.tivoBeaconListener = object()
+		self.testPlugin.findTiVoDevices()
+		self.assertEqual(len(self.refreshThreads), 2)
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# ScheduledQueueTests
+#	The plugin command queue hands out items in order of their due time (first in, first
+#	out for the same time) once due; a wait for the next item ends as soon as an earlier
+#	item is queued, or at the wake time should nothing become due
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+SCHEDULER_ALLOWANCE = 0.5
+
+class ScheduledQueueTests(unittest.TestCase):
+
+	def setUp(self):
+		self.scheduledQueue = RPFramework.RPFrameworkScheduler.RPFrameworkScheduledQueue()
+
+	def getDueInThread(self, wakeTime=None):
+		# waits for the next item on a thread of its own; returns the thread and a list to
+		# which it appends the item (or None) and the time it returned
+		dueResult = []
+		def waitForItem():
+			dueItem = self.scheduledQueue.getDue(wakeTime)
+			dueResult.extend([dueItem, time.time()])
+		dueThread = threading.Thread(target=waitForItem)
+		dueThread.daemon = True
+		dueThread.start()
+		time.sleep(0.1)
+		return (dueThread, dueResult)
+
+	def test_dueTimeOrder(self):
+		timeNow = time.time()
+		for (item, dueOffset) in [(u'third', -1.0), (u'first', -3.0), (u'fourth', 0.0), (u'second', -2.0)]:
+			self.scheduledQueue.putAt(item, timeNow + dueOffset)
+		self.assertEqual([self.scheduledQueue.getDue() for item in range(0, 4)], [u'first', u'second', u'third', u'fourth'])
+		self.assertTrue(self.scheduledQueue.empty())
+
+	def test_sameTimeFirstInFirstOut(self):
+		dueTime = time.time() - 1.0
+		for item in range(0, 10):
+			self.scheduledQueue.putAt(item, dueTime)
+		self.scheduledQueue.put(u'immediate')
+		self.assertEqual([self.scheduledQueue.getDue() for item in range(0, 11)], [u'immediate'] + range(0, 10))
+
+	def test_notHandedOutBeforeDue(self):
+		dueTime = time.time() + 0.3
+		self.scheduledQueue.putAt(u'later', dueTime)
+		self.assertEqual(self.scheduledQueue.getDue(), u'later')
+		self.assertTrue(time.time() >= dueTime)
+
+	def test_earlierItemWakesWait(self):
+		self.scheduledQueue.putAt(u'later', time.time() + 10.0)
+		(dueThread, dueResult) = self.getDueInThread()
+		queuedTime = time.time()
+		self.scheduledQueue.putAt(u'earlier', queuedTime)
+		dueThread.join(SCHEDULER_ALLOWANCE)
+		self.assertEqual(dueResult[0:1], [u'earlier'])
+		self.assertTrue(dueResult[1] - queuedTime < SCHEDULER_ALLOWANCE)
+		self.assertEqual(self.scheduledQueue.qsize(), 1)
+
+	def test_wakeTimeReturnsNone(self):
+		startTime = time.time()
+		self.assertEqual(self.scheduledQueue.getDue(startTime + 0.3), None)
+		self.assertTrue(0.3 <= time.time() - startTime < 0.3 + SCHEDULER_ALLOWANCE)
+
+		# an item not due until after the wake time does not hold the wait up
+		self.scheduledQueue.putAt(u'later', time.time() + 10.0)
+		startTime = time.time()
+		self.assertEqual(self.scheduledQueue.getDue(startTime + 0.3), None)
+		self.assertTrue(0.3 <= time.time() - startTime < 0.3 + SCHEDULER_ALLOWANCE)
+
+	def test_wakeEndsWait(self):
+		(dueThread, dueResult) = self.getDueInThread(time.time() + 10.0)
+		self.scheduledQueue.wake()
+		dueThread.join(SCHEDULER_ALLOWANCE)
+		self.assertEqual(dueResult[0:1], [None])
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# LineFramerTests
+#	Data read from a connection is split into lines however it is divided across reads:
+#	a partial line (or partial line ending) is held until the rest of it arrives and a
+#	read completing several lines delivers them all, in order
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class LineFramerTests(unittest.TestCase):
+
+	def test_partialLineKept(self):
+		lineFramer = RPFramework.RPFrameworkLineFramer.RPFrameworkLineFramer(u'\r')
+		self.assertEqual(lineFramer.addData('CH_STATUS 0'), 0)
+		self.assertEqual(lineFramer.addData('123 '), 0)
+		self.assertEqual(lineFramer.getLine(), None)
+		self.assertEqual(lineFramer.addData('LOCAL\rCH_'), 1)
+		self.assertEqual(lineFramer.getLine(), u'CH_STATUS 0123 LOCAL')
+		self.assertEqual(lineFramer.getLine(), None)
+		self.assertEqual(lineFramer.addData('STATUS 0456 REMOTE\r'), 1)
+		self.assertEqual(lineFramer.getLines(), [u'CH_STATUS 0456 REMOTE'])
+
+	def test_severalLinesPerRead(self):
+		lineFramer = RPFramework.RPFrameworkLineFramer.RPFrameworkLineFramer(u'\r')
+		self.assertEqual(lineFramer.addData('CH_STATUS 0123 LOCAL\r\rLIVETV_READY\rCH_FAILED '), 3)
+		self.assertEqual(lineFramer.addData('INVALID_CHANNEL\r'), 1)
+		self.assertEqual(lineFramer.getLine(), u'CH_STATUS 0123 LOCAL')
+		self.assertEqual(lineFramer.getLines(), [u'', u'LIVETV_READY', u'CH_FAILED INVALID_CHANNEL'])
+		self.assertEqual(lineFramer.getLines(), [])
+
+	def test_lineEndingSplitAcrossReads(self):
+		lineFramer = RPFramework.RPFrameworkLineFramer.RPFrameworkLineFramer(u'\r\n')
+		self.assertEqual(lineFramer.addData('CH_STATUS 0123 LOCAL\r'), 0)
+		self.assertEqual(lineFramer.addData('\nLIVETV_READY\r'), 1)
+		self.assertEqual(lineFramer.addData('\n'), 1)
+		self.assertEqual(lineFramer.getLines(), [u'CH_STATUS 0123 LOCAL', u'LIVETV_READY'])
+
+		# only the whole line ending ends a line
+		self.assertEqual(lineFramer.addData('ONE\rTWO\nTHREE\r\n'), 1)
+		self.assertEqual(lineFramer.getLine(), u'ONE\rTWO\nTHREE')
+
+	def test_characterSplitAcrossReads(self):
+		lineFramer = RPFramework.RPFrameworkLineFramer.RPFrameworkLineFramer(u'\r')
+		self.assertEqual(lineFramer.addData(u'Caf\u00e9\r'.encode('utf-8')[:4]), 0)
+		self.assertEqual(lineFramer.addData(u'Caf\u00e9\r'.encode('utf-8')[4:]), 1)
+		self.assertEqual(lineFramer.getLine(), u'Caf\u00e9')
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# ReconnectionDelayTests
+#	The delay before each reconnection attempt follows the configured scheme up to the
+#	maximum delay, is drawn from 0 up to that delay with full jitter, and after the
+#	attempt limit is the persistent delay (or no further attempt when that is not set)
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+class ReconnectionDelayTests(unittest.TestCase):
+
+	def setUp(self):
+		self.testPlugin = tivoRemoteBenchmark.createPlugin(pluginModule, u'polling')
+		self.testDevice = RPFramework.RPFrameworkDevice(self.testPlugin, tivoRemoteBenchmark.BenchmarkIndigoDevice(1, 0))
+
+	def configureReconnection(self, scheme, maxDelay=0, jitter=RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_JITTER_NONE, persistentDelay=0):
+		for (guiConfigName, guiConfigValue) in [(RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_LIMIT, u'5'),
+			(RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_DELAY, u'2'),
+			(RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME, scheme),
+			(RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_MAXDELAY, unicode(maxDelay)),
+			(RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_JITTER, jitter),
+			(RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_PERSISTENTDELAY, unicode(persistentDelay))]:
+			self.testPlugin.putGUIConfigValue(tivoRemoteBenchmark.PLUGIN_DEVICETYPEID, guiConfigName, guiConfigValue)
+
+	def getDelays(self):
+		# the delays before the first to the seventh attempts, two past the limit of 5
+		return [self.testDevice.getReconnectionDelay(failedAttempts) for failedAttempts in range(1, 8)]
+
+	def test_schemes(self):
+		# (scheme, maximum delay, persistent delay, expected delays) with a delay of 2s
+		for (scheme, maxDelay, persistentDelay, expectedDelays) in [
+			(RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME_FIXED, 0, 0, [2, 2, 2, 2, 2, None, None]),
+			(RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME_REGRESS, 0, 0, [2, 4, 6, 8, 10, None, None]),
+			(RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME_EXPONENTIAL, 0, 0, [2, 4, 8, 16, 32, None, None]),
+			(RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME_REGRESS, 5, 0, [2, 4, 5, 5, 5, None, None]),
+			(RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME_EXPONENTIAL, 10, 0, [2, 4, 8, 10, 10, None, None]),
+			(RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME_EXPONENTIAL, 10, 300, [2, 4, 8, 10, 10, 300, 300]),
+			(RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME_FIXED, 0, 60, [2, 2, 2, 2, 2, 60, 60])]:
+			self.configureReconnection(scheme, maxDelay=maxDelay, persistentDelay=persistentDelay)
+			self.assertEqual(self.getDelays(), expectedDelays, u'%s, maximum %d, persistent %d' % (scheme, maxDelay, persistentDelay))
+
+	def test_exponentLimited(self):
+		self.configureReconnection(RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME_EXPONENTIAL)
+		self.testPlugin.putGUIConfigValue(tivoRemoteBenchmark.PLUGIN_DEVICETYPEID, RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_LIMIT, u'100000')
+		self.assertEqual(self.testDevice.getReconnectionDelay(100000), 2.0 * 2 ** 30)
+
+	def test_fullJitterBounds(self):
+		self.configureReconnection(RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME_EXPONENTIAL, maxDelay=10, jitter=RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_JITTER_FULL, persistentDelay=300)
+		for iteration in range(0, 200):
+			delays = self.getDelays()
+			for (delay, delayCap) in zip(delays, [2, 4, 8, 10, 10, 300, 300]):
+				self.assertTrue(0.0 <= delay <= delayCap, u'jittered delay %.3f outside 0-%d' % (delay, delayCap))
+
+		# the jitter spreads the delays rather than always choosing the cap
+		jitteredDelays = [self.testDevice.getReconnectionDelay(4) for iteration in range(0, 200)]
+		self.assertTrue(min(jitteredDelays) < 5.0 and max(jitteredDelays) > 5.0)
+
+	def test_noAttemptsAfterLimitWithJitter(self):
+		self.configureReconnection(RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME_FIXED, jitter=RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_JITTER_FULL)
+		self.assertEqual(self.getDelays()[5:], [None, None])
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# ConnectionHealthTests
+#	A TiVo which hangs -- its connection open but neither read nor answered -- must be
+#	declared dead within the liveness bounds and a reconnection made after the configured
+#	delay, with each I/O engine. Unlike the health benchmark this does not black-hole the
+#	network, so needs no root privileges; the simulator's frozen connections stand in
+#	for the hung TiVo and their small receive buffer stops written data being
+#	acknowledged once full
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+HEALTH_LIVENESSTIMEOUT = 1.0
+HEALTH_LIVENESSIDLETIME = 1.0
+HEALTH_RECONNECTDELAY = 1.0
+HEALTH_ALLOWANCE = 1.5
+
+class ConnectionHealthTests(unittest.TestCase):
+
+	def setUp(self):
+		self.simulator = tivoRemoteSimulator.TiVoSimulator(count=1, basePort=0, receiveBufferSize=4096)
+		self.simulator.start()
+
+	def tearDown(self):
+		self.simulator.stop()
+
+	def createHealthPlugin(self, ioEngine, livenessCommand):
+		testPlugin = tivoRemoteBenchmark.createPlugin(pluginModule, ioEngine)
+		for (guiConfigName, guiConfigValue) in [(RPFramework.RPFrameworkTelnetDevice.GUI_CONFIG_TELNETDEV_KEEPALIVEIDLE, u'0'),
+			(RPFramework.RPFrameworkTelnetDevice.GUI_CONFIG_TELNETDEV_LIVENESSTIMEOUT, unicode(HEALTH_LIVENESSTIMEOUT)),
+			(RPFramework.RPFrameworkTelnetDevice.GUI_CONFIG_TELNETDEV_LIVENESSIDLETIME, unicode(HEALTH_LIVENESSIDLETIME) if livenessCommand != u'' else u'0'),
+			(RPFramework.RPFrameworkTelnetDevice.GUI_CONFIG_TELNETDEV_LIVENESSCOMMAND, livenessCommand),
+			(RPFramework.RPFrameworkTelnetDevice.GUI_CONFIG_SOCKET_CONNECTIONTIMEOUT, u'1'),
+			(RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_LIMIT, u'10'),
+			(RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_DELAY, unicode(HEALTH_RECONNECTDELAY)),
+			(RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME, RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_SCHEME_FIXED),
+			(RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_JITTER, RPFramework.RPFrameworkPlugin.GUI_CONFIG_RECONNECTIONATTEMPT_JITTER_NONE)]:
+			testPlugin.putGUIConfigValue(tivoRemoteBenchmark.PLUGIN_DEVICETYPEID, guiConfigName, guiConfigValue)
+		pluginThread = threading.Thread(target=testPlugin.runConcurrentThread)
+		pluginThread.daemon = True
+		pluginThread.start()
+		return testPlugin
+
+	# freezes the TiVo (then writes to it, if given data to write) and checks that the
+	# connection is declared dead within the detection limit and then re-established by a
+	# new connection once the reconnection delay has passed
+	def checkHungTiVoDetected(self, ioEngine, livenessCommand, detectionLimit, dataToWrite=None):
+		testPlugin = self.createHealthPlugin(ioEngine, livenessCommand)
+		testDevices = tivoRemoteBenchmark.startDevices(testPlugin, self.simulator.getPorts())
+		try:
+			testDevice = testDevices[0]
+			self.assertNotEqual(testDevice.serverStates.get(u'lastDataReceived', u''), u'')
+			connectionsAccepted = self.simulator.tivos[0].connectionsAccepted
+			
+			self.simulator.freezeConnections()
+			time.sleep(0.1)
+			frozenTime = time.time()
+			if dataToWrite is not None:
+				testPlugin.managedDevices[testDevice.id].queueDeviceCommand(RPFramework.RPFrameworkCommand.RPFrameworkCommand(RPFramework.RPFrameworkTelnetDevice.CMD_WRITE_TO_DEVICE, commandPayload=dataToWrite))
+			self.assertTrue(testDevice.waitFor(lambda: testDevice.serverStates[u'connectionState'] != u'Connected', detectionLimit + HEALTH_ALLOWANCE), u'%s: hung TiVo not detected within %.1fs' % (ioEngine, detectionLimit + HEALTH_ALLOWANCE))
+			detectedTime = time.time()
+			self.assertTrue(detectedTime - frozenTime >= min(detectionLimit, HEALTH_LIVENESSTIMEOUT) - 0.1, u'%s: connection declared dead after only %.2fs' % (ioEngine, detectedTime - frozenTime))
+			self.assertEqual(testDevice.errorState, u'Connection Error')
+			
+			self.assertTrue(testDevice.waitForState(u'connectionState', u'Connected', HEALTH_RECONNECTDELAY + HEALTH_ALLOWANCE), u'%s: not reconnected within %.1fs' % (ioEngine, HEALTH_RECONNECTDELAY + HEALTH_ALLOWANCE))
+			self.assertTrue(time.time() - detectedTime >= HEALTH_RECONNECTDELAY - 0.1, u'%s: reconnected before the reconnection delay' % ioEngine)
+			self.assertEqual(self.simulator.tivos[0].connectionsAccepted, connectionsAccepted + 1)
+		finally:
+			testPlugin.stopConcurrentThread()
+			tivoRemoteBenchmark.stopDevices(testPlugin, testDevices)
+
+	def test_idleLivenessCheckUnanswered(self):
+		# the liveness command goes unanswered once the TiVo hangs; it is sent after the idle
+		# time and must be answered within the liveness timeout
+		for ioEngine in tivoRemoteBenchmark.IO_ENGINES:
+			self.checkHungTiVoDetected(ioEngine, u'TELEPORT LIVETV', HEALTH_LIVENESSIDLETIME + HEALTH_LIVENESSTIMEOUT)
+
+	def test_writtenDataUnacknowledged(self):
+		# more is written than the TiVo's receive buffer holds so that some goes unacknowledged
+		for ioEngine in tivoRemoteBenchmark.IO_ENGINES:
+			self.checkHungTiVoDetected(ioEngine, u'', HEALTH_LIVENESSTIMEOUT, u'KEYBOARD ' + u'A' * 65536)
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+# DownloadResumeTests
+#	An interrupted download is resumed from its partial file only when fetched again
+#	from the same URL and while the file on the device is unchanged; otherwise (or when
+#	the device answers the range request with other bytes) it is downloaded afresh
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+#/////////////////////////////////////////////////////////////////////////////////////////
+RESUME_DOWNLOADSIZE = 1024 * 1024
+RESUME_ABORTAFTER = 256 * 1024
+
+class DownloadResumeTests(unittest.TestCase):
+
+	def setUp(self):
+		self.downloadFolder = tempfile.mkdtemp()
+		self.downloadLocation = os.path.join(self.downloadFolder, u'recording.mpg')
+		self.standIn = tivoRemoteBenchmark.HTTPStandIn(downloadSize=RESUME_DOWNLOADSIZE)
+		self.standIn.start()
+		testPlugin = tivoRemoteBenchmark.createPlugin(pluginModule, u'polling')
+		self.restfulDevice = tivoRemoteBenchmark.createRESTfulDevice(testPlugin, self.standIn.server_address[1])
+
+	def tearDown(self):
+		self.restfulDevice.terminateCommunications()
+		self.standIn.stop()
+		shutil.rmtree(self.downloadFolder, ignore_errors=True)
+
+	def download(self, downloadPath):
+		# runs a download to completion (or failure) on the device's download thread
+		self.restfulDevice.downloadCompletedEvent.clear()
+		downloadPayload = u'|*|'.join([u'http', downloadPath, u'none', u'', u'', self.downloadLocation])
+		self.restfulDevice.queueDeviceCommand(RPFramework.RPFrameworkCommand.RPFrameworkCommand(RPFramework.RPFrameworkRESTfulDevice.CMD_DOWNLOADFILE, commandPayload=downloadPayload))
+		self.restfulDevice.commandQueue.join()
+		while not (self.restfulDevice.downloadThread is None):
+			time.sleep(0.01)
+		return self.restfulDevice.downloadCompletedEvent.isSet()
+
+	def interruptedDownload(self, downloadPath=u'/download/recording.mpg'):
+		self.standIn.abortNextDownloadAfter = RESUME_ABORTAFTER
+		self.assertFalse(self.download(downloadPath))
+		self.assertFalse(os.path.exists(self.downloadLocation))
+		self.assertEqual(os.path.getsize(self.downloadLocation + RPFramework.RPFrameworkRESTfulDevice.DOWNLOAD_PARTIALFILE_EXTENSION), RESUME_ABORTAFTER)
+		del self.standIn.downloadRanges[:]
+		self.standIn.downloadBytesSent = 0
+
+	def assertDownloaded(self, downloadVersion, downloadSize=RESUME_DOWNLOADSIZE):
+		with open(self.downloadLocation, 'rb') as downloadedFile:
+			self.assertTrue(downloadedFile.read() == tivoRemoteBenchmark.getDownloadContent(downloadVersion, downloadSize), u'downloaded file does not match version %d of the file' % downloadVersion)
+		self.assertEqual(os.listdir(self.downloadFolder), [u'recording.mpg'])
+
+	def test_resumed(self):
+		self.interruptedDownload()
+		self.assertTrue(self.download(u'/download/recording.mpg'))
+		self.assertEqual(self.standIn.downloadRanges, ['bytes=%d-' % RESUME_ABORTAFTER])
+		self.assertEqual(self.standIn.downloadBytesSent, RESUME_DOWNLOADSIZE - RESUME_ABORTAFTER)
+		self.assertDownloaded(1)
+
+	def test_otherURLNotResumed(self):
+		self.interruptedDownload(u'/download/other.mpg')
+		self.assertTrue(self.download(u'/download/recording.mpg'))
+		self.assertEqual(self.standIn.downloadRanges, [''])
+		self.assertDownloaded(1)
+
+	def test_changedFileNotResumed(self):
+		# the If-Range validator no longer matches, so the device sends the whole file
+		self.interruptedDownload()
+		self.standIn.downloadVersion = 2
+		self.assertTrue(self.download(u'/download/recording.mpg'))
+		self.assertEqual(self.standIn.downloadRanges, ['bytes=%d-' % RESUME_ABORTAFTER])
+		self.assertEqual(self.standIn.downloadBytesSent, RESUME_DOWNLOADSIZE)
+		self.assertDownloaded(2)
+
+	def test_mismatchedRangeRestarted(self):
+		self.interruptedDownload()
+		self.standIn.misreportNextRange = True
+		self.assertTrue(self.download(u'/download/recording.mpg'))
+		self.assertEqual(self.standIn.downloadRanges, ['bytes=%d-' % RESUME_ABORTAFTER, ''])
+		self.assertDownloaded(1)
+
+	def test_unsatisfiableRangeRestarted(self):
+		# the file on the device is now no longer than the partial file
+		self.interruptedDownload()
+		self.standIn.downloadSize = RESUME_ABORTAFTER
+		self.assertTrue(self.download(u'/download/recording.mpg'))
+		self.assertEqual(self.standIn.downloadRanges, ['bytes=%d-' % RESUME_ABORTAFTER, ''])
+		self.assertDownloaded(1, RESUME_ABORTAFTER)
+
+
+#/////////////////////////////////////////////////////////////////////////////////////////
+# Command line entry point
+#/////////////////////////////////////////////////////////////////////////////////////////
+if __name__ == '__main__':
+	logging.basicConfig(level=logging.CRITICAL)
+	unittest.main()